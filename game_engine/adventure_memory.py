@@ -0,0 +1,182 @@
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+from game_engine.character_manager import Player
+from .common_types import AdventureLogEntry, MemorySummary
+
+SCENE = 0
+CHAPTER = 1
+SAGA = 2
+LEVEL_NAMES = {SCENE: 'scene', CHAPTER: 'chapter', SAGA: 'saga'}
+
+# (texts oldest first, level name) -> summary text. AIDungeonMaster.summarize_adventure fits this.
+Summarizer = Callable[[List[str], str], str]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def format_log_entry(entry: AdventureLogEntry) -> str:
+    """One line per log entry, shared by the summaries and the prompts."""
+    speaker = 'Player' if entry.type == 'player_action' else 'DM'
+    return f"T{entry.turn_number} {speaker}: {entry.content}"
+
+
+def fallback_summary(texts: List[str], level: str, max_chars: int = 400) -> str:
+    """
+    Local extractive summary used when no summarizer is configured or it fails: the first
+    sentence of each text, cut to `max_chars`. Keeps some continuity without an AI call.
+    """
+    sentences = [_SENTENCE_END.split(text.strip(), maxsplit=1)[0] for text in texts if text.strip()]
+    summary = " ".join(sentences)
+    if len(summary) > max_chars:
+        summary = summary[:max_chars - 3].rstrip() + "..."
+    return summary
+
+
+class AdventureMemoryKeeper:
+    """
+    Folds adventure log entries that are trimmed from the in-memory log into rolling summaries
+    stored on the player (Player.memory), so prompts keep the whole campaign in bounded size.
+
+    Every `scene_size` evicted entries become a scene summary. When more than `fan_in` scenes
+    accumulate, the oldest `fan_in` are folded into a chapter summary, and the oldest chapters
+    likewise into the single saga summary. A player therefore never carries more than `fan_in`
+    scenes, `fan_in` chapters, one saga and fewer than `scene_size` unsummarized entries.
+
+    Summaries are generated on a background thread, off the turn's critical path. Until a fold
+    finishes, its entries stay in memory.pending (and are still sent to the AI as raw log lines).
+    The folded memory is written with the player's next save.
+    """
+
+    def __init__(self, summarizer: Optional[Summarizer] = None, scene_size: int = 10, fan_in: int = 4,
+                 background: bool = True):
+        """
+        Args:
+            summarizer (Summarizer, optional): Writes a summary of the given texts. Defaults to
+                                               fallback_summary, which needs no AI.
+            scene_size (int, optional): Evicted log entries per scene summary.
+            fan_in (int, optional): Summaries of one level folded into one of the next level.
+            background (bool, optional): If False, folds run synchronously in remember() (for tools and tests).
+        """
+        self.summarizer = summarizer
+        self.scene_size = scene_size
+        self.fan_in = fan_in
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adventure-memory") if background else None
+        # id(player) -> Future of its latest fold job, dropped once it finishes. A pending job holds
+        # the player, so its id cannot be reused by another player while the entry exists.
+        self._scheduled: dict = {}
+
+    def remember(self, player: Player, evicted_entries: List[AdventureLogEntry]):
+        """
+        Records log entries that were trimmed from the player's adventure log and starts
+        folding them into summaries once a scene's worth has accumulated.
+        """
+        if not evicted_entries:
+            return
+        scheduled = None
+        with self._lock:
+            # Lists on the memory are replaced, never mutated, so readers on other threads
+            # (prompt building, the save snapshot) always see a consistent list.
+            player.memory.pending = player.memory.pending + list(evicted_entries)
+            if self._next_fold(player) is None:
+                return
+            if self._executor is not None:
+                # One worker runs jobs in order, so waiting on the latest job waits for all of them;
+                # a job finding nothing left to fold returns at once.
+                scheduled = self._executor.submit(self.fold, player)
+                self._scheduled[id(player)] = scheduled
+        if scheduled is None:
+            self.fold(player)
+            return
+        # Outside the lock: the callback runs right here if the job already finished
+        scheduled.add_done_callback(lambda future, key=id(player): self._forget(key, future))
+
+    def fold(self, player: Player) -> int:
+        """
+        Runs every fold the player's memory is due for.
+
+        Returns:
+            int: The number of summaries written.
+        """
+        written = 0
+        while True:
+            with self._lock:
+                work = self._next_fold(player)
+            if work is None:
+                return written
+            level, sources, texts, first_turn, last_turn = work
+            text = self._summarize(texts, LEVEL_NAMES[level])
+            summary = MemorySummary(level=level, first_turn=first_turn, last_turn=last_turn, text=text)
+            with self._lock:
+                if not self._apply_fold(player, level, sources, summary):
+                    continue # The memory changed underneath us (e.g. it was replaced); re-plan
+            written += 1
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Waits for scheduled folds. Returns False if they did not finish within `timeout`."""
+        with self._lock:
+            futures: List[Future] = list(self._scheduled.values())
+        _, not_done = wait(futures, timeout=timeout)
+        with self._lock: # Done callbacks run after waiters wake, so some may not have run yet
+            self._scheduled = {key: future for key, future in self._scheduled.items() if not future.done()}
+        return not not_done
+
+    def _forget(self, key: int, future: Future):
+        """Drops a finished job, unless a newer job for the same player has replaced it."""
+        with self._lock:
+            if self._scheduled.get(key) is future:
+                del self._scheduled[key]
+
+    def close(self, timeout: float | None = None):
+        """Finishes scheduled folds and stops the background thread."""
+        self.flush(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _summarize(self, texts: List[str], level: str) -> str:
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(texts, level)
+                if isinstance(summary, str) and summary.strip():
+                    return summary.strip()
+            except Exception as e:
+                print(f"AdventureMemory: Summarizer failed for a {level}, using a local summary: {e}")
+        return fallback_summary(texts, level)
+
+    def _next_fold(self, player: Player):
+        """Returns (level, sources, texts, first_turn, last_turn) for the next fold due, or None."""
+        memory = player.memory
+        if len(memory.pending) >= self.scene_size:
+            entries = memory.pending[:self.scene_size]
+            return (SCENE, entries, [format_log_entry(entry) for entry in entries],
+                    entries[0].turn_number, entries[-1].turn_number)
+        for level in (SCENE, CHAPTER):
+            at_level = [summary for summary in memory.summaries if summary.level == level]
+            if len(at_level) <= self.fan_in:
+                continue
+            group = at_level[:self.fan_in]
+            target = level + 1
+            if target == SAGA:
+                # The saga is a single running summary: fold the existing one in as its opening
+                group = [summary for summary in memory.summaries if summary.level == SAGA] + group
+            return (target, group, [summary.text for summary in group], group[0].first_turn, group[-1].last_turn)
+        return None
+
+    def _apply_fold(self, player: Player, level: int, sources: list, summary: MemorySummary) -> bool:
+        memory = player.memory
+        if level == SCENE:
+            if len(memory.pending) < len(sources) or any(
+                    current is not source for current, source in zip(memory.pending, sources)):
+                return False
+            memory.pending = memory.pending[len(sources):]
+        else:
+            if any(not any(current is source for current in memory.summaries) for source in sources):
+                return False
+            remaining = [current for current in memory.summaries if not any(current is source for source in sources)]
+            memory.summaries = remaining
+        memory.summaries = sorted(memory.summaries + [summary],
+                                  key=lambda item: (-item.level, item.first_turn))
+        return True
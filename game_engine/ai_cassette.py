@@ -0,0 +1,305 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from game_engine.llm_backends import LLMBackend, MockResponse, Prompt, MockUsageMetadata, prompt_kind, prompt_text, turn_action
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMissError(LookupError):
+    """Raised by a strict ReplayBackend when the cassette has no reply for a prompt."""
+
+
+@dataclass
+class CassetteInteraction:
+    """One recorded AI call: the prompt, and the reply as timed chunks."""
+    prompt: str
+    chunks: List[Tuple[float, str]] # (seconds since the call started, text), in arrival order
+    stream: bool = False
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+
+    @property
+    def kind(self) -> str:
+        return prompt_kind(self.prompt)
+
+    @property
+    def text(self) -> str:
+        return "".join(text for _, text in self.chunks)
+
+    @property
+    def latency(self) -> float:
+        return self.chunks[-1][0] if self.chunks else 0.0
+
+    def to_record(self) -> dict:
+        return {'prompt': self.prompt, 'stream': self.stream,
+                'chunks': [[round(offset, 4), text] for offset, text in self.chunks],
+                'usage': [self.prompt_tokens, self.response_tokens]}
+
+    @classmethod
+    def from_record(cls, record: dict) -> 'CassetteInteraction':
+        prompt_tokens, response_tokens = record.get('usage') or (None, None)
+        return cls(prompt=record['prompt'], chunks=[(offset, text) for offset, text in record['chunks']],
+                   stream=record.get('stream', False), prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+
+
+class Cassette:
+    """
+    Recorded AI traffic, stored as gzip-compressed JSON lines (one interaction per line).
+
+    When a path is given, each interaction is appended to the file as soon as it is recorded, as
+    its own gzip member, so a session that crashes keeps everything recorded up to that point.
+    """
+
+    def __init__(self, path: Optional[str] = None, interactions: Optional[List[CassetteInteraction]] = None):
+        self.path = path
+        self.interactions: List[CassetteInteraction] = list(interactions or [])
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        """Reads a cassette written by append() or save()."""
+        interactions = []
+        with gzip.open(path, 'rt', encoding='utf-8') as cassette_file:
+            for line in cassette_file:
+                record = json.loads(line)
+                if 'prompt' in record: # Skip header lines
+                    interactions.append(CassetteInteraction.from_record(record))
+        return cls(path, interactions)
+
+    def append(self, interaction: CassetteInteraction):
+        with self._lock:
+            self.interactions.append(interaction)
+            if self.path is not None:
+                self._write([interaction], 'at')
+
+    def save(self, path: Optional[str] = None):
+        """Writes the whole cassette to `path` (default: its own path), replacing the file."""
+        path = path if path is not None else self.path
+        with self._lock:
+            self._write(self.interactions, 'wt', path)
+
+    def player_actions(self) -> List[str]:
+        """The player's actions of the recorded turns, in order."""
+        return [turn_action(interaction.prompt) for interaction in self.interactions if interaction.kind == 'turn']
+
+    def _write(self, interactions: List[CassetteInteraction], mode: str, path: Optional[str] = None):
+        path = path if path is not None else self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new_file = mode == 'wt' or not os.path.exists(path) or not os.path.getsize(path)
+        with gzip.open(path, mode, encoding='utf-8') as cassette_file:
+            if new_file:
+                cassette_file.write(json.dumps({'cassette_version': CASSETTE_VERSION}) + "\n")
+            for interaction in interactions:
+                cassette_file.write(json.dumps(interaction.to_record(), separators=(',', ':')) + "\n")
+
+
+def _usage_counts(response) -> Tuple[Optional[int], Optional[int]]:
+    metadata = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(metadata, 'prompt_token_count', None)
+    response_tokens = getattr(metadata, 'candidates_token_count', None)
+    return (prompt_tokens if isinstance(prompt_tokens, int) else None,
+            response_tokens if isinstance(response_tokens, int) else None)
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text or ""
+    except ValueError: # Chunks without text parts (e.g. only finish metadata)
+        return ""
+
+
+class RecordingBackend:
+    """
+    Wraps another backend and records every completed call (prompt, reply chunks and their
+    timing, token usage) to a cassette. Calls that fail or streams that are abandoned are not recorded.
+    """
+
+    def __init__(self, inner: LLMBackend, cassette: Cassette, clock: Callable[[], float] = time.monotonic):
+        self.inner = inner
+        self.cassette = cassette
+        self.name = f"recording:{inner.name}"
+        self._clock = clock
+
+    def create_model(self, system_instruction: Optional[str] = None, response_schema: Optional[dict] = None,
+                     model_name: Optional[str] = None) -> 'RecordingModel':
+        return RecordingModel(self, self.inner.create_model(system_instruction, response_schema=response_schema,
+                                                            model_name=model_name))
+
+    def create_cached_model(self, system_instruction: str, ttl_seconds: float, response_schema: Optional[dict] = None,
+                            model_name: Optional[str] = None):
+        model, expire_time = self.inner.create_cached_model(system_instruction, ttl_seconds,
+                                                            response_schema=response_schema, model_name=model_name)
+        return RecordingModel(self, model), expire_time
+
+
+class RecordingModel:
+    def __init__(self, backend: RecordingBackend, model):
+        self.backend = backend
+        self.model = model
+
+    def generate_content(self, prompt: Prompt, stream: bool = False):
+        started = self.backend._clock()
+        if stream:
+            return self._record_stream(prompt, self.model.generate_content(prompt, stream=True), started)
+        response = self.model.generate_content(prompt)
+        self._record(prompt, [(self.backend._clock() - started, response.text)], False, response)
+        return response
+
+    async def generate_content_async(self, prompt: Prompt, stream: bool = False):
+        started = self.backend._clock()
+        if stream:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            return self._record_stream_async(prompt, response, started)
+        response = await self.model.generate_content_async(prompt)
+        self._record(prompt, [(self.backend._clock() - started, response.text)], False, response)
+        return response
+
+    def _record_stream(self, prompt: Prompt, response, started: float) -> Iterator[Any]:
+        chunks, chunk = [], None
+        for chunk in response:
+            chunks.append((self.backend._clock() - started, _chunk_text(chunk)))
+            yield chunk
+        self._record(prompt, chunks, True, chunk)
+
+    async def _record_stream_async(self, prompt: Prompt, response, started: float) -> AsyncIterator[Any]:
+        chunks, chunk = [], None
+        async for chunk in response:
+            chunks.append((self.backend._clock() - started, _chunk_text(chunk)))
+            yield chunk
+        self._record(prompt, chunks, True, chunk)
+
+    def _record(self, prompt: Prompt, chunks: List[Tuple[float, str]], stream: bool, last_response):
+        prompt_tokens, response_tokens = _usage_counts(last_response)
+        # A conversation is recorded as its text, which replays it as long as the same history is sent
+        self.backend.cassette.append(CassetteInteraction(prompt=prompt_text(prompt), chunks=chunks, stream=stream,
+                                                         prompt_tokens=prompt_tokens, response_tokens=response_tokens))
+
+
+class ReplayBackend:
+    """
+    Serves recorded replies from a cassette, without network.
+
+    A prompt gets the reply recorded for exactly that prompt (repeats are served in recorded
+    order, the last one again once they run out). With strict=False, a prompt that was never
+    recorded gets the next unserved reply of the same kind (turn, summary or scene) instead, so
+    a session whose state drifts from the recording still replays the same traffic.
+
+    Replies arrive with their recorded chunk timing divided by `speed`; speed=None serves them
+    as fast as possible.
+    """
+    name = 'replay'
+
+    def __init__(self, cassette: Cassette, speed: Optional[float] = 1.0, strict: bool = True,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            cassette (Cassette): The recorded traffic.
+            speed (float, optional): 1.0 replays at recorded speed, 2.0 twice as fast; None without delays.
+            strict (bool, optional): If True, an unrecorded prompt raises CassetteMissError.
+            sleep (Callable[[float], None], optional): Used by the sync calls to wait between chunks.
+        """
+        self.cassette = cassette
+        self.speed = speed if speed else None
+        self.strict = strict
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._by_prompt: Dict[str, Deque[int]] = defaultdict(deque)
+        self._unserved: Dict[str, List[int]] = defaultdict(list) # kind -> indices in recorded order
+        for index, interaction in enumerate(cassette.interactions):
+            self._by_prompt[interaction.prompt].append(index)
+            self._unserved[interaction.kind].append(index)
+        self._last_for_prompt: Dict[str, int] = {}
+        self._served = set()
+        self.exact_matches = 0
+        self.approximate_matches = 0
+
+    def create_model(self, system_instruction: Optional[str] = None, response_schema: Optional[dict] = None,
+                     model_name: Optional[str] = None) -> 'ReplayModel':
+        return ReplayModel(self) # Replies are served as recorded, from whichever model and format produced them
+
+    def create_cached_model(self, system_instruction: str, ttl_seconds: float, response_schema: Optional[dict] = None,
+                            model_name: Optional[str] = None):
+        raise NotImplementedError("Replayed traffic has no server-side cache.")
+
+    def lookup(self, prompt: Prompt) -> CassetteInteraction:
+        """Returns the recorded interaction that answers `prompt`."""
+        prompt = prompt_text(prompt)
+        with self._lock:
+            recorded = self._by_prompt.get(prompt)
+            if recorded:
+                index = recorded.popleft()
+                self._last_for_prompt[prompt] = index
+                self.exact_matches += 1
+            elif prompt in self._last_for_prompt:
+                index = self._last_for_prompt[prompt]
+                self.exact_matches += 1
+            else:
+                candidates = [index for index in self._unserved[prompt_kind(prompt)] if index not in self._served]
+                if self.strict or not candidates:
+                    raise CassetteMissError(f"No recorded {prompt_kind(prompt)} reply for this prompt.")
+                index = candidates[0]
+                self.approximate_matches += 1
+            self._served.add(index)
+            return self.cassette.interactions[index]
+
+    def delays(self, interaction: CassetteInteraction) -> List[float]:
+        """Seconds to wait before each chunk."""
+        if self.speed is None:
+            return [0.0] * len(interaction.chunks)
+        offsets = [offset for offset, _ in interaction.chunks]
+        return [max(0.0, (offset - previous) / self.speed) for previous, offset in zip([0.0] + offsets, offsets)]
+
+
+class ReplayModel:
+    def __init__(self, backend: ReplayBackend):
+        self.backend = backend
+
+    def generate_content(self, prompt: Prompt, stream: bool = False):
+        interaction = self.backend.lookup(prompt)
+        if stream:
+            return self._stream(interaction)
+        for delay in self.backend.delays(interaction):
+            if delay:
+                self.backend._sleep(delay)
+        return self._response(interaction)
+
+    async def generate_content_async(self, prompt: Prompt, stream: bool = False):
+        interaction = self.backend.lookup(prompt)
+        if stream:
+            return self._stream_async(interaction)
+        await asyncio.sleep(sum(self.backend.delays(interaction)))
+        return self._response(interaction)
+
+    @staticmethod
+    def _response(interaction: CassetteInteraction, text: Optional[str] = None) -> MockResponse:
+        usage = None
+        if interaction.prompt_tokens is not None or interaction.response_tokens is not None:
+            usage = MockUsageMetadata(interaction.prompt_tokens, interaction.response_tokens,
+                                      (interaction.prompt_tokens or 0) + (interaction.response_tokens or 0))
+        return MockResponse(interaction.text if text is None else text, usage)
+
+    def _stream(self, interaction: CassetteInteraction) -> Iterator[MockResponse]:
+        for position, ((_, text), delay) in enumerate(zip(interaction.chunks, self.backend.delays(interaction))):
+            if delay:
+                self.backend._sleep(delay)
+            yield self._chunk(interaction, text, position)
+
+    async def _stream_async(self, interaction: CassetteInteraction) -> AsyncIterator[MockResponse]:
+        for position, ((_, text), delay) in enumerate(zip(interaction.chunks, self.backend.delays(interaction))):
+            await asyncio.sleep(delay)
+            yield self._chunk(interaction, text, position)
+
+    def _chunk(self, interaction: CassetteInteraction, text: str, position: int) -> MockResponse:
+        if position == len(interaction.chunks) - 1:
+            return self._response(interaction, text) # The last chunk carries the usage metadata
+        return MockResponse(text)
@@ -1,80 +1,29 @@
-import google.generativeai as genai
 import os # For potentially loading API key from environment
 import json # For parsing AI response
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, TypeVar
 from game_engine.character_manager import Player # For type hinting
 from .common_types import GameStateUpdates, AdventureLog, AdventureLogEntry # For structuring game state updates and adventure log
-
-class AIDungeonMaster:
-    """
-    Manages interactions with the AI Dungeon Master (DM) using Google's Generative AI.
-    """
-    def __init__(self, api_key: str = None):
-        """
-        Initializes the AI Dungeon Master.
-
-        Args:
-            api_key (str, optional): The API key for Google's Generative AI.
-                                     If None, it will attempt to load from the
-                                     GOOGLE_API_KEY environment variable.
-
-        Raises:
-            ValueError: If the API key is not provided and not found in the environment.
-        """
-        if api_key is None:
-            api_key = os.getenv("GOOGLE_API_KEY")
-
-        if not api_key:
-            raise ValueError("API key not provided and GOOGLE_API_KEY environment variable not set.")
-
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
-        # Further model configuration (e.g., safety settings, generation config) can be done here
-        # self.model.safety_settings = ...
-        # self.model.generation_config = ...
-
-    def get_initial_scene_description(self) -> str:
-        """
-        Generates and returns the initial scene description for the player's adventure.
-
-        Returns:
-            str: A string containing the scene description, or an error message if generation fails.
-        """
-        prompt_string = (
-            'You are a Dungeon Master for a text-based RPG set in a world inspired by Indian Mythology, '
-            'focusing on a great war between Devas and Asuras where the player is caught in the middle. '
-            'Describe the very first intriguing scene the player encounters as they begin their adventure. '
-            'Keep it to 3-4 concise sentences.'
-        )
-        try:
-            response = self.model.generate_content(prompt_string)
-            # Consider adding more robust error checking for response if needed,
-            # e.g., checking response.prompt_feedback for block reasons.
-            return response.text
-        except Exception as e:
-            print(f'Error contacting AI DM for initial scene: {e}')
-            return 'Error: The mists of creation obscure your vision... Please check your connection or API key.'
-
-    def get_ai_response(self, player_object: Player, player_action: str) -> tuple[str, GameStateUpdates]:
-        """
-        Generates and returns the AI DM's response, including narrative and game state updates.
-
-        Args:
-            player_object (Player): The player character object.
-            player_action (str): The action taken by the player.
-
-        Returns:
-            tuple[str, GameStateUpdates]: A tuple containing the narrative string and
-                                          a GameStateUpdates object.
-        """
-        prompt_string = f"""You are the Dungeon Master for a text-based RPG inspired by Indian Mythology, focusing on a great war between Devas and Asuras.
-The player is {player_object.name}.
-Player's current status: HP: {player_object.hp}/{player_object.max_hp}, MP: {player_object.mp}/{player_object.max_mp}.
-Player's current location: {player_object.current_location}.
-Player's inventory: {str(player_object.inventory if hasattr(player_object, 'inventory') else [])}.
-Player's skills: {str(player_object.skills) if hasattr(player_object, 'skills') else 'None'}.
-Key story events/flags known so far: {str(player_object.story_flags)}.
-
-The player says: "{player_action}"
+from .narrative_stream import NarrativeStreamParser
+from .ai_resilience import ResilientCaller, CircuitOpenError, is_transient
+from .prompt_builder import PromptBuilder, BuiltPrompt, TurnTokenUsage, estimate_tokens
+from .llm_backends import LLMBackend, MODEL_NAME, prompt_text
+from .api_key_pool import gemini_backend_for_keys
+from .structured_output import TURN_RESPONSE_SCHEMA, DEFAULT_STRUCTURED_OUTPUT, updates_from_wire
+from .request_scheduler import RequestScheduler, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_BACKGROUND
+from .model_router import ModelRouter, RouteDecision
+from .conversation_session import ConversationSession
+
+T = TypeVar('T')
+
+# The fixed part of every turn prompt: role and combat rules, followed by the response format
+# (below). It is given to the turn model once as its system instruction (or stored server-side as
+# cached content), so each turn only sends the player's state and action.
+DM_ROLE_INSTRUCTION = """You are the Dungeon Master for a text-based RPG inspired by Indian Mythology, focusing on a great war between Devas and Asuras.
+Each message gives the player's current state and what the player says. Reply to the player's action.
+State is written compactly: story flags are listed by name when true and prefixed with "!" when false, and "(+N more)" means less relevant entries were left out.
 
 Combat Instructions:
 - You can introduce hostile NPCs or creatures, initiating combat.
@@ -82,7 +31,10 @@ Combat Instructions:
 - Player actions during combat could be 'attack [target]', 'use [skill name] [on target/on self]', 'defend', 'flee', etc.
 - When the player or an enemy takes damage, or an enemy is defeated, reflect this in the narrative and use `game_state_updates` (especially `hp_change` for the player) for mechanical effects.
 - You are responsible for tracking enemy health and status narratively.
+"""
 
+# How to format the reply, for models without a response schema (prose mode).
+DM_RESPONSE_FORMAT_INSTRUCTION = """
 Your response MUST be a valid JSON object with two top-level keys: "narrative" and "game_state_updates".
 1.  `"narrative"`: String (3-5 sentences) describing what happens next. Maintain theme and consider player's situation.
 2.  `"game_state_updates"`: JSON object for player/world changes. Omit keys or use default values if no change for an aspect.
@@ -91,378 +43,713 @@ Your response MUST be a valid JSON object with two top-level keys: "narrative" a
     -   `"inventory_remove"`: list[str] - Items to remove. Default: [].
     -   `"hp_change"`: int - Player HP change. Default: 0.
     -   `"mp_change"`: int - Player MP change. Default: 0.
-    -   `"new_story_flags"`: object - Story flags to set/update. Default: {{}}.
+    -   `"new_story_flags"`: object - Story flags to set/update. Default: {}.
     -   `"new_location"`: str | null - Player's new location. Default: null.
     -   `"player_name"`: str | null - Player's new name. Default: null.
     -   `"skill_used"`: str | null - The skill the player successfully used. Default: null.
 
 Example 1 (Comprehensive update with skill usage):
 ```json
-{{
+{
     "narrative": "Focusing your will, you unleash a Power Attack against the charging Rakshasa! It stumbles back, wounded. You feel drained but victorious.",
-    "game_state_updates": {{
+    "game_state_updates": {
         "mp_change": -15,
         "skill_used": "Power Attack",
-        "new_story_flags": {{"rakshasa_wounded": true}}
-    }}
-}}
+        "new_story_flags": {"rakshasa_wounded": true}
+    }
+}
 ```
 Example 2 (Simple item discovery, no skill):
 ```json
-{{
+{
     "narrative": "You search the old chest and find a glowing gem inside.",
-    "game_state_updates": {{
+    "game_state_updates": {
         "inventory_add": ["glowing gem"],
-        "new_story_flags": {{"found_gem": true}}
-    }}
-}}
+        "new_story_flags": {"found_gem": true}
+    }
+}
 ```
 Example 3 (Narrative only, no state changes):
 ```json
-{{
+{
     "narrative": "You look around but find nothing of interest, and nothing about you changes.",
-    "game_state_updates": {{}}
-}}
+    "game_state_updates": {}
+}
 ```
 Example 4 (Combat scenario):
 Player action: "I attack the goblin with my sword."
 ```json
-{{
+{
     "narrative": "You swing your sword at the goblin, landing a glancing blow. The goblin shrieks and lunges with its rusty dagger, catching your arm!",
-    "game_state_updates": {{
+    "game_state_updates": {
         "hp_change": -5
-    }}
-}}
+    }
+}
 ```
 Ensure your output is a single, valid JSON object. Only include changed fields in `game_state_updates`.
 """
-        response_text = ""
+
+DM_SYSTEM_INSTRUCTION = DM_ROLE_INSTRUCTION + DM_RESPONSE_FORMAT_INSTRUCTION
+
+# With structured output the response schema (TURN_RESPONSE_SCHEMA) defines the format and its
+# fields, so the instruction only says how to fill them in.
+DM_STRUCTURED_SYSTEM_INSTRUCTION = DM_ROLE_INSTRUCTION + """
+Reply with the narrative (3-5 sentences) describing what happens next. In game_state_updates, only include fields that changed.
+"""
+
+
+def build_turn_prompt(player_object: Player, player_action: str) -> str:
+    """
+    Builds the per-turn message: only the player's current state and action, within the
+    default token budget. The instructions it is interpreted against live in DM_SYSTEM_INSTRUCTION.
+    """
+    return _default_prompt_builder.build_turn(player_object, player_action).text
+
+INITIAL_SCENE_PROMPT = (
+    'You are a Dungeon Master for a text-based RPG set in a world inspired by Indian Mythology, '
+    'focusing on a great war between Devas and Asuras where the player is caught in the middle. '
+    'Describe the very first intriguing scene the player encounters as they begin their adventure. '
+    'Keep it to 3-4 concise sentences.'
+)
+INITIAL_SCENE_ERROR = 'Error: The mists of creation obscure your vision... Please check your connection or API key.'
+CONTINUATION_ERROR = 'Error: The mists of time swirl, obscuring your path forward for a moment... Please try again or check your connection.'
+TURN_TIMEOUT_NARRATIVE = "The threads of fate are tangled... The Dungeon Master took too long to answer. Please try again."
+# Local fallback while the AI upstream is unhealthy (retries exhausted or circuit open).
+# The action is not resolved, so no game state changes.
+AI_UNAVAILABLE_NARRATIVE = ("The Dungeon Master falls silent, gazing into the distance as the winds of fate still... "
+                            "(The AI is unavailable right now. Your action was not resolved; please try again in a moment.)")
+
+# Length of each adventure memory summary, by level (see adventure_memory).
+SUMMARY_SENTENCES = {'scene': 2, 'chapter': 3, 'saga': 5}
+
+# Default deadline, in seconds, for the async AI calls.
+DEFAULT_AI_TIMEOUT = 30.0
+
+# Tokens reserved for the reply when a request is charged against the tokens-per-minute quota.
+REPLY_TOKEN_ALLOWANCE = 400
+
+
+CONTINUATION_PREAMBLE = ("You are a Dungeon Master for a text-based RPG set in a world inspired by Indian Mythology, "
+                         "focusing on a great war between Devas and Asuras.\n"
+                         "The player, {name}, is resuming their adventure.")
+CONTINUATION_INSTRUCTIONS = ("Based on this log and the player's current state, provide a brief (2-3 concise sentences) "
+                             "re-orienting narrative to smoothly continue their adventure. This narrative should bridge "
+                             "from the last log entry and set the immediate scene. Do not ask questions, just describe the situation.")
+
+_default_prompt_builder = PromptBuilder()
+
+
+def build_continuation_prompt(player_object: Player) -> str:
+    """Builds the prompt for re-orienting a returning player from their adventure log, within the default token budget."""
+    return _build_continuation(_default_prompt_builder, player_object).text
+
+
+def _build_continuation(prompt_builder: PromptBuilder, player_object: Player) -> BuiltPrompt:
+    return prompt_builder.build_continuation(player_object, CONTINUATION_PREAMBLE.format(name=player_object.name),
+                                             CONTINUATION_INSTRUCTIONS)
+
+def _fallback_continuation(player_object: Player) -> str:
+    """A scene built from local state, for resuming while the AI is unavailable."""
+    return (f"You gather your bearings at {player_object.current_location}. "
+            "The world around you waits for your next move.")
+
+
+def _continuation_text(response) -> str:
+    # Consider adding more robust error checking for response if needed,
+    # e.g., checking response.prompt_feedback for block reasons.
+    if response.text:
+        return response.text
+    # Handle cases where response.text might be empty or None if API behaves unexpectedly
+    print('AI DM: Received empty response for continuation prompt.')
+    return "The threads of fate are tangled. You find yourself in a familiar yet subtly changed setting..." # Fallback
+
+
+def parse_turn_response(response_text: str) -> tuple[str, GameStateUpdates]:
+    """
+    Parses the model's JSON reply into the narrative and GameStateUpdates. Structured replies
+    are bare JSON; markdown fences (prose mode) are only stripped if that fails.
+
+    Raises:
+        json.JSONDecodeError: If the reply is not valid JSON.
+    """
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError:
+        data = json.loads(_strip_markdown_fences(response_text))
+
+    narrative = data.get("narrative", "The AI did not provide a narrative.")
+    updates_dict = updates_from_wire(data.get("game_state_updates") or {})
+
+    game_state_updates = GameStateUpdates(**updates_dict)
+
+    return narrative, game_state_updates
+
+
+def _strip_markdown_fences(response_text: str) -> str:
+    # Clean up potential markdown fences around the JSON
+    if response_text.startswith("```json\n") and response_text.endswith("\n```"):
+        response_text = response_text[len("```json\n"):-len("\n```")]
+    elif response_text.startswith("```") and response_text.endswith("```"):
+        lines = response_text.splitlines()
+        if len(lines) > 2 and lines[0] == "```" and lines[-1] == "```":
+            response_text = "\n".join(lines[1:-1])
+        elif lines[0].startswith("```json") and lines[-1] == "```": # Single line case
+             response_text = lines[0][len("```json"):].strip()
+             if response_text.endswith("```"):
+                 response_text = response_text[:-len("```")].strip()
+    return response_text
+
+
+def _turn_error_result(error: Exception, response_text: str) -> tuple[str, GameStateUpdates]:
+    """Logs a failed turn and returns what to show instead: the raw reply if there was one."""
+    if isinstance(error, json.JSONDecodeError):
+        print(f"AI response was not valid JSON: {error}\nRaw AI response: {response_text}")
+        return response_text, GameStateUpdates()
+    if isinstance(error, CircuitOpenError) or is_transient(error):
+        print(f"AI DM: Upstream unavailable, using the local fallback narrative: {error}")
+        return AI_UNAVAILABLE_NARRATIVE, GameStateUpdates()
+    error_message = f"An unexpected error occurred while getting AI response: {error}"
+    print(error_message)
+    # Use the raw reply if available, otherwise the error_message itself
+    return (response_text if response_text else error_message), GameStateUpdates()
+
+
+class AIDungeonMaster:
+    """
+    Manages interactions with the AI Dungeon Master (DM) through an LLM backend
+    (Google's Generative AI by default).
+    """
+
+    def __init__(self, api_key: str = None, context_cache_ttl: float | None = None,
+                 resilience: ResilientCaller | None = None, prompt_builder: PromptBuilder | None = None,
+                 backend: LLMBackend | None = None, structured_output: bool = DEFAULT_STRUCTURED_OUTPUT,
+                 request_scheduler: RequestScheduler | None = None, session_key=None,
+                 model_router: ModelRouter | None = None, conversation_mode: bool = False):
+        """
+        Initializes the AI Dungeon Master.
+
+        Args:
+            api_key (str | list[str], optional): The API key for Google's Generative AI.
+                                     If None, it will attempt to load from the
+                                     GOOGLE_API_KEY environment variable. Several keys
+                                     (a list, or comma-separated) are pooled: each request
+                                     goes to the least-loaded key that is not out of quota.
+            context_cache_ttl (float, optional): If set, DM_SYSTEM_INSTRUCTION is stored as
+                                                 server-side cached content for this many seconds
+                                                 and turns reference it by handle. Falls back to a
+                                                 plain system instruction if caching is unavailable.
+            resilience (ResilientCaller, optional): Retry, circuit breaker and hedging policy for upstream
+                                                    calls. Pass one shared instance so every session sees
+                                                    the same breaker. Defaults to retries without hedging.
+            prompt_builder (PromptBuilder, optional): Encodes the player's state within a token budget.
+            backend (LLMBackend, optional): Where the models come from, e.g. a MockLLMBackend to run
+                                            without network. Defaults to Gemini with `api_key`.
+            structured_output (bool, optional): If True, turns are generated against TURN_RESPONSE_SCHEMA
+                                                (JSON mode), so replies always parse and the instructions
+                                                can leave out the format description and examples.
+                                                Defaults to DEFAULT_STRUCTURED_OUTPUT (on); pass False for
+                                                backends without JSON mode.
+            request_scheduler (RequestScheduler, optional): Quota gate every request waits on. Pass the shared
+                                                            instance so all sessions stay within the key's limits.
+                                                            Turns are sent ahead of opening scenes and summaries.
+            session_key (optional): Identifies this session to the scheduler's fair queueing. Defaults to id(self).
+            model_router (ModelRouter, optional): Picks the model tier of each call (e.g. a stronger model for
+                                                  combat turns) and records per-tier latency and cost.
+                                                  Without one, every call uses the backend's default model.
+            conversation_mode (bool, optional): If True, turns are sent as a conversation: a full-state message,
+                                                then messages with only what changed, each request carrying the
+                                                exchanges since the last full-state message. The full state is
+                                                re-sent periodically, on a new location or when a reply shows
+                                                drift (see ConversationSession).
+
+        Raises:
+            ValueError: If no backend is given and the API key is not provided and not found in the environment.
+        """
+        if backend is None:
+            if api_key is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+
+            if not api_key:
+                raise ValueError("API key not provided and GOOGLE_API_KEY environment variable not set.")
+
+            backend = gemini_backend_for_keys(api_key)
+        self.backend = backend
+        self.model = backend.create_model()
+        # Model used for player turns. It carries DM_SYSTEM_INSTRUCTION (or the structured variant) and is built on first use.
+        self.turn_model = None
+        self.structured_output = structured_output
+        self.context_cache_ttl = context_cache_ttl
+        self._context_cache_expiry: datetime | None = None # When the turn model's cached instructions expire
+        self.resilience = resilience if resilience is not None else ResilientCaller()
+        self.prompt_builder = prompt_builder if prompt_builder is not None else PromptBuilder()
+        self.request_scheduler = request_scheduler
+        self.session_key = session_key if session_key is not None else id(self)
+        self.model_router = model_router
+        self.conversation = ConversationSession(self.prompt_builder) if conversation_mode else None
+        # Models of other tiers than the default, by model name: plain ones, and (turn model, cache expiry)
+        self._routed_models: dict = {}
+        self._routed_turn_models: dict = {}
+        # Token usage of the most recent turn or continuation, also printed after each call
+        self.last_turn_usage: TurnTokenUsage | None = None
+        # Further model configuration (e.g., safety settings, generation config) can be done here
+        # self.model.safety_settings = ...
+        # self.model.generation_config = ...
+
+    def _scheduled(self, operation: Callable[[], T], prompt_string: str,
+                   priority: int = PRIORITY_INTERACTIVE) -> Callable[[], T]:
+        """
+        Wraps one request so it first waits for quota on the request scheduler (if any). The wait
+        happens inside the operation, so every retry or hedged attempt is counted as a request.
+        """
+        if self.request_scheduler is None:
+            return operation
+        tokens = estimate_tokens(prompt_string) + REPLY_TOKEN_ALLOWANCE
+
+        def scheduled():
+            self.request_scheduler.acquire(self.session_key, priority, tokens)
+            return operation()
+        return scheduled
+
+    def _scheduled_async(self, operation: Callable[[], Awaitable[T]], prompt_string: str,
+                         priority: int = PRIORITY_INTERACTIVE) -> Callable[[], Awaitable[T]]:
+        """Async version of _scheduled. Time spent queued counts against the caller's deadline."""
+        if self.request_scheduler is None:
+            return operation
+        tokens = estimate_tokens(prompt_string) + REPLY_TOKEN_ALLOWANCE
+
+        async def scheduled():
+            await self.request_scheduler.acquire_async(self.session_key, priority, tokens)
+            return await operation()
+        return scheduled
+
+    def get_initial_scene_description(self, priority: int = PRIORITY_PREFETCH) -> str:
+        """
+        Generates and returns the initial scene description for the player's adventure.
+
+        Args:
+            priority (int, optional): Scheduler priority. PRIORITY_PREFETCH while nobody is waiting for the
+                                      scene yet; PRIORITY_INTERACTIVE when the player is.
+
+        Returns:
+            str: A string containing the scene description, or an error message if generation fails.
+        """
         try:
-            # Log the prompt that will be sent
-            print(f"--- PROMPT SENT TO AI (expecting JSON response) ---\n{prompt_string}\n-------------------------")
+            decision = self._route('scene')
+            model = self._get_model(decision.model_name if decision else None)
+            started = time.perf_counter_ns()
+            response = self.resilience.call(self._scheduled(
+                lambda: model.generate_content(INITIAL_SCENE_PROMPT), INITIAL_SCENE_PROMPT, priority))
+            self._record_route(decision, started, INITIAL_SCENE_PROMPT, response)
+            # Consider adding more robust error checking for response if needed,
+            # e.g., checking response.prompt_feedback for block reasons.
+            return response.text
+        except Exception as e:
+            print(f'Error contacting AI DM for initial scene: {e}')
+            return INITIAL_SCENE_ERROR
 
-            response = self.model.generate_content(prompt_string)
-            response_text = response.text
-            original_response_text_for_debugging = response_text # Keep a copy for debug log
+    async def get_initial_scene_description_async(self, timeout: float | None = DEFAULT_AI_TIMEOUT,
+                                                  priority: int = PRIORITY_PREFETCH) -> str:
+        """
+        Async version of get_initial_scene_description with a deadline.
 
-            # Clean up potential markdown fences around the JSON
-            if response_text.startswith("```json\n") and response_text.endswith("\n```"):
-                response_text = response_text[len("```json\n"):-len("\n```")]
-            elif response_text.startswith("```") and response_text.endswith("```"):
-                lines = response_text.splitlines()
-                if len(lines) > 2 and lines[0] == "```" and lines[-1] == "```":
-                    response_text = "\n".join(lines[1:-1])
-                elif lines[0].startswith("```json") and lines[-1] == "```": # Single line case
-                     response_text = lines[0][len("```json"):].strip()
-                     if response_text.endswith("```"):
-                         response_text = response_text[:-len("```")].strip()
+        Args:
+            timeout (float, optional): Seconds to wait for the reply. None waits indefinitely.
+            priority (int, optional): Scheduler priority. PRIORITY_PREFETCH while nobody is waiting for the
+                                      scene yet; PRIORITY_INTERACTIVE when the player is.
 
-            data = json.loads(response_text)
+        Returns:
+            str: The scene description, or an error message if generation fails or times out.
+        """
+        try:
+            decision = self._route('scene')
+            model = self._get_model(decision.model_name if decision else None)
+            started = time.perf_counter_ns()
+            response = await asyncio.wait_for(
+                self.resilience.call_async(self._scheduled_async(
+                    lambda: model.generate_content_async(INITIAL_SCENE_PROMPT), INITIAL_SCENE_PROMPT, priority)),
+                timeout)
+            self._record_route(decision, started, INITIAL_SCENE_PROMPT, response)
+            return response.text
+        except asyncio.TimeoutError:
+            print(f'AI DM: Initial scene request timed out after {timeout}s.')
+            return INITIAL_SCENE_ERROR
+        except Exception as e:
+            print(f'Error contacting AI DM for initial scene: {e}')
+            return INITIAL_SCENE_ERROR
+
+    def _get_turn_model(self, model_name: str | None = None):
+        """
+        Returns the turn model (of `model_name`, by default the backend's model), (re)building it
+        if it does not exist or its cached content expired.
+        """
+        now = datetime.now(timezone.utc)
+        if model_name is not None:
+            turn_model, expiry = self._routed_turn_models.get(model_name, (None, None))
+            if turn_model is None or (expiry is not None and expiry <= now):
+                turn_model, expiry = self._routed_turn_models[model_name] = self._create_turn_model(model_name)
+            return turn_model
+        if self._context_cache_expiry is not None and self._context_cache_expiry <= now:
+            self.turn_model = None
+            self._context_cache_expiry = None
+        if self.turn_model is None:
+            self.turn_model, self._context_cache_expiry = self._create_turn_model()
+        return self.turn_model
+
+    def _get_model(self, model_name: str | None = None):
+        """Returns the plain model (no instructions) of `model_name`, by default the backend's model."""
+        if model_name is None:
+            return self.model
+        if model_name not in self._routed_models:
+            self._routed_models[model_name] = self.backend.create_model(model_name=model_name)
+        return self._routed_models[model_name]
+
+    def _route(self, route: str, player_object: Player | None = None, player_action: str | None = None) -> RouteDecision | None:
+        """Asks the model router (if any) which tier serves a call: 'turn' (classified), 'scene' or 'summary'."""
+        if self.model_router is None:
+            return None
+        if route == 'turn':
+            decision = self.model_router.route_turn(player_object, player_action)
+            reasons = f" ({', '.join(decision.reasons)})" if decision.reasons else ""
+            print(f"AI DM: {decision.route} -> {decision.tier.name} tier ({decision.model_name}){reasons}")
+            return decision
+        return self.model_router.route(route)
+
+    def _record_route(self, decision: RouteDecision | None, started_ns: int, prompt_string: str, response):
+        """Records a completed call's latency and billed tokens on its tier."""
+        if decision is None:
+            return
+        metadata = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(metadata, 'prompt_token_count', None)
+        response_tokens = getattr(metadata, 'candidates_token_count', None)
+        self.model_router.record(decision, time.perf_counter_ns() - started_ns,
+                                 prompt_tokens if isinstance(prompt_tokens, int) else estimate_tokens(prompt_string),
+                                 response_tokens if isinstance(response_tokens, int) else 0)
+
+    def _create_turn_model(self, model_name: str | None = None):
+        """Returns a new turn model and when its cached instructions expire (None if not cached)."""
+        if self.structured_output:
+            instruction, response_schema = DM_STRUCTURED_SYSTEM_INSTRUCTION, TURN_RESPONSE_SCHEMA
+        else:
+            instruction, response_schema = DM_SYSTEM_INSTRUCTION, None
+        if self.context_cache_ttl is not None:
+            try:
+                return self.backend.create_cached_model(instruction, self.context_cache_ttl,
+                                                        response_schema=response_schema, model_name=model_name)
+            except Exception as e:
+                # e.g. the prefix is below the model's minimum cacheable size
+                print(f"AI DM: Context caching unavailable, sending the instructions as a system instruction: {e}")
+                self.context_cache_ttl = None
+        return self.backend.create_model(system_instruction=instruction, response_schema=response_schema,
+                                         model_name=model_name), None
+
+    def get_ai_response(self, player_object: Player, player_action: str,
+                        on_narrative_fragment: Callable[[str], None] | None = None) -> tuple[str, GameStateUpdates]:
+        """
+        Generates and returns the AI DM's response, including narrative and game state updates.
+
+        Args:
+            player_object (Player): The player character object.
+            player_action (str): The action taken by the player.
+            on_narrative_fragment (Callable[[str], None], optional): If given, the reply is streamed
+                and this is called with each piece of narrative text as it arrives. The game state
+                updates are still only returned once the whole reply has been received.
+
+        Returns:
+            tuple[str, GameStateUpdates]: A tuple containing the narrative string and
+                                          a GameStateUpdates object.
+        """
+        built_prompt, request, usage_label, history_tokens = self._build_turn(player_object, player_action)
+        prompt_string = prompt_text(request)
+        original_response_text_for_debugging = ""
+        try:
+            # Log the prompt that will be sent
+            print(f"--- PROMPT SENT TO AI (expecting JSON response) ---\n{built_prompt.text}\n-------------------------")
+
+            decision = self._route('turn', player_object, player_action)
+            turn_model = self._get_turn_model(decision.model_name if decision else None)
+            started = time.perf_counter_ns()
+            if on_narrative_fragment is None:
+                response = self.resilience.call(self._scheduled(lambda: turn_model.generate_content(request), prompt_string))
+                original_response_text_for_debugging = response.text # Keep a copy for debug log
+                self._report_usage(built_prompt, response, usage_label, history_tokens)
+                self._record_route(decision, started, prompt_string, response)
+            else:
+                # A stream is never hedged, and only retried if nothing has been shown yet
+                shown = []
+                def show_fragment(fragment: str):
+                    shown.append(fragment)
+                    on_narrative_fragment(fragment)
+                original_response_text_for_debugging, last_chunk = self.resilience.call(
+                    self._scheduled(lambda: self._stream_turn(turn_model, request, show_fragment), prompt_string),
+                    hedge=False, can_retry=lambda: not shown)
+                self._report_usage(built_prompt, last_chunk, usage_label, history_tokens)
+                self._record_route(decision, started, prompt_string, last_chunk)
+
+            return self._parse_turn(player_object, original_response_text_for_debugging)
 
-            narrative = data.get("narrative", "The AI did not provide a narrative.")
-            updates_dict = data.get("game_state_updates", {})
+        except Exception as e:
+            return _turn_error_result(e, original_response_text_for_debugging)
 
-            game_state_updates = GameStateUpdates(**updates_dict)
+    async def get_ai_response_async(self, player_object: Player, player_action: str,
+                                    on_narrative_fragment: Callable[[str], None] | None = None,
+                                    timeout: float | None = DEFAULT_AI_TIMEOUT) -> tuple[str, GameStateUpdates]:
+        """
+        Async version of get_ai_response with a deadline. Cancelling the awaiting task
+        (e.g. because the player sent a newer command) cancels the request as well.
 
-            return narrative, game_state_updates
+        Args:
+            player_object (Player): The player character object.
+            player_action (str): The action taken by the player.
+            on_narrative_fragment (Callable[[str], None], optional): Streams the narrative, as in get_ai_response.
+                                                                   Called on the event loop's thread.
+            timeout (float, optional): Seconds to wait for the complete reply. None waits indefinitely.
 
-        except json.JSONDecodeError as e:
-            error_message = f"AI response was not valid JSON: {e}\nRaw AI response: {original_response_text_for_debugging}"
-            print(error_message)
-            return original_response_text_for_debugging, GameStateUpdates()
+        Returns:
+            tuple[str, GameStateUpdates]: The narrative and the game state updates. On timeout, an
+                                          apology narrative and empty updates.
+        """
+        built_prompt, request, usage_label, history_tokens = self._build_turn(player_object, player_action)
+        prompt_string = prompt_text(request)
+        original_response_text_for_debugging = ""
+        try:
+            print(f"--- PROMPT SENT TO AI (async, expecting JSON response) ---\n{built_prompt.text}\n-------------------------")
+            decision = self._route('turn', player_object, player_action)
+            turn_model = self._get_turn_model(decision.model_name if decision else None)
+            started = time.perf_counter_ns()
+            if on_narrative_fragment is None:
+                response = await asyncio.wait_for(
+                    self.resilience.call_async(self._scheduled_async(
+                        lambda: turn_model.generate_content_async(request), prompt_string)), timeout)
+                original_response_text_for_debugging = response.text
+                self._report_usage(built_prompt, response, usage_label, history_tokens)
+                self._record_route(decision, started, prompt_string, response)
+            else:
+                shown = []
+                def show_fragment(fragment: str):
+                    shown.append(fragment)
+                    on_narrative_fragment(fragment)
+                original_response_text_for_debugging, last_chunk = await asyncio.wait_for(
+                    self.resilience.call_async(
+                        self._scheduled_async(lambda: self._stream_turn_async(turn_model, request, show_fragment),
+                                              prompt_string),
+                        hedge=False, can_retry=lambda: not shown), timeout)
+                self._report_usage(built_prompt, last_chunk, usage_label, history_tokens)
+                self._record_route(decision, started, prompt_string, last_chunk)
+            return self._parse_turn(player_object, original_response_text_for_debugging)
+
+        except asyncio.TimeoutError:
+            print(f"AI DM: Turn request timed out after {timeout}s.")
+            return TURN_TIMEOUT_NARRATIVE, GameStateUpdates()
 
         except Exception as e:
-            error_message = f"An unexpected error occurred while getting AI response: {e}"
-            print(error_message)
-            # Use original_response_text_for_debugging if available, otherwise the error_message itself
-            narrative_error = original_response_text_for_debugging if original_response_text_for_debugging else error_message
-            return narrative_error, GameStateUpdates()
+            return _turn_error_result(e, original_response_text_for_debugging)
+
+    def _build_turn(self, player_object: Player, player_action: str) -> tuple[BuiltPrompt, str | list[dict], str, int]:
+        """
+        Builds a turn's message (in conversation mode, often only a delta), what to send (the message,
+        or in conversation mode the conversation ending with it), the label its usage is printed
+        under and the tokens sent along with the message.
+        """
+        if self.conversation is None:
+            built_prompt = self.prompt_builder.build_turn(player_object, player_action)
+            return built_prompt, built_prompt.text, "Turn", 0
+        built_prompt, contents, keyframe_reason = self.conversation.build_turn(player_object, player_action)
+        if keyframe_reason:
+            print(f"AI DM: Sending the full state ({keyframe_reason}).")
+            return built_prompt, contents, "Turn (full state)", 0
+        return built_prompt, contents, f"Turn (delta, after {len(contents) - 1} messages)", self.conversation.history_tokens
+
+    def _parse_turn(self, player_object: Player, response_text: str) -> tuple[str, GameStateUpdates]:
+        """Parses a turn reply. In conversation mode, a reply that parsed joins the conversation the next turns are sent with."""
+        narrative, updates = parse_turn_response(response_text)
+        if self.conversation is not None:
+            self.conversation.check_reply(player_object, updates)
+            self.conversation.complete(response_text)
+        return narrative, updates
+
+    async def _stream_turn_async(self, turn_model, request: str | list[dict],
+                                 on_narrative_fragment: Callable[[str], None]):
+        parser = NarrativeStreamParser()
+        chunk = None
+        response = await turn_model.generate_content_async(request, stream=True)
+        async for chunk in response:
+            try:
+                chunk_text = chunk.text
+            except ValueError: # Chunks without text parts (e.g. only finish metadata)
+                continue
+            fragment = parser.feed(chunk_text)
+            if fragment:
+                on_narrative_fragment(fragment)
+        return parser.text, chunk
+
+    def _stream_turn(self, turn_model, request: str | list[dict], on_narrative_fragment: Callable[[str], None]):
+        """
+        Streams a turn reply, passing narrative text to the callback as soon as it is decoded.
 
-    def get_scene_description_from_log(self, player_object: Player) -> str:
+        Returns:
+            tuple[str, object]: The complete raw reply, for parsing once the stream has finished,
+                                and the last chunk (which carries the usage metadata).
+        """
+        parser = NarrativeStreamParser()
+        chunk = None
+        for chunk in turn_model.generate_content(request, stream=True):
+            try:
+                chunk_text = chunk.text
+            except ValueError: # Chunks without text parts (e.g. only finish metadata)
+                continue
+            fragment = parser.feed(chunk_text)
+            if fragment:
+                on_narrative_fragment(fragment)
+        return parser.text, chunk
+
+    def _report_usage(self, built_prompt: BuiltPrompt, response, label: str = "Turn", history_tokens: int = 0):
+        """
+        Records and prints the token usage of a call; billed counts come from the response's usage metadata.
+        `history_tokens` are the earlier messages of a conversation sent along with the prompt.
+        """
+        usage = TurnTokenUsage(estimated_prompt_tokens=built_prompt.tokens + history_tokens, budget=built_prompt.budget,
+                               omitted=dict(built_prompt.omitted))
+        metadata = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(metadata, 'prompt_token_count', None)
+        response_tokens = getattr(metadata, 'candidates_token_count', None)
+        if isinstance(prompt_tokens, int):
+            usage.prompt_tokens = prompt_tokens
+        if isinstance(response_tokens, int):
+            usage.response_tokens = response_tokens
+        self.last_turn_usage = usage
+        print(f"AI DM: {label} tokens - {usage.summary()}")
+
+    def summarize_adventure(self, texts: list[str], level: str) -> str:
+        """
+        Condenses part of the adventure into a summary for the player's memory. Called by
+        AdventureMemoryKeeper on its background thread, never during a turn.
+
+        Args:
+            texts (list[str]): Log lines or lower-level summaries, oldest first.
+            level (str): 'scene', 'chapter' or 'saga'.
+
+        Returns:
+            str: The summary.
+
+        Raises:
+            Exception: If generation fails; the keeper then falls back to a local summary.
+        """
+        sentences = SUMMARY_SENTENCES.get(level, 3)
+        joined_texts = "\n".join(texts)
+        prompt_string = (f"Summarize this part of a text RPG adventure (one {level}) in at most {sentences} sentences, "
+                         "past tense. Keep names, places, items gained or lost, allies, enemies, promises and "
+                         f"unresolved threads; drop flavour text.\n\n{joined_texts}")
+        decision = self._route('summary')
+        model = self._get_model(decision.model_name if decision else None)
+        started = time.perf_counter_ns()
+        response = self.resilience.call(self._scheduled(
+            lambda: model.generate_content(prompt_string), prompt_string, PRIORITY_BACKGROUND))
+        self._record_route(decision, started, prompt_string, response)
+        return response.text
+
+    def get_scene_description_from_log(self, player_object: Player, priority: int = PRIORITY_PREFETCH) -> str:
         """
         Generates a scene description for a continued game based on the player's adventure log.
+
+        Args:
+            player_object (Player): The player resuming their adventure.
+            priority (int, optional): Scheduler priority. PRIORITY_PREFETCH while nobody is waiting for the
+                                      scene yet; PRIORITY_INTERACTIVE when the player is.
         """
         if not player_object.adventure_log or not player_object.adventure_log.entries:
             # This case should ideally be handled by GameManager, but as a safeguard:
             print("AI_DM: get_scene_description_from_log called with empty or no log. Falling back to initial scene logic.")
-            return self.get_initial_scene_description()
-
-        # Format the adventure log entries for the prompt
-        log_summary = "\n".join([
-            f"- Turn {entry.turn_number} ({entry.type}): {entry.content}"
-            for entry in player_object.adventure_log.entries
-        ])
-
-        prompt_string = f"""You are a Dungeon Master for a text-based RPG set in a world inspired by Indian Mythology, focusing on a great war between Devas and Asuras.
-The player, {player_object.name}, is resuming their adventure.
-Here's a summary of what happened recently (The Adventure Log):
-{log_summary}
-
-Current Player Status:
-- HP: {player_object.hp}/{player_object.max_hp}
-- MP: {player_object.mp}/{player_object.max_mp}
-- Location: {player_object.current_location}
-- Inventory: {str(player_object.inventory if hasattr(player_object, 'inventory') else [])}
-- Skills: {str(player_object.skills) if hasattr(player_object, 'skills') else 'None'}
-- Key Story Flags: {str(player_object.story_flags)}
-
-Based on this log and the player's current state, provide a brief (2-3 concise sentences) re-orienting narrative to smoothly continue their adventure. This narrative should bridge from the last log entry and set the immediate scene. Do not ask questions, just describe the situation.
-"""
+            return self.get_initial_scene_description(priority)
+
+        built_prompt = _build_continuation(self.prompt_builder, player_object)
+        prompt_string = built_prompt.text
         try:
             print(f"--- PROMPT SENT TO AI (for continuation) ---\n{prompt_string}\n-------------------------")
-            response = self.model.generate_content(prompt_string)
+            decision = self._route('scene')
+            model = self._get_model(decision.model_name if decision else None)
+            started = time.perf_counter_ns()
+            response = self.resilience.call(self._scheduled(
+                lambda: model.generate_content(prompt_string), prompt_string, priority))
+            self._report_usage(built_prompt, response, "Continuation")
+            self._record_route(decision, started, prompt_string, response)
             # Consider adding more robust error checking for response if needed,
             # e.g., checking response.prompt_feedback for block reasons.
-            if response.text:
-                return response.text
-            else:
-                # Handle cases where response.text might be empty or None if API behaves unexpectedly
-                print('AI DM: Received empty response for continuation prompt.')
-                return "The threads of fate are tangled. You find yourself in a familiar yet subtly changed setting..." # Fallback
+            return _continuation_text(response)
         except Exception as e:
             print(f'Error contacting AI DM for continuation scene: {e}')
-            return 'Error: The mists of time swirl, obscuring your path forward for a moment... Please try again or check your connection.'
+            if isinstance(e, CircuitOpenError) or is_transient(e):
+                return _fallback_continuation(player_object)
+            return CONTINUATION_ERROR
+
+    async def get_scene_description_from_log_async(self, player_object: Player,
+                                                   timeout: float | None = DEFAULT_AI_TIMEOUT,
+                                                   priority: int = PRIORITY_PREFETCH) -> str:
+        """
+        Async version of get_scene_description_from_log with a deadline.
+
+        Args:
+            player_object (Player): The player resuming their adventure.
+            timeout (float, optional): Seconds to wait for the reply. None waits indefinitely.
+            priority (int, optional): Scheduler priority. PRIORITY_PREFETCH while nobody is waiting for the
+                                      scene yet; PRIORITY_INTERACTIVE when the player is.
+        """
+        if not player_object.adventure_log or not player_object.adventure_log.entries:
+            print("AI_DM: get_scene_description_from_log_async called with empty or no log. Falling back to initial scene logic.")
+            return await self.get_initial_scene_description_async(timeout, priority)
+
+        built_prompt = _build_continuation(self.prompt_builder, player_object)
+        prompt_string = built_prompt.text
+        try:
+            print(f"--- PROMPT SENT TO AI (for continuation) ---\n{prompt_string}\n-------------------------")
+            decision = self._route('scene')
+            model = self._get_model(decision.model_name if decision else None)
+            started = time.perf_counter_ns()
+            response = await asyncio.wait_for(
+                self.resilience.call_async(self._scheduled_async(
+                    lambda: model.generate_content_async(prompt_string), prompt_string, priority)),
+                timeout)
+            self._report_usage(built_prompt, response, "Continuation")
+            self._record_route(decision, started, prompt_string, response)
+            return _continuation_text(response)
+        except asyncio.TimeoutError:
+            print(f'AI DM: Continuation scene request timed out after {timeout}s.')
+            return _fallback_continuation(player_object)
+        except Exception as e:
+            print(f'Error contacting AI DM for continuation scene: {e}')
+            if isinstance(e, CircuitOpenError) or is_transient(e):
+                return _fallback_continuation(player_object)
+            return CONTINUATION_ERROR
 
 if __name__ == '__main__':
-    # Example Usage (requires GOOGLE_API_KEY to be set in the environment or passed directly)
-    # Ensure you have the google-generativeai and pydantic packages installed
-    print("Attempting to initialize AIDungeonMaster...")
-
-    # --- Mock classes for testing ---
-    class MockResponse:
-        def __init__(self, text):
-            self.text = text
-
-    class MockModel:
-        def __init__(self, model_name='gemini-2.0-flash-lite'):
-            self.model_name = model_name
-            self.last_prompt = "" # For debugging
-
-        def generate_content(self, prompt_string):
-            self.last_prompt = prompt_string
-            print(f"\n--- MockModel received prompt string for evaluation: ---\n{prompt_string}\n---------------------------------------------------\n")
-            print("(MockModel logic: evaluating which mock response to return based on prompt content...)")
-            if "Player's skills:" not in prompt_string: # This check is fine
-                print("WARNING: 'Player's skills:' not found in the prompt to MockModel (this might be ok for initial scene calls if any).")
-
-            # Simulate a JSON response based on player action
-            # Order of checks matters if prompts could contain multiple keywords.
-            if "resuming their adventure" in prompt_string: # Check for continuation prompt
-                print("DEBUG: MockModel matched 'resuming their adventure' for get_scene_description_from_log")
-                return MockResponse(text="Mock: The air crackles with anticipation as you step back into the fray. The path ahead is clear.")
-            elif "curse" in prompt_string:
-                print("DEBUG: MockModel matched 'curse'")
-                mock_json_payload = {
-                    "narrative": "Mock: You feel weaker after the Asura's curse and notice your favorite dagger is gone, but you find a healing herb.",
-                    "game_state_updates": {
-                        "inventory_add": ["healing herb"],
-                        "inventory_remove": ["favorite dagger"],
-                        "hp_change": -10,
-                        "mp_change": -5,
-                        "new_story_flags": {"cursed": True},
-                    }
-                }
-            elif "use Power Attack" in prompt_string:
-                print("DEBUG: MockModel matched 'use Power Attack'")
-                mock_json_payload = {
-                    "narrative": "Mock: You unleash a mighty Power Attack! The enemy is stunned.",
-                    "game_state_updates": {
-                        "mp_change": -10,
-                        "skill_used": "Power Attack",
-                        "new_story_flags": {"enemy_stunned": True}
-                    }
-                }
-            elif "attack the goblin" in prompt_string: # New mock for combat
-                print("DEBUG: MockModel matched 'attack the goblin'")
-                mock_json_payload = {
-                    "narrative": "Mock: You swing your sword at the goblin, landing a glancing blow. The goblin shrieks and lunges with its rusty dagger, catching your arm!",
-                    "game_state_updates": {
-                        "hp_change": -5
-                    }
-                }
-            else: # Default mock
-                print("DEBUG: MockModel matched default")
-                mock_json_payload = {
-                    "narrative": "Mock: This is a mock narrative for other actions (default).",
-                    "game_state_updates": {
-                        "inventory_add": ["mock item"],
-                        "hp_change": -5, # Default hp_change
-                        "new_story_flags": {"mock_flag_set_default": True}
-                    }
-                }
-            raw_response_with_fences = f"```json\n{json.dumps(mock_json_payload)}\n```"
-            return MockResponse(text=raw_response_with_fences)
-
-    class MockPlayer:
-        def __init__(self, name, hp, max_hp, mp, max_mp, current_location, story_flags, inventory, skills=None, adventure_log=None):
-            self.name = name
-            self.hp = hp
-            self.max_hp = max_hp
-            self.mp = mp
-            self.max_mp = max_mp
-            self.current_location = current_location
-            self.story_flags = story_flags
-            self.inventory = inventory
-            self.skills = skills if skills is not None else ["Default Skill 1", "Default Skill 2"]
-            self.adventure_log = adventure_log if adventure_log is not None else AdventureLog() # Initialize log
-    # --- End Mock classes ---
+    # Example usage against the local mock engine: no API key or network needed.
+    # Run with `python -m game_engine.ai_dm_interface`.
+    from .llm_backends import MockLLMBackend
 
+    print("Attempting to initialize AIDungeonMaster with the mock backend...")
     try:
-        dm = AIDungeonMaster(api_key="FAKE_API_KEY_FOR_TESTING")
-        dm.model = MockModel()
-
-        print("AIDungeonMaster initialized with MockModel successfully.")
-
-        initial_scene = "You find yourself in a dimly lit antechamber. The air is heavy with the scent of incense."
-        print("\nInitial Scene (Assumed for test):")
-        print(initial_scene)
-
-        print("\n--- Simulating Player Action (expecting comprehensive update from mock) ---")
-        player_input_action = "I touch the cursed idol." # Action to trigger specific mock
-        print(f"Player action: {player_input_action}")
-
-        test_player = MockPlayer(
-            name="TestHero", hp=90, max_hp=100, mp=40, max_mp=50,
-            current_location="Dimly Lit Antechamber", # Simplified for test
-            story_flags={"found_dagger": False, "met_sage": True},
-            inventory=["a rusty sword", "some dried rations", "a mysterious amulet", "favorite dagger"],
-            skills=["Power Attack", "Meditate", "Quick Dodge"]
-        )
-        # Update dm.model.generate_content to use the specific instance of MockModel
-        mock_model_instance = MockModel()
-        dm.model = mock_model_instance # Assign the instance
-
-        narrative, game_updates = dm.get_ai_response(player_object=test_player, player_action=player_input_action)
-
-        print("\n--- Parsed AI Response ---")
-        print("Narrative:")
-        print(narrative)
-        print("\nGame State Updates:")
-        print(f"  Inventory Add: {game_updates.inventory_add}")
-        print(f"  Inventory Remove: {game_updates.inventory_remove}")
-        print(f"  HP Change: {game_updates.hp_change}")
-        print(f"  MP Change: {game_updates.mp_change}")
-        print(f"  New Story Flags: {game_updates.new_story_flags}")
-        print(f"  New Location: {game_updates.new_location}")
-        print(f"  Player Name: {game_updates.player_name}")
-        print(f"  Skill Used: {game_updates.skill_used}") # Should be None for this case
-        if "Combat Instructions:" not in dm.model.last_prompt:
-             print("ERROR: Combat instructions missing in prompt for 'cursed idol' test!")
-
-
-        print("\n--- Simulating Player Action (Skill Usage) ---")
-        player_action_skill = "I use Power Attack on the guard!"
-        print(f"Player action: {player_action_skill}")
-
-        # The same mock_model_instance will be used, its behavior changes based on prompt content
-        narrative_skill, game_updates_skill = dm.get_ai_response(player_object=test_player, player_action=player_action_skill)
-
-        print("\n--- Parsed AI Response (Skill Usage) ---")
-        print("Narrative:")
-        print(narrative_skill)
-        print("\nGame State Updates:")
-        print(f"  MP Change: {game_updates_skill.mp_change}") # Should show -10 from mock
-        print(f"  Skill Used: {game_updates_skill.skill_used}") # Should now be 'Power Attack'
-        print(f"  New Story Flags: {game_updates_skill.new_story_flags}")
-        if "Combat Instructions:" not in dm.model.last_prompt:
-             print("ERROR: Combat instructions missing in prompt for 'Power Attack' test!")
-
-
-        print("\n--- Simulating Player Action (Combat) ---")
-        player_action_combat = "I attack the goblin with my sword."
-        print(f"Player action: {player_action_combat}")
-        narrative_combat, game_updates_combat = dm.get_ai_response(player_object=test_player, player_action=player_action_combat)
-
-        print("\n--- Parsed AI Response (Combat) ---")
-        print("Narrative:")
-        print(narrative_combat)
-        print("\nGame State Updates:")
-        print(f"  HP Change: {game_updates_combat.hp_change}") # Should be -5 from mock
-        print(f"  Skill Used: {game_updates_combat.skill_used}") # Should be None
-        if "Combat Instructions:" not in dm.model.last_prompt:
-             print("ERROR: Combat instructions missing in prompt for 'attack goblin' test!")
-
-
-        print("\n--- Simulating Player Action (expecting minimal update from mock) ---")
-        player_input_action_minimal = "I look around."
-        print(f"Player action: {player_input_action_minimal}")
-
-        # Temporarily override generate_content for this specific test case
-        original_generate_content = dm.model.generate_content
-        dm.model.generate_content = lambda prompt_string: MockResponse(
-            text=f"```json\n{json.dumps({'narrative': 'Mock: You look around but find nothing of interest, and nothing about you changes.', 'game_state_updates': {}})}\n```"
-        )
-        narrative_minimal, game_updates_minimal = dm.get_ai_response(player_object=test_player, player_action=player_input_action_minimal)
-        dm.model.generate_content = original_generate_content # Restore original mock behavior
-
-        print("\n--- Parsed AI Response (Minimal Update) ---")
-        print("Narrative:")
-        print(narrative_minimal)
-        print("\nGame State Updates (should be all defaults):")
-        print(f"  Inventory Add: {game_updates_minimal.inventory_add}")
-        print(f"  MP Change: {game_updates_minimal.mp_change}")
-        print(f"  New Story Flags: {game_updates_minimal.new_story_flags}")
-        print(f"  Skill Used: {game_updates_minimal.skill_used}") # Should be None
-
-
-        print("\n--- Simulating another player action (e.g., AI returns malformed JSON) ---")
-        player_input_action_malformed = "I try to decipher the ancient text."
-        print(f"Player action: {player_input_action_malformed}")
-
-        original_generate_content_malformed = dm.model.generate_content
-        dm.model.generate_content = lambda prompt_string: MockResponse(text="This is not valid JSON {oops")
-        narrative_malformed, game_updates_malformed = dm.get_ai_response(player_object=test_player, player_action=player_input_action_malformed)
-        dm.model.generate_content = original_generate_content_malformed # Restore
-
-        print("\n--- Parsed AI Response (Malformed JSON Test) ---")
-        print("Narrative:")
-        print(narrative_malformed)
-        print("\nGame State Updates (should be default/empty):")
-        print(f"  Inventory Add: {game_updates_malformed.inventory_add}")
-        print(f"  Player Name: {game_updates_malformed.player_name}")
-        print(f"  Skill Used: {game_updates_malformed.skill_used}") # Should be None
+        dm = AIDungeonMaster(backend=MockLLMBackend(seed=7))
+        print("AIDungeonMaster initialized successfully.")
+
+        print("\n--- Initial Scene ---")
+        print(dm.get_initial_scene_description())
+
+        test_player = Player(player_id=1, name="TestHero", hp=90, max_hp=100, mp=40, max_mp=50,
+                             inventory=["a rusty sword", "some dried rations", "a mysterious amulet"],
+                             skills=["Power Attack", "Meditate", "Quick Dodge"])
+        test_player.current_location = "Dimly Lit Antechamber"
+        test_player.story_flags = {"found_dagger": False, "met_sage": True}
+        for player_action in ("I touch the cursed idol.", "I use Power Attack on the guard!", "I look around."):
+            print(f"\n--- Player action: {player_action} ---")
+            fragments = []
+            narrative, game_updates = dm.get_ai_response(player_object=test_player, player_action=player_action,
+                                                         on_narrative_fragment=fragments.append)
+            print(f"Narrative ({len(fragments)} streamed fragments): {narrative}")
+            print(f"Game State Updates: {game_updates}")
 
         print("\n--- Testing get_scene_description_from_log ---")
-        player_with_log = MockPlayer(
-            name="LogHero", hp=80, max_hp=100, mp=30, max_mp=50,
-            current_location="Old Temple",
-            story_flags={"found_relic": True},
-            inventory=["torch", "map"],
-            skills=["Heal Self"],
-            adventure_log=AdventureLog(max_entries=5) # Use a smaller max for test
-        )
-        # Add some entries to the log
-        player_with_log.adventure_log.entries.append(AdventureLogEntry(type="player_action", content="Entered the dark cave", turn_number=1))
-        player_with_log.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content="The cave is damp and silent. A faint glow ahead.", turn_number=1))
-        player_with_log.adventure_log.entries.append(AdventureLogEntry(type="player_action", content="Investigate the glow", turn_number=2))
-        player_with_log.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content="You found a hidden inscription!", turn_number=2))
-
-        continuation_scene = dm.get_scene_description_from_log(player_with_log)
-        print("\n--- Continuation Scene from Log ---")
-        print(continuation_scene)
-
-        print("\n--- Testing get_scene_description_from_log (empty log) ---")
-        player_empty_log = MockPlayer(
-            name="FreshHero", hp=100, max_hp=100, mp=50, max_mp=50,
-            current_location="Starting Village",
-            story_flags={},
-            inventory=[],
-            adventure_log=AdventureLog() # Empty log
-        )
-        # Temporarily make MockModel return a specific string for initial scene to verify fallback
-        original_generate_content_initial = dm.model.generate_content
-        def mock_initial_scene_for_empty_log_test(prompt_string):
-            if "Describe the very first intriguing scene" in prompt_string:
-                 print("DEBUG: MockModel matched 'Describe the very first intriguing scene' for empty log test")
-                 return MockResponse(text="Mock: You stand at a crossroads, ready for a new adventure (empty log fallback).")
-            return original_generate_content_initial(prompt_string) # Call original mock for other prompts
-
-        dm.model.generate_content = mock_initial_scene_for_empty_log_test
-        initial_scene_for_empty_log = dm.get_scene_description_from_log(player_empty_log)
-        dm.model.generate_content = original_generate_content_initial # Restore
-        print("\n--- Initial Scene for Empty Log (Fallback Test) ---")
-        print(initial_scene_for_empty_log)
-
+        test_player.adventure_log.entries.append(AdventureLogEntry(type="player_action", content="Entered the dark cave", turn_number=1))
+        test_player.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content="The cave is damp and silent. A faint glow ahead.", turn_number=1))
+        print(dm.get_scene_description_from_log(test_player))
 
     except ValueError as e:
         print(f"Error during example execution: {e}")
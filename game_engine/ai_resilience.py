@@ -0,0 +1,296 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+T = TypeVar('T')
+
+# Upstream errors worth another attempt: overload, quota, timeouts and server faults.
+# Anything else (bad request, auth, a blocked reply) fails the same way on every attempt.
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.Aborted,
+    google_exceptions.Unknown,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Returns True if `error` looks like a temporary upstream problem."""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n waits a random time in
+    [0, min(max_delay, base_delay * 2**n)], so sessions that failed together do not retry together.
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def delay(self, attempt: int, rng: random.Random = random) -> float:
+        """Returns the pause before retry number `attempt` (0 for the first retry)."""
+        return rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling an unhealthy upstream.
+
+    After `failure_threshold` consecutive transient failures the circuit opens and calls fail
+    fast for `reset_timeout` seconds. Then one trial call is let through (half-open): success
+    closes the circuit, failure opens it again. Thread-safe, so one breaker can be shared by
+    every session talking to the same model.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Returns True if a call may go upstream now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False # Only one trial call at a time while half-open
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Gives back a call that ended without an answer (e.g. cancelled by a deadline or a newer
+        command), so a half-open breaker lets the next call through as its trial instead.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"AI resilience: Circuit opened after {self._failures} failure(s); failing fast for {self.reset_timeout}s.")
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class LatencyTracker:
+    """Keeps recent call latencies to derive the hedging delay (a high percentile)."""
+
+    def __init__(self, window: int = 200, percentile: float = 0.95, min_samples: int = 20,
+                 default_delay: float = 3.0):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """Returns the tracked percentile, or `default_delay` until there are enough samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default_delay
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return ordered[index]
+
+
+class ResilientCaller:
+    """
+    Wraps upstream AI calls with retries, a circuit breaker and optional hedging.
+
+    Hedging sends a second identical request when the first has not answered within the
+    tracked p95 latency, and uses whichever answers first. It roughly doubles the cost of the
+    slowest 5% of calls in exchange for cutting their tail latency; leave it off if quota is tight.
+    """
+
+    def __init__(self, retry_policy: RetryPolicy | None = None, breaker: CircuitBreaker | None = None,
+                 hedge: bool = False, latency: LatencyTracker | None = None,
+                 sleep: Callable[[float], None] = time.sleep, rng: random.Random | None = None):
+        """
+        Args:
+            retry_policy (RetryPolicy, optional): Backoff between attempts. Defaults to 3 attempts.
+            breaker (CircuitBreaker, optional): Share one between sessions so they agree on upstream health.
+            hedge (bool, optional): Send a backup request after the p95 latency.
+            latency (LatencyTracker, optional): Latency history used for the hedging delay.
+            sleep (Callable[[float], None], optional): Used for backoff by call().
+            rng (random.Random, optional): Source of jitter.
+        """
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.hedge = hedge
+        self.latency = latency if latency is not None else LatencyTracker()
+        self._sleep = sleep
+        self._rng = rng if rng is not None else random.Random()
+        self._hedge_pool: ThreadPoolExecutor | None = None
+        self._hedge_pool_lock = threading.Lock()
+
+    def call(self, operation: Callable[[], T], hedge: bool | None = None,
+             can_retry: Callable[[], bool] | None = None) -> T:
+        """
+        Runs `operation` with retries and the circuit breaker.
+
+        Args:
+            operation (Callable[[], T]): Makes one upstream request.
+            hedge (bool, optional): Overrides the caller's hedging setting (e.g. off for streams).
+            can_retry (Callable[[], bool], optional): Checked before each retry; return False once
+                a retry is no longer safe (e.g. part of a stream was already shown).
+
+        Returns:
+            The operation's result.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            Exception: The last error, if it was not transient or the attempts ran out.
+        """
+        use_hedge = self.hedge if hedge is None else hedge
+        for attempt in range(self.retry_policy.max_attempts):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError("AI upstream is unavailable (circuit open).")
+            started = time.monotonic()
+            try:
+                result = self._call_hedged(operation) if use_hedge else operation()
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.record_success() # Upstream answered; the request itself was bad
+                    raise
+                self.breaker.record_failure()
+                if attempt + 1 >= self.retry_policy.max_attempts or (can_retry is not None and not can_retry()):
+                    raise
+                delay = self.retry_policy.delay(attempt, self._rng)
+                print(f"AI resilience: Transient error ({type(e).__name__}: {e}); retrying in {delay:.2f}s.")
+                self._sleep(delay)
+                continue
+            except BaseException: # Interrupted before upstream answered
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            self.latency.record(time.monotonic() - started)
+            return result
+        raise RuntimeError("RetryPolicy.max_attempts must be at least 1.")
+
+    async def call_async(self, operation: Callable[[], Awaitable[T]], hedge: bool | None = None,
+                         can_retry: Callable[[], bool] | None = None) -> T:
+        """Async version of call(). `operation` returns a new awaitable for each attempt."""
+        use_hedge = self.hedge if hedge is None else hedge
+        for attempt in range(self.retry_policy.max_attempts):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError("AI upstream is unavailable (circuit open).")
+            started = time.monotonic()
+            try:
+                result = await (self._call_hedged_async(operation) if use_hedge else operation())
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt + 1 >= self.retry_policy.max_attempts or (can_retry is not None and not can_retry()):
+                    raise
+                delay = self.retry_policy.delay(attempt, self._rng)
+                print(f"AI resilience: Transient error ({type(e).__name__}: {e}); retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException: # Cancelled (a deadline or a newer command) before upstream answered
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            self.latency.record(time.monotonic() - started)
+            return result
+        raise RuntimeError("RetryPolicy.max_attempts must be at least 1.")
+
+    def _call_hedged(self, operation: Callable[[], T]) -> T:
+        pool = self._get_hedge_pool()
+        pending = {pool.submit(operation)}
+        done, pending = wait(pending, timeout=self.latency.hedge_delay())
+        if not done:
+            print("AI resilience: Request slower than p95; sending a hedged request.")
+            pending.add(pool.submit(operation))
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    # The loser keeps running in the pool; its result is ignored.
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    async def _call_hedged_async(self, operation: Callable[[], Awaitable[T]]) -> T:
+        pending = {asyncio.ensure_future(operation())}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.latency.hedge_delay())
+            if not done:
+                print("AI resilience: Request slower than p95; sending a hedged request.")
+                pending.add(asyncio.ensure_future(operation()))
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel() # The first answer won; stop the other request
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        with self._hedge_pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-hedge")
+            return self._hedge_pool
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional
+
+
+class AITaskRunner:
+    """
+    Runs AI coroutines for any number of game sessions on one shared asyncio event loop.
+
+    The loop lives on a daemon thread, so AI calls from every session are multiplexed over
+    a single thread instead of holding one blocked thread each. At most one task is kept in
+    flight per session key: submitting a new one (e.g. because the player sent a newer
+    command) cancels the previous task, which cancels its request to the model.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="ai-task-runner", daemon=True)
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._closed = False
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, session_key: Hashable, coroutine: Coroutine[Any, Any, Any]) -> Future:
+        """
+        Schedules `coroutine` on the shared loop as the session's current task.
+
+        Args:
+            session_key (Hashable): Identifies the session (e.g. the player ID).
+            coroutine (Coroutine): The AI call to run.
+
+        Returns:
+            concurrent.futures.Future: The task's result. It raises concurrent.futures.CancelledError
+                                       if a newer task for the same session superseded it.
+
+        Raises:
+            RuntimeError: If the runner has been closed.
+        """
+        with self._lock:
+            if self._closed:
+                coroutine.close() # Avoid a "coroutine was never awaited" warning
+                raise RuntimeError("AITaskRunner is closed.")
+            previous = self._in_flight.get(session_key)
+            future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+            self._in_flight[session_key] = future
+        if previous is not None and not previous.done():
+            previous.cancel()
+        future.add_done_callback(lambda done: self._forget(session_key, done))
+        return future
+
+    def _forget(self, session_key: Hashable, future: Future):
+        with self._lock:
+            if self._in_flight.get(session_key) is future:
+                del self._in_flight[session_key]
+
+    def run(self, session_key: Hashable, coroutine: Coroutine[Any, Any, Any],
+            idle: Optional[Callable[[float], None]] = None, poll_interval: float = 0.05):
+        """
+        Submits `coroutine` and waits for its result.
+
+        Args:
+            session_key (Hashable): Identifies the session, see submit().
+            coroutine (Coroutine): The AI call to run.
+            idle (Callable[[float], None], optional): Called with `poll_interval` while the task is
+                running, instead of blocking the calling thread. Eel handles commands in gevent
+                greenlets without monkey-patching, so a blocking wait would freeze every other
+                handler; pass a cooperative sleep such as eel.sleep there.
+            poll_interval (float, optional): Seconds between checks when `idle` is given.
+
+        Returns:
+            The coroutine's result.
+
+        Raises:
+            concurrent.futures.CancelledError: If a newer task for the same session superseded this one.
+        """
+        future = self.submit(session_key, coroutine)
+        if idle is None:
+            return future.result()
+        while not future.done():
+            idle(poll_interval)
+        return future.result()
+
+    def in_flight(self) -> int:
+        """Returns the number of sessions with a task still running."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def close(self, timeout: float = 5.0):
+        """Cancels any running tasks and stops the event loop thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            # Let cancelled tasks unwind (closing their HTTP streams) before the loop stops
+            asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result(timeout)
+        except Exception as e:
+            print(f"AITaskRunner: Error cancelling tasks on close: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._loop.close()
+
+    async def _cancel_all(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_shared_runner: Optional[AITaskRunner] = None
+_shared_runner_lock = threading.Lock()
+
+
+def get_ai_task_runner() -> AITaskRunner:
+    """Returns the process-wide runner, starting it on first use."""
+    global _shared_runner
+    with _shared_runner_lock:
+        if _shared_runner is None or _shared_runner._closed:
+            _shared_runner = AITaskRunner()
+        return _shared_runner
@@ -0,0 +1,263 @@
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+from google.api_core import exceptions as google_exceptions
+
+from game_engine.llm_backends import LLMBackend, GeminiBackend, MODEL_NAME, Prompt, prompt_text
+from game_engine.prompt_builder import estimate_tokens
+from game_engine.request_scheduler import (TokenBucket, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE,
+                                           quota_per_key_from_env)
+
+# The key ran out of quota: it rests while the other keys take its traffic.
+QUOTA_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+# The key does not work at all (revoked, API disabled for its project): it rests for the longest quarantine.
+KEY_ERRORS = (google_exceptions.PermissionDenied, google_exceptions.Unauthenticated)
+
+
+def parse_api_keys(api_keys: str | Sequence[str] | None) -> List[str]:
+    """Splits a comma-separated GOOGLE_API_KEY value (or a list of keys) into distinct keys, in order."""
+    if not api_keys:
+        return []
+    if isinstance(api_keys, str):
+        api_keys = api_keys.split(',')
+    keys = []
+    for key in api_keys:
+        key = key.strip()
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def mask_api_key(api_key: str) -> str:
+    """A printable label for a key: its last four characters."""
+    return f"key ...{api_key[-4:]}"
+
+
+# Pools by (keys, model name), shared by every session in the process so they all see which keys are resting.
+_shared_pools: dict = {}
+_shared_pools_lock = threading.Lock()
+
+
+def gemini_backend_for_keys(api_keys: str | Sequence[str], model_name: str = MODEL_NAME, **pool_options) -> LLMBackend:
+    """
+    Returns the Gemini backend for one key, or a KeyPoolBackend balancing requests over several.
+    Sessions given the same keys share one pool (`pool_options` apply when it is first created).
+
+    Raises:
+        ValueError: If no key is given.
+    """
+    keys = parse_api_keys(api_keys)
+    if not keys:
+        raise ValueError("No API key given.")
+    if len(keys) == 1:
+        return GeminiBackend(api_key=keys[0], model_name=model_name)
+    with _shared_pools_lock:
+        pool_key = (tuple(keys), model_name)
+        if pool_key not in _shared_pools:
+            _shared_pools[pool_key] = KeyPoolBackend.for_gemini(keys, model_name, **pool_options)
+        return _shared_pools[pool_key]
+
+
+class PooledKey:
+    """One key (or project) of a pool: its backend, its own quota and how it has been doing."""
+
+    def __init__(self, index: int, label: str, backend: LLMBackend, request_quota: TokenBucket, token_quota: TokenBucket):
+        self.index = index
+        self.label = label
+        self.backend = backend
+        self.request_quota = request_quota
+        self.token_quota = token_quota
+        self.in_flight = 0
+        self.requests = 0
+        self.quota_errors = 0
+        self.consecutive_quota_errors = 0
+        self.quarantined_until = 0.0
+
+
+class ApiKeyPool:
+    """
+    Spreads requests over several API keys, each with its own client and quota.
+
+    Each key's requests and tokens per minute are tracked in its own token buckets. A request
+    goes to the healthy key with quota left that has the fewest requests in flight (ties go to
+    the one used least), so load follows the keys that answer fastest; if no healthy key has quota
+    left, to the one whose quota frees up first. A key that reports a quota error is
+    quarantined, for `quarantine_seconds` doubling with each further quota error up to
+    `max_quarantine_seconds`; its first success resets that. A key rejected as invalid is
+    quarantined for the maximum. If every key is quarantined, requests go to the key whose
+    quarantine ends first rather than failing outright. Thread-safe.
+    """
+
+    def __init__(self, backends: Sequence[LLMBackend], labels: Optional[Sequence[str]] = None,
+                 quarantine_seconds: float = 30.0, max_quarantine_seconds: float = 300.0,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            backends (Sequence[LLMBackend]): One backend per key, each using only its own key.
+            labels (Sequence[str], optional): Printable names of the keys. Defaults to "key 1", "key 2", ...
+            quarantine_seconds (float, optional): Rest after a key's first quota error.
+            max_quarantine_seconds (float, optional): Longest rest.
+            requests_per_minute (float, optional): Request quota of each key.
+            tokens_per_minute (float, optional): Token quota of each key (prompt tokens).
+            clock (Callable[[], float], optional): Monotonic time source.
+        """
+        if not backends:
+            raise ValueError("An API key pool needs at least one key.")
+        labels = list(labels) if labels is not None else [f"key {index + 1}" for index in range(len(backends))]
+        self.keys = [PooledKey(index, label, backend, TokenBucket(requests_per_minute, clock=clock),
+                               TokenBucket(tokens_per_minute, clock=clock))
+                     for index, (label, backend) in enumerate(zip(labels, backends))]
+        self.quarantine_seconds = quarantine_seconds
+        self.max_quarantine_seconds = max_quarantine_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> PooledKey:
+        """Picks the key for one request of about `tokens` tokens. Every acquire() must be followed by release()."""
+        with self._lock:
+            now = self._clock()
+            healthy = [key for key in self.keys if key.quarantined_until <= now]
+            with_quota = [key for key in healthy if self._quota_wait(key, tokens) == 0.0]
+            if with_quota:
+                key = min(with_quota, key=lambda candidate: (candidate.in_flight, candidate.requests))
+            elif healthy:
+                key = min(healthy, key=lambda candidate: (self._quota_wait(candidate, tokens), candidate.in_flight))
+            else:
+                key = min(self.keys, key=lambda candidate: candidate.quarantined_until)
+            key.request_quota.take(1)
+            key.token_quota.take(tokens)
+            key.in_flight += 1
+            key.requests += 1
+            return key
+
+    @staticmethod
+    def _quota_wait(key: PooledKey, tokens: int) -> float:
+        return max(key.request_quota.wait_time(1), key.token_quota.wait_time(tokens))
+
+    def release(self, key: PooledKey, error: BaseException | None = None):
+        """Records how a request on `key` ended, quarantining the key if it is out of quota."""
+        with self._lock:
+            key.in_flight -= 1
+            if isinstance(error, QUOTA_ERRORS):
+                key.quota_errors += 1
+                key.consecutive_quota_errors += 1
+                rest = min(self.max_quarantine_seconds,
+                           self.quarantine_seconds * 2 ** (key.consecutive_quota_errors - 1))
+            elif isinstance(error, KEY_ERRORS):
+                rest = self.max_quarantine_seconds
+            else:
+                if error is None:
+                    key.consecutive_quota_errors = 0
+                return
+            now = self._clock()
+            key.quarantined_until = max(key.quarantined_until, now + rest)
+            available = sum(1 for candidate in self.keys if candidate.quarantined_until <= now)
+        print(f"API key pool: {key.label} rejected a request ({type(error).__name__}); resting it for {rest:.0f}s "
+              f"({available} of {len(self.keys)} keys in rotation).")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-key load and health, for logs and dashboards."""
+        with self._lock:
+            now = self._clock()
+            return [{'key': key.label, 'in_flight': key.in_flight, 'requests': key.requests,
+                     'quota_errors': key.quota_errors,
+                     'quarantined_for': round(max(0.0, key.quarantined_until - now), 1),
+                     'requests_available': round(key.request_quota.available, 1),
+                     'tokens_available': round(key.token_quota.available)} for key in self.keys]
+
+
+class KeyPoolBackend:
+    """An LLMBackend whose models send each request through an ApiKeyPool."""
+
+    def __init__(self, pool: ApiKeyPool):
+        self.pool = pool
+        self.name = f"pool:{len(pool.keys)}x{pool.keys[0].backend.name}"
+
+    @classmethod
+    def for_gemini(cls, api_keys: Sequence[str], model_name: str = MODEL_NAME, **pool_options) -> 'KeyPoolBackend':
+        """A pool of Gemini keys, each with its own clients and, unless given, the quota from quota_per_key_from_env()."""
+        requests_per_minute, tokens_per_minute = quota_per_key_from_env()
+        pool_options.setdefault('requests_per_minute', requests_per_minute)
+        pool_options.setdefault('tokens_per_minute', tokens_per_minute)
+        backends = [GeminiBackend(api_key=key, model_name=model_name, own_client=True) for key in api_keys]
+        return cls(ApiKeyPool(backends, labels=[mask_api_key(key) for key in api_keys], **pool_options))
+
+    def create_model(self, system_instruction: Optional[str] = None, response_schema: Optional[dict] = None,
+                     model_name: Optional[str] = None) -> 'PooledModel':
+        return PooledModel(self.pool, lambda backend: backend.create_model(
+            system_instruction, response_schema=response_schema, model_name=model_name))
+
+    def create_cached_model(self, system_instruction: str, ttl_seconds: float, response_schema: Optional[dict] = None,
+                            model_name: Optional[str] = None):
+        # google.generativeai creates cached content only through the process-wide client, which
+        # pooled keys do not use; the DM then sends the instructions as a system instruction.
+        raise NotImplementedError("Context caching is unavailable with a key pool.")
+
+
+class PooledModel:
+    """
+    A model that sends each request with the key the pool picks for it. The key's own model is
+    created on first use. A stream holds its key until it is exhausted or closed.
+    """
+
+    def __init__(self, pool: ApiKeyPool, create_model: Callable[[LLMBackend], Any]):
+        self.pool = pool
+        self._create_model = create_model
+        self._models: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: Prompt, stream: bool = False):
+        key = self.pool.acquire(estimate_tokens(prompt_text(prompt)))
+        try:
+            response = self._model_for(key).generate_content(prompt, stream=stream)
+        except Exception as e:
+            self.pool.release(key, e)
+            raise
+        if stream:
+            return self._release_after_stream(key, response)
+        self.pool.release(key)
+        return response
+
+    async def generate_content_async(self, prompt: Prompt, stream: bool = False):
+        key = self.pool.acquire(estimate_tokens(prompt_text(prompt)))
+        try:
+            response = await self._model_for(key).generate_content_async(prompt, stream=stream)
+        except BaseException as e: # Includes cancellation, which must give the key back too
+            self.pool.release(key, e)
+            raise
+        if stream:
+            return self._release_after_stream_async(key, response)
+        self.pool.release(key)
+        return response
+
+    def _model_for(self, key: PooledKey):
+        with self._lock:
+            model = self._models.get(key.index)
+            if model is None:
+                model = self._models[key.index] = self._create_model(key.backend)
+            return model
+
+    def _release_after_stream(self, key: PooledKey, response) -> Iterator[Any]:
+        error = None
+        try:
+            for chunk in response:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.pool.release(key, error)
+
+    async def _release_after_stream_async(self, key: PooledKey, response) -> AsyncIterator[Any]:
+        error = None
+        try:
+            async for chunk in response:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.pool.release(key, error)
@@ -1,18 +1,27 @@
-from typing import List, Optional
-from .common_types import AdventureLog
+import copy
+from typing import Iterable, List, Optional, Set
+from .common_types import AdventureLog, AdventureLogEntry, AdventureMemory
+
+# Player attributes that are stored in the players table, in column order.
+PERSISTED_FIELDS = ('name', 'hp', 'max_hp', 'mp', 'max_mp', 'current_location',
+                    'story_flags', 'inventory', 'slot', 'memory', 'adventure_log')
+# Snapshot value of a field whose last save failed: it compares unequal to anything, so the field stays dirty.
+_UNSAVED = object()
 
 class Player:
     """
     Represents a player character in the game.
     """
-    def __init__(self, player_id: int, name: str, hp: int, max_hp: int, mp: int, max_mp: int,
+    def __init__(self, player_id: Optional[int], name: str, hp: int, max_hp: int, mp: int, max_mp: int,
                  inventory: Optional[List[str]] = None, skills: Optional[List[str]] = None,
-                 adventure_log: Optional[AdventureLog] = None): # Added adventure_log
+                 adventure_log: Optional[AdventureLog] = None, slot: Optional[int] = None,
+                 memory: Optional[AdventureMemory] = None): # Added adventure_log
         """
         Initializes a new Player instance.
 
         Args:
-            player_id (int): The unique identifier for the player.
+            player_id (Optional[int]): The unique identifier for the player. None for a new player
+                                       whose ID is assigned by the store on creation.
             name (str): The name of the player.
             hp (int): The current hit points of the player.
             max_hp (int): The maximum hit points of the player.
@@ -24,6 +33,9 @@ class Player:
                                                   Defaults to ["Meditate", "Power Attack"].
             adventure_log (Optional[AdventureLog], optional): The player's adventure log.
                                                             Defaults to a new AdventureLog instance.
+            slot (Optional[int], optional): The save slot this player occupies. Defaults to None (no slot).
+            memory (Optional[AdventureMemory], optional): Summaries of the history trimmed from the
+                                                         adventure log. Defaults to an empty AdventureMemory.
         """
         self.player_id = player_id
         self.name = name
@@ -36,6 +48,129 @@ class Player:
         self.adventure_log: AdventureLog = adventure_log if adventure_log is not None else AdventureLog() # Initialize adventure_log
         self.current_location: str = 'Battlefield - Edge of the Kurukshetra' # Default, can be overwritten by load
         self.story_flags: dict = {} # Default, can be overwritten by load
+        self.slot: Optional[int] = slot
+        self.memory: AdventureMemory = memory if memory is not None else AdventureMemory()
+        # Copy of the persisted fields as of the last save/load; None means never persisted.
+        self._persisted_snapshot: Optional[dict] = None
+        # Log entries not yet saved, oldest first, kept even once trimmed from the in-memory log
+        self._unsaved_log_entries: List[AdventureLogEntry] = []
+        self._last_tracked_log_entry: Optional[AdventureLogEntry] = None
+
+    def _last_log_entry(self) -> Optional[AdventureLogEntry]:
+        entries = self.adventure_log.entries if self.adventure_log else []
+        return entries[-1] if entries else None
+
+    def add_log_entry(self, entry: AdventureLogEntry):
+        """Appends an entry to the adventure log; it stays unsaved until the next save, even if trimmed first."""
+        self.adventure_log.entries.append(entry)
+        self._track_log_entries()
+
+    def trim_adventure_log(self) -> List[AdventureLogEntry]:
+        """
+        Trims the in-memory log to its max_entries most recent entries. Trimmed entries that were
+        not saved yet are still returned by get_unsaved_log_entries().
+
+        Returns:
+            List[AdventureLogEntry]: The trimmed entries, oldest first.
+        """
+        self._track_log_entries()
+        entries = self.adventure_log.entries
+        excess = len(entries) - self.adventure_log.max_entries
+        if excess <= 0:
+            return []
+        evicted_entries = entries[:excess]
+        self.adventure_log.entries = entries[excess:]
+        return evicted_entries
+
+    def _track_log_entries(self):
+        """Adds the entries appended to the log since the last call to the unsaved buffer."""
+        entries = self.adventure_log.entries if self.adventure_log else []
+        tracked = self._last_tracked_log_entry
+        new_entries = list(entries)
+        if tracked is not None:
+            for index in range(len(entries) - 1, -1, -1):
+                if entries[index] is tracked:
+                    new_entries = entries[index + 1:]
+                    break
+            else:
+                # The log was replaced: every entry in it not already buffered is new
+                new_entries = [entry for entry in entries
+                               if not any(entry is unsaved for unsaved in self._unsaved_log_entries)]
+        self._unsaved_log_entries.extend(new_entries)
+        if entries:
+            self._last_tracked_log_entry = entries[-1]
+
+    def mark_persisted(self):
+        """
+        Records the current state as the persisted one, so subsequent calls to
+        get_dirty_fields() only report changes made after this point.
+        Called by the persistence layer after a successful save or load.
+        """
+        self._persisted_snapshot = {
+            'name': self.name,
+            'hp': self.hp,
+            'max_hp': self.max_hp,
+            'mp': self.mp,
+            'max_mp': self.max_mp,
+            'current_location': self.current_location,
+            'story_flags': dict(self.story_flags),
+            'inventory': list(self.inventory),
+            'slot': self.slot,
+            'memory': copy.deepcopy(self.memory),
+            'adventure_log': self._last_log_entry(),
+        }
+        self._unsaved_log_entries = []
+        self._last_tracked_log_entry = self._last_log_entry()
+
+    def mark_unsaved(self, fields: Iterable[str], log_entries: Iterable[AdventureLogEntry] = (), full: bool = False):
+        """
+        Undoes mark_persisted() for a save that failed after it was called (e.g. a queued write
+        the writer thread could not commit): `fields` report dirty again and `log_entries` are
+        unsaved again, so the next save writes them. With `full`, the failed save was a full one
+        and the player counts as never persisted.
+        """
+        if full:
+            self._persisted_snapshot = None
+        elif self._persisted_snapshot is not None:
+            for field in fields:
+                if field != 'adventure_log':
+                    self._persisted_snapshot[field] = _UNSAVED
+        self._track_log_entries()
+        restored = [entry for entry in log_entries
+                    if not any(entry is unsaved for unsaved in self._unsaved_log_entries)]
+        self._unsaved_log_entries[:0] = restored
+
+    def is_persisted(self) -> bool:
+        """Returns True if this player has been saved or loaded at least once."""
+        return self._persisted_snapshot is not None
+
+    def get_dirty_fields(self) -> Set[str]:
+        """
+        Returns the persisted fields that changed since the last save/load.
+        In-place changes to inventory and story_flags are detected as well as reassignment.
+        A player that has never been persisted reports every field as dirty.
+        """
+        snapshot = self._persisted_snapshot
+        if snapshot is None:
+            return set(PERSISTED_FIELDS)
+
+        dirty = {field for field in PERSISTED_FIELDS[:-1] if getattr(self, field) != snapshot[field]}
+        if self._last_log_entry() is not snapshot['adventure_log'] or self.get_unsaved_log_entries():
+            dirty.add('adventure_log')
+        return dirty
+
+    def get_unsaved_log_entries(self) -> List[AdventureLogEntry]:
+        """
+        Returns the adventure log entries appended since the last save/load, oldest first,
+        including those already trimmed from the in-memory log by trim_adventure_log().
+        If the log was replaced, every entry in it is considered new.
+        """
+        self._track_log_entries()
+        return list(self._unsaved_log_entries)
+
+    def is_dirty(self) -> bool:
+        """Returns True if any persisted field changed since the last save/load."""
+        return bool(self.get_dirty_fields())
 
     def __repr__(self):
         """
@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from game_engine.input_parser import parse_input
+from game_engine.character_manager import Player
+
+# A local handler answers a command from the in-memory Player (and may refresh the UI),
+# returning the lines to show. It must not change game state: only the AI advances the story.
+LocalHandler = Callable[[Player, object], List[str]]
+
+# Trailing punctuation ignored when matching, so "where am I?" matches "where am i".
+_IGNORED_PUNCTUATION = '?!.'
+
+
+@dataclass
+class LocalCommand:
+    """A command answered locally, and the phrases that trigger it."""
+    name: str
+    phrases: Tuple[str, ...]
+    handler: LocalHandler
+    description: str = ""
+
+
+class CommandRouter:
+    """
+    Decides whether a command can be answered locally or has to go to the AI Dungeon Master.
+
+    Commands are normalized with parse_input and matched as whole phrases ("inventory",
+    "where am i"), never by their first word alone, so "help the wounded soldier" or
+    "look at my inventory closely" still go to the AI as narrative actions.
+    """
+
+    def __init__(self):
+        self._commands: List[LocalCommand] = []
+        self._by_phrase: Dict[Tuple[str, ...], LocalCommand] = {}
+
+    @property
+    def commands(self) -> List[LocalCommand]:
+        return list(self._commands)
+
+    def register(self, name: str, phrases: List[str], handler: LocalHandler, description: str = ""):
+        """
+        Adds a local command. Later registrations of the same phrase replace earlier ones.
+
+        Args:
+            name (str): Shown in help.
+            phrases (list[str]): Inputs that trigger the command, e.g. ["inventory", "inv", "i"].
+            handler (LocalHandler): Called with (player, ui); returns the lines to display.
+            description (str, optional): One-line summary for help.
+        """
+        keys = tuple(self._phrase_key(phrase) for phrase in phrases)
+        command = LocalCommand(name=name, phrases=tuple(" ".join(key) for key in keys),
+                               handler=handler, description=description)
+        self._commands = [existing for existing in self._commands if existing.name != name]
+        self._commands.append(command)
+        for key in keys:
+            self._by_phrase[key] = command
+
+    def match(self, command_string: str) -> Optional[LocalCommand]:
+        """Returns the local command for this input, or None if it should go to the AI."""
+        key = self._phrase_key(command_string)
+        if not key:
+            return None
+        return self._by_phrase.get(key)
+
+    def handle(self, command_string: str, player: Player, ui) -> bool:
+        """
+        Answers the command locally if it matches a registered phrase.
+
+        Args:
+            command_string (str): The raw command from the player.
+            player (Player): The current player.
+            ui: The UI manager used to display the answer.
+
+        Returns:
+            bool: True if the command was handled, False if it should go to the AI.
+        """
+        command = self.match(command_string)
+        if command is None:
+            return False
+        self.run(command, player, ui)
+        return True
+
+    def run(self, command: LocalCommand, player: Player, ui):
+        """Runs a matched local command and displays its answer."""
+        for line in command.handler(player, ui):
+            ui.add_story_text(line, 'command_response')
+
+    @staticmethod
+    def _phrase_key(text: str) -> Tuple[str, ...]:
+        parsed = parse_input(text.strip().rstrip(_IGNORED_PUNCTUATION))
+        if parsed['command'] is None:
+            return ()
+        return (parsed['command'], *parsed['arguments'])
+
+
+def _show_inventory(player: Player, ui) -> List[str]:
+    if not player.inventory:
+        return ["Your pack is empty."]
+    return [f"You are carrying: {', '.join(player.inventory)}."]
+
+
+def _show_stats(player: Player, ui) -> List[str]:
+    ui.update_player_display(player) # Make sure the side panel agrees with what we report
+    return [f"{player.name} - HP: {player.hp}/{player.max_hp}, MP: {player.mp}/{player.max_mp}",
+            f"Location: {player.current_location}"]
+
+
+def _show_skills(player: Player, ui) -> List[str]:
+    if not player.skills:
+        return ["You currently have no special skills."]
+    return [f"Your available skills: {', '.join(player.skills)}"]
+
+
+def _show_location(player: Player, ui) -> List[str]:
+    return [f"You are at {player.current_location}."]
+
+
+def default_command_router() -> CommandRouter:
+    """Returns a router with the built-in state queries: inventory, stats, skills, location and help."""
+    router = CommandRouter()
+    router.register("inventory", ["inventory", "inv", "i", "show inventory", "check inventory"],
+                    _show_inventory, "List what you are carrying.")
+    router.register("stats", ["stats", "status", "show stats", "check stats", "hp"],
+                    _show_stats, "Show your HP, MP and location.")
+    router.register("skills", ["skills", "show skills", "list skills"],
+                    _show_skills, "List your skills.")
+    router.register("where am i", ["where am i", "location", "whereami"],
+                    _show_location, "Show where you are.")
+
+    def show_help(player: Player, ui) -> List[str]:
+        lines = ["Quick commands (answered instantly):"]
+        lines += [f"{command.phrases[0]} - {command.description}" for command in router.commands]
+        lines.append("Anything else is an action for the Dungeon Master, e.g. 'search the ruins' or 'use a healing herb'.")
+        return lines
+
+    router.register("help", ["help", "commands"], show_help, "Show this list.")
+    return router
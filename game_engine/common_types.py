@@ -2,14 +2,15 @@ from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
 
 class GameStateUpdates(BaseModel):
-    inventory_add: List[str] = Field(default_factory=list)
-    inventory_remove: List[str] = Field(default_factory=list)
-    hp_change: int = 0
-    mp_change: int = 0
-    new_story_flags: Dict[str, bool] = Field(default_factory=dict)
-    new_location: Optional[str] = None
-    player_name: Optional[str] = None
-    skill_used: Optional[str] = None # New field for used skill
+    # Descriptions are sent to the model as part of the structured-output schema (see structured_output)
+    inventory_add: List[str] = Field(default_factory=list, description="Items the player gains.")
+    inventory_remove: List[str] = Field(default_factory=list, description="Items the player loses or uses up.")
+    hp_change: int = Field(0, description="Change to the player's HP, negative for damage.")
+    mp_change: int = Field(0, description="Change to the player's MP, negative when a skill costs MP.")
+    new_story_flags: Dict[str, bool] = Field(default_factory=dict, description="Story flags to set or update.")
+    new_location: Optional[str] = Field(None, description="The player's new location, if they moved.")
+    player_name: Optional[str] = Field(None, description="The player's new name, if it changed.")
+    skill_used: Optional[str] = Field(None, description="The skill the player successfully used.") # New field for used skill
     # Future potential fields:
     # new_quests_added: List[str] = Field(default_factory=list)
     # quests_completed: List[str] = Field(default_factory=list)
@@ -29,6 +30,18 @@ class AdventureLog(BaseModel):
     entries: List[AdventureLogEntry] = Field(default_factory=list)
     max_entries: int = 10
 
+class MemorySummary(BaseModel):
+    level: int  # 0 = scene, 1 = chapter, 2 = saga (everything older than the chapters)
+    first_turn: int
+    last_turn: int
+    text: str
+
+class AdventureMemory(BaseModel):
+    # Entries trimmed from the adventure log that are not yet folded into a scene summary
+    pending: List[AdventureLogEntry] = Field(default_factory=list)
+    # Saga first, then chapters, then scenes; oldest first within a level
+    summaries: List[MemorySummary] = Field(default_factory=list)
+
 if __name__ == '__main__':
     # Example usage and test
     updates_data_from_ai = {
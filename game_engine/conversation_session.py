@@ -0,0 +1,151 @@
+from typing import List, Optional, Tuple
+
+from game_engine.character_manager import Player
+from game_engine.prompt_builder import BuiltPrompt, PromptBuilder, format_flag
+from .common_types import GameStateUpdates
+
+def state_snapshot(player: Player) -> dict:
+    """The parts of the player's state a turn message describes, as comparable values."""
+    return {
+        'player_id': player.player_id,
+        'name': player.name,
+        'location': player.current_location,
+        'skills': tuple(getattr(player, 'skills', None) or ()),
+        'inventory': tuple(getattr(player, 'inventory', None) or ()),
+        'flags': dict(player.story_flags or {}),
+    }
+
+
+def describe_changes(previous: dict, current: dict) -> List[str]:
+    """
+    Lists what changed between two snapshots, one entry per item, skill or flag. HP, MP and the
+    location are left out: every turn message states them anyway.
+    """
+    changes = []
+    if current['name'] != previous['name']:
+        changes.append(f"renamed to {current['name']}")
+    changes += [f"learned {skill}" for skill in current['skills'] if skill not in previous['skills']]
+    changes += [f"gained {item}" for item in current['inventory'] if item not in previous['inventory']]
+    changes += [f"lost {item}" for item in previous['inventory'] if item not in current['inventory']]
+    changes += [f"flag {format_flag(name, value)}" for name, value in current['flags'].items()
+                if previous['flags'].get(name, object()) != value]
+    changes += [f"flag {name} cleared" for name in previous['flags'] if name not in current['flags']]
+    return changes
+
+
+class ConversationSession:
+    """
+    Turns sent as a conversation: after a full-state turn (a keyframe), each turn only adds a
+    message with what changed since the previous one and the state relevant to the action (see
+    PromptBuilder.build_delta_turn).
+
+    The Gemini API keeps no state between calls, so every request carries the conversation since
+    the last keyframe as `contents`: the keyframe, then each later turn message and the DM's
+    reply to it. The model sees the full state and every exchange since, while the messages
+    themselves stay small. The window is bounded by the keyframes: each one starts a new
+    conversation, so a request never carries more than `keyframe_interval` turns.
+
+    A keyframe is sent on the first turn, every `keyframe_interval` turns, when the player moves
+    (a new scene), when more than `max_changes` things changed, and when the drift check finds
+    the DM's last reply working from a different state than the player's (e.g. removing an item
+    the player does not carry).
+    """
+
+    def __init__(self, prompt_builder: PromptBuilder, keyframe_interval: int = 6, max_changes: int = 6):
+        """
+        Args:
+            prompt_builder (PromptBuilder): Builds the keyframe and delta messages.
+            keyframe_interval (int, optional): Turns between full-state turns, and so the most turns one request carries.
+            max_changes (int, optional): More changes than this since the previous turn send the full state instead.
+        """
+        self.prompt_builder = prompt_builder
+        self.keyframe_interval = keyframe_interval
+        self.max_changes = max_changes
+        self.keyframes = 0
+        self.delta_turns = 0
+        self._sent: Optional[dict] = None # Snapshot of the state as of the last completed turn
+        self._history: List[dict] = [] # Messages since the last keyframe, as contents
+        self._history_tokens = 0
+        self._turns_since_keyframe = 0
+        self._drift: Optional[str] = None
+        self._pending: Optional[Tuple[dict, bool, List[dict], int]] = None # (snapshot, keyframe, contents, tokens) in flight
+
+    @property
+    def history_tokens(self) -> int:
+        """Estimated tokens of the earlier messages sent along with the turn in flight."""
+        return self._pending[3] if self._pending is not None else 0
+
+    def build_turn(self, player: Player, player_action: str) -> Tuple[BuiltPrompt, List[dict], str]:
+        """
+        Builds the next turn's message and the request that carries it.
+
+        Returns:
+            Tuple[BuiltPrompt, List[dict], str]: The message; the contents to send (the conversation
+                                                 since the last keyframe, ending with the message);
+                                                 and why the full state was sent ("" for a delta turn).
+        """
+        snapshot = state_snapshot(player)
+        changes = describe_changes(self._sent, snapshot) if self._sent is not None else []
+        reason = self._keyframe_reason(snapshot, changes)
+        if reason:
+            built_prompt = self.prompt_builder.build_turn(player, player_action)
+            history, history_tokens = [], 0
+        else:
+            built_prompt = self.prompt_builder.build_delta_turn(player, player_action, changes)
+            history, history_tokens = self._history, self._history_tokens
+        contents = history + [{'role': 'user', 'parts': [built_prompt.text]}]
+        self._pending = (snapshot, bool(reason), contents, history_tokens)
+        return built_prompt, contents, reason
+
+    def check_reply(self, player: Player, updates: GameStateUpdates):
+        """
+        Drift check, run on the DM's reply before its updates are applied: updates that only make
+        sense for another state mean the model has lost track, so the next turn resends everything.
+        """
+        unknown_items = [item for item in updates.inventory_remove if item not in (player.inventory or [])]
+        if unknown_items:
+            self._drift = f"reply removed unknown item '{unknown_items[0]}'"
+        elif updates.skill_used and updates.skill_used not in (getattr(player, 'skills', None) or []):
+            self._drift = f"reply used unknown skill '{updates.skill_used}'"
+
+    def complete(self, reply_text: str):
+        """
+        Records that the turn in flight was answered: the message and the DM's reply (as the model
+        sent it) join the conversation, and the state sent becomes the baseline for the next delta.
+        """
+        if self._pending is None:
+            return
+        snapshot, keyframe, contents, history_tokens = self._pending
+        self._pending = None
+        self._sent = snapshot
+        self._history = contents + [{'role': 'model', 'parts': [reply_text]}]
+        self._history_tokens = history_tokens + sum(self.prompt_builder.counter.count(message['parts'][0])
+                                                    for message in self._history[-2:])
+        if keyframe:
+            self.keyframes += 1
+            self._turns_since_keyframe = 0
+        else:
+            self.delta_turns += 1
+        self._turns_since_keyframe += 1
+
+    def reset(self):
+        """Forgets the conversation: the next turn sends the full state."""
+        self._sent = self._pending = self._drift = None
+        self._history, self._history_tokens = [], 0
+        self._turns_since_keyframe = 0
+
+    def _keyframe_reason(self, snapshot: dict, changes: List[str]) -> str:
+        if self._sent is None:
+            return "first turn"
+        if self._drift:
+            reason, self._drift = f"drift: {self._drift}", None
+            return reason
+        if snapshot['player_id'] != self._sent['player_id']:
+            return "player changed"
+        if snapshot['location'] != self._sent['location']:
+            return "new location"
+        if len(changes) > self.max_changes:
+            return f"{len(changes)} changes"
+        if self._turns_since_keyframe >= self.keyframe_interval:
+            return f"every {self.keyframe_interval} turns"
+        return ""
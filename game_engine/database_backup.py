@@ -0,0 +1,227 @@
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Callable, List, Optional
+
+# Allow running as a script (python game_engine/database_backup.py) as well as with -m
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.schema_migrations import migrate
+
+# The first bytes of every gzip stream; used to recognise compressed backups on restore.
+_GZIP_MAGIC = b'\x1f\x8b'
+BACKUP_PREFIX = 'rpg_save-'
+
+
+def backup_database(db_path: str, backup_path: str, pages: int = 256, step_sleep: float = 0.005,
+                    compress: bool = False, progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """
+    Copies a live save database with SQLite's online backup API.
+
+    The copy is made `pages` pages at a time, sleeping `step_sleep` seconds between batches.
+    The source is only read-locked during each batch, and in WAL mode readers never block
+    writers, so save_player keeps committing while the backup runs. If another connection
+    writes to the database between batches, SQLite restarts the copy so the backup is always
+    a consistent snapshot; on a very busy database raise `pages` (or pass -1 to copy in one step).
+
+    Args:
+        db_path (str): The database to back up.
+        backup_path (str): Where to write the backup. With `compress`, a '.gz' suffix is
+                           added unless it is already there.
+        pages (int, optional): Pages copied per batch. -1 copies everything in one step.
+        step_sleep (float, optional): Seconds to pause between batches.
+        compress (bool, optional): gzip the backup file.
+        progress (Callable[[int, int], None], optional): Called after each batch with
+                                                        (pages remaining, total pages).
+
+    Returns:
+        str: The path of the finished backup file.
+
+    Raises:
+        FileNotFoundError: If `db_path` does not exist (connecting would create an empty database).
+        sqlite3.Error: If the database cannot be read or the backup fails.
+    """
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"No database to back up at {db_path}")
+    if compress and not backup_path.endswith('.gz'):
+        backup_path += '.gz'
+    backup_dir = os.path.dirname(backup_path)
+    if backup_dir:
+        os.makedirs(backup_dir, exist_ok=True)
+
+    # Build the copy next to its final name, then rename it into place, so a crash
+    # mid-backup never leaves a truncated file that looks like a valid backup.
+    raw_path = f"{backup_path}.{os.getpid()}.partial"
+    compressed_path = f"{raw_path}.gz"
+    try:
+        source = sqlite3.connect(db_path)
+        try:
+            target = sqlite3.connect(raw_path)
+            try:
+                source.backup(target, pages=pages, progress=_adapt_progress(progress), sleep=step_sleep)
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+        if compress:
+            with open(raw_path, 'rb') as raw_file, gzip.open(compressed_path, 'wb') as compressed_file:
+                shutil.copyfileobj(raw_file, compressed_file, length=1024 * 1024)
+            os.replace(compressed_path, backup_path)
+        else:
+            os.replace(raw_path, backup_path)
+    finally:
+        for partial_path in (raw_path, compressed_path):
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+    return backup_path
+
+
+def _adapt_progress(progress: Optional[Callable[[int, int], None]]):
+    if progress is None:
+        return None
+    # sqlite3 calls progress(status, remaining, total)
+    return lambda status, remaining, total: progress(remaining, total)
+
+
+def restore_database(backup_path: str, db_path: str, pages: int = -1):
+    """
+    Restores a backup (plain or gzip-compressed) over the save database.
+
+    The backup is integrity-checked before anything is overwritten. It is then copied in
+    with the backup API, so connections already open on `db_path` (including the pooled
+    ones) see the restored data on their next read. Finally pending schema migrations are
+    applied, in case the backup was taken by an older version of the game. Players already
+    loaded in memory are not refreshed; restore while no game session is running, or reload them.
+
+    Args:
+        backup_path (str): The backup file written by backup_database.
+        db_path (str): The database to overwrite. Created if it does not exist.
+        pages (int, optional): Pages copied per step. -1 copies everything in one step.
+
+    Raises:
+        sqlite3.DatabaseError: If the backup is not a valid SQLite database or fails its integrity check.
+    """
+    temp_path = None
+    source_path = backup_path
+    try:
+        with open(backup_path, 'rb') as backup_file:
+            is_compressed = backup_file.read(2) == _GZIP_MAGIC
+        if is_compressed:
+            temp_path = f"{db_path}.{os.getpid()}.restore"
+            with gzip.open(backup_path, 'rb') as compressed_file, open(temp_path, 'wb') as raw_file:
+                shutil.copyfileobj(compressed_file, raw_file, length=1024 * 1024)
+            source_path = temp_path
+
+        source = sqlite3.connect(source_path)
+        try:
+            result = source.execute("PRAGMA integrity_check;").fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f"Backup {backup_path} failed its integrity check: {result}")
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            target = sqlite3.connect(db_path)
+            try:
+                source.backup(target, pages=pages)
+                migrate(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def snapshot(db_path: str, backup_dir: str, keep: Optional[int] = None, compress: bool = False,
+             pages: int = 256, step_sleep: float = 0.005) -> str:
+    """
+    Writes a timestamped backup into `backup_dir` and prunes old ones.
+    Meant to be run regularly (e.g. from cron with the `backup` command) against the live database.
+
+    Args:
+        db_path (str): The database to back up.
+        backup_dir (str): Directory holding the snapshots.
+        keep (int, optional): Number of most recent snapshots to keep. None keeps all of them.
+        compress (bool, optional): gzip the snapshot.
+        pages (int, optional): Pages copied per batch, see backup_database.
+        step_sleep (float, optional): Seconds to pause between batches.
+
+    Returns:
+        str: The path of the new snapshot.
+    """
+    # Microseconds keep names unique (and sortable) when snapshots are taken back to back.
+    timestamp = datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+    backup_path = backup_database(db_path, os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}.db"),
+                                  pages=pages, step_sleep=step_sleep, compress=compress)
+    if keep is not None:
+        prune_backups(backup_dir, keep)
+    return backup_path
+
+
+def list_backups(backup_dir: str) -> List[str]:
+    """Returns the snapshot paths in `backup_dir`, oldest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(name for name in os.listdir(backup_dir)
+                   if name.startswith(BACKUP_PREFIX) and (name.endswith('.db') or name.endswith('.db.gz')))
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def prune_backups(backup_dir: str, keep: int) -> List[str]:
+    """
+    Deletes all but the `keep` most recent snapshots.
+
+    Returns:
+        list[str]: The paths that were deleted.
+    """
+    backups = list_backups(backup_dir)
+    stale = backups[:-keep] if keep > 0 else backups
+    for path in stale:
+        os.remove(path)
+    return stale
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Back up or restore the save database while the game is running.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = subparsers.add_parser('backup', help="Write a timestamped snapshot of the database.")
+    backup_parser.add_argument('--db', default='data/rpg_save.db', help="Database to back up.")
+    backup_parser.add_argument('--output-dir', default='data/backups', help="Directory for snapshots.")
+    backup_parser.add_argument('--compress', action='store_true', help="gzip the snapshot.")
+    backup_parser.add_argument('--keep', type=int, default=None, help="Keep only the N most recent snapshots.")
+    backup_parser.add_argument('--pages', type=int, default=256, help="Pages copied per batch (-1: all at once).")
+
+    restore_parser = subparsers.add_parser('restore', help="Restore a snapshot over the database.")
+    restore_parser.add_argument('backup', help="Snapshot file (.db or .db.gz). 'latest' picks the newest in --output-dir.")
+    restore_parser.add_argument('--db', default='data/rpg_save.db', help="Database to overwrite.")
+    restore_parser.add_argument('--output-dir', default='data/backups', help="Directory searched for 'latest'.")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'backup':
+            path = snapshot(args.db, args.output_dir, keep=args.keep, compress=args.compress, pages=args.pages)
+            print(f"Backup written to {path}")
+        else:
+            backup_path = args.backup
+            if backup_path == 'latest':
+                backups = list_backups(args.output_dir)
+                if not backups:
+                    print(f"No backups found in {args.output_dir}")
+                    return 1
+                backup_path = backups[-1]
+            restore_database(backup_path, args.db)
+            print(f"Restored {args.db} from {backup_path}")
+    except (sqlite3.Error, OSError) as e:
+        print(f"Backup error: {e}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
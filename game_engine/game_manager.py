@@ -1,5 +1,8 @@
 import os
+import queue
 import sys
+import threading
+from concurrent.futures import CancelledError, Future
 
 # Adjust path to import from parent directory (root)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -7,9 +10,17 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Removed: from ui.ui_manager import GameUI (Tkinter)
 # Removed: import tkinter as tk
 
-from game_engine.persistence_service import setup_database, save_player, load_player
+from game_engine.storage_backends import StorageBackend, SQLiteBackend
+from game_engine.player_cache import PlayerCache
 from game_engine.input_parser import parse_input
-from game_engine.ai_dm_interface import AIDungeonMaster
+from game_engine.ai_dm_interface import AIDungeonMaster, DEFAULT_AI_TIMEOUT
+from game_engine.ai_task_runner import AITaskRunner
+from game_engine.llm_backends import LLMBackend
+from game_engine.request_scheduler import RequestScheduler, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+from game_engine.model_router import ModelRouter
+from game_engine.structured_output import DEFAULT_STRUCTURED_OUTPUT
+from game_engine.command_router import CommandRouter, default_command_router
+from game_engine.adventure_memory import AdventureMemoryKeeper
 from game_engine.character_manager import Player
 from .common_types import GameStateUpdates, AdventureLogEntry # Import for type hinting and usage
 # ui.web_ui_manager is imported in main.py and instance is passed
@@ -21,18 +32,79 @@ class GameManager:
     Manages the overall game state, UI, and core game logic.
     Adapted for WebUIManager using Eel.
     """
-    def __init__(self, ui_manager): # ui_manager is now injected
+    def __init__(self, ui_manager, write_behind: bool = False, write_behind_window: float = 0.5,
+                 player_cache: PlayerCache | None = None,
+                 storage: StorageBackend | None = None, slot: int = 1,
+                 stream_narrative: bool = True, ai_runner: AITaskRunner | None = None,
+                 ai_timeout: float | None = DEFAULT_AI_TIMEOUT,
+                 command_router: CommandRouter | None = None,
+                 memory_keeper: AdventureMemoryKeeper | None = None,
+                 prefetch_opening_scene: bool = True,
+                 llm_backend: LLMBackend | None = None,
+                 structured_output: bool = DEFAULT_STRUCTURED_OUTPUT,
+                 request_scheduler: RequestScheduler | None = None,
+                 model_router: ModelRouter | None = None,
+                 conversation_mode: bool = False): # ui_manager is now injected
         """
         Initializes the GameManager, sets up the database.
         UI initialization is now handled by main.py with Eel.
+
+        Args:
+            ui_manager: The UI manager (WebUIManager) used to display game output.
+            write_behind (bool, optional): If True, per-turn saves to the default SQLite store are
+                                           committed by a background writer thread instead of blocking the turn.
+            write_behind_window (float, optional): Durability window in seconds for write-behind saves.
+            player_cache (PlayerCache, optional): Shared cache of live players for multi-session hosting.
+                                                  When given, the player is loaded and saved through it.
+            storage (StorageBackend, optional): Where players are stored. Defaults to the player cache's
+                                                store, else a SQLiteBackend at DB_PATH.
+            slot (int, optional): The save slot to play. A new player is created if the slot is empty.
+            stream_narrative (bool, optional): If True, the AI's narrative is shown in the UI as it is
+                                               generated instead of after the whole reply has arrived.
+            ai_runner (AITaskRunner, optional): Shared event loop for AI turns. When given, turns use the async
+                                                AI client with a deadline of `ai_timeout` seconds, and a newer
+                                                command from the player cancels the turn still in flight.
+            ai_timeout (float, optional): Deadline in seconds for AI turns run on `ai_runner`.
+            command_router (CommandRouter, optional): Commands answered locally instead of by the AI.
+                                                      Defaults to the built-in state queries (inventory, stats, ...).
+            memory_keeper (AdventureMemoryKeeper, optional): Summarizes log entries trimmed from the adventure log
+                                                             in the background. Defaults to one using the AI DM.
+            prefetch_opening_scene (bool, optional): If True, the opening scene is requested from the AI as soon as
+                                                     the player is loaded, while the browser starts, and shown
+                                                     by initialize_game_state_and_ui.
+            llm_backend (LLMBackend, optional): The AI DM's model backend, e.g. a MockLLMBackend to play or
+                                                load-test without network. Defaults to Gemini, asking for an API key.
+            structured_output (bool, optional): If True, AI turns are generated against a JSON response schema
+                                                instead of asking for JSON in the instructions. Defaults to
+                                                DEFAULT_STRUCTURED_OUTPUT, as for AIDungeonMaster.
+            request_scheduler (RequestScheduler, optional): Process-wide quota gate shared by all sessions. When given,
+                                                            AI requests wait for the key's rate limits, with turns
+                                                            served before opening scenes and summaries.
+            model_router (ModelRouter, optional): Picks a cheap or strong model per AI call (e.g. the strong one for
+                                                  combat turns) and records per-tier latency and cost.
+            conversation_mode (bool, optional): If True, AI turns are sent as a conversation of small change
+                                                messages after a full-state one, re-sending the full state
+                                                periodically and after drift.
         """
         self.ui = ui_manager # Store the passed WebUIManager instance
         self.player: Player | None = None
         self.ai_dm: AIDungeonMaster | None = None
         self.turn_number: int = 0
+        self.slot = slot
+        self.stream_narrative = stream_narrative
+        self.ai_runner = ai_runner
+        self.ai_timeout = ai_timeout
+        self.command_router = command_router if command_router is not None else default_command_router()
+        self._opening_scene: Future | None = None # Prefetched opening scene, consumed once the UI is ready
+        self.player_cache = player_cache
+        if storage is None and player_cache is not None:
+            storage = player_cache.storage
+        uses_default_storage = storage is None
+        self.storage: StorageBackend = storage if storage is not None else SQLiteBackend(
+            DB_PATH, write_behind=write_behind, write_behind_window=write_behind_window)
 
         data_dir = 'data'
-        if not os.path.exists(data_dir):
+        if uses_default_storage and not os.path.exists(data_dir):
             try:
                 os.makedirs(data_dir)
                 print(f"Directory '{data_dir}' created by GameManager.")
@@ -41,19 +113,28 @@ class GameManager:
                 return
 
         print("GameManager: Setting up database...")
-        setup_database(DB_PATH)
-        print("GameManager: Database setup complete.")
-
-        print("GameManager: Loading player...")
-        self.player = load_player(DB_PATH, player_id=1)
+        self.storage.setup()
+        print(f"GameManager: Database setup complete ({type(self.storage).__name__}).")
+
+        print(f"GameManager: Loading player in slot {slot}...")
+        player_id = self.storage.find_player_id_by_slot(slot)
+        if player_id is None:
+            self.player = None
+        elif self.player_cache is not None:
+            self.player = self.player_cache.get(player_id) # Reattaches to the live Player if it is cached
+        else:
+            self.player = self.storage.load_player(player_id)
         if self.player is None:
             print("GameManager: No player found, creating new default player.")
-            self.player = Player(player_id=1, name='Veera', hp=100, max_hp=100, mp=50, max_mp=50)
+            # player_id=None lets the store assign the next free ID
+            self.player = Player(player_id=None, name='Veera', hp=100, max_hp=100, mp=50, max_mp=50, slot=slot)
             self.player.current_location = 'Kurukshetra - Battlefield Edge' # Default location
             self.player.story_flags = {'war_just_started': True}
             self.player.inventory = ["a simple dagger", "a healing herb"]
             # Default skills are set in Player class: ["Meditate", "Power Attack"]
-            save_player(DB_PATH, self.player)
+            self.storage.create_player(self.player)
+            if self.player_cache is not None and self.player.player_id is not None:
+                self.player_cache.put(self.player)
             print(f"GameManager: New player '{self.player.name}' created and saved.")
         else:
             print(f"GameManager: Player '{self.player.name}' loaded successfully.")
@@ -61,7 +142,7 @@ class GameManager:
                  # For players saved before skills were introduced
                 print(f"GameManager: Player '{self.player.name}' has no skills, assigning defaults.")
                 self.player.skills = ["Meditate", "Power Attack"] # Default skills
-                save_player(DB_PATH, self.player) # Save updated player
+                self._save_player_state() # Save updated player (skipped if nothing persisted changed)
 
         # DO NOT update UI (e.g. self.ui.update_player_display(self.player)) here.
         # This will be done in initialize_game_state_and_ui after JS is ready.
@@ -70,11 +151,18 @@ class GameManager:
         # In a real app, API key might come from a config file or secure input
         # For now, let's keep the input, but acknowledge it's blocking for Eel startup.
         # Consider moving this to after JS ready if it's problematic.
+        session_key = self.player.player_id if self.player.player_id is not None else id(self)
+        ai_options = {'structured_output': structured_output, 'request_scheduler': request_scheduler,
+                      'session_key': session_key, 'model_router': model_router,
+                      'conversation_mode': conversation_mode}
         try:
-            api_key_from_input = os.getenv("GOOGLE_API_KEY")
-            if not api_key_from_input: # Fallback if env var is not set
-                 api_key_from_input = input('Please enter your Google AI API Key (or set GOOGLE_API_KEY env var): ')
-            self.ai_dm = AIDungeonMaster(api_key=api_key_from_input)
+            if llm_backend is not None:
+                self.ai_dm = AIDungeonMaster(backend=llm_backend, **ai_options)
+            else:
+                api_key_from_input = os.getenv("GOOGLE_API_KEY")
+                if not api_key_from_input: # Fallback if env var is not set
+                     api_key_from_input = input('Please enter your Google AI API Key (or set GOOGLE_API_KEY env var): ')
+                self.ai_dm = AIDungeonMaster(api_key=api_key_from_input, **ai_options)
             print("GameManager: AI Dungeon Master initialized.")
         except Exception as e:
             print(f"GameManager: Error initializing AI DM: {e}")
@@ -82,6 +170,14 @@ class GameManager:
                 self.ui.add_story_text(f"[System Error: Could not initialize AI. Game may not function. {e}]")
             # Potentially re-raise or handle to prevent game from starting without AI
 
+        if memory_keeper is None:
+            # Without an AI DM the keeper still writes local (extractive) summaries
+            memory_keeper = AdventureMemoryKeeper(summarizer=self.ai_dm.summarize_adventure if self.ai_dm else None)
+        self.memory_keeper = memory_keeper
+
+        if prefetch_opening_scene:
+            self._opening_scene = self._prefetch_opening_scene()
+
     def initialize_game_state_and_ui(self):
         """
         Called once JavaScript is ready. Sends initial game state to UI.
@@ -100,6 +196,31 @@ class GameManager:
         else:
             self.turn_number = 0
 
+        initial_description = self._take_prefetched_opening_scene()
+        if initial_description is None:
+            initial_description = self._fetch_opening_scene(PRIORITY_INTERACTIVE) # The player is waiting for it
+        self.ui.add_story_text(initial_description)
+
+        # Debug print before initial player display update
+        if self.player:
+            print(f"DEBUG GameManager (init_ui): Player state before initial display: HP={self.player.hp}/{self.player.max_hp}, MP={self.player.mp}/{self.player.max_mp}, Loc='{self.player.current_location}', Inv={self.player.inventory}, Skills={self.player.skills}")
+        self.ui.update_player_display(self.player)
+
+        if self.player.skills: # player should exist here due to checks above
+            self.ui.add_story_text(f"Your available skills: {', '.join(self.player.skills)}")
+        else:
+            self.ui.add_story_text("You currently have no special skills.")
+        self.ui.add_story_text("Type your commands below and press Enter or click Send.")
+
+
+    def _fetch_opening_scene(self, priority: int) -> str:
+        """
+        Asks the AI for the scene the session opens with: a continuation from the adventure log
+        for a returning player, otherwise the initial scene.
+
+        Args:
+            priority (int): Scheduler priority; PRIORITY_PREFETCH when prefetching, PRIORITY_INTERACTIVE when the UI waits.
+        """
         initial_description = "" # Initialize
         if self.player and self.player.adventure_log and self.player.adventure_log.entries:
             # Log exists and has entries, try to get continuation from AI
@@ -109,31 +230,75 @@ class GameManager:
             print("GameManager: Adventure log found, attempting to get continuation from AI.") # For logging
             try:
                 # Pass the full player object, as the AI prompt might need other player details too.
-                initial_description = self.ai_dm.get_scene_description_from_log(self.player)
+                initial_description = self.ai_dm.get_scene_description_from_log(self.player, priority)
             except AttributeError:
                 # Fallback if the method doesn't exist yet on ai_dm (it will be added next)
                 print("GameManager: ai_dm.get_scene_description_from_log not yet implemented. Falling back to initial scene.")
-                initial_description = self.ai_dm.get_initial_scene_description()
+                initial_description = self.ai_dm.get_initial_scene_description(priority)
             except Exception as e:
                 print(f"GameManager: Error getting scene description from log: {e}. Falling back.")
-                initial_description = self.ai_dm.get_initial_scene_description() # Fallback on any error
+                initial_description = self.ai_dm.get_initial_scene_description(priority) # Fallback on any error
         else:
             # No log or log is empty, get standard initial scene
             print("GameManager: No adventure log found or log is empty. Getting initial scene description.") # For logging
-            initial_description = self.ai_dm.get_initial_scene_description()
-        self.ui.add_story_text(initial_description)
+            initial_description = self.ai_dm.get_initial_scene_description(priority)
+        return initial_description
 
-        # Debug print before initial player display update
-        if self.player:
-            print(f"DEBUG GameManager (init_ui): Player state before initial display: HP={self.player.hp}/{self.player.max_hp}, MP={self.player.mp}/{self.player.max_mp}, Loc='{self.player.current_location}', Inv={self.player.inventory}, Skills={self.player.skills}")
-        self.ui.update_player_display(self.player)
+    async def _fetch_opening_scene_async(self) -> str:
+        if self.player.adventure_log and self.player.adventure_log.entries:
+            return await self.ai_dm.get_scene_description_from_log_async(self.player, timeout=self.ai_timeout)
+        return await self.ai_dm.get_initial_scene_description_async(timeout=self.ai_timeout)
 
-        if self.player.skills: # player should exist here due to checks above
-            self.ui.add_story_text(f"Your available skills: {', '.join(self.player.skills)}")
-        else:
-            self.ui.add_story_text("You currently have no special skills.")
-        self.ui.add_story_text("Type your commands below and press Enter or click Send.")
+    def _prefetch_opening_scene(self) -> Future | None:
+        """
+        Starts fetching the opening scene in the background, so the AI round trip overlaps with
+        Eel and the browser starting up instead of beginning only once JS is ready.
 
+        Returns:
+            concurrent.futures.Future | None: The scene being fetched, or None if it cannot be prefetched.
+        """
+        if not self.player or not self.ai_dm:
+            return None
+        print("GameManager: Prefetching the opening scene while the UI starts.")
+        try:
+            if self.ai_runner is not None:
+                # Keyed apart from the player's turns, so their first command does not cancel it
+                session_key = self.player.player_id if self.player.player_id is not None else id(self)
+                return self.ai_runner.submit(("opening-scene", session_key), self._fetch_opening_scene_async())
+            future = Future()
+
+            def fetch():
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(self._fetch_opening_scene(PRIORITY_PREFETCH))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=fetch, name="opening-scene-prefetch", daemon=True).start()
+            return future
+        except Exception as e:
+            print(f"GameManager: Could not prefetch the opening scene: {e}")
+            return None
+
+    def _take_prefetched_opening_scene(self) -> str | None:
+        """
+        Returns the prefetched opening scene, waiting for it if it is still in flight.
+        Returns None if there was no prefetch or it failed, so the caller fetches it directly.
+        """
+        future, self._opening_scene = self._opening_scene, None # Only the first JS ready uses it
+        if future is None:
+            return None
+        while not future.done():
+            # Yield to other Eel handlers instead of blocking their greenlets
+            self.ui.sleep(0.05)
+        try:
+            return future.result()
+        except CancelledError:
+            print("GameManager: Opening scene prefetch was cancelled. Fetching it now.")
+        except Exception as e:
+            print(f"GameManager: Opening scene prefetch failed: {e}. Fetching it now.")
+        return None
 
     def start_game(self):
         """
@@ -152,11 +317,18 @@ class GameManager:
             self.ui.add_story_text("[System Error: Game not fully initialized. Cannot process command.]")
             return
 
-        self.turn_number += 1
-
         # command_string is already provided by JS
         stripped_command = command_string.strip()
 
+        local_command = self.command_router.match(stripped_command)
+        if local_command is not None:
+            # State queries are answered from the in-memory player: no AI call, no turn, no log entry
+            self.ui.add_story_text(f"> {stripped_command}")
+            self.command_router.run(local_command, self.player, self.ui)
+            return
+
+        self.turn_number += 1
+
         # Log player action
         player_log_entry = AdventureLogEntry(
             type="player_action",
@@ -164,7 +336,7 @@ class GameManager:
             turn_number=self.turn_number
         )
         if self.player.adventure_log: # Should always exist due to Player.__init__
-            self.player.adventure_log.entries.append(player_log_entry)
+            self.player.add_log_entry(player_log_entry)
         # else: self.player.adventure_log = AdventureLog(entries=[player_log_entry]) # Safeguard
 
         parsed_result = parse_input(command_string) # Normalizes and splits
@@ -179,11 +351,21 @@ class GameManager:
 
         # AI interaction using the full stripped_command
         player_action_for_ai = stripped_command
-        narrative, game_updates = self.ai_dm.get_ai_response(
-            player_object=self.player,
-            player_action=player_action_for_ai
-        )
-        self.ui.add_story_text(narrative)
+        try:
+            if self.ai_runner is not None:
+                narrative, game_updates = self._get_ai_response_async(player_action_for_ai)
+            elif self.stream_narrative:
+                narrative, game_updates = self._get_streamed_ai_response(player_action_for_ai)
+            else:
+                narrative, game_updates = self.ai_dm.get_ai_response(
+                    player_object=self.player,
+                    player_action=player_action_for_ai
+                )
+                self.ui.add_story_text(narrative)
+        except CancelledError:
+            # The player sent a newer command while this turn was waiting on the AI; that one takes over.
+            print(f"GameManager: Turn {self.turn_number} ('{stripped_command}') superseded by a newer command.")
+            return
 
         # Log AI output
         ai_log_entry = AdventureLogEntry(
@@ -192,14 +374,15 @@ class GameManager:
             turn_number=self.turn_number
         )
         if self.player.adventure_log:
-            self.player.adventure_log.entries.append(ai_log_entry)
+            self.player.add_log_entry(ai_log_entry)
 
-        # Log Trimming Logic
+        # Log Trimming Logic: the in-memory log is only a window of recent entries.
+        # Every entry, trimmed or not, is appended to the adventure_log_entries table when the player is next saved.
         if self.player.adventure_log and self.player.adventure_log.entries:
-            max_entries = self.player.adventure_log.max_entries
-            current_length = len(self.player.adventure_log.entries)
-            if current_length > max_entries:
-                self.player.adventure_log.entries = self.player.adventure_log.entries[current_length - max_entries:]
+            evicted_entries = self.player.trim_adventure_log()
+            if evicted_entries:
+                # Folded into the player's memory summaries off the critical path
+                self.memory_keeper.remember(self.player, evicted_entries)
 
         if game_updates:
             if game_updates.skill_used:
@@ -245,21 +428,117 @@ class GameManager:
             # Refresh the entire player display panel after all changes
             self.ui.update_player_display(self.player)
 
-            # Save player state after updates
-            save_player(DB_PATH, self.player)
+            # Save player state after updates; only the fields this turn changed are written
+            self._save_player_state()
+
+    def _get_streamed_ai_response(self, player_action: str):
+        """
+        Gets the AI response while streaming its narrative into a single, growing story message.
+        Game state updates only arrive with the complete reply, so they are applied afterwards as usual.
+        """
+        streamed_parts = []
+        narrative, game_updates = self.ai_dm.get_ai_response(
+            player_object=self.player,
+            player_action=player_action,
+            on_narrative_fragment=lambda fragment: self._show_narrative_fragment(fragment, streamed_parts)
+        )
+        self._finish_narrative(narrative, streamed_parts)
+        return narrative, game_updates
+
+    def _get_ai_response_async(self, player_action: str):
+        """
+        Runs the turn with the async AI client on the shared AI runner.
+        While waiting, this handler yields through the UI's cooperative sleep so other commands keep
+        being handled; streamed fragments arrive on the runner's thread and are shown from here.
+
+        Raises:
+            concurrent.futures.CancelledError: If a newer command from this player superseded the turn.
+        """
+        fragments = queue.SimpleQueue()
+        streamed_parts = []
+
+        def show_pending_fragments():
+            while True:
+                try:
+                    fragment = fragments.get_nowait()
+                except queue.Empty:
+                    return
+                self._show_narrative_fragment(fragment, streamed_parts)
+
+        def idle(seconds: float):
+            show_pending_fragments()
+            self.ui.sleep(seconds)
+
+        session_key = self.player.player_id if self.player.player_id is not None else id(self)
+        coroutine = self.ai_dm.get_ai_response_async(
+            player_object=self.player,
+            player_action=player_action,
+            on_narrative_fragment=fragments.put if self.stream_narrative else None,
+            timeout=self.ai_timeout
+        )
+        try:
+            narrative, game_updates = self.ai_runner.run(session_key, coroutine, idle=idle)
+        except CancelledError:
+            if streamed_parts:
+                self.ui.end_story_stream()
+            raise
+        show_pending_fragments()
+        self._finish_narrative(narrative, streamed_parts)
+        return narrative, game_updates
+
+    def _show_narrative_fragment(self, fragment: str, streamed_parts: list):
+        if not streamed_parts:
+            self.ui.begin_story_stream()
+        streamed_parts.append(fragment)
+        self.ui.append_story_stream(fragment)
+
+    def _finish_narrative(self, narrative: str, streamed_parts: list):
+        if streamed_parts:
+            self.ui.end_story_stream()
+        if "".join(streamed_parts) != narrative:
+            # Nothing was streamed (e.g. the reply was not JSON) or the stream broke off: show the final text
+            self.ui.add_story_text(narrative)
+
+    def _save_player_state(self):
+        """
+        Persists the player's changes through the player cache if one is shared,
+        otherwise directly to the storage backend (which may queue them write-behind).
+        """
+        if self.player_cache is not None:
+            self.player_cache.save(self.player)
+        else:
+            self.storage.save_player_changes(self.player)
 
 
     def quit_game(self):
         """
         Saves the player's state. UI closing is handled by Eel or Python exit.
         """
+        if getattr(self, '_opening_scene', None) is not None:
+            self._opening_scene.cancel() # The player quit before the UI asked for it
+        if hasattr(self, 'memory_keeper'):
+            # Let summaries still being written land in the player's memory before the final save
+            self.memory_keeper.close(timeout=10)
+        if getattr(self, 'ai_dm', None) is not None and self.ai_dm.request_scheduler is not None:
+            print(f"GameManager: AI request scheduler - {self.ai_dm.request_scheduler.stats().summary()}")
+        if getattr(self, 'ai_dm', None) is not None and self.ai_dm.model_router is not None:
+            print(f"GameManager: AI model tiers -\n{self.ai_dm.model_router.report()}")
+        if getattr(self, 'ai_dm', None) is not None and self.ai_dm.conversation is not None:
+            conversation = self.ai_dm.conversation
+            print(f"GameManager: AI conversation - {conversation.delta_turns} delta turns, {conversation.keyframes} full-state turns.")
         if hasattr(self, 'player') and self.player is not None:
             print(f"GameManager: Saving player '{self.player.name}' before quitting...")
-            save_player(DB_PATH, self.player)
+            self._save_player_state()
             print("Game saved.")
         else:
             print("GameManager: No player data to save.")
 
+        if self.player_cache is not None:
+            self.player_cache.flush()
+        # Commits any queued write-behind saves, then releases pooled DB connections
+        # (closing the last one checkpoints the WAL into the main file).
+        self.storage.close()
+
         print("GameManager: Exiting application via sys.exit().")
         sys.exit(0) # Request a clean exit
 
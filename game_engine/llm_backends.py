@@ -0,0 +1,400 @@
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Protocol, Tuple, Union
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+from game_engine.prompt_builder import estimate_tokens
+from game_engine.structured_output import RESPONSE_MIME_TYPE, updates_to_wire
+
+MODEL_NAME = 'gemini-2.0-flash-lite'
+
+# A prompt is a string, or a conversation in the google.generativeai contents format:
+# [{'role': 'user' | 'model', 'parts': [text]}, ...], oldest first, ending with the user's message.
+Prompt = Union[str, List[dict]]
+
+
+class LLMBackend(Protocol):
+    """
+    Where AIDungeonMaster gets its models. A model has the google.generativeai.GenerativeModel
+    calling convention the DM already uses:
+
+        generate_content(prompt, stream=False) / await generate_content_async(prompt, stream=False)
+
+    with a string or a conversation (see Prompt) as the prompt, returning a response with `.text` and `.usage_metadata` (prompt_token_count,
+    candidates_token_count), or with stream=True an (async) iterator of such chunks, the last
+    of which carries the usage metadata.
+    """
+    name: str
+
+    def create_model(self, system_instruction: Optional[str] = None,
+                     response_schema: Optional[dict] = None, model_name: Optional[str] = None) -> Any:
+        """
+        Returns a model, optionally carrying a fixed system instruction. With a response schema
+        (see structured_output), every reply is JSON matching it. `model_name` picks another model
+        than the backend's default (see model_router); backends without a choice of models ignore it.
+        """
+        ...
+
+    def create_cached_model(self, system_instruction: str, ttl_seconds: float,
+                            response_schema: Optional[dict] = None, model_name: Optional[str] = None) -> Tuple[Any, datetime]:
+        """
+        Returns a model whose system instruction is stored server-side, and when that copy expires.
+        Raises if the backend cannot cache it; the caller then uses create_model().
+        """
+        ...
+
+
+class GeminiBackend:
+    """Google Gemini through google.generativeai: the production backend."""
+    name = 'gemini'
+
+    # Server-side cached system instructions by model name and instruction, shared by every
+    # session in the process so a new game reuses the cache instead of creating its own.
+    _shared_context_caches: dict = {}
+
+    def __init__(self, api_key: str, model_name: str = MODEL_NAME, own_client: bool = False):
+        """
+        Args:
+            api_key (str): The Google AI API key.
+            model_name (str, optional): The Gemini model to use.
+            own_client (bool, optional): If True, requests use clients of this key alone instead of the
+                                         process-wide google.generativeai configuration, so several keys
+                                         can be used side by side (see api_key_pool). Context caching
+                                         needs the process-wide client and is then unavailable.
+        """
+        self.model_name = model_name
+        self.own_client = own_client
+        self._api_key = api_key
+        self._clients: dict = {} # 'sync' / 'async' -> this key's generative service client
+        self._clients_lock = threading.Lock()
+        if not own_client:
+            genai.configure(api_key=api_key)
+
+    def create_model(self, system_instruction: Optional[str] = None, response_schema: Optional[dict] = None,
+                     model_name: Optional[str] = None):
+        options = {}
+        if system_instruction is not None:
+            options['system_instruction'] = system_instruction
+        if response_schema is not None:
+            options['generation_config'] = self._structured_config(response_schema)
+        model = genai.GenerativeModel(model_name or self.model_name, **options)
+        return _OwnClientModel(self, model) if self.own_client else model
+
+    def create_cached_model(self, system_instruction: str, ttl_seconds: float, response_schema: Optional[dict] = None,
+                            model_name: Optional[str] = None):
+        if self.own_client:
+            raise NotImplementedError("Context caching needs the process-wide client; unavailable for a pooled key.")
+        model_name = model_name or self.model_name
+        cache_key = (model_name, system_instruction)
+        cache = GeminiBackend._shared_context_caches.get(cache_key)
+        if cache is None or cache.expire_time <= datetime.now(timezone.utc):
+            cache = genai.caching.CachedContent.create(
+                model=f"models/{model_name}",
+                display_name="ai-dm-system-instruction",
+                system_instruction=system_instruction,
+                ttl=timedelta(seconds=ttl_seconds),
+            )
+            GeminiBackend._shared_context_caches[cache_key] = cache
+        if response_schema is not None:
+            return (genai.GenerativeModel.from_cached_content(cache, generation_config=self._structured_config(response_schema)),
+                    cache.expire_time)
+        return genai.GenerativeModel.from_cached_content(cache), cache.expire_time
+
+    @staticmethod
+    def _structured_config(response_schema: dict):
+        return genai.GenerationConfig(response_mime_type=RESPONSE_MIME_TYPE, response_schema=response_schema)
+
+    def client(self, kind: str):
+        """Returns this key's 'sync' or 'async' generative service client, created on first use."""
+        with self._clients_lock:
+            service_client = self._clients.get(kind)
+            if service_client is None:
+                client_class = glm.GenerativeServiceAsyncClient if kind == 'async' else glm.GenerativeServiceClient
+                service_client = client_class(client_options={'api_key': self._api_key})
+                self._clients[kind] = service_client
+            return service_client
+
+
+class _OwnClientModel:
+    """
+    A GenerativeModel that sends its requests with its backend's own clients.
+
+    google.generativeai 0.7 has no public way to give a model its own client: it only reads the
+    private `_client` / `_async_client` attributes, falling back to the process-wide client when
+    they are None. requirements.txt pins the SDK for that reason, and the attributes are checked
+    here so an SDK that renamed them fails loudly instead of silently sending every key's
+    requests with the process-wide client.
+    """
+
+    def __init__(self, backend: GeminiBackend, model):
+        missing = [name for name in ('_client', '_async_client') if not hasattr(model, name)]
+        if missing:
+            raise RuntimeError(f"This google-generativeai version has no GenerativeModel.{', .'.join(missing)}; "
+                               f"per-key clients need the version pinned in requirements.txt.")
+        self.backend = backend
+        self.model = model
+
+    def generate_content(self, prompt: Prompt, stream: bool = False):
+        self.model._client = self.backend.client('sync')
+        return self.model.generate_content(prompt, stream=stream)
+
+    async def generate_content_async(self, prompt: Prompt, stream: bool = False):
+        # Attached on first use, like the process-wide client, so it binds to the loop that awaits it
+        self.model._async_client = self.backend.client('async')
+        return await self.model.generate_content_async(prompt, stream=stream)
+
+
+# Latency models for the mock engine: rng -> seconds for a whole reply.
+LatencyModel = Callable[[random.Random], float]
+
+
+def fixed_latency(seconds: float) -> LatencyModel:
+    """Every reply takes `seconds`."""
+    return lambda rng: seconds
+
+
+def uniform_latency(low: float, high: float) -> LatencyModel:
+    """Replies take between `low` and `high` seconds."""
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> LatencyModel:
+    """
+    Log-normally distributed replies around `median` seconds. A larger `sigma` gives a longer
+    tail, which is what real model latencies look like (and what hedging and deadlines are for).
+    """
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+@dataclass
+class MockUsageMetadata:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+
+
+@dataclass
+class MockResponse:
+    """A reply or stream chunk from the mock engine."""
+    text: str
+    usage_metadata: Optional[MockUsageMetadata] = None
+
+
+# Word banks for the generated narrative.
+_SUBJECTS = ["A conch shell", "The beat of war drums", "A wounded Deva", "An Asura scout", "The river Saraswati",
+             "A sage in ochre robes", "Dust from the chariots", "A banner of Indra", "A Rakshasa's shadow",
+             "The evening wind"]
+_VERBS = ["echoes across", "drifts over", "circles", "falls silent near", "stirs beside", "looms above",
+          "whispers through", "gathers around"]
+_PLACES = ["the battlefield edge", "the ruined shrine", "the banyan grove", "the camp of the Devas",
+           "the riverbank", "the ridge above Kurukshetra", "the smouldering chariots", "the old well"]
+_ITEMS = ["a bronze arrowhead", "a lotus amulet", "a healing herb", "a torn war banner", "a conch shell",
+          "a sandalwood charm"]
+_LOCATIONS = ["Kurukshetra - Battlefield Edge", "Banyan Grove", "Ruined Shrine", "Deva Encampment",
+              "Saraswati Riverbank"]
+_TURN_MARKER = 'The player says: "'
+
+
+def prompt_text(prompt: Prompt) -> str:
+    """The text of a prompt. A conversation's messages are joined oldest first, so its latest message comes last."""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n\n".join(part for message in prompt for part in message['parts'])
+
+
+def prompt_kind(prompt: str) -> str:
+    """Classifies a prompt the AI DM sends: 'turn' (expects JSON), 'summary' or 'scene' (plain narrative)."""
+    if _TURN_MARKER in prompt:
+        return 'turn'
+    if prompt.startswith("Summarize"):
+        return 'summary'
+    return 'scene'
+
+
+def turn_action(prompt: str) -> str:
+    """Returns what the player said in a turn prompt (the latest turn, for a conversation's text)."""
+    return prompt.rsplit(_TURN_MARKER, 1)[1].rsplit('"', 1)[0]
+
+
+class MockLLMBackend:
+    """
+    Deterministic local engine for tests, demos and load tests: no network, no quota.
+
+    Turn prompts get a JSON reply valid against GameStateUpdates, other prompts (opening scene,
+    continuation, summaries) plain narrative. Reply text depends only on `seed` and the prompt,
+    so runs are reproducible. Latency is drawn from `latency` by a seeded generator and spread
+    across the chunks of a streamed reply; sizes are set by `sentences` and `chunk_size`.
+    """
+    name = 'mock'
+
+    def __init__(self, latency: LatencyModel | None = None, sentences: Tuple[int, int] = (3, 5),
+                 chunk_size: int = 24, seed: int = 0, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            latency (LatencyModel, optional): Seconds per reply. Defaults to no delay.
+            sentences (tuple[int, int], optional): Range of narrative sentences per reply.
+            chunk_size (int, optional): Characters per chunk of a streamed reply.
+            seed (int, optional): Changes every reply and the latency sequence.
+            sleep (Callable[[float], None], optional): Used by the sync calls to simulate latency.
+        """
+        self.latency = latency if latency is not None else fixed_latency(0.0)
+        self.sentences = sentences
+        self.chunk_size = max(1, chunk_size)
+        self.seed = seed
+        self._sleep = sleep
+        self._latency_rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> 'MockLLMBackend':
+        """Builds the engine from AI_MOCK_LATENCY (median seconds, log-normal) and AI_MOCK_SEED."""
+        median = float(os.getenv("AI_MOCK_LATENCY", "0") or 0)
+        seed = int(os.getenv("AI_MOCK_SEED", "0") or 0)
+        return cls(latency=lognormal_latency(median) if median > 0 else None, seed=seed)
+
+    def create_model(self, system_instruction: Optional[str] = None, response_schema: Optional[dict] = None,
+                     model_name: Optional[str] = None) -> 'MockModel':
+        return MockModel(self, system_instruction, response_schema) # Every model name gets the same engine
+
+    def create_cached_model(self, system_instruction: str, ttl_seconds: float, response_schema: Optional[dict] = None,
+                            model_name: Optional[str] = None):
+        return (MockModel(self, system_instruction, response_schema),
+                datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds))
+
+    def reply_text(self, prompt: str, structured: bool = False) -> str:
+        """
+        The reply to `prompt`; the same prompt always gets the same reply. Structured turn
+        replies use the response schema's wire format (story flags as name/value pairs).
+        """
+        rng = random.Random(f"{self.seed}:{prompt}")
+        if prompt_kind(prompt) == 'turn':
+            updates = self._updates(rng)
+            return json.dumps({"narrative": self._narrative(rng, turn_action(prompt)),
+                               "game_state_updates": updates_to_wire(updates) if structured else updates})
+        return self._narrative(rng)
+
+    def next_latency(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return max(0.0, self.latency(self._latency_rng))
+
+    def usage(self, prompt: str, reply: str) -> MockUsageMetadata:
+        prompt_tokens, reply_tokens = estimate_tokens(prompt), estimate_tokens(reply)
+        return MockUsageMetadata(prompt_tokens, reply_tokens, prompt_tokens + reply_tokens)
+
+    def _narrative(self, rng: random.Random, action: str | None = None) -> str:
+        count = rng.randint(*self.sentences)
+        sentences = []
+        if action:
+            sentences.append(f"You act ({action.rstrip('.!?')}), and the battlefield answers.")
+        while len(sentences) < count:
+            sentences.append(f"{rng.choice(_SUBJECTS)} {rng.choice(_VERBS)} {rng.choice(_PLACES)}.")
+        return " ".join(sentences)
+
+    @staticmethod
+    def _updates(rng: random.Random) -> Dict[str, Any]:
+        updates: Dict[str, Any] = {}
+        if rng.random() < 0.5:
+            updates["hp_change"] = rng.randint(-10, 5)
+        if rng.random() < 0.3:
+            updates["mp_change"] = rng.randint(-10, 5)
+        if rng.random() < 0.2:
+            updates["inventory_add"] = [rng.choice(_ITEMS)]
+        if rng.random() < 0.2:
+            updates["new_story_flags"] = {f"omen_{rng.randrange(100)}": True}
+        if rng.random() < 0.1:
+            updates["new_location"] = rng.choice(_LOCATIONS)
+        return updates
+
+
+class MockModel:
+    """A model of MockLLMBackend, with the GenerativeModel calling convention."""
+
+    def __init__(self, backend: MockLLMBackend, system_instruction: Optional[str] = None,
+                 response_schema: Optional[dict] = None):
+        self.backend = backend
+        self.system_instruction = system_instruction
+        self.response_schema = response_schema
+
+    def generate_content(self, prompt: Prompt, stream: bool = False):
+        prompt = prompt_text(prompt)
+        reply = self.backend.reply_text(prompt, structured=self.response_schema is not None)
+        latency = self.backend.next_latency()
+        if stream:
+            return self._stream(prompt, reply, latency)
+        self.backend._sleep(latency)
+        return MockResponse(reply, self.backend.usage(prompt, reply))
+
+    async def generate_content_async(self, prompt: Prompt, stream: bool = False):
+        prompt = prompt_text(prompt)
+        reply = self.backend.reply_text(prompt, structured=self.response_schema is not None)
+        latency = self.backend.next_latency()
+        if stream:
+            return self._stream_async(prompt, reply, latency)
+        await asyncio.sleep(latency)
+        return MockResponse(reply, self.backend.usage(prompt, reply))
+
+    def _chunks(self, prompt: str, reply: str) -> List[MockResponse]:
+        size = self.backend.chunk_size
+        chunks = [MockResponse(reply[index:index + size]) for index in range(0, len(reply), size)] or [MockResponse("")]
+        chunks[-1].usage_metadata = self.backend.usage(prompt, reply)
+        return chunks
+
+    def _stream(self, prompt: str, reply: str, latency: float) -> Iterator[MockResponse]:
+        chunks = self._chunks(prompt, reply)
+        for chunk in chunks:
+            self.backend._sleep(latency / len(chunks))
+            yield chunk
+
+    async def _stream_async(self, prompt: str, reply: str, latency: float) -> AsyncIterator[MockResponse]:
+        chunks = self._chunks(prompt, reply)
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield chunk
+
+
+def llm_backend_from_env() -> Optional[LLMBackend]:
+    """
+    Returns the backend selected by environment variables, or None for the default Gemini
+    backend (which GameManager builds with the player's API key):
+
+    - AI_REPLAY_CASSETTE=path serves a recorded cassette (AI_REPLAY_SPEED: 1 for recorded speed,
+      0 for as fast as possible).
+    - AI_BACKEND=mock uses the local mock engine.
+    - AI_RECORD_CASSETTE=path records the traffic of the selected backend (Gemini needs GOOGLE_API_KEY).
+    """
+    # Imported here: ai_cassette and api_key_pool build on this module
+    from game_engine.ai_cassette import Cassette, RecordingBackend, ReplayBackend
+    from game_engine.api_key_pool import gemini_backend_for_keys
+
+    replay_path = os.getenv("AI_REPLAY_CASSETTE")
+    if replay_path:
+        speed = float(os.getenv("AI_REPLAY_SPEED", "1") or 0)
+        print(f"LLM backend: Replaying {replay_path} ({'recorded speed x' + str(speed) if speed else 'no delays'}).")
+        return ReplayBackend(Cassette.load(replay_path), speed=speed, strict=False)
+
+    backend: Optional[LLMBackend] = None
+    if os.getenv("AI_BACKEND", "").strip().lower() == MockLLMBackend.name:
+        backend = MockLLMBackend.from_env()
+
+    record_path = os.getenv("AI_RECORD_CASSETTE")
+    if record_path:
+        if backend is None:
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                print("LLM backend: AI_RECORD_CASSETTE needs GOOGLE_API_KEY to record Gemini traffic; not recording.")
+                return None
+            backend = gemini_backend_for_keys(api_key)
+        print(f"LLM backend: Recording AI traffic to {record_path}.")
+        backend = RecordingBackend(backend, Cassette(record_path))
+    return backend
@@ -0,0 +1,231 @@
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from game_engine.character_manager import Player
+from game_engine.input_parser import parse_input
+from game_engine.llm_backends import MODEL_NAME
+
+FAST = 'fast'
+STRONG = 'strong'
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """A model the router can pick, with its list price in USD per million tokens."""
+    name: str
+    model_name: str
+    input_cost_per_million: float
+    output_cost_per_million: float
+
+    def cost(self, prompt_tokens: int, response_tokens: int) -> float:
+        return (prompt_tokens * self.input_cost_per_million + response_tokens * self.output_cost_per_million) / 1e6
+
+
+DEFAULT_TIERS = {
+    FAST: ModelTier(FAST, MODEL_NAME, 0.075, 0.30),
+    STRONG: ModelTier(STRONG, 'gemini-2.0-flash', 0.10, 0.40),
+}
+
+# Turn classes, from the heuristics in classify_turn
+SIMPLE = 'simple'     # Moving, looking around: a short description will do
+STANDARD = 'standard'
+COMPLEX = 'complex'   # Combat, skills, high stakes or multi-step actions
+
+# Route (call type, or "turn:<class>") -> tier name. A turn route missing here falls back to "turn".
+DEFAULT_POLICY = {
+    'turn:simple': FAST,
+    'turn:standard': FAST,
+    'turn:complex': STRONG,
+    'scene': FAST,    # Opening and continuation scenes
+    'summary': FAST,  # Adventure memory summaries, written in the background
+}
+
+SIMPLE_COMMANDS = frozenset({
+    'look', 'l', 'go', 'move', 'walk', 'run', 'enter', 'exit', 'leave', 'climb', 'north', 'south', 'east', 'west',
+    'n', 's', 'e', 'w', 'up', 'down', 'examine', 'x', 'inspect', 'search', 'listen', 'smell', 'wait', 'rest', 'sit',
+    'stand', 'sleep', 'take', 'get', 'pick', 'drop', 'read', 'open', 'close',
+})
+COMPLEX_COMMANDS = frozenset({
+    'attack', 'fight', 'strike', 'hit', 'kill', 'slash', 'stab', 'shoot', 'cast', 'use', 'defend', 'block',
+    'parry', 'dodge', 'flee', 'charge', 'duel', 'ambush', 'sneak', 'steal', 'persuade', 'negotiate',
+    'bargain', 'trade', 'summon', 'invoke', 'pray',
+})
+# Words in the DM's last reply that mean a fight is under way
+COMBAT_WORDS = frozenset({'attack', 'attacks', 'strikes', 'lunges', 'enemy', 'combat', 'battle', 'wounded',
+                          'blade', 'arrows', 'charges', 'roars'})
+SEQUENCE_WORDS = frozenset({'then', 'after', 'before', 'while'})
+
+LOW_HP_FRACTION = 0.3
+LONG_ACTION_WORDS = 12
+
+
+def classify_turn(player: Player, player_action: str) -> Tuple[str, List[str]]:
+    """
+    Classifies a turn with local heuristics over parse_input() and the player's state.
+
+    Returns:
+        Tuple[str, List[str]]: SIMPLE, STANDARD or COMPLEX, and the reasons (for logs and tuning).
+    """
+    parsed = parse_input(player_action)
+    command, arguments = parsed["command"], parsed["arguments"]
+    reasons = []
+    if command in COMPLEX_COMMANDS:
+        reasons.append(f"command '{command}'")
+    words = [command] + list(arguments) if command else []
+    skills = {skill.lower() for skill in getattr(player, 'skills', None) or []}
+    if any(skill in player_action.lower() for skill in skills):
+        reasons.append("uses a skill")
+    if len(words) > LONG_ACTION_WORDS or (len(words) > 4 and SEQUENCE_WORDS.intersection(arguments)):
+        reasons.append("multi-step action")
+    if player.max_hp and player.hp <= player.max_hp * LOW_HP_FRACTION:
+        reasons.append("low HP")
+    if _in_combat(player):
+        reasons.append("in combat")
+    if reasons:
+        return COMPLEX, reasons
+    if command in SIMPLE_COMMANDS and len(words) <= 4:
+        return SIMPLE, [f"command '{command}'"]
+    return STANDARD, []
+
+
+def _in_combat(player: Player) -> bool:
+    flags = getattr(player, 'story_flags', None) or {}
+    if any(value and ('combat' in name or 'fight' in name) for name, value in flags.items()):
+        return True
+    entries = player.adventure_log.entries if getattr(player, 'adventure_log', None) else []
+    for entry in reversed(entries):
+        if entry.type != 'player_action':
+            return bool(COMBAT_WORDS.intersection(entry.content.lower().replace(',', ' ').replace('.', ' ').split()))
+    return False
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Which tier serves a call, and why."""
+    route: str # e.g. "turn:complex", "scene", "summary"
+    tier: ModelTier
+    reasons: Tuple[str, ...] = ()
+
+    @property
+    def model_name(self) -> str:
+        return self.tier.model_name
+
+
+def _percentile_ms(ordered_ns: List[int], fraction: float) -> float:
+    if not ordered_ns:
+        return 0.0
+    return ordered_ns[min(len(ordered_ns) - 1, int(round(fraction * (len(ordered_ns) - 1))))] / 1e6
+
+
+class _TierStats:
+    def __init__(self, window: int):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.cost = 0.0
+        self.routes: Dict[str, int] = {}
+        self.latencies_ns: Deque[int] = deque(maxlen=window)
+
+
+class ModelRouter:
+    """
+    Picks the model tier for each AI call: turns by their classify_turn class, other calls by
+    their type, following a policy (route -> tier name) that can be changed without code changes.
+
+    Latency, token counts and cost are recorded per tier, so the policy can be tuned from data:
+    if complex turns on the fast tier read as well as on the strong one, route them there.
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, ModelTier]] = None, policy: Optional[Dict[str, str]] = None,
+                 default_tier: str = FAST, window: int = 1000):
+        """
+        Args:
+            tiers (Dict[str, ModelTier], optional): Tiers by name. Defaults to DEFAULT_TIERS.
+            policy (Dict[str, str], optional): Route -> tier name, overriding DEFAULT_POLICY entries.
+            default_tier (str, optional): Tier for routes the policy does not name.
+            window (int, optional): Latest latencies kept per tier for the percentiles.
+        """
+        self.tiers = dict(tiers if tiers is not None else DEFAULT_TIERS)
+        self.policy = dict(DEFAULT_POLICY)
+        self.policy.update(policy or {})
+        self.default_tier = default_tier
+        self._window = window
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _TierStats] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional['ModelRouter']:
+        """
+        A router configured by AI_MODEL_ROUTING, e.g. "turn:standard=strong,scene=strong" to override
+        policy entries, or "off" for no routing (every call on the backend's default model).
+        AI_STRONG_MODEL overrides the strong tier's model.
+        """
+        spec = os.getenv("AI_MODEL_ROUTING", "").strip()
+        if spec.lower() == 'off':
+            return None
+        tiers = dict(DEFAULT_TIERS)
+        strong_model = os.getenv("AI_STRONG_MODEL", "").strip()
+        if strong_model:
+            tiers[STRONG] = ModelTier(STRONG, strong_model, tiers[STRONG].input_cost_per_million,
+                                      tiers[STRONG].output_cost_per_million)
+        return cls(tiers=tiers, policy=parse_policy(spec, tiers))
+
+    def route_turn(self, player: Player, player_action: str) -> RouteDecision:
+        turn_class, reasons = classify_turn(player, player_action)
+        return self.route(f"turn:{turn_class}", reasons)
+
+    def route(self, route: str, reasons: List[str] | Tuple[str, ...] = ()) -> RouteDecision:
+        tier_name = self.policy.get(route) or self.policy.get(route.split(':')[0]) or self.default_tier
+        return RouteDecision(route, self.tiers[tier_name], tuple(reasons))
+
+    def record(self, decision: RouteDecision, latency_ns: int, prompt_tokens: int = 0, response_tokens: int = 0):
+        """Records one completed call on the decision's tier."""
+        with self._lock:
+            stats = self._stats.setdefault(decision.tier.name, _TierStats(self._window))
+            stats.routes[decision.route] = stats.routes.get(decision.route, 0) + 1
+            stats.calls += 1
+            stats.latencies_ns.append(latency_ns)
+            stats.prompt_tokens += prompt_tokens
+            stats.response_tokens += response_tokens
+            stats.cost += decision.tier.cost(prompt_tokens, response_tokens)
+
+    def stats(self) -> List[dict]:
+        """Per tier: call counts by route, latency percentiles (ms), tokens and cost (USD)."""
+        with self._lock:
+            rows = []
+            for tier_name, stats in self._stats.items():
+                latencies = sorted(stats.latencies_ns)
+                rows.append({'tier': tier_name, 'model': self.tiers[tier_name].model_name, 'routes': dict(stats.routes),
+                             'count': stats.calls,
+                             'p50_ms': _percentile_ms(latencies, 0.50), 'p95_ms': _percentile_ms(latencies, 0.95),
+                             'prompt_tokens': stats.prompt_tokens, 'response_tokens': stats.response_tokens,
+                             'cost_usd': stats.cost, 'cost_per_call_usd': stats.cost / stats.calls if stats.calls else 0.0})
+            return rows
+
+    def report(self) -> str:
+        lines = []
+        for row in self.stats():
+            routes = ", ".join(f"{route} {count}" for route, count in sorted(row['routes'].items()))
+            lines.append(f"{row['tier']} ({row['model']}): {row['count']} calls, "
+                         f"p50 {row['p50_ms']:.0f}ms p95 {row['p95_ms']:.0f}ms, ${row['cost_usd']:.5f} "
+                         f"(${row['cost_per_call_usd']:.6f}/call) [{routes}]")
+        return "\n".join(lines) if lines else "no AI calls routed"
+
+
+def parse_policy(spec: str, tiers: Optional[Dict[str, ModelTier]] = None) -> Dict[str, str]:
+    """Parses "route=tier,route=tier" policy overrides. Entries naming an unknown tier are skipped."""
+    tiers = tiers if tiers is not None else DEFAULT_TIERS
+    policy = {}
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        route, _, tier_name = entry.partition('=')
+        route, tier_name = route.strip(), tier_name.strip()
+        if tier_name not in tiers:
+            print(f"ModelRouter: Ignoring routing entry '{entry.strip()}': unknown tier (known: {', '.join(tiers)}).")
+            continue
+        policy[route] = tier_name
+    return policy
@@ -0,0 +1,162 @@
+import json
+from typing import List
+
+
+class NarrativeStreamParser:
+    """
+    Incrementally extracts the top-level "narrative" string from a JSON reply that is
+    still arriving in chunks, so the story can be shown while the model is generating.
+
+    feed() takes each chunk as it arrives and returns the newly decoded narrative text.
+    Escape sequences split across chunks are held back until complete, and other keys
+    (including nested objects that also have a "narrative" key) are skipped. The full raw
+    text is kept, so once the stream ends it can be parsed normally for game_state_updates.
+    Markdown fences around the JSON do not matter: scanning starts at the first '{'.
+    """
+    # Scanner states
+    _SEEK_OBJECT = 0      # before the opening '{'
+    _SEEK_KEY = 1         # inside the object, outside any string
+    _IN_STRING = 2        # inside a string that is not the narrative value
+    _AFTER_KEY = 3        # just closed a top-level string; waiting for ':' to see if it was a key
+    _BEFORE_VALUE = 4     # after "narrative": waiting for the opening quote
+    _IN_NARRATIVE = 5     # inside the narrative string
+    _DONE = 6             # narrative string closed
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = self._SEEK_OBJECT
+        self._depth = 0
+        self._string_start = 0
+        self._last_string = None
+        self._narrative_parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """All raw text fed so far."""
+        return self._buffer
+
+    @property
+    def narrative(self) -> str:
+        """The narrative text decoded so far."""
+        return "".join(self._narrative_parts)
+
+    @property
+    def narrative_complete(self) -> bool:
+        """True once the closing quote of the narrative string has been seen."""
+        return self._state == self._DONE
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a chunk of the reply.
+
+        Returns:
+            str: Narrative text decoded from this chunk (possibly empty).
+        """
+        self._buffer += chunk
+        fragment = self._scan()
+        if fragment:
+            self._narrative_parts.append(fragment)
+        return fragment
+
+    def _scan(self) -> str:
+        buffer = self._buffer
+        length = len(buffer)
+        while self._pos < length:
+            state = self._state
+            char = buffer[self._pos]
+            if state == self._SEEK_OBJECT:
+                if char == '{':
+                    self._depth = 1
+                    self._state = self._SEEK_KEY
+                self._pos += 1
+            elif state == self._SEEK_KEY:
+                if char == '"':
+                    self._state = self._IN_STRING
+                    self._string_start = self._pos + 1
+                elif char in '{[':
+                    self._depth += 1
+                elif char in '}]':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = self._DONE # Object ended without a narrative
+                self._pos += 1
+            elif state == self._IN_STRING:
+                if char == '\\':
+                    if self._pos + 1 >= length:
+                        return "" # Wait for the escaped character
+                    self._pos += 2
+                    continue
+                if char == '"':
+                    if self._depth == 1:
+                        self._last_string = buffer[self._string_start:self._pos]
+                        self._state = self._AFTER_KEY
+                    else:
+                        self._state = self._SEEK_KEY
+                self._pos += 1
+            elif state == self._AFTER_KEY:
+                if char.isspace():
+                    self._pos += 1
+                elif char == ':' and self._last_string == 'narrative':
+                    self._state = self._BEFORE_VALUE
+                    self._pos += 1
+                else:
+                    self._state = self._SEEK_KEY # A value, or a key we don't stream; rescan this char
+            elif state == self._BEFORE_VALUE:
+                if char.isspace():
+                    self._pos += 1
+                elif char == '"':
+                    self._state = self._IN_NARRATIVE
+                    self._pos += 1
+                else:
+                    self._state = self._SEEK_KEY # Not a string (e.g. null); nothing to stream
+            elif state == self._IN_NARRATIVE:
+                return self._scan_narrative()
+            else: # _DONE
+                self._pos = length
+        return ""
+
+    def _scan_narrative(self) -> str:
+        buffer = self._buffer
+        length = len(buffer)
+        start = index = self._pos
+        closed = False
+        while index < length:
+            char = buffer[index]
+            if char == '\\':
+                if index + 1 >= length:
+                    break
+                if buffer[index + 1] != 'u':
+                    index += 2
+                    continue
+                if index + 6 > length:
+                    break
+                try:
+                    code_unit = int(buffer[index + 2:index + 6], 16)
+                except ValueError:
+                    code_unit = 0
+                if 0xD800 <= code_unit <= 0xDBFF:
+                    # A high surrogate is only decodable together with the low one after it
+                    if index + 12 > length:
+                        break
+                    index += 12
+                else:
+                    index += 6
+                continue
+            if char == '"':
+                closed = True
+                break
+            index += 1
+
+        raw = buffer[start:index]
+        if closed:
+            self._state = self._DONE
+            self._pos = index + 1
+        else:
+            self._pos = index
+        if not raw:
+            return ""
+        try:
+            return json.loads(f'"{raw}"', strict=False) # strict=False tolerates raw newlines
+        except ValueError:
+            return raw
@@ -0,0 +1,232 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+# Allow running as a script (python game_engine/persistence_benchmark.py) as well as with -m
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.character_manager import Player
+from game_engine.common_types import AdventureLog, AdventureLogEntry
+from game_engine.storage_backends import (
+    StorageBackend, SQLiteBackend, InMemoryBackend, FilePerPlayerBackend, player_to_record
+)
+
+
+# Synthetic state sizes: (inventory items, story flags, adventure log entries).
+SIZE_PROFILES: Dict[str, Dict[str, int]] = {
+    'small': {'inventory': 5, 'story_flags': 10, 'log_entries': 10},
+    'medium': {'inventory': 50, 'story_flags': 200, 'log_entries': 200},
+    'large': {'inventory': 300, 'story_flags': 2000, 'log_entries': 2000},
+}
+
+# Storage modes: name -> factory taking a scratch directory.
+STORAGE_MODES: Dict[str, Callable[[str], StorageBackend]] = {
+    'memory': lambda work_dir: InMemoryBackend(),
+    'sqlite': lambda work_dir: SQLiteBackend(os.path.join(work_dir, 'bench.db')),
+    'sqlite-write-behind': lambda work_dir: SQLiteBackend(os.path.join(work_dir, 'bench.db'), write_behind=True),
+    'file': lambda work_dir: FilePerPlayerBackend(os.path.join(work_dir, 'players')),
+    'file-nofsync': lambda work_dir: FilePerPlayerBackend(os.path.join(work_dir, 'players'), fsync=False),
+}
+
+NARRATIVE_SENTENCE = "The conch shells sound across Kurukshetra as chariots wheel through the dust. "
+
+
+def make_synthetic_player(player_id: int, profile: Dict[str, int], rng: random.Random) -> Player:
+    """
+    Builds a Player whose inventory, story flags and adventure log have the sizes in `profile`.
+    The adventure log keeps every generated entry (max_entries is raised to match), so the
+    benchmark can measure how persistence scales with log length.
+    """
+    log_entries = profile['log_entries']
+    player = Player(player_id=player_id, name=f"Bench Hero {player_id}", hp=100, max_hp=100, mp=50, max_mp=50,
+                    adventure_log=AdventureLog(max_entries=max(log_entries, 1)))
+    player.current_location = "Kurukshetra - Battlefield Edge"
+    player.inventory = [f"item_{index}_{rng.randrange(10_000)}" for index in range(profile['inventory'])]
+    player.story_flags = {f"flag_{index}": rng.random() < 0.5 for index in range(profile['story_flags'])}
+    for index in range(log_entries):
+        turn_number = index // 2 + 1
+        if index % 2 == 0:
+            entry = AdventureLogEntry(type="player_action", content=f"attack the asura #{index}", turn_number=turn_number)
+        else:
+            entry = AdventureLogEntry(type="ai_output", content=NARRATIVE_SENTENCE * 3, turn_number=turn_number)
+        player.adventure_log.entries.append(entry)
+    return player
+
+
+def apply_typical_turn(player: Player, turn_number: int):
+    """Mutates a player the way an average turn does: an HP change and two new log entries."""
+    player.hp = max(1, player.hp - 1)
+    player.adventure_log.entries.append(AdventureLogEntry(type="player_action", content="look around", turn_number=turn_number))
+    player.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content=NARRATIVE_SENTENCE, turn_number=turn_number))
+
+
+def summarize(operation: str, mode: str, size: str, samples_ns: List[int]) -> dict:
+    """Turns raw per-operation timings into throughput and latency percentiles (milliseconds)."""
+    ordered = sorted(samples_ns)
+    count = len(ordered)
+
+    def percentile(fraction: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(count - 1, max(0, int(round(fraction * (count - 1)))))
+        return ordered[index] / 1e6
+
+    total_ns = sum(ordered)
+    return {
+        'mode': mode,
+        'size': size,
+        'operation': operation,
+        'count': count,
+        'mean_ms': (total_ns / count / 1e6) if count else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': ordered[-1] / 1e6 if ordered else 0.0,
+        'ops_per_sec': (count / (total_ns / 1e9)) if total_ns else 0.0,
+    }
+
+
+def _time_each(items, operation: Callable) -> List[int]:
+    samples = []
+    for item in items:
+        start = time.perf_counter_ns()
+        operation(item)
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def benchmark_serialization(size: str, profile: Dict[str, int], iterations: int, seed: int) -> dict:
+    """Times serializing a full player (state record plus every log entry), independent of the store."""
+    rng = random.Random(seed)
+    players = [make_synthetic_player(index + 1, profile, rng) for index in range(iterations)]
+
+    def serialize(player: Player):
+        json.dumps(player_to_record(player))
+        for entry in player.adventure_log.entries:
+            entry.model_dump_json()
+
+    return summarize('serialize', 'n/a', size, _time_each(players, serialize))
+
+
+def benchmark_mode(mode: str, size: str, profile: Dict[str, int], iterations: int, seed: int,
+                   load_window: Optional[int] = None) -> List[dict]:
+    """
+    Runs insert, full update, delta update (a typical turn) and load against one storage mode.
+    `load_window` is the number of log entries each load fetches (AdventureLog.max_entries if None).
+
+    Returns:
+        list[dict]: One summary per operation.
+    """
+    rng = random.Random(seed)
+    work_dir = tempfile.mkdtemp(prefix=f"wsp-bench-{mode}-")
+    backend = STORAGE_MODES[mode](work_dir)
+    results = []
+    # save_player logs every insert/update; keep that chatter out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            backend.setup()
+            players = [make_synthetic_player(index + 1, profile, rng) for index in range(iterations)]
+
+            results.append(summarize('insert', mode, size, _time_each(players, backend.save_player)))
+            backend.flush()
+
+            results.append(summarize('update_full', mode, size, _time_each(players, backend.save_player)))
+            backend.flush()
+
+            turn_number = profile['log_entries'] // 2 + 1
+            for player in players:
+                apply_typical_turn(player, turn_number)
+            results.append(summarize('update_delta', mode, size, _time_each(players, backend.save_player_changes)))
+            flush_start = time.perf_counter_ns()
+            backend.flush()
+            results.append(summarize('flush', mode, size, [time.perf_counter_ns() - flush_start]))
+
+            player_ids = [player.player_id for player in players]
+            load = lambda player_id: backend.load_player(player_id, load_window)
+            results.append(summarize('load', mode, size, _time_each(player_ids, load)))
+        finally:
+            backend.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def run_benchmarks(modes: Optional[List[str]] = None, sizes: Optional[List[str]] = None,
+                   iterations: int = 100, seed: int = 1234, load_window: Optional[int] = None) -> dict:
+    """
+    Runs the full benchmark matrix and returns machine-readable results.
+
+    Args:
+        modes (list[str], optional): Storage modes from STORAGE_MODES. Defaults to all.
+        sizes (list[str], optional): Size profiles from SIZE_PROFILES. Defaults to all.
+        iterations (int, optional): Players (and therefore samples) per operation.
+        seed (int, optional): Seed for the synthetic data, for repeatable runs.
+        load_window (int, optional): Log entries fetched per load. Defaults to AdventureLog.max_entries.
+    """
+    modes = modes or list(STORAGE_MODES)
+    sizes = sizes or list(SIZE_PROFILES)
+    results = []
+    for size in sizes:
+        profile = SIZE_PROFILES[size]
+        results.append(benchmark_serialization(size, profile, iterations, seed))
+        for mode in modes:
+            results.extend(benchmark_mode(mode, size, profile, iterations, seed, load_window))
+    return {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'sqlite_version': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'iterations': iterations,
+        'seed': seed,
+        'load_window': load_window if load_window is not None else AdventureLog().max_entries,
+        'size_profiles': {size: SIZE_PROFILES[size] for size in sizes},
+        'results': results,
+    }
+
+
+def format_report(report: dict) -> str:
+    """Formats benchmark results as a plain-text table."""
+    lines = [f"{'size':<8} {'mode':<20} {'operation':<13} {'ops/s':>10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for row in report['results']:
+        lines.append(f"{row['size']:<8} {row['mode']:<20} {row['operation']:<13} {row['ops_per_sec']:>10.1f} "
+                     f"{row['mean_ms']:>9.3f} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark player save/load across storage modes and state sizes.")
+    parser.add_argument('--modes', default=','.join(STORAGE_MODES),
+                        help=f"Comma-separated storage modes ({', '.join(STORAGE_MODES)}).")
+    parser.add_argument('--sizes', default=','.join(SIZE_PROFILES),
+                        help=f"Comma-separated size profiles ({', '.join(SIZE_PROFILES)}).")
+    parser.add_argument('--iterations', type=int, default=100, help="Samples per operation.")
+    parser.add_argument('--seed', type=int, default=1234, help="Seed for the synthetic players.")
+    parser.add_argument('--load-window', type=int, default=None,
+                        help="Adventure log entries fetched per load (default: AdventureLog.max_entries).")
+    parser.add_argument('--output', help="Write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [mode for mode in modes if mode not in STORAGE_MODES] + [size for size in sizes if size not in SIZE_PROFILES]
+    if unknown:
+        parser.error(f"Unknown mode/size: {', '.join(unknown)}")
+
+    report = run_benchmarks(modes, sizes, args.iterations, args.seed, args.load_window)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -2,70 +2,270 @@ import sqlite3
 import json
 import os # Already used in __main__, good to have at top if needed elsewhere
 import sys # For path manipulation if character_manager is in a different relative path
+import threading
+import queue
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 
 # Adjust path to import Player class, assuming character_manager.py is in the same directory
 # If this file is run directly, this might need adjustment or character_manager.py
 # needs to be in PYTHONPATH. For project structure, this should be okay.
 # A more robust way for direct execution might involve adding parent dir if files are in subdirs.
 try:
-    from game_engine.character_manager import Player
-    from .common_types import AdventureLog # Added import
+    from game_engine.character_manager import Player, PERSISTED_FIELDS
+    from .common_types import AdventureLog, AdventureLogEntry, AdventureMemory # Added import
+    from .schema_migrations import migrate
 except ImportError:
     # This block is to allow the script to run directly for its own testing
     # if game_engine is not in the Python path (e.g. when running from the directory itself)
     # For the actual application run via main.py, this shouldn't be an issue.
     if __name__ == '__main__': # Only adjust path if running this file directly
         sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-        from game_engine.character_manager import Player
+        from game_engine.character_manager import Player, PERSISTED_FIELDS
+        from game_engine.common_types import AdventureLog, AdventureLogEntry, AdventureMemory
+        from game_engine.schema_migrations import migrate
     else:
         raise # Re-raise if not running directly, means path issue in project context
 
 
+# Player attributes stored as columns of the players table. The adventure log lives in
+# its own append-only adventure_log_entries table instead.
+_PLAYER_COLUMNS = tuple(field for field in PERSISTED_FIELDS if field != 'adventure_log')
+
+# SQL used on the per-turn hot path. Keeping these as module-level constants means the
+# text is identical on every call, so sqlite3's per-connection statement cache can hand
+# back the already-prepared statement instead of re-parsing it each turn.
+# Full saves are a single upsert: inserting a new player and overwriting an existing one
+# cost one statement. A NULL id never conflicts, so SQLite assigns the next rowid instead.
+_UPSERT_PLAYER_SQL = f"""
+    INSERT INTO players (id, {', '.join(_PLAYER_COLUMNS)})
+    VALUES (?, {', '.join('?' for _ in _PLAYER_COLUMNS)})
+    ON CONFLICT(id) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in _PLAYER_COLUMNS)}
+"""
+_SELECT_PLAYER_SQL = f"SELECT id, {', '.join(_PLAYER_COLUMNS)} FROM players WHERE id = ?"
+# Lookups served by idx_players_slot / idx_players_name (schema version 4), so they stay
+# O(log n) however many players share the database file.
+_SELECT_PLAYER_ID_BY_SLOT_SQL = "SELECT id FROM players WHERE slot = ?"
+_SELECT_PLAYER_IDS_BY_NAME_SQL = "SELECT id FROM players WHERE name = ? ORDER BY id"
+# Columns returned by list_players: enough for a save-slot menu, without the JSON blobs or log.
+PLAYER_SUMMARY_FIELDS = ('player_id', 'name', 'slot', 'hp', 'max_hp', 'mp', 'max_mp', 'current_location')
+_LIST_PLAYERS_SQL = "SELECT id, name, slot, hp, max_hp, mp, max_mp, current_location FROM players"
+# seq numbers the entries within one turn; the subquery is a lookup on the unique index.
+_INSERT_LOG_ENTRY_SQL = """
+    INSERT INTO adventure_log_entries (player_id, turn_number, seq, type, content)
+    VALUES (:player_id, :turn_number,
+            (SELECT COALESCE(MAX(seq) + 1, 0) FROM adventure_log_entries
+             WHERE player_id = :player_id AND turn_number = :turn_number),
+            :type, :content)
+"""
+_SELECT_RECENT_LOG_ENTRIES_SQL = """
+    SELECT type, content, turn_number FROM adventure_log_entries
+    WHERE player_id = ?
+    ORDER BY turn_number DESC, seq DESC
+    LIMIT ?
+"""
+_SELECT_LOG_ENTRIES_BEFORE_TURN_SQL = """
+    SELECT type, content, turn_number FROM adventure_log_entries
+    WHERE player_id = ? AND turn_number < ?
+    ORDER BY turn_number DESC, seq DESC
+    LIMIT ?
+"""
+
+
+@lru_cache(maxsize=None)
+def _build_partial_update_sql(columns: tuple) -> str:
+    # One statement text per distinct set of dirty columns, so each still hits the statement cache.
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    return f"UPDATE players SET {assignments} WHERE id = ?"
+
+
+def _serialize_player_field(player_obj: Player, field: str):
+    """Converts one Player attribute to the value stored in its players column."""
+    value = getattr(player_obj, field)
+    if field in ('story_flags', 'inventory'):
+        return json.dumps(value if value is not None else ({} if field == 'story_flags' else []))
+    if field == 'memory':
+        try:
+            return value.model_dump_json()
+        except AttributeError: # Fallback for Pydantic v1
+            return value.json()
+    return value
+
+
+def _deserialize_memory(player_id: int, memory_json: str | None) -> AdventureMemory:
+    if not memory_json:
+        return AdventureMemory()
+    try:
+        try:
+            return AdventureMemory.model_validate_json(memory_json)
+        except AttributeError: # Fallback for Pydantic v1
+            return AdventureMemory.parse_raw(memory_json)
+    except Exception as e: # Catch potential Pydantic validation errors
+        print(f"Error decoding memory JSON for player_id {player_id}, starting with an empty memory: {e}")
+        return AdventureMemory()
+
+
+def _insert_log_entries(cursor: sqlite3.Cursor, player_id: int, entries: list):
+    """Appends adventure log entries for a player. Cost depends only on len(entries)."""
+    if entries:
+        cursor.executemany(_INSERT_LOG_ENTRY_SQL, [
+            {'player_id': player_id, 'turn_number': entry.turn_number, 'type': entry.type, 'content': entry.content}
+            for entry in entries
+        ])
+
+
+class ConnectionManager:
+    """
+    Owns long-lived SQLite connections, pooled per database path.
+
+    Connections are opened lazily, configured once (WAL journaling, relaxed fsync,
+    larger page cache) and then reused for every save/load instead of being
+    re-opened per call. Each path keeps up to `max_connections_per_path` connections;
+    callers beyond that wait for one to be released.
+    """
+    def __init__(self, max_connections_per_path: int = 4, cache_size_kib: int = 8192,
+                 synchronous: str = 'NORMAL', busy_timeout: float = 5.0,
+                 statement_cache_size: int = 64):
+        """
+        Initializes an empty connection manager.
+
+        Args:
+            max_connections_per_path (int, optional): Upper bound on open connections per database file.
+            cache_size_kib (int, optional): SQLite page cache size per connection, in KiB.
+            synchronous (str, optional): Value for PRAGMA synchronous. NORMAL is durable
+                                         across application crashes when WAL is enabled.
+            busy_timeout (float, optional): Seconds to wait on a locked database before failing.
+            statement_cache_size (int, optional): Number of prepared statements cached per connection.
+        """
+        if max_connections_per_path < 1:
+            raise ValueError("max_connections_per_path must be at least 1.")
+        self.max_connections_per_path = max_connections_per_path
+        self.cache_size_kib = cache_size_kib
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.statement_cache_size = statement_cache_size
+        self._condition = threading.Condition()
+        self._idle: dict[str, list[sqlite3.Connection]] = {}
+        self._open_counts: dict[str, int] = {}
+
+    def _max_connections_for(self, db_path: str) -> int:
+        # Every connection to ':memory:' is a separate database, so it must never be pooled wider than one.
+        if db_path == ':memory:':
+            return 1
+        return self.max_connections_per_path
+
+    def _open(self, db_path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False, # Access is serialized by the pool, not by thread identity
+            cached_statements=self.statement_cache_size
+        )
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL;")
+        cursor.execute(f"PRAGMA synchronous={self.synchronous};")
+        cursor.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)};")
+        cursor.execute("PRAGMA temp_store=MEMORY;")
+        cursor.close()
+        return conn
+
+    def acquire(self, db_path: str) -> sqlite3.Connection:
+        """
+        Returns an idle pooled connection for `db_path`, opening one if the pool has room.
+        Blocks while all of the path's connections are in use.
+        """
+        with self._condition:
+            while True:
+                idle = self._idle.get(db_path)
+                if idle:
+                    return idle.pop()
+                if self._open_counts.get(db_path, 0) < self._max_connections_for(db_path):
+                    # Reserve the slot before releasing the lock to open the connection.
+                    self._open_counts[db_path] = self._open_counts.get(db_path, 0) + 1
+                    break
+                self._condition.wait()
+        try:
+            return self._open(db_path)
+        except Exception:
+            with self._condition:
+                self._open_counts[db_path] -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, db_path: str, conn: sqlite3.Connection):
+        """
+        Returns a connection obtained from `acquire` to the pool.
+        Any transaction left open by the caller is rolled back first.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        with self._condition:
+            self._idle.setdefault(db_path, []).append(conn)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, db_path: str):
+        """
+        Context manager yielding a pooled connection for `db_path`.
+        The connection goes back to the pool on exit, rolled back if an exception escaped.
+        """
+        conn = self.acquire(db_path)
+        try:
+            yield conn
+        finally:
+            self.release(db_path, conn)
+
+    def close(self, db_path: str | None = None):
+        """
+        Closes idle pooled connections for `db_path`, or for every path if None.
+        Call this at shutdown, or before deleting/replacing a database file.
+        """
+        with self._condition:
+            paths = [db_path] if db_path is not None else list(self._idle.keys())
+            for path in paths:
+                for conn in self._idle.pop(path, []):
+                    try:
+                        conn.close()
+                    except sqlite3.Error as e:
+                        print(f"Database error while closing connection to '{path}': {e}")
+                    self._open_counts[path] -= 1
+                if self._open_counts.get(path) == 0:
+                    del self._open_counts[path]
+            self._condition.notify_all()
+
+
+_connection_manager = ConnectionManager()
+
+
+def get_connection_manager() -> ConnectionManager:
+    """Returns the process-wide ConnectionManager used by this module's functions."""
+    return _connection_manager
+
+
+def close_connections(db_path: str | None = None):
+    """
+    Shutdown hook: closes the pooled connections for `db_path` (or all paths).
+    Closing the last connection also checkpoints the WAL back into the main database file.
+    """
+    _connection_manager.close(db_path)
+
+
 def setup_database(db_path='data/rpg_save.db'):
     """
-    Connects to the SQLite database and creates the 'players' table if it doesn't exist.
+    Connects to the SQLite database and brings its schema up to date.
+    Pending migrations (see schema_migrations.MIGRATIONS) are applied once; when the
+    schema is already current this only reads PRAGMA user_version.
 
     Args:
         db_path (str, optional): The path to the database file.
                                  Defaults to 'data/rpg_save.db'.
     """
-    conn = None  # Initialize conn to None
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Create players table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS players (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                hp INTEGER,
-                max_hp INTEGER,
-                mp INTEGER,
-                max_mp INTEGER,
-                current_location TEXT,
-                story_flags TEXT,
-                inventory TEXT
-            )
-        ''')
-        conn.commit() # Commit table creation before altering
-
-        # Add adventure_log column if it doesn't exist
-        try:
-            cursor.execute("ALTER TABLE players ADD COLUMN adventure_log TEXT;")
-            conn.commit()
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e).lower():
-                # Column already exists, which is fine
-                pass
-            else:
-                # Another OperationalError, raise it
-                raise
+        with _connection_manager.connection(db_path) as conn:
+            migrate(conn)
     except sqlite3.Error as e:
         print(f"Database error in setup_database: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == '__main__':
     # Example usage:
@@ -82,154 +282,591 @@ if __name__ == '__main__':
     # print("Custom database setup complete. Check for 'custom_db.db'")
 
 
+class _PlayerWrite:
+    """
+    Serialized changes for one player, captured at save time so they can be applied
+    later (possibly on another thread) while the live Player keeps changing.
+    """
+    __slots__ = ('player_id', 'columns', 'is_full', 'log_entries', 'players')
+
+    def __init__(self, player_id: int, columns: dict, is_full: bool, log_entries: list, player: Player | None = None):
+        self.player_id = player_id
+        self.columns = columns          # players column -> serialized value
+        self.is_full = is_full          # True if columns holds every column (row may be inserted)
+        self.log_entries = log_entries  # AdventureLogEntry objects to append
+        self.players = [player] if player is not None else [] # Live players to mark unsaved if the write is lost
+
+    def is_empty(self) -> bool:
+        return not self.columns and not self.log_entries
+
+    def merge(self, newer: '_PlayerWrite'):
+        """Folds a later write for the same player into this one; newer column values win."""
+        self.columns.update(newer.columns)
+        self.is_full = self.is_full or newer.is_full
+        self.log_entries.extend(newer.log_entries)
+        self.players.extend(player for player in newer.players if all(player is not known for known in self.players))
+
+    def mark_unsaved(self):
+        """Makes the captured changes dirty again on the live players, so their next save retries them."""
+        for player in self.players:
+            player.mark_unsaved(self.columns, self.log_entries, full=self.is_full)
+
+
+def _capture_player_write(player_obj: Player, full: bool) -> _PlayerWrite:
+    """Serializes either every column (full) or only the dirty ones, plus unsaved log entries."""
+    if full:
+        columns = _PLAYER_COLUMNS
+    else:
+        dirty_fields = player_obj.get_dirty_fields()
+        # Keep column order stable so each distinct dirty set maps to one statement text.
+        columns = tuple(field for field in _PLAYER_COLUMNS if field in dirty_fields)
+    return _PlayerWrite(
+        player_id=player_obj.player_id,
+        columns={column: _serialize_player_field(player_obj, column) for column in columns},
+        is_full=full,
+        log_entries=list(player_obj.get_unsaved_log_entries()),
+        player=player_obj
+    )
+
+
+def _apply_player_write(cursor: sqlite3.Cursor, write: _PlayerWrite) -> str:
+    """
+    Executes a captured write inside the caller's transaction.
+
+    Full writes are one upsert; a write with no player_id inserts a new row and stores
+    the assigned ID back on the write.
+
+    Returns:
+        str: 'saved' or 'created' for full writes, 'updated' for partial ones, or 'missing'
+             if a partial write found no row to update (nothing is written in that case).
+    """
+    outcome = 'updated'
+    if write.is_full:
+        cursor.execute(_UPSERT_PLAYER_SQL, [write.player_id] + [write.columns[column] for column in _PLAYER_COLUMNS])
+        if write.player_id is None:
+            write.player_id = cursor.lastrowid # New player; SQLite assigned its ID
+            outcome = 'created'
+        else:
+            outcome = 'saved'
+    elif write.columns:
+        columns = tuple(column for column in _PLAYER_COLUMNS if column in write.columns)
+        values = [write.columns[column] for column in columns]
+        values.append(write.player_id)
+        cursor.execute(_build_partial_update_sql(columns), values)
+        if cursor.rowcount == 0:
+            return 'missing'
+    _insert_log_entries(cursor, write.player_id, write.log_entries)
+    return outcome
+
+
 def save_player(db_path: str, player_obj: Player):
     """
     Saves the player's current state to the database.
-    This function will handle both inserting a new player and updating an existing one.
-    (Currently a skeleton with placeholder logic)
+    This function will handle both inserting a new player and updating an existing one,
+    with a single upsert statement. A player whose player_id is None is inserted as a new
+    player and gets the ID SQLite assigns. Uses a pooled connection from the module's ConnectionManager.
 
     Args:
         db_path (str): The path to the SQLite database file.
         player_obj (Player): The Player object to save.
     """
-    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        # Serialize every players column (story_flags and inventory as JSON) plus new log entries
+        write = _capture_player_write(player_obj, full=True)
 
-        # Serialize story_flags, inventory, and adventure_log
-        story_flags_json = json.dumps(player_obj.story_flags)
-        inventory_json = json.dumps(player_obj.inventory if hasattr(player_obj, 'inventory') else [])
-        adventure_log_json = None
-        if hasattr(player_obj, 'adventure_log') and player_obj.adventure_log:
-            try:
-                adventure_log_json = player_obj.adventure_log.model_dump_json()
-            except AttributeError: # Fallback for Pydantic v1
-                adventure_log_json = player_obj.adventure_log.json()
-
-
-        # Define the SQL UPDATE query
-        update_sql = """
-        UPDATE players
-        SET name = ?, hp = ?, max_hp = ?, mp = ?, max_mp = ?, current_location = ?, story_flags = ?, inventory = ?, adventure_log = ?
-        WHERE id = ?
-        """
+        with _connection_manager.connection(db_path) as conn:
+            outcome = _apply_player_write(conn.cursor(), write)
+            conn.commit()
+            player_obj.player_id = write.player_id
+            print(f"Player {player_obj.player_id} {outcome}.") # Optional: for logging/debug
+        player_obj.mark_persisted()
 
-        # Create a tuple of values corresponding to the placeholders in the query
-        values = (
-            player_obj.name,
-            player_obj.hp,
-            player_obj.max_hp,
-            player_obj.mp,
-            player_obj.max_mp,
-            player_obj.current_location,
-            story_flags_json,
-            inventory_json,
-            adventure_log_json, # Added adventure_log_json
-            player_obj.player_id
-        )
+    except sqlite3.Error as e:
+        print(f"Database error in save_player for player {player_obj.player_id if player_obj else 'Unknown'}: {e}")
+        # The pooled connection rolls back any uncommitted statements when it is released
+    except Exception as e:
+        # Catch other potential errors, e.g., from json.dumps or attribute access
+        print(f"An unexpected error occurred in save_player: {e}")
 
-        # Execute the query
-        cursor.execute(update_sql, values)
 
-        if cursor.rowcount == 0:
-            # Player with this ID doesn't exist, so INSERT
-            insert_sql = """
-            INSERT INTO players (id, name, hp, max_hp, mp, max_mp, current_location, story_flags, inventory, adventure_log)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            insert_values = (
-                player_obj.player_id,
-                player_obj.name,
-                player_obj.hp,
-                player_obj.max_hp,
-                player_obj.mp,
-                player_obj.max_mp,
-                player_obj.current_location,
-                story_flags_json,
-                inventory_json,
-                adventure_log_json # Added adventure_log_json
-            )
-            cursor.execute(insert_sql, insert_values)
-            print(f"Player {player_obj.player_id} inserted.") # Optional: for logging/debug
-        else:
-            print(f"Player {player_obj.player_id} updated.") # Optional: for logging/debug
+def save_player_changes(db_path: str, player_obj: Player) -> bool:
+    """
+    Saves only the fields of the player that changed since it was last saved or loaded.
+    Unchanged players are skipped without touching the database, and only the dirty
+    columns are serialized and written. Players that were never persisted, or whose
+    row is missing, fall back to a full save_player.
 
+    Args:
+        db_path (str): The path to the SQLite database file.
+        player_obj (Player): The Player object to save.
 
-        conn.commit()
-        # print(f"Player {player_obj.player_id} data changes committed.")
+    Returns:
+        bool: True if anything was written, False if the player was unchanged or the save failed.
+    """
+    if not player_obj.is_persisted():
+        save_player(db_path, player_obj)
+        return player_obj.is_persisted()
 
+    try:
+        write = _capture_player_write(player_obj, full=False)
+        if write.is_empty():
+            if player_obj.is_dirty():
+                player_obj.mark_persisted() # e.g. the log was cleared; nothing to write
+            return False
+
+        with _connection_manager.connection(db_path) as conn:
+            outcome = _apply_player_write(conn.cursor(), write)
+            if outcome != 'missing':
+                conn.commit()
     except sqlite3.Error as e:
-        print(f"Database error in save_player for player {player_obj.player_id if player_obj else 'Unknown'}: {e}")
-        # Consider how to handle partial saves or rollbacks if needed
+        print(f"Database error in save_player_changes for player {player_obj.player_id}: {e}")
+        return False
     except Exception as e:
-        # Catch other potential errors, e.g., from json.dumps or attribute access
-        print(f"An unexpected error occurred in save_player: {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"An unexpected error occurred in save_player_changes: {e}")
+        return False
+
+    if outcome == 'missing':
+        # The row was deleted behind our back; write the whole player again.
+        save_player(db_path, player_obj)
+        return not player_obj.is_dirty()
+
+    player_obj.mark_persisted()
+    return True
+
+
+def _player_from_rows(row: tuple, log_rows: list, adventure_log: AdventureLog) -> Player:
+    """Builds a clean Player from a players row and its newest-first log rows."""
+    db_id, name, hp, max_hp, mp, max_mp, current_location, story_flags_json, inventory_json, slot, memory_json = row
+
+    story_flags = json.loads(story_flags_json)
+
+    inventory = [] # Default to empty list
+    if inventory_json: # Check if inventory_json is not None or empty string
+        try:
+            inventory = json.loads(inventory_json)
+        except json.JSONDecodeError:
+            print(f"Error decoding inventory JSON for player_id {db_id}: {inventory_json}")
+            # Keep inventory as empty list or handle error as appropriate
+
+    # Assuming Player.__init__ might not take inventory directly, or we want to ensure it's handled post-init
+    player = Player(player_id=db_id, name=name, hp=hp, max_hp=max_hp, mp=mp, max_mp=max_mp, slot=slot,
+                    memory=_deserialize_memory(db_id, memory_json))
+    player.current_location = current_location
+    player.story_flags = story_flags
+    player.inventory = inventory
+
+    # Rows come newest first from the index scan; the log is kept oldest first
+    adventure_log.entries = [
+        AdventureLogEntry(type=entry_type, content=content, turn_number=turn_number)
+        for entry_type, content, turn_number in reversed(log_rows)
+    ]
+    player.adventure_log = adventure_log
+
+    player.mark_persisted() # Freshly loaded state is clean
+    return player
 
 
-def load_player(db_path: str, player_id: int):
+def load_player(db_path: str, player_id: int, max_log_entries: int | None = None):
     """
     Loads a player's state from the database.
+    Only the most recent adventure log entries are loaded; older ones stay in the
+    adventure_log_entries table and can be read with load_adventure_log_history.
 
     Args:
         db_path (str): The path to the SQLite database file.
         player_id (int): The ID of the player to load.
+        max_log_entries (int, optional): How many recent log entries to load.
+                                         Defaults to AdventureLog.max_entries.
 
     Returns:
         Player: The loaded Player object, or None if not found or an error occurs.
     """
-    conn = None
-    player = None
+    players = load_players(db_path, [player_id], max_log_entries)
+    return players.get(player_id)
+
+
+def load_players(db_path: str, player_ids, max_log_entries: int | None = None) -> dict:
+    """
+    Bulk variant of load_player: loads several players over one pooled connection.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        player_ids (Iterable[int]): The IDs of the players to load.
+        max_log_entries (int, optional): How many recent log entries to load per player.
+
+    Returns:
+        dict[int, Player]: Loaded players by ID. Missing IDs are absent; empty on error.
+    """
+    players = {}
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        with _connection_manager.connection(db_path) as conn:
+            for player_id in player_ids:
+                adventure_log = AdventureLog()
+                limit = adventure_log.max_entries if max_log_entries is None else max_log_entries
+                row = conn.execute(_SELECT_PLAYER_SQL, (player_id,)).fetchone()
+                if row:
+                    log_rows = conn.execute(_SELECT_RECENT_LOG_ENTRIES_SQL, (player_id, limit)).fetchall()
+                    players[player_id] = _player_from_rows(row, log_rows, adventure_log)
+    except sqlite3.Error as e:
+        print(f"Database error in load_players for player_ids {player_ids}: {e}")
+        return {}
+    return players
 
-        cursor.execute(
-            "SELECT id, name, hp, max_hp, mp, max_mp, current_location, story_flags, inventory, adventure_log FROM players WHERE id = ?", # Added adventure_log
-            (player_id,)
-        )
-        row = cursor.fetchone()
 
-        if row:
-            db_id, name, hp, max_hp, mp, max_mp, current_location, story_flags_json, inventory_json, adventure_log_json = row # Added adventure_log_json
+def save_players(db_path: str, players) -> int:
+    """
+    Bulk save: writes the changes of several players in a single transaction.
+    Players that were never persisted are written in full, the others as deltas;
+    unchanged players are skipped.
 
-            story_flags = json.loads(story_flags_json)
+    Args:
+        db_path (str): The path to the SQLite database file.
+        players (Iterable[Player]): The players to save.
 
-            inventory = [] # Default to empty list
-            if inventory_json: # Check if inventory_json is not None or empty string
-                try:
-                    inventory = json.loads(inventory_json)
-                except json.JSONDecodeError:
-                    print(f"Error decoding inventory JSON for player_id {player_id}: {inventory_json}")
-                    # Keep inventory as empty list or handle error as appropriate
-
-            # Assuming Player.__init__ might not take inventory directly, or we want to ensure it's handled post-init
-            # Assuming Player.__init__ might not take inventory directly, or we want to ensure it's handled post-init
-            player = Player(player_id=db_id, name=name, hp=hp, max_hp=max_hp, mp=mp, max_mp=max_mp) # AdventureLog will be default
-            player.current_location = current_location
-            player.story_flags = story_flags
-            player.inventory = inventory
-
-            if adventure_log_json:
-                try:
-                    player.adventure_log = AdventureLog.model_validate_json(adventure_log_json)
-                except AttributeError: # Fallback for Pydantic v1
-                    player.adventure_log = AdventureLog.parse_raw(adventure_log_json)
-                except Exception as e: # Catch potential Pydantic validation errors
-                    print(f"Error decoding AdventureLog JSON for player_id {player_id}: {e}")
-                    player.adventure_log = AdventureLog() # Default to empty log on error
+    Returns:
+        int: Number of players written, or 0 if the transaction failed.
+    """
+    pending = []
+    for player_obj in players:
+        write = _capture_player_write(player_obj, full=not player_obj.is_persisted())
+        if write.is_empty():
+            player_obj.mark_persisted()
+        else:
+            pending.append((player_obj, write))
+    if not pending:
+        return 0
+    try:
+        with _connection_manager.connection(db_path) as conn:
+            cursor = conn.cursor()
+            for player_obj, write in pending:
+                if _apply_player_write(cursor, write) == 'missing':
+                    # Row deleted behind our back; upgrade to a full write within the same transaction
+                    _apply_player_write(cursor, _capture_player_write(player_obj, full=True))
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"Database error in save_players for {len(pending)} player(s): {e}")
+        return 0
+    for player_obj, write in pending:
+        player_obj.player_id = write.player_id # Set for players created by this batch
+        player_obj.mark_persisted()
+    return len(pending)
+
+
+def delete_player(db_path: str, player_id: int) -> bool:
+    """
+    Deletes a player and their whole adventure log history.
+
+    Returns:
+        bool: True if a player row was deleted.
+    """
+    try:
+        with _connection_manager.connection(db_path) as conn:
+            cursor = conn.execute("DELETE FROM players WHERE id = ?", (player_id,))
+            deleted = cursor.rowcount > 0
+            conn.execute("DELETE FROM adventure_log_entries WHERE player_id = ?", (player_id,))
+            conn.commit()
+            return deleted
+    except sqlite3.Error as e:
+        print(f"Database error in delete_player for player_id {player_id}: {e}")
+        return False
+
+
+def iter_player_ids(db_path: str, batch_size: int = 500):
+    """
+    Yields every player ID in ascending order. IDs are fetched in keyset-paginated
+    batches, so no connection is held while the caller processes them.
+    """
+    last_id = None
+    while True:
+        try:
+            with _connection_manager.connection(db_path) as conn:
+                if last_id is None:
+                    rows = conn.execute("SELECT id FROM players ORDER BY id LIMIT ?", (batch_size,)).fetchall()
+                else:
+                    rows = conn.execute("SELECT id FROM players WHERE id > ? ORDER BY id LIMIT ?",
+                                        (last_id, batch_size)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in iter_player_ids: {e}")
+            return
+        for (player_id,) in rows:
+            yield player_id
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+
+def create_player(db_path: str, player_obj: Player) -> int | None:
+    """
+    Inserts a new player in one statement, letting SQLite assign its ID when
+    player_obj.player_id is None. The assigned ID is set on the player.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        player_obj (Player): The new player. Its slot, if any, must not be taken.
+
+    Returns:
+        int: The player's ID, or None if the insert failed (e.g. the slot is in use).
+    """
+    save_player(db_path, player_obj)
+    return player_obj.player_id if player_obj.is_persisted() else None
+
+
+def find_player_id_by_slot(db_path: str, slot: int) -> int | None:
+    """
+    Returns the ID of the player in the given save slot, or None if the slot is empty.
+    """
+    try:
+        with _connection_manager.connection(db_path) as conn:
+            row = conn.execute(_SELECT_PLAYER_ID_BY_SLOT_SQL, (slot,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error in find_player_id_by_slot for slot {slot}: {e}")
+        return None
+    return row[0] if row else None
+
+
+def find_player_ids_by_name(db_path: str, name: str) -> list:
+    """
+    Returns the IDs of every player with exactly this name, in ascending order.
+    Names are not unique: the same hero may occupy several slots.
+    """
+    try:
+        with _connection_manager.connection(db_path) as conn:
+            rows = conn.execute(_SELECT_PLAYER_IDS_BY_NAME_SQL, (name,)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error in find_player_ids_by_name for name {name!r}: {e}")
+        return []
+    return [player_id for (player_id,) in rows]
+
+
+def list_players(db_path: str, limit: int = 50, after_id: int | None = None) -> list:
+    """
+    Lists players one page at a time, without reading their inventory, story flags or log.
+    Pages are keyset-paginated on the primary key, so every page costs O(log n + limit)
+    however deep into the list it is.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        limit (int, optional): Maximum number of players to return.
+        after_id (int, optional): Return players with IDs greater than this; pass the last
+                                  player_id of the previous page. None starts from the beginning.
+
+    Returns:
+        list[dict]: Player summaries with the keys in PLAYER_SUMMARY_FIELDS, ordered by ID.
+    """
+    try:
+        with _connection_manager.connection(db_path) as conn:
+            if after_id is None:
+                rows = conn.execute(f"{_LIST_PLAYERS_SQL} ORDER BY id LIMIT ?", (limit,)).fetchall()
             else:
-                player.adventure_log = AdventureLog() # Initialize new log if none in DB
+                rows = conn.execute(f"{_LIST_PLAYERS_SQL} WHERE id > ? ORDER BY id LIMIT ?",
+                                    (after_id, limit)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error in list_players: {e}")
+        return []
+    return [dict(zip(PLAYER_SUMMARY_FIELDS, row)) for row in rows]
+
 
+def load_adventure_log_history(db_path: str, player_id: int, limit: int = 100,
+                               before_turn: int | None = None) -> list:
+    """
+    Reads older adventure log entries that are no longer in the in-memory log.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        player_id (int): The ID of the player whose history to read.
+        limit (int, optional): Maximum number of entries to return. Defaults to 100.
+        before_turn (int, optional): Only return entries from turns before this one,
+                                     for paging backwards through history.
+
+    Returns:
+        list[AdventureLogEntry]: The entries, oldest first. Empty if none or on error.
+    """
+    try:
+        with _connection_manager.connection(db_path) as conn:
+            if before_turn is None:
+                rows = conn.execute(_SELECT_RECENT_LOG_ENTRIES_SQL, (player_id, limit)).fetchall()
+            else:
+                rows = conn.execute(_SELECT_LOG_ENTRIES_BEFORE_TURN_SQL, (player_id, before_turn, limit)).fetchall()
     except sqlite3.Error as e:
-        print(f"Database error in load_player for player_id {player_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
-    return player
+        print(f"Database error in load_adventure_log_history for player_id {player_id}: {e}")
+        return []
+    return [
+        AdventureLogEntry(type=entry_type, content=content, turn_number=turn_number)
+        for entry_type, content, turn_number in reversed(rows)
+    ]
+
+class WriteBehindWriter:
+    """
+    Optional write-behind persistence: saves are captured on the calling thread and
+    committed later by a dedicated writer thread, taking disk I/O off the turn's critical path.
+
+    Submitted writes go through a bounded queue (submit blocks when it is full). The writer
+    collects writes for up to `flush_interval` seconds, merges repeated saves of the same
+    player, and commits the whole batch in one transaction (group commit). `flush_interval`
+    is therefore the durability window: at most that much accepted work is lost on a crash.
+    Call flush() before reading saved state back, and close() at shutdown.
+
+    A batch that still fails after `max_retries` attempts is dropped: its players are marked
+    unsaved again (so their next save retries the changes), and flush()/close() return False.
+    """
+    _FLUSH = object() # Queue marker: commit what is pending now
+    _STOP = object()  # Queue marker: commit what is pending and exit
+
+    def __init__(self, db_path: str, flush_interval: float = 0.5, max_queue_size: int = 1024,
+                 max_batch_size: int = 256, max_retries: int = 3):
+        """
+        Initializes the writer and starts its thread.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+            flush_interval (float, optional): Seconds a write may wait before being committed.
+            max_queue_size (int, optional): Bound on writes waiting for the writer thread.
+            max_batch_size (int, optional): Commit early once this many distinct players are pending.
+            max_retries (int, optional): Attempts for a failing batch before its writes are dropped
+                                         and handed back to their players as unsaved.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.batches_committed = 0
+        self.writes_committed = 0
+        self.writes_merged = 0
+        self.writes_dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="WriteBehindWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, player_obj: Player) -> bool:
+        """
+        Captures the player's unsaved changes and queues them for the writer thread.
+        The player is considered persisted as soon as this returns, until its write is dropped.
+
+        Returns:
+            bool: True if a write was queued, False if the player had no changes.
+        """
+        if self._closed:
+            raise RuntimeError("WriteBehindWriter is closed.")
+        if player_obj.player_id is None:
+            raise ValueError("New players must be created with save_player before queued saves.")
+        write = _capture_player_write(player_obj, full=not player_obj.is_persisted())
+        player_obj.mark_persisted()
+        if write.is_empty():
+            return False
+        self._queue.put(write)
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until every write submitted before this call is committed or dropped.
+
+        Returns:
+            bool: True if the flush completed within `timeout` and no write was dropped meanwhile.
+        """
+        dropped_before = self.writes_dropped
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        return done.wait(timeout) and self.writes_dropped == dropped_before
+
+    def close(self, timeout: float | None = None) -> bool:
+        """
+        Commits all pending writes and stops the writer thread. Safe to call twice.
+
+        Returns:
+            bool: True if the writer stopped within `timeout` and no write was ever dropped.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put((self._STOP, None))
+            self._thread.join(timeout)
+        return not self._thread.is_alive() and self.writes_dropped == 0
+
+    def pending_count(self) -> int:
+        """Approximate number of writes waiting in the queue."""
+        return self._queue.qsize()
+
+    def _run(self):
+        pending: dict[int, _PlayerWrite] = {}
+        waiters = [] # flush() callers, released once everything before their marker is committed
+        attempts = 0
+        running = True
+        while running:
+            # Wait for the first write (or marker), then keep the batch open for the durability window.
+            deadline = None
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if deadline is None and pending:
+                    timeout = 0.0 # Retrying a failed batch; don't wait for new work first
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, tuple):
+                    marker, event = item
+                    if event is not None:
+                        waiters.append(event)
+                    if marker is self._STOP:
+                        running = False
+                    break
+                if item.player_id in pending:
+                    pending[item.player_id].merge(item)
+                    self.writes_merged += 1
+                else:
+                    pending[item.player_id] = item
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) >= self.max_batch_size:
+                    break
+
+            if pending:
+                if self._commit_batch(pending):
+                    pending = {}
+                    attempts = 0
+                else:
+                    attempts += 1
+                    if attempts >= self.max_retries or not running:
+                        print(f"WriteBehindWriter: Dropping {len(pending)} player write(s) after {attempts} failed attempt(s); "
+                              f"the players are marked unsaved again.")
+                        for write in pending.values():
+                            write.mark_unsaved()
+                        self.writes_dropped += len(pending)
+                        pending = {}
+                        attempts = 0
+                    else:
+                        time.sleep(min(self.flush_interval, 1.0))
+            if not pending:
+                for event in waiters:
+                    event.set()
+                waiters = []
+
+    def _commit_batch(self, pending: dict) -> bool:
+        try:
+            with _connection_manager.connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                lost = []
+                for write in pending.values():
+                    if _apply_player_write(cursor, write) != 'missing':
+                        continue
+                    if not write.players:
+                        lost.append(write)
+                        continue
+                    # Row deleted behind our back; upgrade to a full write within the same transaction.
+                    # The log entries stay the captured ones: the live player's newer entries belong to its next write.
+                    full_write = _capture_player_write(write.players[-1], full=True)
+                    full_write.log_entries = write.log_entries
+                    _apply_player_write(cursor, full_write)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in WriteBehindWriter batch of {len(pending)} player(s): {e}")
+            return False
+        for write in lost:
+            print(f"WriteBehindWriter: Player {write.player_id} has no row to update and no live player to rewrite it from; write dropped.")
+        self.writes_dropped += len(lost)
+        self.batches_committed += 1
+        self.writes_committed += len(pending) - len(lost)
+        return True
+
 
 if __name__ == '__main__':
     # ... (existing __main__ block) ...
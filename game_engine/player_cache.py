@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from game_engine.character_manager import Player
+from game_engine.storage_backends import StorageBackend
+
+
+class PlayerCache:
+    """
+    Read-through / write-through cache of live Player objects for multi-session deployments.
+
+    get() returns the in-memory Player when it is cached, so a reconnecting player reattaches
+    to their state with no database read or JSON decode; misses fall through to the storage
+    backend. save() hands changes to the backend immediately (which may itself queue them
+    write-behind), so the cache never holds the only copy of saved state. Entries are evicted
+    least-recently-used once the cache exceeds `max_size`, or after `idle_timeout` seconds
+    without access; evicted players get a final delta save before they are dropped.
+
+    Storage I/O (loads on a miss, saves, eviction saves) runs outside the cache's lock, so one
+    player's disk access never holds up other sessions. Concurrent misses for the same player
+    share a single load.
+    """
+    def __init__(self, storage: StorageBackend, max_size: int = 256, idle_timeout: float | None = 1800.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes an empty cache.
+
+        Args:
+            storage (StorageBackend): The store players are loaded from and saved to.
+            max_size (int, optional): Maximum number of players kept in memory.
+            idle_timeout (float | None, optional): Seconds without access before a player is evicted.
+                                                   None disables idle eviction.
+            clock (Callable[[], float], optional): Time source, replaceable in tests.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.storage = storage
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._lock = threading.RLock()
+        # player_id -> (player, last access time); ordered least recently used first
+        self._entries: "OrderedDict[int, tuple[Player, float]]" = OrderedDict()
+        self._loading: Dict[int, Future] = {}  # player_id -> load in flight, shared by concurrent misses
+        self._evicting: Dict[int, Player] = {} # Evicted players whose final save is still running
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self._entries
+
+    def get(self, player_id: int) -> Optional[Player]:
+        """
+        Returns the cached Player, loading it from the storage backend on a miss.
+
+        Returns:
+            Player: The player, or None if it is not in the cache or the store.
+        """
+        with self._lock:
+            now = self._clock()
+            evicted = self._evict_idle(now)
+            cached = self._entries.get(player_id)
+            if cached is None and player_id in self._evicting:
+                # Still being saved after eviction: reattach to the live object rather than reading back a stale row
+                evicted += self._insert(self._evicting[player_id], now)
+                cached = self._entries[player_id]
+            if cached is not None:
+                self.hits += 1
+                self._entries[player_id] = (cached[0], now)
+                self._entries.move_to_end(player_id)
+                player = cached[0]
+                load = None
+            else:
+                self.misses += 1
+                load = self._loading.get(player_id)
+                loader = load is None
+                if loader:
+                    load = self._loading[player_id] = Future()
+        self._persist_evicted(evicted)
+        if load is None:
+            return player
+        if not loader:
+            return load.result()
+
+        try:
+            player = self.storage.load_player(player_id)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[player_id]
+            load.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[player_id]
+            cached = self._entries.get(player_id)
+            if cached is not None:
+                player = cached[0] # Put in the cache while we were loading; that object is the live one
+                evicted = []
+            elif player is not None:
+                evicted = self._insert(player, self._clock())
+            else:
+                evicted = []
+        load.set_result(player)
+        self._persist_evicted(evicted)
+        return player
+
+    def put(self, player: Player):
+        """Adds (or replaces) a player in the cache and persists any unsaved changes."""
+        self.save(player)
+
+    def save(self, player: Player) -> bool:
+        """
+        Write-through save: persists the player's changes and refreshes its cache entry.
+
+        Returns:
+            bool: True if anything was written or queued.
+        """
+        with self._lock:
+            evicted = self._insert(player, self._clock())
+        self._persist_evicted(evicted)
+        return self._persist(player)
+
+    def invalidate(self, player_id: int):
+        """Saves and drops one player from the cache; the next get() reloads it."""
+        with self._lock:
+            cached = self._entries.pop(player_id, None)
+            if cached is not None:
+                self._evicting[player_id] = cached[0]
+        if cached is not None:
+            self._persist_evicted([cached[0]])
+
+    def evict_idle(self) -> int:
+        """
+        Evicts players that were idle longer than `idle_timeout`.
+        Eviction also happens as a side effect of get(); call this from a periodic
+        task if the cache can sit untouched for long stretches.
+
+        Returns:
+            int: Number of players evicted.
+        """
+        with self._lock:
+            evicted = self._evict_idle(self._clock())
+        self._persist_evicted(evicted)
+        return len(evicted)
+
+    def flush(self):
+        """Persists any unsaved changes of every cached player, keeping them cached."""
+        with self._lock:
+            players = [player for player, _ in self._entries.values()]
+        for player in players:
+            self._persist(player)
+        self.storage.flush()
+
+    def close(self):
+        """Flushes every cached player and empties the cache."""
+        self.flush()
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the cache's size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    # The helpers below run under self._lock. Those that evict return the evicted players,
+    # which the caller saves with _persist_evicted() once the lock is released.
+
+    def _insert(self, player: Player, now: float) -> List[Player]:
+        self._evicting.pop(player.player_id, None)
+        self._entries[player.player_id] = (player, now)
+        self._entries.move_to_end(player.player_id)
+        evicted = []
+        while len(self._entries) > self.max_size:
+            evicted.append(self._evict_oldest())
+        return evicted
+
+    def _evict_idle(self, now: float) -> List[Player]:
+        if self.idle_timeout is None:
+            return []
+        evicted = []
+        cutoff = now - self.idle_timeout
+        # Entries are ordered by last access, so idle ones are all at the front.
+        while self._entries:
+            _, last_access = next(iter(self._entries.values()))
+            if last_access > cutoff:
+                break
+            evicted.append(self._evict_oldest())
+        return evicted
+
+    def _evict_oldest(self) -> Player:
+        player_id, (player, _) = self._entries.popitem(last=False)
+        self.evictions += 1
+        self._evicting[player_id] = player
+        return player
+
+    def _persist_evicted(self, players: List[Player]):
+        """Final save of evicted players, called without the lock held."""
+        for player in players:
+            try:
+                self._persist(player)
+            finally:
+                with self._lock:
+                    if self._evicting.get(player.player_id) is player:
+                        del self._evicting[player.player_id]
+
+    def _persist(self, player: Player) -> bool:
+        return self.storage.save_player_changes(player)
@@ -0,0 +1,249 @@
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from game_engine.character_manager import Player
+from game_engine.adventure_memory import LEVEL_NAMES, SAGA, format_log_entry
+
+# Token budgets for the dynamic part of each prompt (the fixed DM instructions are sent
+# separately as the system instruction and are not counted here).
+DEFAULT_TURN_BUDGET = 512
+DEFAULT_CONTINUATION_BUDGET = 1536
+
+# Words that say nothing about relevance when matching items and flags to the scene.
+_STOPWORDS = frozenset({
+    'a', 'an', 'the', 'of', 'to', 'and', 'or', 'in', 'on', 'at', 'with', 'for', 'from',
+    'my', 'your', 'i', 'is', 'it', 'this', 'that',
+})
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local estimate of the model's token count: one token per punctuation mark and
+    roughly one per four characters of each word. Close enough for budgeting, with no API call.
+    """
+    return sum(max(1, (len(piece) + 3) // 4) for piece in _TOKEN_PATTERN.findall(text))
+
+
+class TokenCounter:
+    """
+    Counts tokens with an LRU cache, so segments that repeat from turn to turn (the status
+    line, skills, unchanged inventory entries) are only measured once.
+
+    Args:
+        count_fn (Callable[[str], int], optional): The counting function. Defaults to
+            estimate_tokens; pass e.g. `lambda text: model.count_tokens(text).total_tokens`
+            for exact counts, which the cache then keeps off the critical path after warm-up.
+        cache_size (int, optional): Number of segments to remember.
+    """
+
+    def __init__(self, count_fn: Callable[[str], int] | None = None, cache_size: int = 4096):
+        self._count_fn = count_fn if count_fn is not None else estimate_tokens
+        self._cache_size = cache_size
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return self._cache[text]
+            self.misses += 1
+        tokens = self._count_fn(text)
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+
+@dataclass
+class BuiltPrompt:
+    """A prompt and how it fit its token budget."""
+    text: str
+    tokens: int
+    budget: int
+    omitted: Dict[str, int] = field(default_factory=dict) # Section -> entries left out
+
+
+@dataclass
+class TurnTokenUsage:
+    """Token usage of one AI call: the local estimate, and the billed counts when the API reports them."""
+    estimated_prompt_tokens: int
+    budget: int
+    omitted: Dict[str, int] = field(default_factory=dict)
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+
+    def summary(self) -> str:
+        parts = [f"prompt ~{self.estimated_prompt_tokens}/{self.budget}"]
+        if self.prompt_tokens is not None:
+            parts.append(f"billed prompt {self.prompt_tokens}")
+        if self.response_tokens is not None:
+            parts.append(f"reply {self.response_tokens}")
+        if self.omitted:
+            parts.append("trimmed " + ", ".join(f"{count} {name}" for name, count in self.omitted.items()))
+        return ", ".join(parts)
+
+
+def format_flag(name: str, value) -> str:
+    """Compact flag notation: `name` when true, `!name` when false, `name=value` otherwise."""
+    if value is True:
+        return name
+    if value is False:
+        return f"!{name}"
+    return f"{name}={value}"
+
+
+def _relevance_words(text: str) -> set:
+    return set(_WORD_PATTERN.findall(text.lower().replace('_', ' '))) - _STOPWORDS
+
+
+def rank_by_relevance(entries: List[str], context: str) -> List[int]:
+    """
+    Returns the indices of `entries`, most important first: those sharing words with `context`
+    (the location and the player's action), then the most recent (entries are oldest first).
+    """
+    context_words = _relevance_words(context)
+    return sorted(range(len(entries)),
+                  key=lambda index: (-len(_relevance_words(entries[index]) & context_words), -index))
+
+
+class PromptBuilder:
+    """
+    Builds the dynamic part of the AI prompts within a token budget.
+
+    State is encoded compactly (no Python reprs), and the lines that must always be sent
+    (status, location, the player's action) are placed first. The remaining budget is filled
+    section by section in priority order (skills, inventory, story flags, then the summaries of
+    older history; for a resumed game the adventure log and summaries come first), each section keeping its most relevant entries and noting how many it left out.
+    """
+
+    def __init__(self, turn_budget: int = DEFAULT_TURN_BUDGET,
+                 continuation_budget: int = DEFAULT_CONTINUATION_BUDGET,
+                 counter: TokenCounter | None = None):
+        self.turn_budget = turn_budget
+        self.continuation_budget = continuation_budget
+        self.counter = counter if counter is not None else TokenCounter()
+
+    def build_turn(self, player: Player, player_action: str) -> BuiltPrompt:
+        """Builds the per-turn message: the player's current state and action."""
+        context = f"{player.current_location} {player_action}"
+        required = [
+            f"Player: {player.name}. HP: {player.hp}/{player.max_hp}, MP: {player.mp}/{player.max_mp}.",
+            f"Location: {player.current_location}.",
+        ]
+        closing = ["", f'The player says: "{player_action}"']
+        sections = self._state_sections(player, context) + [self._memory_section(player)]
+        return self._build(required, sections, closing, self.turn_budget)
+
+    def build_delta_turn(self, player: Player, player_action: str, changes: List[str]) -> BuiltPrompt:
+        """
+        Builds a turn message for a conversation session (see conversation_session): the status and
+        location, what changed since the previous message, and only the skills, items and flags that
+        bear on the action. The rest of the state is in the conversation's keyframe.
+        """
+        context = f"{player.current_location} {player_action}"
+        required = [
+            f"Player: {player.name}. HP: {player.hp}/{player.max_hp}, MP: {player.mp}/{player.max_mp}.",
+            f"Location: {player.current_location}.",
+        ]
+        required.append(f"Changes since the last message: {'; '.join(changes) if changes else 'none'}.")
+        closing = ["", f'The player says: "{player_action}"']
+        context_words = _relevance_words(context)
+        sections = []
+        for name, label, entries, _, separator in self._state_sections(player, context):
+            relevant = [entry for entry in entries if _relevance_words(entry) & context_words]
+            sections.append((name, f"Relevant {label[0].lower()}{label[1:]}", relevant, list(range(len(relevant))), separator))
+        return self._build(required, sections, closing, self.turn_budget)
+
+    def build_continuation(self, player: Player, preamble: str, instructions: str) -> BuiltPrompt:
+        """
+        Builds the prompt for re-orienting a returning player, keeping the newest log entries
+        that fit after the player's state.
+        """
+        context = player.current_location
+        required = [
+            preamble,
+            f"Current state - HP: {player.hp}/{player.max_hp}, MP: {player.mp}/{player.max_mp}. "
+            f"Location: {player.current_location}.",
+        ]
+        # Entries trimmed from the log but not yet summarized come before the log itself
+        entries = list(player.memory.pending) + (player.adventure_log.entries if player.adventure_log else [])
+        log_lines = [format_log_entry(entry) for entry in entries]
+        # The log matters most when resuming, so it is filled first, newest entries first,
+        # followed by the summaries of everything older
+        sections = [("log entries", "Adventure log (oldest first):", log_lines,
+                     list(reversed(range(len(log_lines)))), "\n"),
+                    self._memory_section(player)]
+        sections += self._state_sections(player, context)
+        return self._build(required, sections, ["", instructions], self.continuation_budget)
+
+    def _state_sections(self, player: Player, context: str) -> List[Tuple[str, str, List[str], List[int], str]]:
+        inventory = list(getattr(player, 'inventory', None) or [])
+        skills = list(getattr(player, 'skills', None) or [])
+        flags = [format_flag(name, value) for name, value in (player.story_flags or {}).items()]
+        # (name used in reports, label, entries, indices in priority order, separator)
+        return [
+            ("skills", "Skills:", skills, list(range(len(skills))), "; "),
+            ("items", "Inventory:", inventory, rank_by_relevance(inventory, context), "; "),
+            ("flags", "Story flags:", flags, rank_by_relevance(flags, context), ", "),
+        ]
+
+    def _memory_section(self, player: Player) -> Tuple[str, str, List[str], List[int], str]:
+        summaries = player.memory.summaries
+        lines = [f"{LEVEL_NAMES[summary.level].capitalize()} (turns {summary.first_turn}-{summary.last_turn}): {summary.text}"
+                 for summary in summaries]
+        # The saga keeps the campaign's through-line; after it, the most recent summaries first
+        priority = sorted(range(len(summaries)),
+                          key=lambda index: (summaries[index].level != SAGA, -summaries[index].last_turn))
+        return ("summaries", "Story so far:", lines, priority, "\n")
+
+    def _build(self, required: List[str], sections: Iterable[Tuple[str, str, List[str], List[int], str]],
+               closing: List[str], budget: int) -> BuiltPrompt:
+        lines = list(required)
+        used = sum(self.counter.count(line) for line in required + closing)
+        omitted: Dict[str, int] = {}
+        for name, label, entries, priority, separator in sections:
+            if not entries:
+                continue
+            kept = []
+            estimate = used + self.counter.count(label)
+            for index in priority:
+                cost = self.counter.count(entries[index]) + (1 if kept else 0) # +1 for the separator
+                if estimate + cost > budget:
+                    break # Stop at the first entry that does not fit, so priority order is respected
+                kept.append(index)
+                estimate += cost
+            # Measure the line as it will be sent; drop the lowest-priority entries until it fits
+            while True:
+                line = self._section_line(label, entries, kept, separator)
+                line_tokens = self.counter.count(line)
+                if used + line_tokens <= budget or not kept:
+                    break
+                kept.pop()
+            if used + line_tokens > budget:
+                omitted[name] = len(entries) # Not even the label fits
+                continue
+            if len(kept) < len(entries):
+                omitted[name] = len(entries) - len(kept)
+            lines.append(line)
+            used += line_tokens
+        lines.extend(closing)
+        return BuiltPrompt(text="\n".join(lines) + "\n", tokens=used, budget=budget, omitted=omitted)
+
+    @staticmethod
+    def _section_line(label: str, entries: List[str], kept: List[int], separator: str) -> str:
+        # Entries are shown in their original order (e.g. the log as a story), whatever the priority
+        body = separator.join(entries[index] for index in sorted(kept))
+        more = f" (+{len(entries) - len(kept)} more)" if len(kept) < len(entries) else ""
+        if separator == "\n":
+            return f"{label}{more}\n{body}" if body else f"{label}{more}"
+        return f"{label} {body}{more}".rstrip()
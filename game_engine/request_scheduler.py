@@ -0,0 +1,291 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+# Request priorities, most urgent first. Interactive turns go ahead of everything queued.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1   # Opening scenes requested while the UI starts
+PRIORITY_BACKGROUND = 2 # Adventure memory summaries
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_PREFETCH: 'prefetch', PRIORITY_BACKGROUND: 'background'}
+
+# Default quota of one API key, matching the Gemini free tier for the default model. Override with
+# AI_REQUESTS_PER_MINUTE / AI_TOKENS_PER_MINUTE for a paid key. With several keys, the shared
+# scheduler allows their total and the key pool tracks each key's own quota (see api_key_pool).
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+
+
+class TokenBucket:
+    """
+    Continuously refilling allowance of `per_minute` units, holding at most `capacity`.
+    Not thread-safe on its own; RequestScheduler uses it under its lock.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._clock = clock
+        self._level = self.capacity
+        self._updated = clock()
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._level
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the capacity wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self._level -= amount
+
+    def _refill(self):
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+@dataclass
+class _Ticket:
+    session_key: Hashable
+    priority: int
+    tokens: int
+    enqueued_at: float
+    on_grant: Callable[[], None]
+
+
+@dataclass
+class SchedulerStats:
+    """A snapshot of the scheduler: what is queued and how long granted requests waited (in ms)."""
+    queue_depth: int
+    queue_depth_by_priority: Dict[str, int]
+    sessions_waiting: int
+    granted: int
+    wait_p50_ms: float
+    wait_p95_ms: float
+    wait_max_ms: float
+    wait_p95_ms_by_priority: Dict[str, float] = field(default_factory=dict)
+    requests_available: float = 0.0
+    tokens_available: float = 0.0
+
+    def summary(self) -> str:
+        return (f"queued {self.queue_depth} ({self.sessions_waiting} sessions), granted {self.granted}, "
+                f"wait p50 {self.wait_p50_ms:.0f}ms p95 {self.wait_p95_ms:.0f}ms max {self.wait_max_ms:.0f}ms, "
+                f"available {self.requests_available:.0f} req / {self.tokens_available:.0f} tokens")
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class RequestScheduler:
+    """
+    Process-wide gate in front of every AI request, so all sessions share one view of the
+    API key's quota instead of each calling as fast as its player types.
+
+    Each request takes one unit from a requests-per-minute bucket and its estimated tokens from a
+    tokens-per-minute bucket. When either is empty, requests queue: by priority first, then round
+    robin between sessions, so one busy session cannot starve the others. A dispatcher thread
+    grants queued requests as the buckets refill. Both sync (acquire) and asyncio (acquire_async)
+    callers are supported.
+    """
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE, burst: float | None = None,
+                 wait_window: int = 500, slow_wait_warning: float = 1.0):
+        """
+        Args:
+            requests_per_minute (float, optional): Request quota.
+            tokens_per_minute (float, optional): Token quota (prompt plus expected reply).
+            burst (float, optional): Requests that may be sent back to back after an idle period.
+                                     Defaults to a full minute's quota.
+            wait_window (int, optional): Recent waits kept for the percentiles in stats().
+            slow_wait_warning (float, optional): Waits longer than this many seconds are printed.
+        """
+        self.requests = TokenBucket(requests_per_minute, capacity=burst)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.slow_wait_warning = slow_wait_warning
+        self._condition = threading.Condition()
+        self._queues: Dict[int, OrderedDict] = {} # priority -> session key -> deque of tickets
+        self._waits: Dict[int, Deque[float]] = {}
+        self._wait_window = wait_window
+        self._granted = 0
+        self._dispatcher: threading.Thread | None = None
+        self._closed = False
+
+    def acquire(self, session_key: Hashable, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0,
+                timeout: float | None = None) -> float:
+        """
+        Blocks until the request may be sent.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            TimeoutError: If the request was not granted within `timeout` seconds.
+        """
+        granted = threading.Event()
+        ticket = self._enqueue(session_key, priority, tokens, granted.set)
+        if ticket is None:
+            return 0.0
+        if not granted.wait(timeout):
+            if self._cancel(ticket):
+                raise TimeoutError(f"AI request not scheduled within {timeout}s.")
+        return time.monotonic() - ticket.enqueued_at
+
+    async def acquire_async(self, session_key: Hashable, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0) -> float:
+        """Async version of acquire(). Cancelling the awaiting task withdraws the request from the queue."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def on_grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        ticket = self._enqueue(session_key, priority, tokens, on_grant)
+        if ticket is None:
+            return 0.0
+        try:
+            await granted
+        except asyncio.CancelledError:
+            self._cancel(ticket)
+            raise
+        return time.monotonic() - ticket.enqueued_at
+
+    def stats(self) -> SchedulerStats:
+        with self._condition:
+            depth_by_priority = {PRIORITY_NAMES.get(priority, str(priority)): sum(len(tickets) for tickets in sessions.values())
+                                 for priority, sessions in self._queues.items() if sessions}
+            sessions_waiting = len({key for sessions in self._queues.values() for key in sessions})
+            all_waits = [wait for waits in self._waits.values() for wait in waits]
+            p95_by_priority = {PRIORITY_NAMES.get(priority, str(priority)): _percentile(list(waits), 0.95) * 1000
+                               for priority, waits in self._waits.items()}
+            return SchedulerStats(
+                queue_depth=sum(depth_by_priority.values()), queue_depth_by_priority=depth_by_priority,
+                sessions_waiting=sessions_waiting, granted=self._granted,
+                wait_p50_ms=_percentile(all_waits, 0.50) * 1000, wait_p95_ms=_percentile(all_waits, 0.95) * 1000,
+                wait_max_ms=max(all_waits, default=0.0) * 1000, wait_p95_ms_by_priority=p95_by_priority,
+                requests_available=self.requests.available, tokens_available=self.tokens.available)
+
+    def close(self):
+        """Stops the dispatcher. Requests still queued are released so their callers are not stuck."""
+        with self._condition:
+            self._closed = True
+            for sessions in self._queues.values():
+                for tickets in sessions.values():
+                    for ticket in tickets:
+                        ticket.on_grant()
+            self._queues.clear()
+            self._condition.notify_all()
+
+    def _enqueue(self, session_key: Hashable, priority: int, tokens: int, on_grant: Callable[[], None]) -> Optional[_Ticket]:
+        """Grants at once if nothing is queued and the buckets allow it (returns None); otherwise queues a ticket."""
+        with self._condition:
+            if self._closed:
+                return None
+            if not self._has_queued() and self._wait_for(tokens) == 0.0:
+                self._take(priority, tokens, 0.0)
+                return None
+            ticket = _Ticket(session_key, priority, tokens, time.monotonic(), on_grant)
+            sessions = self._queues.setdefault(priority, OrderedDict())
+            sessions.setdefault(session_key, deque()).append(ticket)
+            self._start_dispatcher()
+            self._condition.notify_all()
+            return ticket
+
+    def _cancel(self, ticket: _Ticket) -> bool:
+        """Withdraws a queued ticket. Returns False if it had already been granted."""
+        with self._condition:
+            tickets = self._queues.get(ticket.priority, {}).get(ticket.session_key)
+            if not tickets or ticket not in tickets:
+                return False
+            tickets.remove(ticket)
+            if not tickets:
+                del self._queues[ticket.priority][ticket.session_key]
+            self._condition.notify_all()
+            return True
+
+    def _has_queued(self) -> bool:
+        return any(self._queues.values())
+
+    def _wait_for(self, tokens: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _take(self, priority: int, tokens: int, waited: float):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._granted += 1
+        self._waits.setdefault(priority, deque(maxlen=self._wait_window)).append(waited)
+
+    def _start_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name="ai-request-scheduler", daemon=True)
+            self._dispatcher.start()
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def _dispatch(self):
+        with self._condition:
+            while not self._closed:
+                ticket = self._next_ticket()
+                if ticket is None:
+                    self._condition.wait()
+                    continue
+                wait = self._wait_for(ticket.tokens)
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue # A more urgent request may have arrived meanwhile
+                sessions = self._queues[ticket.priority]
+                tickets = sessions.pop(ticket.session_key)
+                tickets.popleft()
+                if tickets:
+                    sessions[ticket.session_key] = tickets # Back of the line: round robin between sessions
+                waited = time.monotonic() - ticket.enqueued_at
+                self._take(ticket.priority, ticket.tokens, waited)
+                if waited >= self.slow_wait_warning:
+                    print(f"Request scheduler: {PRIORITY_NAMES.get(ticket.priority, ticket.priority)} request waited "
+                          f"{waited:.1f}s for quota ({sum(len(t) for s in self._queues.values() for t in s.values())} still queued).")
+                ticket.on_grant()
+
+
+_shared_scheduler: Optional[RequestScheduler] = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def quota_per_key_from_env() -> Tuple[float, float]:
+    """Requests and tokens per minute of one API key: AI_REQUESTS_PER_MINUTE / AI_TOKENS_PER_MINUTE, else the defaults."""
+    return (float(os.getenv("AI_REQUESTS_PER_MINUTE") or DEFAULT_REQUESTS_PER_MINUTE),
+            float(os.getenv("AI_TOKENS_PER_MINUTE") or DEFAULT_TOKENS_PER_MINUTE))
+
+
+def get_request_scheduler() -> RequestScheduler:
+    """
+    Returns the process-wide scheduler. Its quota is the per-key quota (quota_per_key_from_env)
+    times the number of keys in GOOGLE_API_KEY, so a key pool is not held to one key's limits.
+    """
+    from game_engine.api_key_pool import parse_api_keys # Deferred: api_key_pool imports this module
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None or _shared_scheduler._closed:
+            requests_per_minute, tokens_per_minute = quota_per_key_from_env()
+            key_count = max(1, len(parse_api_keys(os.getenv("GOOGLE_API_KEY"))))
+            _shared_scheduler = RequestScheduler(requests_per_minute=requests_per_minute * key_count,
+                                                 tokens_per_minute=tokens_per_minute * key_count)
+        return _shared_scheduler
@@ -0,0 +1,145 @@
+import sqlite3
+from typing import Callable, List, Tuple
+
+from .common_types import AdventureLog
+
+
+# The schema version is stored in the database header via PRAGMA user_version.
+# Version 0 is either an empty database or one created by the old CREATE + ALTER
+# setup code, so the early migrations are written to be no-ops on such databases.
+
+def _create_players_table(cursor: sqlite3.Cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            hp INTEGER,
+            max_hp INTEGER,
+            mp INTEGER,
+            max_mp INTEGER,
+            current_location TEXT,
+            story_flags TEXT,
+            inventory TEXT
+        )
+    ''')
+
+
+def _add_adventure_log_column(cursor: sqlite3.Cursor):
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(players);").fetchall()}
+    if 'adventure_log' not in columns:
+        cursor.execute("ALTER TABLE players ADD COLUMN adventure_log TEXT;")
+
+
+def _create_adventure_log_entries(cursor: sqlite3.Cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS adventure_log_entries (
+            id INTEGER PRIMARY KEY,
+            player_id INTEGER NOT NULL,
+            turn_number INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            content TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_adventure_log_entries_player_turn_seq
+        ON adventure_log_entries (player_id, turn_number, seq)
+    ''')
+
+    # Move the legacy players.adventure_log JSON blobs into the new table, then NULL them.
+    cursor.execute("SELECT id, adventure_log FROM players WHERE adventure_log IS NOT NULL")
+    for player_id, adventure_log_json in cursor.fetchall():
+        try:
+            try:
+                legacy_log = AdventureLog.model_validate_json(adventure_log_json)
+            except AttributeError: # Fallback for Pydantic v1
+                legacy_log = AdventureLog.parse_raw(adventure_log_json)
+            next_seq: dict = {}
+            rows = []
+            for entry in legacy_log.entries:
+                seq = next_seq.get(entry.turn_number)
+                if seq is None:
+                    seq = cursor.execute(
+                        "SELECT COALESCE(MAX(seq) + 1, 0) FROM adventure_log_entries WHERE player_id = ? AND turn_number = ?",
+                        (player_id, entry.turn_number)
+                    ).fetchone()[0]
+                next_seq[entry.turn_number] = seq + 1
+                rows.append((player_id, entry.turn_number, seq, entry.type, entry.content))
+            cursor.executemany(
+                "INSERT INTO adventure_log_entries (player_id, turn_number, seq, type, content) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        except Exception as e: # Catch potential Pydantic validation errors
+            print(f"Error migrating AdventureLog JSON for player_id {player_id}, dropping it: {e}")
+        cursor.execute("UPDATE players SET adventure_log = NULL WHERE id = ?", (player_id,))
+
+
+def _add_player_slots_and_lookup_indexes(cursor: sqlite3.Cursor):
+    cursor.execute("ALTER TABLE players ADD COLUMN slot INTEGER;")
+    # Existing databases hold one player per file; give each existing player the slot matching its ID.
+    cursor.execute("UPDATE players SET slot = id;")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_players_name ON players (name)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_players_slot ON players (slot) WHERE slot IS NOT NULL")
+
+
+def _add_player_memory_column(cursor: sqlite3.Cursor):
+    # JSON-encoded AdventureMemory: rolling summaries of the history trimmed from the adventure log
+    cursor.execute("ALTER TABLE players ADD COLUMN memory TEXT;")
+
+
+# Ordered (version, description, apply) triples. Append new migrations at the end with
+# the next version number; never edit or reorder ones that have shipped.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "create players table", _create_players_table),
+    (2, "add players.adventure_log column", _add_adventure_log_column),
+    (3, "move adventure log into adventure_log_entries", _create_adventure_log_entries),
+    (4, "add players.slot and name/slot lookup indexes", _add_player_slots_and_lookup_indexes),
+    (5, "add players.memory column", _add_player_memory_column),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Returns the schema version recorded in the database's user_version header field."""
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations=None) -> int:
+    """
+    Brings the database schema up to date by applying, in order, every migration newer
+    than the recorded version. Each migration runs in its own transaction together with
+    the user_version bump, so a failing migration leaves the database at the previous version.
+    When the schema is already current this is a single PRAGMA read.
+
+    Args:
+        conn (sqlite3.Connection): An open connection with no transaction in progress.
+        migrations (list, optional): (version, description, apply) triples. Defaults to MIGRATIONS.
+
+    Returns:
+        int: The schema version after migrating.
+
+    Raises:
+        sqlite3.Error: If a migration fails. Earlier migrations stay applied.
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+    current_version = get_schema_version(conn)
+    if not migrations or current_version >= migrations[-1][0]:
+        return current_version
+
+    for version, description, apply_migration in migrations:
+        if version <= current_version:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            apply_migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Schema migrated to version {version}: {description}")
+        current_version = version
+    return current_version
@@ -0,0 +1,579 @@
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Set, Tuple, runtime_checkable
+
+from game_engine.character_manager import Player
+from game_engine import persistence_service
+from game_engine.persistence_service import PLAYER_SUMMARY_FIELDS
+from .common_types import AdventureLog, AdventureLogEntry, AdventureMemory
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """
+    Interface every player store implements. GameManager, PlayerCache and the
+    persistence benchmarks only talk to this protocol, so stores can be swapped
+    per deployment profile.
+
+    Saves follow Player's dirty tracking: a successful save calls mark_persisted(),
+    save_player_changes() skips unchanged players, and adventure log entries are
+    appended rather than rewritten.
+    """
+    def setup(self) -> None:
+        """Prepares the store (creates tables, directories, ...). Safe to call repeatedly."""
+        ...
+
+    def save_player(self, player: Player) -> None:
+        """Writes the whole player, inserting it if it does not exist yet."""
+        ...
+
+    def save_player_changes(self, player: Player) -> bool:
+        """Writes only what changed since the last save/load. Returns True if anything was written."""
+        ...
+
+    def load_player(self, player_id: int, max_log_entries: Optional[int] = None) -> Optional[Player]:
+        """Returns the player with its most recent log entries, or None if it does not exist."""
+        ...
+
+    def create_player(self, player: Player) -> Optional[int]:
+        """
+        Stores a new player, assigning the next free ID when player.player_id is None.
+        Returns the player's ID, or None if it could not be stored (e.g. its slot is taken).
+        """
+        ...
+
+    def delete_player(self, player_id: int) -> bool:
+        """Removes the player and its log history. Returns True if the player existed."""
+        ...
+
+    def find_player_id_by_slot(self, slot: int) -> Optional[int]:
+        """Returns the ID of the player in the save slot, or None if the slot is empty."""
+        ...
+
+    def find_player_ids_by_name(self, name: str) -> List[int]:
+        """Returns the IDs of every player with this exact name, in ascending order."""
+        ...
+
+    def list_players(self, limit: int = 50, after_id: Optional[int] = None) -> List[dict]:
+        """
+        Returns up to `limit` player summaries (see PLAYER_SUMMARY_FIELDS) with IDs greater
+        than `after_id`, in ascending ID order, without loading inventories or logs.
+        """
+        ...
+
+    def iter_player_ids(self) -> Iterator[int]:
+        """Yields every stored player ID in ascending order."""
+        ...
+
+    def save_many(self, players: Iterable[Player]) -> int:
+        """Bulk save of several players' changes. Returns the number of players written."""
+        ...
+
+    def load_many(self, player_ids: Iterable[int], max_log_entries: Optional[int] = None) -> Dict[int, Player]:
+        """Bulk load. Returns the players found, keyed by ID."""
+        ...
+
+    def flush(self) -> None:
+        """Blocks until every accepted save is durable in the store."""
+        ...
+
+    def close(self) -> None:
+        """Flushes and releases the store's resources."""
+        ...
+
+
+def player_to_record(player: Player) -> dict:
+    """Returns a JSON-compatible copy of the player's non-log persisted state."""
+    return {
+        'player_id': player.player_id,
+        'name': player.name,
+        'hp': player.hp,
+        'max_hp': player.max_hp,
+        'mp': player.mp,
+        'max_mp': player.max_mp,
+        'current_location': player.current_location,
+        'story_flags': dict(player.story_flags),
+        'inventory': list(player.inventory),
+        'slot': player.slot,
+        'memory': _memory_to_dict(player.memory),
+    }
+
+
+def _memory_to_dict(memory: AdventureMemory) -> dict:
+    try:
+        return memory.model_dump()
+    except AttributeError: # Fallback for Pydantic v1
+        return memory.dict()
+
+
+def player_summary(record: dict) -> dict:
+    """Returns the list_players() summary of a player record."""
+    return {field: record.get(field) for field in PLAYER_SUMMARY_FIELDS}
+
+
+def player_from_record(record: dict, log_entries: List[AdventureLogEntry]) -> Player:
+    """Builds a clean (just-loaded) Player from a record and its recent log entries, oldest first."""
+    player = Player(player_id=record['player_id'], name=record['name'], hp=record['hp'],
+                    max_hp=record['max_hp'], mp=record['mp'], max_mp=record['max_mp'],
+                    inventory=list(record['inventory']), adventure_log=AdventureLog(entries=list(log_entries)),
+                    slot=record.get('slot'),
+                    memory=AdventureMemory(**record['memory']) if record.get('memory') else None)
+    player.current_location = record['current_location']
+    player.story_flags = dict(record['story_flags'])
+    player.mark_persisted()
+    return player
+
+
+def _needs_record_write(player: Player) -> bool:
+    return not player.is_persisted() or bool(player.get_dirty_fields() - {'adventure_log'})
+
+
+class _PlayerIndex:
+    """
+    In-process slot and name index for the stores that have no database to index for them.
+    Not thread-safe on its own; callers hold their store's lock.
+    """
+    def __init__(self):
+        self._keys: Dict[int, Tuple[str, Optional[int]]] = {} # player_id -> (name, slot)
+        self._slots: Dict[int, int] = {}
+        self._names: Dict[str, Set[int]] = {}
+
+    def next_player_id(self) -> int:
+        return max(self._keys, default=0) + 1
+
+    def slot_taken_by_other(self, player_id: Optional[int], slot: Optional[int]) -> bool:
+        return slot is not None and self._slots.get(slot, player_id) != player_id
+
+    def update(self, player_id: int, name: str, slot: Optional[int]):
+        self.discard(player_id)
+        self._keys[player_id] = (name, slot)
+        if slot is not None:
+            self._slots[slot] = player_id
+        self._names.setdefault(name, set()).add(player_id)
+
+    def discard(self, player_id: int):
+        keys = self._keys.pop(player_id, None)
+        if keys is None:
+            return
+        name, slot = keys
+        if slot is not None:
+            self._slots.pop(slot, None)
+        name_ids = self._names.get(name)
+        if name_ids is not None:
+            name_ids.discard(player_id)
+            if not name_ids:
+                del self._names[name]
+
+    def find_by_slot(self, slot: int) -> Optional[int]:
+        return self._slots.get(slot)
+
+    def find_by_name(self, name: str) -> List[int]:
+        return sorted(self._names.get(name, ()))
+
+
+class SQLiteBackend:
+    """
+    StorageBackend over a SQLite database file, using the pooled connections and
+    statements of persistence_service. With `write_behind` enabled, delta saves are
+    queued on a WriteBehindWriter and group-committed off the caller's thread.
+    """
+    def __init__(self, db_path: str, write_behind: bool = False, write_behind_window: float = 0.5):
+        """
+        Args:
+            db_path (str): The path to the SQLite database file.
+            write_behind (bool, optional): Queue save_player_changes() on a background writer.
+            write_behind_window (float, optional): Durability window in seconds for queued saves.
+        """
+        self.db_path = db_path
+        self.write_behind = write_behind
+        self.write_behind_window = write_behind_window
+        self.writer: Optional[persistence_service.WriteBehindWriter] = None
+
+    def setup(self) -> None:
+        persistence_service.setup_database(self.db_path)
+        if self.write_behind and self.writer is None:
+            self.writer = persistence_service.WriteBehindWriter(self.db_path, flush_interval=self.write_behind_window)
+
+    def save_player(self, player: Player) -> None:
+        if self.writer is not None:
+            self.writer.flush() # Keep ordering with earlier queued writes
+        persistence_service.save_player(self.db_path, player)
+
+    def save_player_changes(self, player: Player) -> bool:
+        if self.writer is not None and player.player_id is not None:
+            return self.writer.submit(player)
+        if player.player_id is None:
+            return self.create_player(player) is not None
+        return persistence_service.save_player_changes(self.db_path, player)
+
+    def create_player(self, player: Player) -> Optional[int]:
+        if self.writer is not None:
+            self.writer.flush()
+        return persistence_service.create_player(self.db_path, player)
+
+    def load_player(self, player_id: int, max_log_entries: Optional[int] = None) -> Optional[Player]:
+        return persistence_service.load_player(self.db_path, player_id, max_log_entries)
+
+    def delete_player(self, player_id: int) -> bool:
+        if self.writer is not None:
+            self.writer.flush()
+        return persistence_service.delete_player(self.db_path, player_id)
+
+    def find_player_id_by_slot(self, slot: int) -> Optional[int]:
+        self.flush() # Queued saves may move a player into or out of a slot
+        return persistence_service.find_player_id_by_slot(self.db_path, slot)
+
+    def find_player_ids_by_name(self, name: str) -> List[int]:
+        self.flush()
+        return persistence_service.find_player_ids_by_name(self.db_path, name)
+
+    def list_players(self, limit: int = 50, after_id: Optional[int] = None) -> List[dict]:
+        self.flush()
+        return persistence_service.list_players(self.db_path, limit, after_id)
+
+    def iter_player_ids(self) -> Iterator[int]:
+        return persistence_service.iter_player_ids(self.db_path)
+
+    def save_many(self, players: Iterable[Player]) -> int:
+        if self.writer is not None:
+            return sum(1 for player in players if self.save_player_changes(player))
+        return persistence_service.save_players(self.db_path, players)
+
+    def load_many(self, player_ids: Iterable[int], max_log_entries: Optional[int] = None) -> Dict[int, Player]:
+        return persistence_service.load_players(self.db_path, player_ids, max_log_entries)
+
+    def flush(self) -> None:
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self) -> None:
+        if self.writer is not None:
+            # Guarantee every queued write is committed before connections go away.
+            self.writer.close()
+            self.writer = None
+        persistence_service.close_connections(self.db_path)
+
+
+class InMemoryBackend:
+    """
+    StorageBackend that keeps copies of player state in process memory. Nothing touches
+    disk, which makes it the baseline for benchmarks and a fast store for tests and load
+    tests. Loads return fresh Player objects, as the on-disk backends do.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: Dict[int, dict] = {}
+        self._logs: Dict[int, List[AdventureLogEntry]] = {}
+        self._index = _PlayerIndex()
+
+    def setup(self) -> None:
+        pass
+
+    def save_player(self, player: Player) -> None:
+        with self._lock:
+            self._write(player, full=True)
+
+    def save_player_changes(self, player: Player) -> bool:
+        with self._lock:
+            return self._write(player, full=False)
+
+    def _write(self, player: Player, full: bool) -> bool:
+        new_entries = player.get_unsaved_log_entries()
+        write_record = full or _needs_record_write(player)
+        if not write_record and not new_entries:
+            player.mark_persisted()
+            return False
+        if write_record:
+            if self._index.slot_taken_by_other(player.player_id, player.slot):
+                print(f"Cannot save player {player.player_id}: slot {player.slot} is already taken.")
+                return False
+            if player.player_id is None:
+                player.player_id = self._index.next_player_id()
+            self._records[player.player_id] = player_to_record(player)
+            self._index.update(player.player_id, player.name, player.slot)
+        self._logs.setdefault(player.player_id, []).extend(new_entries)
+        player.mark_persisted()
+        return True
+
+    def create_player(self, player: Player) -> Optional[int]:
+        with self._lock:
+            return player.player_id if self._write(player, full=True) else None
+
+    def load_player(self, player_id: int, max_log_entries: Optional[int] = None) -> Optional[Player]:
+        with self._lock:
+            record = self._records.get(player_id)
+            if record is None:
+                return None
+            if max_log_entries is None:
+                max_log_entries = AdventureLog().max_entries
+            log = self._logs.get(player_id, [])
+            recent_entries = log[len(log) - max_log_entries:] if max_log_entries < len(log) else log
+            return player_from_record(record, recent_entries)
+
+    def delete_player(self, player_id: int) -> bool:
+        with self._lock:
+            self._logs.pop(player_id, None)
+            self._index.discard(player_id)
+            return self._records.pop(player_id, None) is not None
+
+    def find_player_id_by_slot(self, slot: int) -> Optional[int]:
+        with self._lock:
+            return self._index.find_by_slot(slot)
+
+    def find_player_ids_by_name(self, name: str) -> List[int]:
+        with self._lock:
+            return self._index.find_by_name(name)
+
+    def list_players(self, limit: int = 50, after_id: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            player_ids = sorted(player_id for player_id in self._records if after_id is None or player_id > after_id)
+            return [player_summary(self._records[player_id]) for player_id in player_ids[:limit]]
+
+    def iter_player_ids(self) -> Iterator[int]:
+        with self._lock:
+            player_ids = sorted(self._records)
+        return iter(player_ids)
+
+    def save_many(self, players: Iterable[Player]) -> int:
+        with self._lock:
+            return sum(1 for player in players if self._write(player, full=not player.is_persisted()))
+
+    def load_many(self, player_ids: Iterable[int], max_log_entries: Optional[int] = None) -> Dict[int, Player]:
+        players = {}
+        for player_id in player_ids:
+            player = self.load_player(player_id, max_log_entries)
+            if player is not None:
+                players[player_id] = player
+        return players
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FilePerPlayerBackend:
+    """
+    StorageBackend storing each player as two files in one directory:
+    `player_<id>.json` holds the state and is replaced atomically (write to a temp file,
+    fsync, rename, fsync the directory), and `player_<id>.log.jsonl` holds the adventure log, one entry per
+    line, appended as the game goes on. Slot and name lookups use an in-process index
+    that setup() builds by reading every state file once.
+    """
+    def __init__(self, directory: str, fsync: bool = True):
+        """
+        Args:
+            directory (str): Directory holding the player files. Created by setup().
+            fsync (bool, optional): fsync each file before renaming/after appending, and the directory
+                                    after a rename or a new file.
+                                    Disable for benchmarks that should measure CPU only.
+        """
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._index = _PlayerIndex()
+
+    def _state_path(self, player_id: int) -> str:
+        return os.path.join(self.directory, f"player_{int(player_id)}.json")
+
+    def _log_path(self, player_id: int) -> str:
+        return os.path.join(self.directory, f"player_{int(player_id)}.log.jsonl")
+
+    def setup(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            index = _PlayerIndex()
+            for player_id in self.iter_player_ids():
+                record = self._read_record(player_id)
+                if record is not None:
+                    index.update(player_id, record['name'], record.get('slot'))
+            self._index = index
+
+    def _read_record(self, player_id: int) -> Optional[dict]:
+        try:
+            with open(self._state_path(player_id), 'r', encoding='utf-8') as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"File storage error loading player {player_id}: {e}")
+            return None
+
+    def save_player(self, player: Player) -> None:
+        with self._lock:
+            self._write(player, full=True)
+
+    def save_player_changes(self, player: Player) -> bool:
+        with self._lock:
+            return self._write(player, full=False)
+
+    def _write(self, player: Player, full: bool) -> bool:
+        new_entries = player.get_unsaved_log_entries()
+        write_record = full or _needs_record_write(player)
+        if not write_record and not new_entries:
+            player.mark_persisted()
+            return False
+        if write_record and self._index.slot_taken_by_other(player.player_id, player.slot):
+            print(f"Cannot save player {player.player_id}: slot {player.slot} is already taken.")
+            return False
+        state_written = False
+        try:
+            if write_record:
+                if player.player_id is None:
+                    player.player_id = self._index.next_player_id()
+                self._write_state_atomically(player.player_id, json.dumps(player_to_record(player)))
+                self._index.update(player.player_id, player.name, player.slot)
+                state_written = True
+            if new_entries:
+                self._append_log(player.player_id, new_entries)
+        except OSError as e:
+            print(f"File storage error saving player {player.player_id}: {e}")
+            if state_written:
+                # The state file is saved; only the log entries are left for the next save
+                player.mark_persisted()
+                player.mark_unsaved((), new_entries)
+            return False
+        player.mark_persisted()
+        return True
+
+    def _append_log(self, player_id: int, entries: List[AdventureLogEntry]):
+        """
+        Appends entries to the player's log, one JSON line each. A line torn by a crash mid-append
+        is terminated first, so only that line is lost, and an append that fails part way is cut
+        off again, so retrying it never duplicates entries.
+        """
+        log_path = self._log_path(player_id)
+        new_log_file = not os.path.exists(log_path)
+        payload = "".join(entry.model_dump_json() + "\n" for entry in entries).encode('utf-8')
+        with open(log_path, 'a+b', buffering=0) as log_file: # Unbuffered, so nothing is written after a truncate
+            start = log_file.seek(0, os.SEEK_END)
+            if start:
+                log_file.seek(-1, os.SEEK_END)
+                if log_file.read(1) != b"\n":
+                    payload = b"\n" + payload
+            try:
+                remaining = memoryview(payload)
+                while remaining:
+                    remaining = remaining[log_file.write(remaining):]
+                if self.fsync:
+                    os.fsync(log_file.fileno())
+            except OSError:
+                try:
+                    log_file.truncate(start)
+                except OSError:
+                    pass # The original error is the one worth reporting
+                raise
+        if self.fsync and new_log_file:
+            self._fsync_directory() # Make the new file's directory entry durable too
+
+    def _write_state_atomically(self, player_id: int, payload: str):
+        final_path = self._state_path(player_id)
+        temp_path = f"{final_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as temp_file:
+                temp_file.write(payload)
+                if self.fsync:
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+            os.replace(temp_path, final_path) # Atomic: readers see the old or the new file, never a mix
+            if self.fsync:
+                self._fsync_directory() # The rename itself only survives a crash once the directory is synced
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _fsync_directory(self):
+        """fsyncs the storage directory, persisting renames and new files. Skipped where directories cannot be opened (Windows)."""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        directory_fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+    def create_player(self, player: Player) -> Optional[int]:
+        with self._lock:
+            return player.player_id if self._write(player, full=True) else None
+
+    def load_player(self, player_id: int, max_log_entries: Optional[int] = None) -> Optional[Player]:
+        record = self._read_record(player_id)
+        if record is None:
+            return None
+
+        if max_log_entries is None:
+            max_log_entries = AdventureLog().max_entries
+        recent_entries: List[AdventureLogEntry] = []
+        if max_log_entries > 0:
+            try:
+                with open(self._log_path(player_id), 'r', encoding='utf-8', errors='replace') as log_file:
+                    recent_lines = deque(log_file, maxlen=max_log_entries)
+            except FileNotFoundError:
+                recent_lines = deque()
+            except OSError as e:
+                print(f"File storage error reading log of player {player_id}: {e}")
+                recent_lines = deque()
+            for line in recent_lines:
+                if not line.strip():
+                    continue
+                try:
+                    recent_entries.append(AdventureLogEntry.model_validate_json(line))
+                except ValueError as e: # A line torn by a crash, or otherwise corrupt; skip just that line
+                    print(f"File storage error in log of player {player_id}, skipping a line: {e}")
+        return player_from_record(record, recent_entries)
+
+    def delete_player(self, player_id: int) -> bool:
+        with self._lock:
+            existed = os.path.exists(self._state_path(player_id))
+            for path in (self._state_path(player_id), self._log_path(player_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._index.discard(player_id)
+            return existed
+
+    def find_player_id_by_slot(self, slot: int) -> Optional[int]:
+        with self._lock:
+            return self._index.find_by_slot(slot)
+
+    def find_player_ids_by_name(self, name: str) -> List[int]:
+        with self._lock:
+            return self._index.find_by_name(name)
+
+    def list_players(self, limit: int = 50, after_id: Optional[int] = None) -> List[dict]:
+        player_ids = [player_id for player_id in self.iter_player_ids() if after_id is None or player_id > after_id]
+        summaries = []
+        for player_id in player_ids[:limit]:
+            record = self._read_record(player_id)
+            if record is not None:
+                summaries.append(player_summary(record))
+        return summaries
+
+    def iter_player_ids(self) -> Iterator[int]:
+        player_ids = []
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith("player_") and file_name.endswith(".json"):
+                id_text = file_name[len("player_"):-len(".json")]
+                if id_text.lstrip('-').isdigit():
+                    player_ids.append(int(id_text))
+        return iter(sorted(player_ids))
+
+    def save_many(self, players: Iterable[Player]) -> int:
+        with self._lock:
+            return sum(1 for player in players if self._write(player, full=not player.is_persisted()))
+
+    def load_many(self, player_ids: Iterable[int], max_log_entries: Optional[int] = None) -> Dict[int, Player]:
+        players = {}
+        for player_id in player_ids:
+            player = self.load_player(player_id, max_log_entries)
+            if player is not None:
+                players[player_id] = player
+        return players
+
+    def flush(self) -> None:
+        pass # Every save is durable when it returns
+
+    def close(self) -> None:
+        pass
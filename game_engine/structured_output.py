@@ -0,0 +1,98 @@
+import typing
+from typing import Any, Dict, List, Optional, Union
+
+from .common_types import GameStateUpdates
+
+# Generation settings for structured turns: the model must reply with JSON matching TURN_RESPONSE_SCHEMA.
+RESPONSE_MIME_TYPE = "application/json"
+# Whether turns use structured output unless told otherwise, for every entry point that builds an AI DM.
+DEFAULT_STRUCTURED_OUTPUT = True
+
+# Maps (Dict[str, X] fields) travel as lists of {"name", "value"} pairs: the response schema
+# format only describes objects with fixed property names.
+_MAP_KEY = "name"
+_MAP_VALUE = "value"
+
+_SCALAR_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def _field_descriptions(model) -> Dict[str, Optional[str]]:
+    try:
+        return {name: field.description for name, field in model.model_fields.items()}
+    except AttributeError: # Fallback for Pydantic V1
+        return {name: field.field_info.description for name, field in model.__fields__.items()}
+
+
+def _schema_for_type(annotation) -> Dict[str, Any]:
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is Union and type(None) in args:
+        (inner,) = [arg for arg in args if arg is not type(None)]
+        return {**_schema_for_type(inner), "nullable": True}
+    if origin in (list, List):
+        return {"type": "array", "items": _schema_for_type(args[0])}
+    if origin in (dict, Dict):
+        return {"type": "array", "items": {
+            "type": "object",
+            "properties": {_MAP_KEY: _schema_for_type(args[0]), _MAP_VALUE: _schema_for_type(args[1])},
+            "required": [_MAP_KEY, _MAP_VALUE],
+        }}
+    if annotation in _SCALAR_TYPES:
+        return {"type": _SCALAR_TYPES[annotation]}
+    raise TypeError(f"No response schema mapping for {annotation!r}.")
+
+
+def schema_for_model(model) -> Dict[str, Any]:
+    """
+    Derives a response schema (the OpenAPI subset accepted by generation configs) from a
+    pydantic model's fields and their descriptions. Fields with defaults are optional.
+    """
+    descriptions = _field_descriptions(model)
+    properties = {}
+    for name, annotation in typing.get_type_hints(model).items():
+        if name not in descriptions:
+            continue # Class-level annotations that are not fields
+        schema = _schema_for_type(annotation)
+        if descriptions[name]:
+            schema["description"] = descriptions[name]
+        properties[name] = schema
+    return {"type": "object", "properties": properties}
+
+
+def turn_response_schema() -> Dict[str, Any]:
+    """The schema of a turn reply: the narrative and the GameStateUpdates it causes."""
+    return {
+        "type": "object",
+        "properties": {
+            "narrative": {"type": "string", "description": "What happens next, in 3-5 sentences."},
+            "game_state_updates": schema_for_model(GameStateUpdates),
+        },
+        "required": ["narrative", "game_state_updates"],
+    }
+
+
+TURN_RESPONSE_SCHEMA = turn_response_schema()
+
+
+def _map_fields(model) -> List[str]:
+    return [name for name, annotation in typing.get_type_hints(model).items()
+            if typing.get_origin(annotation) in (dict, Dict)]
+
+
+def updates_from_wire(updates: Dict[str, Any], model=GameStateUpdates) -> Dict[str, Any]:
+    """
+    Turns map fields sent as [{"name": ..., "value": ...}] back into dicts, so the result can be
+    passed to `model`. Replies that already use plain objects (prose mode) pass through unchanged.
+    """
+    converted = dict(updates)
+    for name in _map_fields(model):
+        value = updates.get(name)
+        if isinstance(value, list):
+            converted[name] = {item[_MAP_KEY]: item[_MAP_VALUE] for item in value
+                               if isinstance(item, dict) and _MAP_KEY in item and _MAP_VALUE in item}
+    return converted
+
+
+def updates_to_wire(updates: Dict[str, Any]) -> Dict[str, Any]:
+    """The reverse of updates_from_wire, for replies produced locally (e.g. by the mock engine)."""
+    return {name: [{_MAP_KEY: key, _MAP_VALUE: item} for key, item in value.items()] if isinstance(value, dict) else value
+            for name, value in updates.items()}
@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Allow running as a script (python game_engine/turn_benchmark.py) as well as with -m
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.ai_cassette import Cassette, ReplayBackend
+from game_engine.ai_task_runner import AITaskRunner
+from game_engine.game_manager import GameManager
+from game_engine.persistence_benchmark import summarize
+from game_engine.storage_backends import InMemoryBackend
+
+# How GameManager runs each turn: name -> GameManager options ('ai_runner' gets a fresh AITaskRunner).
+TURN_MODES: Dict[str, dict] = {
+    'sync': {'stream_narrative': False},
+    'stream': {'stream_narrative': True},
+    'async': {'stream_narrative': True, 'ai_runner': True},
+}
+
+
+class BenchmarkUI:
+    """Stands in for WebUIManager: output is discarded so only the turn pipeline is measured."""
+    is_ready = True
+
+    def add_story_text(self, text: str, msg_type: str = 'normal'):
+        pass
+
+    def begin_story_stream(self, msg_type: str = 'normal'):
+        pass
+
+    def append_story_stream(self, fragment: str):
+        pass
+
+    def end_story_stream(self):
+        pass
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def update_player_display(self, player):
+        pass
+
+
+def benchmark_replay(cassette: Cassette, mode: str = 'stream', speed: Optional[float] = None, runs: int = 1) -> dict:
+    """
+    Replays the cassette's player actions through GameManager.process_player_command_from_js,
+    starting each run from a new player, with AI replies served by a ReplayBackend.
+
+    Args:
+        cassette (Cassette): Recorded traffic; its turn prompts give the actions to replay.
+        mode (str, optional): A TURN_MODES entry.
+        speed (float, optional): Replay speed (1.0 = recorded timing); None serves replies without delay.
+        runs (int, optional): Times to replay the whole session.
+
+    Returns:
+        dict: Latency summary of the turns, plus how many replies matched their recorded prompt exactly.
+    """
+    options = dict(TURN_MODES[mode])
+    use_runner = options.pop('ai_runner', False)
+    actions = cassette.player_actions()
+    samples: List[int] = []
+    exact = approximate = 0
+    # GameManager and the AI DM log every turn; keep that chatter out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(runs):
+            backend = ReplayBackend(cassette, speed=speed, strict=False)
+            runner = AITaskRunner() if use_runner else None
+            game_manager = GameManager(ui_manager=BenchmarkUI(), storage=InMemoryBackend(), llm_backend=backend,
+                                       ai_runner=runner, prefetch_opening_scene=False, **options)
+            try:
+                for action in actions:
+                    start = time.perf_counter_ns()
+                    game_manager.process_player_command_from_js(action)
+                    samples.append(time.perf_counter_ns() - start)
+            finally:
+                game_manager.memory_keeper.close()
+                game_manager.storage.close()
+                if runner is not None:
+                    runner.close()
+            exact += backend.exact_matches
+            approximate += backend.approximate_matches
+    speed_label = f"x{speed:g}" if speed else 'fast'
+    result = summarize('turn', mode, speed_label, samples)
+    result.update({'speed': speed_label, 'exact_matches': exact, 'approximate_matches': approximate})
+    return result
+
+
+def run_benchmarks(cassette_path: str, modes: Optional[List[str]] = None, speed: Optional[float] = None,
+                   runs: int = 1) -> dict:
+    """Replays a cassette in each mode and returns machine-readable results."""
+    cassette = Cassette.load(cassette_path)
+    modes = modes or list(TURN_MODES)
+    return {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cassette': cassette_path,
+        'recorded_interactions': len(cassette.interactions),
+        'turns_per_run': len(cassette.player_actions()),
+        'runs': runs,
+        'results': [benchmark_replay(cassette, mode, speed, runs) for mode in modes],
+    }
+
+
+def format_report(report: dict) -> str:
+    """Formats benchmark results as a plain-text table."""
+    lines = [f"{'mode':<8} {'speed':<7} {'turns':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'exact':>6} {'approx':>6}"]
+    for row in report['results']:
+        lines.append(f"{row['mode']:<8} {row['speed']:<7} {row['count']:>6} {row['mean_ms']:>9.3f} {row['p50_ms']:>9.3f} "
+                     f"{row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['exact_matches']:>6} {row['approximate_matches']:>6}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the turn pipeline by replaying recorded AI traffic.")
+    parser.add_argument('cassette', help="Cassette recorded with AI_RECORD_CASSETTE.")
+    parser.add_argument('--modes', default=','.join(TURN_MODES),
+                        help=f"Comma-separated turn modes ({', '.join(TURN_MODES)}).")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="Replay speed: 1 for recorded timing, 0 (default) for as fast as possible.")
+    parser.add_argument('--runs', type=int, default=1, help="Times to replay the session.")
+    parser.add_argument('--output', help="Write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in TURN_MODES]
+    if unknown:
+        parser.error(f"Unknown mode: {', '.join(unknown)}")
+
+    report = run_benchmarks(args.cassette, modes, args.speed or None, args.runs)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 
 from game_engine.game_manager import GameManager
+from game_engine.ai_task_runner import get_ai_task_runner
+from game_engine.llm_backends import llm_backend_from_env
+from game_engine.request_scheduler import get_request_scheduler
+from game_engine.model_router import ModelRouter
 from ui.web_ui_manager import WebUIManager
 # Import handlers and the descriptions dictionary
 from main_eel_handlers import (
@@ -61,7 +65,15 @@ def main_eel():
 
     try:
         # Initialize GameManager with the WebUIManager
-        game_manager = GameManager(ui_manager=web_ui_manager)
+        # AI turns run on the shared event loop so a newer command can cancel a slow one.
+        # AI_BACKEND=mock plays against the local mock engine instead of Gemini.
+        # Every AI request waits on the shared scheduler, which keeps the keys within their combined rate limits.
+        # Combat and other complex turns go to a stronger model (AI_MODEL_ROUTING=off disables this).
+        # AI_CONVERSATION_MODE=1 sends most turns as state changes, in a conversation since the last full-state turn.
+        game_manager = GameManager(ui_manager=web_ui_manager, ai_runner=get_ai_task_runner(),
+                                   llm_backend=llm_backend_from_env(), request_scheduler=get_request_scheduler(),
+                                   model_router=ModelRouter.from_env(),
+                                   conversation_mode=os.getenv("AI_CONVERSATION_MODE", "").strip().lower() in ('1', 'true', 'on'))
         print("Main: GameManager initialized successfully.")
     except Exception as e:
         print(f"Main: Error initializing GameManager: {e}")
@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.adventure_memory import AdventureMemoryKeeper, fallback_summary, SCENE, CHAPTER, SAGA
+from game_engine.character_manager import Player
+from game_engine.common_types import AdventureLogEntry
+from game_engine.persistence_service import setup_database, save_player, load_player, close_connections
+from game_engine.prompt_builder import PromptBuilder
+
+
+def make_entries(first_turn, count):
+    return [AdventureLogEntry(type="player_action" if index % 2 == 0 else "ai_output",
+                              content=f"Event {first_turn + index}. More detail follows.", turn_number=first_turn + index)
+            for index in range(count)]
+
+
+class TestAdventureMemory(unittest.TestCase):
+    """
+    Test suite for the rolling adventure log summaries.
+    """
+
+    def setUp(self):
+        self.player = Player(player_id=1, name="Veera", hp=100, max_hp=100, mp=50, max_mp=50)
+        self.summarized = []
+
+        def summarizer(texts, level):
+            self.summarized.append((level, len(texts)))
+            return f"{level} of {len(texts)}"
+
+        self.keeper = AdventureMemoryKeeper(summarizer=summarizer, scene_size=4, fan_in=2, background=False)
+
+    def levels(self):
+        return [summary.level for summary in self.player.memory.summaries]
+
+    def test_evicted_entries_fold_into_scenes(self):
+        """Tests that a scene's worth of evicted entries becomes one scene summary."""
+        self.keeper.remember(self.player, make_entries(1, 3))
+        self.assertEqual(self.player.memory.summaries, [])
+        self.assertEqual(len(self.player.memory.pending), 3)
+
+        self.keeper.remember(self.player, make_entries(4, 2))
+        self.assertEqual(self.summarized, [('scene', 4)])
+        scene = self.player.memory.summaries[0]
+        self.assertEqual((scene.level, scene.first_turn, scene.last_turn, scene.text), (SCENE, 1, 4, "scene of 4"))
+        self.assertEqual([entry.turn_number for entry in self.player.memory.pending], [5])
+
+    def test_long_campaign_stays_bounded(self):
+        """Tests the scene -> chapter -> saga cascade keeps memory bounded."""
+        for first_turn in range(1, 401, 4):
+            self.keeper.remember(self.player, make_entries(first_turn, 4))
+        memory = self.player.memory
+        self.assertLessEqual(self.levels().count(SCENE), 2)
+        self.assertLessEqual(self.levels().count(CHAPTER), 2)
+        self.assertEqual(self.levels().count(SAGA), 1)
+        self.assertEqual(self.levels(), sorted(self.levels(), reverse=True)) # Saga, chapters, scenes
+        self.assertEqual(memory.summaries[0].first_turn, 1) # The saga still covers the start
+        self.assertEqual(memory.summaries[-1].last_turn, 400)
+        self.assertIn(('saga', 3), self.summarized) # Previous saga + fan_in chapters
+
+    def test_summarizer_failure_uses_local_summary(self):
+        """Tests that a failing summarizer does not lose the entries."""
+        keeper = AdventureMemoryKeeper(summarizer=lambda texts, level: 1 / 0, scene_size=2, background=False)
+        with patch('builtins.print'):
+            keeper.remember(self.player, make_entries(1, 2))
+        self.assertEqual(self.player.memory.summaries[0].text, "T1 Player: Event 1. T2 DM: Event 2.")
+        self.assertEqual(fallback_summary(["x" * 500], 'scene', max_chars=10), "xxxxxxx...")
+
+    def test_background_folds_do_not_block_remember(self):
+        """Tests that remember() returns while the summary is still being written."""
+        release = threading.Event()
+
+        def slow_summarizer(texts, level):
+            release.wait(5)
+            return "The battle at the river."
+
+        keeper = AdventureMemoryKeeper(summarizer=slow_summarizer, scene_size=2)
+        self.addCleanup(keeper.close, 5)
+        keeper.remember(self.player, make_entries(1, 2))
+        self.assertEqual(self.player.memory.summaries, []) # Not on the critical path
+        self.assertEqual(len(self.player.memory.pending), 2) # Still available to prompts meanwhile
+        release.set()
+        self.assertTrue(keeper.flush(5))
+        self.assertEqual(self.player.memory.summaries[0].text, "The battle at the river.")
+        self.assertEqual(self.player.memory.pending, [])
+        self.assertEqual(keeper._scheduled, {}) # Finished jobs are not kept per player
+
+    def test_memory_is_saved_and_fed_into_prompts(self):
+        """Tests that summaries are stored with the player and appear in the continuation prompt."""
+        self.keeper.remember(self.player, make_entries(1, 5))
+        temp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(temp_dir, 'memory.db')
+        self.addCleanup(shutil.rmtree, temp_dir, True)
+        self.addCleanup(close_connections, db_path)
+        with patch('builtins.print'):
+            setup_database(db_path)
+            save_player(db_path, self.player)
+            loaded = load_player(db_path, 1)
+        self.assertEqual(loaded.memory, self.player.memory)
+        self.assertFalse(loaded.is_dirty())
+
+        prompt = PromptBuilder().build_continuation(loaded, "Resume.", "Describe the scene.").text
+        self.assertIn("Story so far:\nScene (turns 1-4): scene of 4", prompt)
+        self.assertIn("T5 Player: Event 5.", prompt) # Pending entries are sent as raw log lines
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import asyncio
+import json
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.ai_cassette import Cassette, CassetteMissError, RecordingBackend, ReplayBackend
+from game_engine.ai_dm_interface import AIDungeonMaster
+from game_engine.llm_backends import MockLLMBackend
+from game_engine.character_manager import Player
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.25
+        return self.now
+
+
+class TestAICassette(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'session.jsonl.gz')
+        self.player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+
+    @patch('builtins.print')
+    def _record_session(self, mock_print):
+        mock = MockLLMBackend(chunk_size=16)
+        dm = AIDungeonMaster(backend=RecordingBackend(mock, Cassette(self.path), clock=FakeClock()))
+        results = [dm.get_initial_scene_description(),
+                   dm.get_ai_response(self.player, "attack the asura"),
+                   dm.get_ai_response(self.player, "look around", on_narrative_fragment=lambda fragment: None),
+                   asyncio.run(dm.get_ai_response_async(self.player, "flee", timeout=5))]
+        return results
+
+    def test_recording_is_written_as_it_happens_and_reloads(self):
+        """Tests that every call lands on disk with its chunks, timing and usage."""
+        self._record_session()
+        cassette = Cassette.load(self.path)
+        self.assertEqual([interaction.kind for interaction in cassette.interactions], ['scene', 'turn', 'turn', 'turn'])
+        self.assertEqual(cassette.player_actions(), ["attack the asura", "look around", "flee"])
+        streamed = cassette.interactions[2]
+        self.assertTrue(streamed.stream)
+        self.assertGreater(len(streamed.chunks), 1)
+        self.assertEqual(streamed.chunks[1][0] - streamed.chunks[0][0], 0.25)
+        self.assertIn("look around", json.loads(streamed.text)["narrative"])
+        self.assertGreater(streamed.prompt_tokens, 0)
+
+    @patch('builtins.print')
+    def test_replay_serves_recorded_replies_without_delay(self, mock_print):
+        """Tests that a replayed session returns exactly what was recorded, with no sleeping when fast."""
+        recorded = self._record_session()
+        sleeps = []
+        dm = AIDungeonMaster(backend=ReplayBackend(Cassette.load(self.path), speed=None, sleep=sleeps.append))
+        fragments = []
+        self.assertEqual(dm.get_initial_scene_description(), recorded[0])
+        self.assertEqual(dm.get_ai_response(self.player, "attack the asura", on_narrative_fragment=fragments.append)[0],
+                         recorded[1][0])
+        self.assertEqual("".join(fragments), recorded[1][0])
+        self.assertEqual(dm.get_ai_response(self.player, "look around"), recorded[2])
+        self.assertEqual(sleeps, [])
+        self.assertEqual(dm.backend.exact_matches, 3)
+
+    def test_replay_at_recorded_speed(self):
+        """Tests that chunks are paced by their recorded offsets divided by the speed."""
+        self._record_session()
+        sleeps = []
+        backend = ReplayBackend(Cassette.load(self.path), speed=2.0, sleep=sleeps.append)
+        interaction = backend.cassette.interactions[2]
+        list(backend.create_model().generate_content(interaction.prompt, stream=True))
+        self.assertEqual(len(sleeps), len(interaction.chunks))
+        self.assertAlmostEqual(sum(sleeps), interaction.latency / 2)
+
+    def test_unrecorded_prompts(self):
+        """Tests that strict replay rejects unknown prompts and lenient replay serves the next of the same kind."""
+        self._record_session()
+        cassette = Cassette.load(self.path)
+        prompt = 'Player: Someone else.\nThe player says: "dance"\n'
+        with self.assertRaises(CassetteMissError):
+            ReplayBackend(cassette, speed=None).lookup(prompt)
+        lenient = ReplayBackend(cassette, speed=None, strict=False)
+        self.assertIs(lenient.lookup(prompt), cassette.interactions[1])
+        self.assertIs(lenient.lookup(prompt), cassette.interactions[2])
+        self.assertEqual(lenient.approximate_matches, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,30 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import sys
 import os
 
 # Add the parent directory to the Python path to allow importing from game_engine
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from game_engine.ai_dm_interface import AIDungeonMaster
+from game_engine.ai_dm_interface import AIDungeonMaster, DM_SYSTEM_INSTRUCTION, INITIAL_SCENE_ERROR, AI_UNAVAILABLE_NARRATIVE
+from game_engine.ai_dm_interface import DM_STRUCTURED_SYSTEM_INSTRUCTION, parse_turn_response
+from game_engine.llm_backends import GeminiBackend, MockLLMBackend
+from game_engine.request_scheduler import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_BACKGROUND
+from game_engine.model_router import ModelRouter
+from game_engine.ai_resilience import ResilientCaller, RetryPolicy, CircuitBreaker
+from google.api_core import exceptions as google_exceptions
+from game_engine.prompt_builder import PromptBuilder
+from game_engine.character_manager import Player
+from datetime import datetime, timedelta, timezone
+import json
+import asyncio
 
 class TestAIDungeonMaster(unittest.TestCase):
     """
     Test suite for the AIDungeonMaster class.
     """
 
-    @patch('game_engine.ai_dm_interface.genai')
+    @patch('game_engine.llm_backends.genai')
     def test_init_with_direct_api_key(self, mock_genai):
         """
         Tests initialization with a directly provided API key.
@@ -24,7 +35,7 @@ class TestAIDungeonMaster(unittest.TestCase):
         self.assertEqual(dm.model, mock_genai.GenerativeModel.return_value)
 
     @patch('game_engine.ai_dm_interface.os.getenv')
-    @patch('game_engine.ai_dm_interface.genai')
+    @patch('game_engine.llm_backends.genai')
     def test_init_with_env_variable_api_key(self, mock_genai, mock_os_getenv):
         """
         Tests initialization with API key from environment variable.
@@ -37,7 +48,7 @@ class TestAIDungeonMaster(unittest.TestCase):
         self.assertEqual(dm.model, mock_genai.GenerativeModel.return_value)
 
     @patch('game_engine.ai_dm_interface.os.getenv')
-    @patch('game_engine.ai_dm_interface.genai') # Still need to mock genai to prevent actual calls
+    @patch('game_engine.llm_backends.genai') # Still need to mock genai to prevent actual calls
     def test_init_no_api_key_raises_value_error(self, mock_genai, mock_os_getenv):
         """
         Tests that ValueError is raised if no API key is provided or found in env.
@@ -48,7 +59,7 @@ class TestAIDungeonMaster(unittest.TestCase):
         self.assertTrue("API key not provided" in str(context.exception))
         mock_genai.configure.assert_not_called() # Ensure configure wasn't called
 
-    @patch('game_engine.ai_dm_interface.genai')
+    @patch('game_engine.llm_backends.genai')
     def test_get_initial_scene_description_success(self, mock_genai_module):
         """
         Tests successful retrieval of an initial scene description.
@@ -75,7 +86,7 @@ class TestAIDungeonMaster(unittest.TestCase):
         self.assertEqual(scene, "A mystical forest appears before you.")
 
     @patch('builtins.print') # Mock the print function
-    @patch('game_engine.ai_dm_interface.genai')
+    @patch('game_engine.llm_backends.genai')
     def test_get_initial_scene_description_api_error(self, mock_genai_module, mock_print):
         """
         Tests the API error handling in get_initial_scene_description.
@@ -93,7 +104,7 @@ class TestAIDungeonMaster(unittest.TestCase):
         self.assertEqual(scene, 'Error: The mists of creation obscure your vision... Please check your connection or API key.')
         mock_print.assert_called_once_with(f'Error contacting AI DM for initial scene: {api_error_message}')
 
-    @patch('game_engine.ai_dm_interface.genai')
+    @patch('game_engine.llm_backends.genai')
     def test_get_ai_response_success(self, mock_genai_module):
         """
         Tests successful retrieval of an AI response to player action.
@@ -155,7 +166,7 @@ class TestAIDungeonMaster(unittest.TestCase):
 
 
     @patch('builtins.print')
-    @patch('game_engine.ai_dm_interface.genai')
+    @patch('game_engine.llm_backends.genai')
     def test_get_ai_response_api_error(self, mock_genai_module, mock_print):
         """
         Tests API error handling in get_ai_response.
@@ -172,5 +183,282 @@ class TestAIDungeonMaster(unittest.TestCase):
         self.assertEqual(response_text, 'Error: The threads of fate are tangled... Please try again.')
         mock_print.assert_called_once_with(f'Error contacting AI DM (player action): {error_message}')
 
+    def _turn_response(self, narrative="The wind howls."):
+        response = MagicMock()
+        response.text = json.dumps({"narrative": narrative, "game_state_updates": {"hp_change": -1}})
+        return response
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_turns_send_only_dynamic_state(self, mock_genai_module, mock_print):
+        """
+        Tests that the fixed instructions go to the turn model once, as its system instruction,
+        and each turn only sends the player's state and action.
+        """
+        turn_model = MagicMock()
+        turn_model.generate_content.return_value = self._turn_response()
+        base_model = MagicMock()
+        mock_genai_module.GenerativeModel.side_effect = [base_model, turn_model]
+
+        dm = AIDungeonMaster(api_key='test_key_turns', structured_output=False)
+        player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+        narrative, updates = dm.get_ai_response(player, "look around")
+        dm.get_ai_response(player, "draw my sword")
+
+        self.assertEqual(narrative, "The wind howls.")
+        self.assertEqual(updates.hp_change, -1)
+        mock_genai_module.GenerativeModel.assert_called_with('gemini-2.0-flash-lite', system_instruction=DM_SYSTEM_INSTRUCTION)
+        self.assertEqual(mock_genai_module.GenerativeModel.call_count, 2) # Base model + one turn model
+        base_model.generate_content.assert_not_called()
+        first_prompt = turn_model.generate_content.call_args_list[0][0][0]
+        self.assertIn('The player says: "look around"', first_prompt)
+        self.assertIn("HP: 90/100", first_prompt)
+        self.assertNotIn("Combat Instructions", first_prompt)
+        self.assertLess(len(first_prompt), len(DM_SYSTEM_INSTRUCTION))
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_structured_output_uses_response_schema(self, mock_genai_module, mock_print):
+        """Tests that structured turns request JSON against the schema and drop the format prose."""
+        turn_model = MagicMock()
+        turn_model.generate_content.return_value.text = json.dumps({
+            "narrative": "The gate creaks open.",
+            "game_state_updates": {"new_story_flags": [{"name": "gate_open", "value": True}], "hp_change": 0}})
+        mock_genai_module.GenerativeModel.side_effect = [MagicMock(), turn_model]
+
+        dm = AIDungeonMaster(api_key='test_key_structured', structured_output=True)
+        narrative, updates = dm.get_ai_response(Player(player_id=1, name="Veera", hp=9, max_hp=10, mp=4, max_mp=5),
+                                                "push the gate")
+
+        self.assertEqual(narrative, "The gate creaks open.")
+        self.assertEqual(updates.new_story_flags, {"gate_open": True})
+        kwargs = mock_genai_module.GenerativeModel.call_args.kwargs
+        self.assertEqual(kwargs['system_instruction'], DM_STRUCTURED_SYSTEM_INSTRUCTION)
+        self.assertNotIn("Example 1", DM_STRUCTURED_SYSTEM_INSTRUCTION)
+        mock_genai_module.GenerationConfig.assert_called_once()
+        self.assertEqual(mock_genai_module.GenerationConfig.call_args.kwargs['response_mime_type'], "application/json")
+        self.assertIs(kwargs['generation_config'], mock_genai_module.GenerationConfig.return_value)
+
+    def test_parse_falls_back_to_stripping_fences(self):
+        """Tests that fenced prose-mode replies still parse once bare JSON has failed."""
+        reply = json.dumps({"narrative": "Dust settles.", "game_state_updates": {"mp_change": 2}})
+        for text in (reply, f"```json\n{reply}\n```", f"```\n{reply}\n```"):
+            narrative, updates = parse_turn_response(text)
+            self.assertEqual((narrative, updates.mp_change), ("Dust settles.", 2))
+        with self.assertRaises(json.JSONDecodeError):
+            parse_turn_response("The DM mumbles.")
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_context_cache_is_shared_across_sessions(self, mock_genai_module, mock_print):
+        """Tests that sessions reuse one cached-content handle until it expires."""
+        GeminiBackend._shared_context_caches.clear()
+        self.addCleanup(GeminiBackend._shared_context_caches.clear)
+        cache = MagicMock()
+        cache.expire_time = datetime.now(timezone.utc) + timedelta(hours=1)
+        mock_genai_module.caching.CachedContent.create.return_value = cache
+        cached_model = mock_genai_module.GenerativeModel.from_cached_content.return_value
+        cached_model.generate_content.return_value = self._turn_response()
+
+        player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+        for _ in range(2): # Two sessions
+            dm = AIDungeonMaster(api_key='test_key_cache', context_cache_ttl=3600, structured_output=False)
+            dm.get_ai_response(player, "look around")
+            dm.get_ai_response(player, "look around")
+
+        mock_genai_module.caching.CachedContent.create.assert_called_once()
+        self.assertEqual(mock_genai_module.caching.CachedContent.create.call_args.kwargs['system_instruction'],
+                         DM_SYSTEM_INSTRUCTION)
+        mock_genai_module.GenerativeModel.from_cached_content.assert_called_with(cache)
+        self.assertEqual(cached_model.generate_content.call_count, 4)
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_context_cache_failure_falls_back_to_system_instruction(self, mock_genai_module, mock_print):
+        """Tests that turns still work when cached content cannot be created."""
+        GeminiBackend._shared_context_caches.clear()
+        mock_genai_module.caching.CachedContent.create.side_effect = Exception("content too small to cache")
+        turn_model = MagicMock()
+        turn_model.generate_content.return_value = self._turn_response()
+        mock_genai_module.GenerativeModel.side_effect = [MagicMock(), turn_model]
+
+        dm = AIDungeonMaster(api_key='test_key_fallback', context_cache_ttl=600, structured_output=False)
+        narrative, _ = dm.get_ai_response(Player(player_id=1, name="Veera", hp=9, max_hp=10, mp=4, max_mp=5), "wait")
+
+        self.assertEqual(narrative, "The wind howls.")
+        mock_genai_module.GenerativeModel.assert_called_with('gemini-2.0-flash-lite', system_instruction=DM_SYSTEM_INSTRUCTION)
+        self.assertIsNone(dm.context_cache_ttl)
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_streamed_response_delivers_narrative_fragments(self, mock_genai_module, mock_print):
+        """Tests that streaming passes narrative pieces to the callback and parses updates at the end."""
+        reply = json.dumps({"narrative": "Arrows fall like rain.", "game_state_updates": {"hp_change": -3}})
+        chunks = []
+        for index in range(0, len(reply), 9):
+            chunk = MagicMock()
+            chunk.text = reply[index:index + 9]
+            chunks.append(chunk)
+        turn_model = MagicMock()
+        turn_model.generate_content.return_value = iter(chunks)
+        mock_genai_module.GenerativeModel.side_effect = [MagicMock(), turn_model]
+
+        dm = AIDungeonMaster(api_key='test_key_stream')
+        fragments = []
+        narrative, updates = dm.get_ai_response(Player(player_id=1, name="Veera", hp=9, max_hp=10, mp=4, max_mp=5),
+                                                "duck", on_narrative_fragment=fragments.append)
+
+        self.assertTrue(turn_model.generate_content.call_args.kwargs['stream'])
+        self.assertGreater(len(fragments), 1)
+        self.assertEqual("".join(fragments), "Arrows fall like rain.")
+        self.assertEqual(narrative, "Arrows fall like rain.")
+        self.assertEqual(updates.hp_change, -3)
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_async_streamed_response(self, mock_genai_module, mock_print):
+        """Tests the async turn: streamed fragments, then updates parsed from the whole reply."""
+        reply = json.dumps({"narrative": "The conch sounds.", "game_state_updates": {"mp_change": 2}})
+
+        async def stream_chunks():
+            for index in range(0, len(reply), 7):
+                chunk = MagicMock()
+                chunk.text = reply[index:index + 7]
+                yield chunk
+
+        turn_model = MagicMock()
+        turn_model.generate_content_async = AsyncMock(return_value=stream_chunks())
+        mock_genai_module.GenerativeModel.side_effect = [MagicMock(), turn_model]
+
+        dm = AIDungeonMaster(api_key='test_key_async')
+        fragments = []
+        narrative, updates = asyncio.run(dm.get_ai_response_async(
+            Player(player_id=1, name="Veera", hp=9, max_hp=10, mp=4, max_mp=5), "listen",
+            on_narrative_fragment=fragments.append, timeout=5))
+
+        self.assertTrue(turn_model.generate_content_async.call_args.kwargs['stream'])
+        self.assertEqual("".join(fragments), "The conch sounds.")
+        self.assertEqual(narrative, "The conch sounds.")
+        self.assertEqual(updates.mp_change, 2)
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_async_calls_respect_deadline(self, mock_genai_module, mock_print):
+        """Tests that a slow upstream call is abandoned at the deadline."""
+        cancelled = []
+
+        async def never_answers(*args, **kwargs):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        slow_model = MagicMock()
+        slow_model.generate_content_async = never_answers
+        mock_genai_module.GenerativeModel.return_value = slow_model
+
+        dm = AIDungeonMaster(api_key='test_key_timeout')
+        player = Player(player_id=1, name="Veera", hp=9, max_hp=10, mp=4, max_mp=5)
+        narrative, updates = asyncio.run(dm.get_ai_response_async(player, "wait", timeout=0.05))
+        self.assertIn("took too long", narrative)
+        self.assertEqual(updates.hp_change, 0)
+        self.assertEqual(asyncio.run(dm.get_initial_scene_description_async(timeout=0.05)), INITIAL_SCENE_ERROR)
+        self.assertEqual(len(cancelled), 2) # The upstream requests were cancelled, not left running
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_upstream_outage_uses_local_fallback(self, mock_genai_module, mock_print):
+        """Tests retries on transient errors, then the fallback narrative and a fast-failing circuit."""
+        turn_model = MagicMock()
+        turn_model.generate_content.side_effect = google_exceptions.ServiceUnavailable("overloaded")
+        mock_genai_module.GenerativeModel.side_effect = [MagicMock(), turn_model]
+        resilience = ResilientCaller(retry_policy=RetryPolicy(max_attempts=3), sleep=lambda seconds: None,
+                                     breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+        dm = AIDungeonMaster(api_key='test_key_outage', resilience=resilience)
+        player = Player(player_id=1, name="Veera", hp=9, max_hp=10, mp=4, max_mp=5)
+        narrative, updates = dm.get_ai_response(player, "charge")
+        self.assertEqual(narrative, AI_UNAVAILABLE_NARRATIVE)
+        self.assertEqual(updates.hp_change, 0)
+        self.assertEqual(turn_model.generate_content.call_count, 3)
+
+        # The circuit is now open: the next turn fails fast without calling upstream
+        self.assertEqual(dm.get_ai_response(player, "charge again")[0], AI_UNAVAILABLE_NARRATIVE)
+        self.assertEqual(turn_model.generate_content.call_count, 3)
+
+    @patch('builtins.print')
+    @patch('game_engine.llm_backends.genai')
+    def test_turn_prompt_budget_and_usage_report(self, mock_genai_module, mock_print):
+        """Tests that turns are built within the budget and their token usage is reported."""
+        response = self._turn_response()
+        response.usage_metadata.prompt_token_count = 812
+        response.usage_metadata.candidates_token_count = 64
+        turn_model = MagicMock()
+        turn_model.generate_content.return_value = response
+        mock_genai_module.GenerativeModel.side_effect = [MagicMock(), turn_model]
+
+        dm = AIDungeonMaster(api_key='test_key_budget', prompt_builder=PromptBuilder(turn_budget=80))
+        player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+        player.story_flags = {f"rumour_{index}": True for index in range(100)}
+        dm.get_ai_response(player, "listen")
+
+        prompt = turn_model.generate_content.call_args[0][0]
+        self.assertNotIn("rumour_0,", prompt)
+        usage = dm.last_turn_usage
+        self.assertLessEqual(usage.estimated_prompt_tokens, 80)
+        self.assertGreater(usage.omitted['flags'], 0)
+        self.assertEqual((usage.prompt_tokens, usage.response_tokens), (812, 64))
+        mock_print.assert_any_call(f"AI DM: Turn tokens - {usage.summary()}")
+
+    @patch('builtins.print')
+    def test_requests_wait_on_scheduler_by_priority(self, mock_print):
+        """Tests that each request (including retries) waits for quota, turns as interactive and summaries as background."""
+        scheduler = MagicMock()
+        scheduler.acquire_async = AsyncMock(return_value=0.0)
+        dm = AIDungeonMaster(backend=MockLLMBackend(), request_scheduler=scheduler, session_key='slot-1',
+                             resilience=ResilientCaller(retry_policy=RetryPolicy(max_attempts=2, base_delay=0)))
+        player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+
+        dm.get_ai_response(player, "look around")
+        narrative, _ = asyncio.run(dm.get_ai_response_async(player, "listen", on_narrative_fragment=lambda fragment: None))
+        self.assertNotIn("error", narrative.lower())
+        dm.summarize_adventure(["T1 Player: look around"], 'scene')
+        dm.get_initial_scene_description() # Prefetch priority unless the player is waiting for it
+        dm.get_initial_scene_description(PRIORITY_INTERACTIVE)
+
+        calls = [(c.args[0], c.args[1]) for c in scheduler.acquire.call_args_list + scheduler.acquire_async.call_args_list]
+        self.assertEqual(sorted(calls), sorted([('slot-1', PRIORITY_INTERACTIVE), ('slot-1', PRIORITY_BACKGROUND),
+                                                ('slot-1', PRIORITY_INTERACTIVE), ('slot-1', PRIORITY_PREFETCH),
+                                                ('slot-1', PRIORITY_INTERACTIVE)]))
+        self.assertGreater(scheduler.acquire.call_args_list[0].args[2], 0) # Tokens charged for prompt and reply
+
+        failing_model = MagicMock()
+        failing_model.generate_content.side_effect = google_exceptions.ServiceUnavailable("busy")
+        dm.turn_model = failing_model
+        scheduler.acquire.reset_mock()
+        dm.get_ai_response(player, "wait")
+        self.assertEqual(scheduler.acquire.call_count, 2)
+
+    @patch('builtins.print')
+    def test_model_router_picks_tier_per_turn(self, mock_print):
+        """Tests that turns use their tier's model, each model is built once, and calls are recorded per tier."""
+        backend = MockLLMBackend()
+        router = ModelRouter()
+        with patch.object(backend, 'create_model', wraps=backend.create_model) as create_model:
+            dm = AIDungeonMaster(backend=backend, model_router=router)
+            player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+            dm.get_ai_response(player, "look around")
+            dm.get_ai_response(player, "attack the asura")
+            dm.get_ai_response(player, "go north")
+            dm.summarize_adventure(["T1 Player: look around"], 'scene')
+
+        turn_models = [call.kwargs['model_name'] for call in create_model.call_args_list
+                       if call.kwargs.get('system_instruction')]
+        self.assertEqual(turn_models, ['gemini-2.0-flash-lite', 'gemini-2.0-flash'])
+        routes = {row['tier']: row['routes'] for row in router.stats()}
+        self.assertEqual(routes, {'fast': {'turn:simple': 2, 'summary': 1}, 'strong': {'turn:complex': 1}})
+        self.assertTrue(all(row['cost_usd'] > 0 for row in router.stats()))
+
 if __name__ == '__main__':
     unittest.main()
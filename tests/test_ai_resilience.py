@@ -0,0 +1,174 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from google.api_core import exceptions as google_exceptions
+from game_engine.ai_resilience import (
+    RetryPolicy, CircuitBreaker, LatencyTracker, ResilientCaller, CircuitOpenError
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAIResilience(unittest.TestCase):
+    """
+    Test suite for the retry, circuit breaker and hedging helpers in ai_resilience.
+    """
+
+    def setUp(self):
+        self.sleeps = []
+        self.caller = ResilientCaller(retry_policy=RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=1.0),
+                                      sleep=self.sleeps.append, rng=random.Random(7))
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Tests that delays stay within the exponential envelope and the cap."""
+        policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+        rng = random.Random(1)
+        for attempt, ceiling in [(0, 0.5), (1, 1.0), (2, 2.0), (6, 2.0)]:
+            delays = [policy.delay(attempt, rng) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_transient_errors_are_retried(self):
+        """Tests that a blip is retried with backoff and the call succeeds."""
+        outcomes = [google_exceptions.ServiceUnavailable("blip"), ConnectionError("reset"), "ok"]
+
+        def operation():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with patch('builtins.print'):
+            self.assertEqual(self.caller.call(operation), "ok")
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.caller.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_permanent_errors_are_not_retried(self):
+        """Tests that a bad request fails immediately."""
+        calls = []
+
+        def operation():
+            calls.append(1)
+            raise google_exceptions.InvalidArgument("bad prompt")
+
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            self.caller.call(operation)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_circuit_opens_fails_fast_and_recovers(self):
+        """Tests the closed -> open -> half-open -> closed cycle."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        caller = ResilientCaller(retry_policy=RetryPolicy(max_attempts=1), breaker=breaker)
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise google_exceptions.ServiceUnavailable("down")
+
+        with patch('builtins.print'):
+            for _ in range(2):
+                with self.assertRaises(google_exceptions.ServiceUnavailable):
+                    caller.call(failing)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            caller.call(failing)
+        self.assertEqual(len(calls), 2) # Upstream was not called while open
+
+        clock.now = 10
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(caller.call(lambda: "recovered"), "recovered")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_cancelled_trial_does_not_keep_the_circuit_open(self):
+        """Tests that a half-open trial cut off by a deadline lets the next call through as the trial."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        caller = ResilientCaller(retry_policy=RetryPolicy(max_attempts=1), breaker=breaker)
+
+        async def failing():
+            raise google_exceptions.ServiceUnavailable("down")
+
+        async def hanging():
+            await asyncio.sleep(10)
+
+        async def recovered():
+            return "recovered"
+
+        async def scenario():
+            with patch('builtins.print'):
+                with self.assertRaises(google_exceptions.ServiceUnavailable):
+                    await caller.call_async(failing)
+            clock.now = 10
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(caller.call_async(hanging), 0.01)
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            return await caller.call_async(recovered)
+
+        self.assertEqual(asyncio.run(scenario()), "recovered")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_hedged_request_wins_over_slow_one(self):
+        """Tests that a backup request is sent after the hedge delay and the first answer wins."""
+        latency = LatencyTracker(min_samples=1000, default_delay=0.05)
+        caller = ResilientCaller(hedge=True, latency=latency)
+        first_call = threading.Event()
+
+        def operation():
+            if not first_call.is_set():
+                first_call.set()
+                time.sleep(1.0) # The degraded first request
+                return "slow"
+            return "fast"
+
+        started = time.monotonic()
+        with patch('builtins.print'):
+            self.assertEqual(caller.call(operation), "fast")
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_async_hedge_cancels_the_loser(self):
+        """Tests async hedging: the slow request is cancelled once the hedge answers."""
+        caller = ResilientCaller(hedge=True, latency=LatencyTracker(min_samples=1000, default_delay=0.02))
+        cancelled = []
+        attempts = []
+
+        async def operation():
+            attempts.append(1)
+            if len(attempts) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+            return "hedged"
+
+        with patch('builtins.print'):
+            self.assertEqual(asyncio.run(caller.call_async(lambda: operation())), "hedged")
+        self.assertEqual(cancelled, [True])
+
+    def test_latency_tracker_uses_p95_after_warmup(self):
+        """Tests the hedge delay derived from recorded latencies."""
+        latency = LatencyTracker(min_samples=20, default_delay=3.0)
+        self.assertEqual(latency.hedge_delay(), 3.0)
+        for millis in range(1, 101):
+            latency.record(millis / 1000)
+        self.assertAlmostEqual(latency.hedge_delay(), 0.096)
+
+if __name__ == '__main__':
+    unittest.main()
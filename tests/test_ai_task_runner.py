@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import CancelledError
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.ai_task_runner import AITaskRunner
+
+
+class TestAITaskRunner(unittest.TestCase):
+    """
+    Test suite for the AITaskRunner class.
+    """
+
+    def setUp(self):
+        self.runner = AITaskRunner()
+
+    def tearDown(self):
+        self.runner.close()
+
+    def test_newer_task_cancels_in_flight_task_of_same_session(self):
+        """Tests that only the session's latest task survives, and other sessions are untouched."""
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        async def slow_turn():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def answer(text):
+            return text
+
+        first = self.runner.submit(1, slow_turn())
+        other_session = self.runner.submit(2, answer("other player"))
+        self.assertTrue(started.wait(5))
+        self.assertEqual(self.runner.run(1, answer("newer command")), "newer command")
+        with self.assertRaises(CancelledError):
+            first.result(5)
+        self.assertTrue(cancelled.wait(5)) # The coroutine itself saw the cancellation
+        self.assertEqual(other_session.result(5), "other player")
+        self.assertEqual(self.runner.in_flight(), 0)
+
+    def test_run_waits_through_idle_callback(self):
+        """Tests that run() polls with the idle callback instead of blocking."""
+        idle_calls = []
+
+        async def turn():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        result = self.runner.run("session", turn(), idle=idle_calls.append, poll_interval=0.01)
+        self.assertEqual(result, "done")
+        self.assertTrue(idle_calls)
+        self.assertTrue(all(seconds == 0.01 for seconds in idle_calls))
+
+    def test_close_cancels_tasks_and_rejects_new_ones(self):
+        """Tests shutdown of the shared loop."""
+        future = self.runner.submit(1, asyncio.sleep(60))
+        self.runner.close()
+        self.assertTrue(future.cancelled())
+        coroutine = asyncio.sleep(0)
+        with self.assertRaises(RuntimeError):
+            self.runner.submit(1, coroutine)
+
+if __name__ == '__main__':
+    unittest.main()
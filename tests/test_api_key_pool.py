@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import asyncio
+import os
+import sys
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from google.api_core import exceptions as google_exceptions
+from game_engine.api_key_pool import (ApiKeyPool, KeyPoolBackend, gemini_backend_for_keys, parse_api_keys)
+from game_engine.ai_resilience import ResilientCaller, RetryPolicy
+from game_engine.llm_backends import GeminiBackend, MockLLMBackend
+from game_engine.request_scheduler import get_request_scheduler
+
+
+class TestApiKeyPool(unittest.TestCase):
+    """
+    Test suite for ApiKeyPool and KeyPoolBackend.
+    """
+
+    def setUp(self):
+        self.now = [0.0]
+        self.backends = [MockLLMBackend(seed=index) for index in range(3)]
+        self.pool = ApiKeyPool(self.backends, quarantine_seconds=10, max_quarantine_seconds=30,
+                               clock=lambda: self.now[0])
+
+    def test_routes_to_least_loaded_key(self):
+        """Tests that concurrent requests spread over the keys and a busy key is passed over."""
+        first, second, third = self.pool.acquire(), self.pool.acquire(), self.pool.acquire()
+        self.assertEqual(sorted(key.index for key in (first, second, third)), [0, 1, 2])
+        self.pool.release(second)
+        self.assertIs(self.pool.acquire(), second)
+
+    @patch('builtins.print')
+    def test_quota_errors_quarantine_key_with_backoff(self, mock_print):
+        """Tests that a key out of quota leaves rotation, longer each time, and returns once rested."""
+        key = self.pool.acquire()
+        self.pool.release(key, google_exceptions.ResourceExhausted("quota"))
+        self.assertNotIn(key, [self.pool.acquire() for _ in range(4)])
+        self.assertIn("resting it for 10s (2 of 3 keys in rotation)", mock_print.call_args[0][0])
+
+        self.now[0] = 10.0
+        self.assertEqual(self.pool.stats()[key.index]['quarantined_for'], 0)
+        self.pool.acquire()
+        self.pool.release(key, google_exceptions.TooManyRequests("again"))
+        self.assertIn("resting it for 20s", mock_print.call_args[0][0])
+
+        self.pool.release(key) # A success resets the backoff
+        self.assertEqual(key.consecutive_quota_errors, 0)
+
+    @patch('builtins.print')
+    def test_retry_moves_request_to_another_key(self, mock_print):
+        """Tests that a quota error on one key is retried on a healthy one, for plain and streamed calls."""
+        self.backends[0].create_model = MagicMock()
+        exhausted_model = self.backends[0].create_model.return_value
+        exhausted_model.generate_content.side_effect = google_exceptions.ResourceExhausted("quota")
+        model = KeyPoolBackend(self.pool).create_model()
+        caller = ResilientCaller(retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+
+        response = caller.call(lambda: model.generate_content("Player: look"))
+        self.assertTrue(response.text)
+        self.assertEqual(exhausted_model.generate_content.call_count, 1)
+
+        chunks = list(model.generate_content("Player: listen", stream=True))
+        streamed = asyncio.run(self._collect_async(model))
+        self.assertTrue(chunks and streamed)
+        self.assertEqual([key.in_flight for key in self.pool.keys], [0, 0, 0])
+        self.assertEqual(self.pool.keys[0].requests, 1)
+
+    @staticmethod
+    async def _collect_async(model):
+        response = await model.generate_content_async("Player: run", stream=True)
+        return [chunk async for chunk in response]
+
+    def test_each_key_tracks_its_own_quota(self):
+        """Tests that a key without tokens left is passed over and the shared scheduler scales with the pool."""
+        pool = ApiKeyPool(self.backends[:2], requests_per_minute=10, tokens_per_minute=1000, clock=lambda: self.now[0])
+        for tokens in (900, 10):
+            pool.release(pool.acquire(tokens))
+        self.assertEqual([row['tokens_available'] for row in pool.stats()], [100, 990])
+        self.assertEqual(pool.acquire(500).index, 1) # Key 0 is the least loaded but only has 100 tokens left
+        self.now[0] = 60.0
+        self.assertEqual([row['tokens_available'] for row in pool.stats()], [1000, 1000])
+
+        with patch.dict(os.environ, {'GOOGLE_API_KEY': 'key-a,key-b,key-c', 'AI_REQUESTS_PER_MINUTE': '20'}), \
+             patch('game_engine.request_scheduler._shared_scheduler', None):
+            scheduler = get_request_scheduler()
+            self.assertEqual(scheduler.requests.capacity, 60)
+            scheduler.close()
+
+    @patch.dict('game_engine.api_key_pool._shared_pools', clear=True)
+    @patch('game_engine.llm_backends.glm')
+    @patch('game_engine.llm_backends.genai')
+    def test_gemini_keys_get_their_own_clients(self, mock_genai, mock_glm):
+        """Tests that several keys build a pool whose requests use per-key clients, not the global configuration."""
+        self.assertEqual(parse_api_keys(" key-a, key-b,,key-a "), ["key-a", "key-b"])
+        self.assertIsInstance(gemini_backend_for_keys("key-single"), GeminiBackend)
+        mock_genai.configure.assert_called_once_with(api_key="key-single")
+
+        backend = gemini_backend_for_keys("key-a,key-b")
+        self.assertIsInstance(backend, KeyPoolBackend)
+        self.assertIs(gemini_backend_for_keys(["key-a", "key-b"]), backend) # Shared by every session
+        self.assertEqual(mock_genai.configure.call_count, 1)
+
+        backend.create_model().generate_content("Player: look")
+        mock_glm.GenerativeServiceClient.assert_called_once_with(client_options={'api_key': 'key-a'})
+        self.assertIs(mock_genai.GenerativeModel.return_value._client, mock_glm.GenerativeServiceClient.return_value)
+        with self.assertRaises(NotImplementedError):
+            backend.create_cached_model("instructions", 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,8 @@ import os
 # This assumes the tests directory is one level down from the project root
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from game_engine.character_manager import Player
+from game_engine.character_manager import Player, PERSISTED_FIELDS
+from game_engine.common_types import AdventureLogEntry
 
 class TestPlayer(unittest.TestCase):
     """
@@ -95,6 +96,40 @@ class TestPlayer(unittest.TestCase):
                          "inventory=[], skills=['Meditate', 'Power Attack'])")
         self.assertEqual(repr(player), expected_repr, "__repr__ output with default skills/inventory is not as expected.")
 
+    def test_new_player_reports_all_fields_dirty(self):
+        """A player that was never persisted reports every persisted field as dirty."""
+        player = Player(player_id=6, name="Novice", hp=10, max_hp=10, mp=5, max_mp=5)
+        self.assertFalse(player.is_persisted())
+        self.assertEqual(player.get_dirty_fields(), set(PERSISTED_FIELDS))
+
+    def test_dirty_fields_track_changes_since_mark_persisted(self):
+        """Assignments and in-place container changes after mark_persisted are reported."""
+        player = Player(player_id=7, name="Scout", hp=40, max_hp=40, mp=10, max_mp=10)
+        player.mark_persisted()
+        self.assertFalse(player.is_dirty())
+
+        player.hp -= 5
+        player.inventory.append("rope")
+        player.story_flags["met_guide"] = True
+        self.assertEqual(player.get_dirty_fields(), {"hp", "inventory", "story_flags"})
+
+        player.mark_persisted()
+        self.assertEqual(player.get_dirty_fields(), set())
+
+    def test_reassigning_same_value_is_not_dirty(self):
+        """Re-assigning an equal value (e.g. clamping HP) does not mark the field dirty."""
+        player = Player(player_id=8, name="Guard", hp=40, max_hp=40, mp=10, max_mp=10)
+        player.mark_persisted()
+        player.hp = max(0, min(player.hp + 10, player.max_hp))
+        self.assertFalse(player.is_dirty())
+
+    def test_adventure_log_append_is_dirty(self):
+        """Appending to the adventure log marks it dirty."""
+        player = Player(player_id=9, name="Bard", hp=30, max_hp=30, mp=30, max_mp=30)
+        player.mark_persisted()
+        player.adventure_log.entries.append(AdventureLogEntry(type="player_action", content="sing", turn_number=1))
+        self.assertEqual(player.get_dirty_fields(), {"adventure_log"})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.command_router import default_command_router
+from game_engine.character_manager import Player
+
+
+class TestCommandRouter(unittest.TestCase):
+    """
+    Test suite for the CommandRouter class and the built-in local commands.
+    """
+
+    def setUp(self):
+        self.router = default_command_router()
+        self.player = Player(player_id=1, name="Veera", hp=80, max_hp=100, mp=30, max_mp=50)
+        self.player.current_location = "Kurukshetra - Battlefield Edge"
+        self.player.inventory = ["a simple dagger", "a healing herb"]
+        self.ui = MagicMock()
+
+    def shown_lines(self):
+        return [c.args[0] for c in self.ui.add_story_text.call_args_list]
+
+    def test_state_queries_match_whole_phrases(self):
+        """Tests that queries match regardless of case, spacing and trailing punctuation."""
+        for text, name in [("inventory", "inventory"), ("  INV ", "inventory"), ("Stats", "stats"),
+                           ("skills", "skills"), ("Where am I?", "where am i"), ("help", "help")]:
+            self.assertEqual(self.router.match(text).name, name, text)
+
+    def test_narrative_commands_go_to_the_ai(self):
+        """Tests that actions merely starting with a local verb are not intercepted."""
+        for text in ["help the wounded soldier", "look at my inventory closely", "attack", "", "   "]:
+            self.assertIsNone(self.router.match(text), text)
+            self.assertFalse(self.router.handle(text, self.player, self.ui))
+        self.ui.add_story_text.assert_not_called()
+
+    def test_answers_come_from_player_state(self):
+        """Tests the text of the built-in answers."""
+        self.assertTrue(self.router.handle("inventory", self.player, self.ui))
+        self.assertTrue(self.router.handle("stats", self.player, self.ui))
+        self.assertTrue(self.router.handle("where am i", self.player, self.ui))
+        self.assertEqual(self.shown_lines(), [
+            "You are carrying: a simple dagger, a healing herb.",
+            "Veera - HP: 80/100, MP: 30/50",
+            "Location: Kurukshetra - Battlefield Edge",
+            "You are at Kurukshetra - Battlefield Edge.",
+        ])
+        self.ui.update_player_display.assert_called_once_with(self.player)
+
+    def test_registered_commands_appear_in_help(self):
+        """Tests custom registrations and the generated help text."""
+        self.router.register("quests", ["quests", "journal"], lambda player, ui: ["No quests yet."], "List your quests.")
+        self.assertTrue(self.router.handle("Journal", self.player, self.ui))
+        self.assertTrue(self.router.handle("help", self.player, self.ui))
+        lines = self.shown_lines()
+        self.assertEqual(lines[0], "No quests yet.")
+        self.assertIn("inventory - List what you are carrying.", lines)
+        self.assertIn("quests - List your quests.", lines)
+
+if __name__ == '__main__':
+    unittest.main()
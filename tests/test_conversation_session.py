@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.conversation_session import ConversationSession, describe_changes, state_snapshot
+from game_engine.character_manager import Player
+from game_engine.common_types import GameStateUpdates
+from game_engine.ai_dm_interface import AIDungeonMaster
+from game_engine.llm_backends import MockLLMBackend, MockModel, prompt_text, turn_action
+from game_engine.prompt_builder import PromptBuilder, estimate_tokens
+
+
+class TestConversationSession(unittest.TestCase):
+    """
+    Test suite for delta turns, keyframes and the drift check of ConversationSession.
+    """
+
+    def setUp(self):
+        self.player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+        self.player.current_location = "Hastinapura - Palace Gates"
+        self.player.inventory = ["a simple dagger", "a healing herb", "a bronze key", "a coil of rope",
+                                 "a conch shell", "a map of Kuru lands", "a pouch of silver", "a peacock feather"]
+        self.player.story_flags = {'war_just_started': True, 'met_vidura': True, 'oath_sworn': 'Bhishma',
+                                   'bridge_burned': True, 'owes_karna': True}
+        self.session = ConversationSession(PromptBuilder(), keyframe_interval=3)
+
+    def _turn(self, action: str, reply: str = "The guards watch you. Nothing else stirs."):
+        built_prompt, contents, reason = self.session.build_turn(self.player, action)
+        self.session.complete(reply)
+        return built_prompt, contents, reason
+
+    def test_describe_changes(self):
+        """Tests the change lines between two snapshots."""
+        before = state_snapshot(self.player)
+        self.player.inventory = [item for item in self.player.inventory if item != "a coil of rope"] + ["a lotus"]
+        self.player.skills = self.player.skills + ["Archery"]
+        self.player.story_flags = {'war_just_started': True, 'oath_sworn': 'Drona', 'bridge_burned': True,
+                                   'owes_karna': True, 'gates_open': True}
+        self.assertEqual(describe_changes(before, state_snapshot(self.player)),
+                         ["learned Archery", "gained a lotus", "lost a coil of rope",
+                          "flag oath_sworn=Drona", "flag gates_open", "flag met_vidura cleared"])
+
+    def test_delta_turns_between_keyframes(self):
+        """Tests that delta turns are sent with the conversation since the keyframe, which each keyframe resets."""
+        first, contents, reason = self._turn("look around")
+        self.assertEqual(reason, "first turn")
+        self.assertIn("a coil of rope", first.text)
+        self.assertEqual(contents, [{'role': 'user', 'parts': [first.text]}])
+
+        self.player.inventory = self.player.inventory + ["a lotus"]
+        delta, contents, reason = self._turn("open the gate with the bronze key")
+        self.assertEqual(reason, "")
+        self.assertEqual(contents, [{'role': 'user', 'parts': [first.text]},
+                                    {'role': 'model', 'parts': ["The guards watch you. Nothing else stirs."]},
+                                    {'role': 'user', 'parts': [delta.text]}])
+        self.assertIn("Changes since the last message: gained a lotus.", delta.text)
+        self.assertIn("a bronze key", delta.text) # Relevant to the action
+        self.assertNotIn("a coil of rope", delta.text)
+        full_state = self.session.prompt_builder.build_turn(self.player, "open the gate with the bronze key")
+        self.assertLess(delta.tokens, full_state.tokens)
+
+        self.assertEqual(len(self._turn("wait")[1]), 5)
+        self.assertEqual(self.session.history_tokens, 0) # Nothing in flight
+        _, contents, reason = self._turn("wait")
+        self.assertEqual((reason, len(contents)), ("every 3 turns", 1))
+        self.player.current_location = "Hastinapura - Throne Room"
+        self.assertEqual(self._turn("bow to the king")[2], "new location")
+        self.assertEqual((self.session.keyframes, self.session.delta_turns), (3, 2))
+
+    def test_drift_and_failed_turns(self):
+        """Tests that a reply out of step with the player's state, or an unanswered turn, forces the full state."""
+        self._turn("look around")
+        self.session.check_reply(self.player, GameStateUpdates(inventory_remove=["a golden crown"]))
+        self.assertEqual(self._turn("wait")[2], "drift: reply removed unknown item 'a golden crown'")
+        self.session.check_reply(self.player, GameStateUpdates(skill_used="Power Attack"))
+        self.assertEqual(self._turn("wait")[2], "")
+
+        session = ConversationSession(PromptBuilder())
+        session.build_turn(self.player, "look around") # Never answered
+        self.assertEqual(session.build_turn(self.player, "look around")[2], "first turn")
+
+    @patch('builtins.print')
+    def test_ai_dm_conversation_mode(self, mock_print):
+        """Tests that the AI DM sends delta turns with the conversation so far and labels their usage."""
+        dm = AIDungeonMaster(backend=MockLLMBackend(), conversation_mode=True)
+        with patch.object(MockModel, 'generate_content', autospec=True, side_effect=MockModel.generate_content) as generate:
+            dm.get_ai_response(self.player, "look around")
+            dm.get_ai_response(self.player, "listen at the gate")
+        keyframe, delta = (call.args[1] for call in generate.call_args_list)
+        self.assertEqual([message['role'] for message in delta], ['user', 'model', 'user'])
+        self.assertEqual(delta[0], keyframe[0])
+        self.assertIn('"narrative"', delta[1]['parts'][0]) # The reply as the model sent it
+        self.assertEqual(turn_action(prompt_text(delta)), "listen at the gate")
+        self.assertGreater(dm.last_turn_usage.estimated_prompt_tokens, estimate_tokens(delta[2]['parts'][0]))
+        printed = [call.args[0] for call in mock_print.call_args_list if call.args]
+        self.assertTrue(any(line.startswith("AI DM: Turn (full state) tokens") for line in printed))
+        self.assertTrue(any(line.startswith("AI DM: Turn (delta, after 2 messages) tokens") for line in printed))
+        self.assertEqual((dm.conversation.keyframes, dm.conversation.delta_turns), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
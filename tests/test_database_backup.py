@@ -0,0 +1,103 @@
+import unittest
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.database_backup import (
+    backup_database, restore_database, snapshot, list_backups, prune_backups, main
+)
+from game_engine.persistence_service import setup_database, save_player, load_player, close_connections
+from game_engine.character_manager import Player
+
+
+class TestDatabaseBackup(unittest.TestCase):
+    """
+    Test suite for the database_backup module.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'rpg_save.db')
+        self.backup_dir = os.path.join(self.temp_dir, 'backups')
+        with patch('builtins.print'):
+            setup_database(self.db_path)
+            for player_id in range(1, 4):
+                save_player(self.db_path, Player(player_id=player_id, name=f"Hero {player_id}",
+                                                 hp=100, max_hp=100, mp=50, max_mp=50))
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def player_names(self, db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            return [row[0] for row in conn.execute("SELECT name FROM players ORDER BY id")]
+        finally:
+            conn.close()
+
+    def test_backup_copies_live_database_in_batches(self):
+        """Tests a page-batched backup taken while a pooled connection is open."""
+        progress = []
+        backup_path = backup_database(self.db_path, os.path.join(self.backup_dir, 'copy.db'),
+                                      pages=1, step_sleep=0, progress=lambda remaining, total: progress.append(remaining))
+        self.assertEqual(self.player_names(backup_path), ["Hero 1", "Hero 2", "Hero 3"])
+        self.assertGreater(len(progress), 1) # One callback per batch
+        self.assertEqual(progress[-1], 0)
+        self.assertEqual(os.listdir(self.backup_dir), ['copy.db']) # No partial files left behind
+
+    def test_compressed_backup_round_trip(self):
+        """Tests that a gzip backup restores the saved state."""
+        backup_path = backup_database(self.db_path, os.path.join(self.backup_dir, 'copy.db'), compress=True)
+        self.assertTrue(backup_path.endswith('.db.gz'))
+        with gzip.open(backup_path, 'rb') as compressed_file:
+            self.assertTrue(compressed_file.read(16).startswith(b'SQLite format 3'))
+
+        with patch('builtins.print'):
+            player = load_player(self.db_path, 1)
+            player.hp = 1
+            save_player(self.db_path, player)
+        restore_database(backup_path, self.db_path)
+        # Pooled connections see the restored data without being reopened
+        self.assertEqual(load_player(self.db_path, 1).hp, 100)
+
+    def test_restore_rejects_invalid_backup(self):
+        """Tests that a file that is not a database never overwrites the save."""
+        bogus_path = os.path.join(self.temp_dir, 'bogus.db')
+        with open(bogus_path, 'wb') as bogus_file:
+            bogus_file.write(b'not a database' * 100)
+        with self.assertRaises(sqlite3.DatabaseError):
+            restore_database(bogus_path, self.db_path)
+        self.assertEqual(self.player_names(self.db_path), ["Hero 1", "Hero 2", "Hero 3"])
+
+    def test_backup_of_missing_database_fails(self):
+        """Tests that a mistyped source path raises instead of backing up a new empty database."""
+        missing_path = os.path.join(self.temp_dir, 'rpg_sav.db')
+        with self.assertRaises(FileNotFoundError):
+            backup_database(missing_path, os.path.join(self.backup_dir, 'copy.db'))
+        self.assertFalse(os.path.exists(missing_path))
+        self.assertFalse(os.path.exists(os.path.join(self.backup_dir, 'copy.db')))
+
+    def test_snapshots_are_pruned_to_keep(self):
+        """Tests timestamped snapshots and retention."""
+        paths = [snapshot(self.db_path, self.backup_dir, keep=2) for _ in range(3)]
+        self.assertEqual(list_backups(self.backup_dir), paths[1:])
+        self.assertEqual(prune_backups(self.backup_dir, 1), [paths[1]])
+
+    def test_cli_backup_and_restore_latest(self):
+        """Tests the backup and restore commands."""
+        with patch('builtins.print'):
+            self.assertEqual(main(['backup', '--db', self.db_path, '--output-dir', self.backup_dir, '--compress']), 0)
+            restored_path = os.path.join(self.temp_dir, 'restored.db')
+            self.assertEqual(main(['restore', 'latest', '--db', restored_path, '--output-dir', self.backup_dir]), 0)
+        self.assertEqual(self.player_names(restored_path), ["Hero 1", "Hero 2", "Hero 3"])
+
+if __name__ == '__main__':
+    unittest.main()
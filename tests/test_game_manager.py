@@ -1,12 +1,18 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, call
 import sys
 import os
+import asyncio
+import time
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from game_engine.game_manager import GameManager
+from game_engine.storage_backends import InMemoryBackend
+from game_engine.common_types import GameStateUpdates
+from game_engine.ai_task_runner import AITaskRunner
+from game_engine.request_scheduler import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
 # from game_engine.character_manager import Player
 # from game_engine.common_types import GameStateUpdates
 
@@ -16,19 +22,19 @@ class TestGameManagerMinimal(unittest.TestCase):
     """
 
     @patch('game_engine.game_manager.os.path.exists')
-    @patch('game_engine.game_manager.setup_database')
-    @patch('game_engine.game_manager.load_player')
+    @patch('game_engine.game_manager.SQLiteBackend')
     @patch('game_engine.game_manager.AIDungeonMaster')
     @patch('game_engine.game_manager.os.getenv') # Mock getenv
     # @patch('builtins.input') # Mock input just in case getenv mock fails
-    def test_minimal_initialization(self, mock_os_getenv, mock_aidm_class, mock_load_player, mock_setup_db, mock_os_path_exists):
+    def test_minimal_initialization(self, mock_os_getenv, mock_aidm_class, mock_sqlite_backend_class, mock_os_path_exists):
         """Tests if GameManager can be initialized with critical components mocked."""
         print("MinimalTest: Starting test_minimal_initialization...")
 
         mock_os_path_exists.return_value = True # Assume data dir exists
         mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING_MINIMAL" # Provide API key via env
 
-        mock_load_player.return_value = None # Simulate new player
+        mock_storage = mock_sqlite_backend_class.return_value
+        mock_storage.find_player_id_by_slot.return_value = None # Simulate new player
 
         mock_ai_dm_instance = MagicMock()
         mock_aidm_class.return_value = mock_ai_dm_instance
@@ -41,11 +47,226 @@ class TestGameManagerMinimal(unittest.TestCase):
             self.assertIsNotNone(gm, "GameManager instance should not be None.")
             print("MinimalTest: GameManager instantiated.")
             self.assertTrue(True) # If it reaches here, it didn't hang.
+            mock_storage.setup.assert_called_once()
+            mock_storage.find_player_id_by_slot.assert_called_once_with(1)
+            mock_storage.create_player.assert_called_once_with(gm.player)
         except Exception as e:
             print(f"MinimalTest: Exception during instantiation: {e}")
             self.fail(f"GameManager instantiation failed: {e}")
 
         print("MinimalTest: Finished test_minimal_initialization.")
 
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_initialization_with_in_memory_storage(self, mock_os_getenv, mock_aidm_class):
+        """Tests that an injected storage backend is used instead of the SQLite file."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        storage = InMemoryBackend()
+        gm = GameManager(ui_manager=MagicMock(), storage=storage)
+        self.assertIs(gm.storage, storage)
+        self.assertEqual(list(storage.iter_player_ids()), [1])
+        self.assertEqual(storage.load_player(1).name, gm.player.name)
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_initialization_selects_save_slot(self, mock_os_getenv, mock_aidm_class):
+        """Tests that each slot gets its own player and an occupied slot is loaded, not recreated."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        storage = InMemoryBackend()
+        first = GameManager(ui_manager=MagicMock(), storage=storage, slot=1)
+        first.player.hp = 42
+        first._save_player_state()
+        second = GameManager(ui_manager=MagicMock(), storage=storage, slot=2)
+        self.assertNotEqual(first.player.player_id, second.player.player_id)
+        self.assertEqual(second.player.slot, 2)
+
+        reloaded = GameManager(ui_manager=MagicMock(), storage=storage, slot=1)
+        self.assertEqual(reloaded.player.player_id, first.player.player_id)
+        self.assertEqual(reloaded.player.hp, 42)
+        self.assertEqual(len(storage.list_players()), 2)
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_streamed_narrative_is_appended_before_updates_apply(self, mock_os_getenv, mock_aidm_class):
+        """Tests that narrative fragments go to the stream channel and state updates apply afterwards."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        ui = MagicMock()
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend())
+        hp_during_stream = []
+
+        def fake_response(player_object, player_action, on_narrative_fragment=None):
+            for fragment in ("The asura ", "roars."):
+                on_narrative_fragment(fragment)
+                hp_during_stream.append(player_object.hp)
+            return "The asura roars.", GameStateUpdates(hp_change=-10)
+
+        gm.ai_dm.get_ai_response.side_effect = fake_response
+        gm.process_player_command_from_js("attack the asura")
+
+        ui.begin_story_stream.assert_called_once()
+        self.assertEqual([c.args[0] for c in ui.append_story_stream.call_args_list], ["The asura ", "roars."])
+        ui.end_story_stream.assert_called_once()
+        self.assertNotIn(call("The asura roars."), ui.add_story_text.call_args_list)
+        self.assertEqual(hp_during_stream, [100, 100])
+        self.assertEqual(gm.player.hp, 90)
+        self.assertEqual(gm.player.adventure_log.entries[-1].content, "The asura roars.")
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_unstreamed_reply_is_shown_whole(self, mock_os_getenv, mock_aidm_class):
+        """Tests the fallback when the reply yields no streamable narrative (e.g. it is not JSON)."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        ui = MagicMock()
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend())
+        gm.ai_dm.get_ai_response.return_value = ("Plain text reply.", GameStateUpdates())
+        gm.process_player_command_from_js("look")
+        ui.begin_story_stream.assert_not_called()
+        ui.add_story_text.assert_any_call("Plain text reply.")
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_newer_command_supersedes_in_flight_async_turn(self, mock_os_getenv, mock_aidm_class):
+        """Tests that a command sent while the previous turn waits on the AI cancels that turn."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        ui = MagicMock()
+        runner = AITaskRunner()
+        self.addCleanup(runner.close)
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend(), ai_runner=runner, ai_timeout=5)
+
+        async def fake_response_async(player_object, player_action, on_narrative_fragment=None, timeout=None):
+            if player_action == "wait":
+                await asyncio.sleep(60)
+            on_narrative_fragment("You ")
+            await asyncio.sleep(0)
+            on_narrative_fragment("run.")
+            return "You run.", GameStateUpdates(mp_change=-5)
+
+        gm.ai_dm.get_ai_response_async = fake_response_async
+
+        def idle_sleep(seconds):
+            # Stands in for the player sending another command while the first turn is in flight
+            ui.sleep.side_effect = lambda seconds: time.sleep(0.001)
+            gm.process_player_command_from_js("run")
+
+        ui.sleep.side_effect = idle_sleep
+        gm.process_player_command_from_js("wait")
+
+        self.assertEqual([c.args[0] for c in ui.append_story_stream.call_args_list], ["You ", "run."])
+        self.assertEqual(gm.player.mp, 45) # Only the newer turn's updates were applied
+        self.assertEqual([entry.content for entry in gm.player.adventure_log.entries],
+                         ["wait", "run", "You run."])
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_state_queries_skip_the_ai(self, mock_os_getenv, mock_aidm_class):
+        """Tests that local commands are answered without an AI call or a new turn."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        ui = MagicMock()
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend())
+        gm.process_player_command_from_js("Inventory")
+        gm.ai_dm.get_ai_response.assert_not_called()
+        ui.add_story_text.assert_any_call("You are carrying: a simple dagger, a healing herb.", 'command_response')
+        self.assertEqual(gm.turn_number, 0)
+        self.assertEqual(gm.player.adventure_log.entries, [])
+
+        gm.ai_dm.get_ai_response.return_value = ("You check the straps of your pack.", GameStateUpdates())
+        gm.process_player_command_from_js("check my inventory for holes")
+        gm.ai_dm.get_ai_response.assert_called_once()
+        self.assertEqual(gm.turn_number, 1)
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_trimmed_log_entries_go_to_memory(self, mock_os_getenv, mock_aidm_class):
+        """Tests that entries trimmed from the adventure log are handed to the memory keeper."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        keeper = MagicMock()
+        gm = GameManager(ui_manager=MagicMock(), storage=InMemoryBackend(), memory_keeper=keeper, stream_narrative=False)
+        gm.ai_dm.get_ai_response.return_value = ("Dust swirls.", GameStateUpdates())
+        for turn in range(6):
+            gm.process_player_command_from_js(f"step {turn}")
+
+        self.assertEqual(len(gm.player.adventure_log.entries), 10)
+        evicted = [entry for c in keeper.remember.call_args_list for entry in c.args[1]]
+        self.assertEqual([entry.content for entry in evicted], ["step 0", "Dust swirls."])
+        keeper.remember.assert_called_with(gm.player, evicted)
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_log_entries_trimmed_before_a_save_are_still_saved(self, mock_os_getenv, mock_aidm_class):
+        """Tests that turns trimmed from the in-memory log while unsaved reach the store on the next save."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        storage = InMemoryBackend()
+        gm = GameManager(ui_manager=MagicMock(), storage=storage, memory_keeper=MagicMock(), stream_narrative=False)
+        gm.ai_dm.get_ai_response.return_value = ("Dust swirls.", None) # No updates: the turn is not saved
+        for turn in range(9):
+            gm.process_player_command_from_js(f"step {turn}")
+        self.assertEqual(len(gm.player.adventure_log.entries), 10)
+
+        gm._save_player_state()
+        loaded = storage.load_player(gm.player.player_id, max_log_entries=100)
+        self.assertEqual([entry.turn_number for entry in loaded.adventure_log.entries if entry.type == 'player_action'],
+                         list(range(1, 10)))
+        self.assertEqual(gm.player.get_unsaved_log_entries(), [])
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_opening_scene_is_prefetched_before_js_ready(self, mock_os_getenv, mock_aidm_class):
+        """Tests that the opening scene is requested during construction and shown when JS is ready."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        mock_aidm_class.return_value.get_initial_scene_description.return_value = "The conch sounds."
+        ui = MagicMock()
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend())
+        gm._opening_scene.result(timeout=5) # Fetched before the UI asked for it
+
+        gm.initialize_game_state_and_ui()
+        gm.ai_dm.get_initial_scene_description.assert_called_once_with(PRIORITY_PREFETCH)
+        ui.add_story_text.assert_any_call("The conch sounds.")
+        self.assertIsNone(gm._opening_scene)
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_opening_scene_without_prefetch_is_interactive(self, mock_os_getenv, mock_aidm_class):
+        """Tests that a scene fetched while the UI waits is not queued behind other sessions' turns."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        mock_aidm_class.return_value.get_initial_scene_description.return_value = "The conch sounds."
+        gm = GameManager(ui_manager=MagicMock(), storage=InMemoryBackend(), prefetch_opening_scene=False)
+        gm.initialize_game_state_and_ui()
+        gm.ai_dm.get_initial_scene_description.assert_called_once_with(PRIORITY_INTERACTIVE)
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_failed_prefetch_falls_back_to_direct_fetch(self, mock_os_getenv, mock_aidm_class):
+        """Tests that the scene is fetched again when JS is ready if the prefetch raised."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        mock_aidm_class.return_value.get_initial_scene_description.side_effect = [RuntimeError("boom"), "Dawn breaks."]
+        ui = MagicMock()
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend())
+        gm.initialize_game_state_and_ui()
+        self.assertEqual(gm.ai_dm.get_initial_scene_description.call_count, 2)
+        ui.add_story_text.assert_any_call("Dawn breaks.")
+
+    @patch('game_engine.game_manager.AIDungeonMaster')
+    @patch('game_engine.game_manager.os.getenv')
+    def test_prefetch_runs_on_ai_runner(self, mock_os_getenv, mock_aidm_class):
+        """Tests that with an AI runner the prefetch uses the async client and is awaited cooperatively."""
+        mock_os_getenv.return_value = "FAKE_API_KEY_FOR_TESTING"
+        runner = AITaskRunner()
+        self.addCleanup(runner.close)
+        release = asyncio.Event()
+
+        async def fake_scene_async(timeout=None):
+            await asyncio.wait_for(release.wait(), 5)
+            return "Chariots gather."
+
+        mock_aidm_class.return_value.get_initial_scene_description_async = fake_scene_async
+        ui = MagicMock()
+        ui.sleep.side_effect = lambda seconds: runner._loop.call_soon_threadsafe(release.set)
+        gm = GameManager(ui_manager=ui, storage=InMemoryBackend(), ai_runner=runner)
+        gm.initialize_game_state_and_ui()
+
+        ui.sleep.assert_called() # Waited for the in-flight prefetch instead of fetching again
+        gm.ai_dm.get_initial_scene_description.assert_not_called()
+        ui.add_story_text.assert_any_call("Chariots gather.")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import asyncio
+import json
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import google.ai.generativelanguage as glm
+
+from game_engine.llm_backends import (MockLLMBackend, GeminiBackend, _OwnClientModel, fixed_latency, lognormal_latency,
+                                      llm_backend_from_env)
+from game_engine.ai_dm_interface import AIDungeonMaster, build_turn_prompt
+from game_engine.character_manager import Player
+from game_engine.common_types import GameStateUpdates
+
+
+class TestMockLLMBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+
+    def test_turn_replies_are_deterministic_and_schema_valid(self):
+        """Tests that turn prompts get valid JSON updates and the same prompt the same reply."""
+        backend = MockLLMBackend(seed=3)
+        model = backend.create_model()
+        for action in ("attack the asura", "look around", "pray at the shrine", "flee"):
+            prompt = build_turn_prompt(self.player, action)
+            reply = model.generate_content(prompt)
+            data = json.loads(reply.text)
+            self.assertIn(action, data["narrative"])
+            GameStateUpdates(**data["game_state_updates"])
+            self.assertEqual(model.generate_content(prompt).text, reply.text)
+            self.assertGreater(reply.usage_metadata.prompt_token_count, 0)
+        self.assertNotEqual(MockLLMBackend(seed=4).reply_text(prompt), backend.reply_text(prompt))
+
+    def test_streams_split_latency_across_chunks(self):
+        """Tests that a streamed reply arrives in chunk_size pieces, paced by the latency model."""
+        sleeps = []
+        backend = MockLLMBackend(latency=fixed_latency(0.4), chunk_size=10, sleep=sleeps.append)
+        chunks = list(backend.create_model().generate_content("Describe the scene.", stream=True))
+        self.assertEqual("".join(chunk.text for chunk in chunks), backend.reply_text("Describe the scene."))
+        self.assertTrue(all(len(chunk.text) <= 10 for chunk in chunks))
+        self.assertIsNotNone(chunks[-1].usage_metadata)
+        self.assertAlmostEqual(sum(sleeps), 0.4)
+        self.assertEqual(len(sleeps), len(chunks))
+
+    def test_latency_sequence_is_seeded(self):
+        """Tests that the same seed replays the same latency distribution."""
+        first = MockLLMBackend(latency=lognormal_latency(0.2), seed=11)
+        second = MockLLMBackend(latency=lognormal_latency(0.2), seed=11)
+        self.assertEqual([first.next_latency() for _ in range(5)], [second.next_latency() for _ in range(5)])
+        self.assertEqual(first.calls, 5)
+
+    @patch('builtins.print')
+    def test_dungeon_master_runs_without_network(self, mock_print):
+        """Tests sync, streamed and async turns through AIDungeonMaster on the mock engine."""
+        dm = AIDungeonMaster(backend=MockLLMBackend(chunk_size=8))
+        narrative, updates = dm.get_ai_response(self.player, "search the ruins")
+        self.assertIn("search the ruins", narrative)
+        fragments = []
+        streamed, _ = dm.get_ai_response(self.player, "search the ruins", on_narrative_fragment=fragments.append)
+        self.assertEqual("".join(fragments), streamed)
+        async_narrative, _ = asyncio.run(dm.get_ai_response_async(self.player, "search the ruins", timeout=5))
+        self.assertEqual(async_narrative, narrative)
+        self.assertTrue(dm.get_initial_scene_description())
+        self.assertEqual(dm.last_turn_usage.prompt_tokens, dm.last_turn_usage.estimated_prompt_tokens)
+
+    @patch('game_engine.llm_backends.os.getenv')
+    def test_backend_selected_from_env(self, mock_getenv):
+        """Tests that AI_BACKEND=mock selects the local engine and anything else the default."""
+        mock_getenv.side_effect = lambda name, default=None: {"AI_BACKEND": "mock", "AI_MOCK_LATENCY": "0.5"}.get(name, default)
+        backend = llm_backend_from_env()
+        self.assertIsInstance(backend, MockLLMBackend)
+        self.assertGreater(backend.next_latency(), 0)
+        mock_getenv.side_effect = lambda name, default=None: default
+        self.assertIsNone(llm_backend_from_env())
+
+class TestGeminiOwnClient(unittest.TestCase):
+    """
+    Runs the installed google-generativeai SDK (no network) to check that per-key clients are
+    still honoured; this fails if an SDK upgrade renames the private client attributes.
+    """
+
+    def test_requests_use_the_keys_own_clients(self):
+        backend = GeminiBackend(api_key="test-key", own_client=True)
+        model = backend.create_model(system_instruction="You are the DM.")
+        service_client = MagicMock()
+        service_client.generate_content.return_value = glm.GenerateContentResponse(
+            candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text="The conch sounds.")]))])
+        with patch.object(backend, 'client', return_value=service_client) as client:
+            reply = model.generate_content("look around")
+        client.assert_called_with('sync')
+        self.assertEqual(reply.text, "The conch sounds.")
+        request = service_client.generate_content.call_args.args[0]
+        self.assertEqual(request.contents[0].parts[0].text, "look around")
+
+    def test_sdk_without_client_attributes_is_rejected(self):
+        with self.assertRaises(RuntimeError):
+            _OwnClientModel(GeminiBackend(api_key="test-key", own_client=True), object())
+
+if __name__ == '__main__':
+    unittest.main()
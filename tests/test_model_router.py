@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.model_router import (ModelRouter, classify_turn, parse_policy, DEFAULT_TIERS, FAST, STRONG,
+                                      SIMPLE, STANDARD, COMPLEX)
+from game_engine.character_manager import Player
+from game_engine.common_types import AdventureLogEntry
+
+
+class TestModelRouter(unittest.TestCase):
+    """
+    Test suite for turn classification and the ModelRouter.
+    """
+
+    def setUp(self):
+        self.player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+
+    def test_classify_turn(self):
+        """Tests the heuristics over the parsed action and the player's state."""
+        self.assertEqual(classify_turn(self.player, "  Look AROUND ")[0], SIMPLE)
+        self.assertEqual(classify_turn(self.player, "go north")[0], SIMPLE)
+        self.assertEqual(classify_turn(self.player, "ask the sage about the war")[0], STANDARD)
+        self.assertEqual(classify_turn(self.player, "attack the rakshasa"), (COMPLEX, ["command 'attack'"]))
+        self.assertIn("uses a skill", classify_turn(self.player, "I try Power Attack on the gate")[1])
+        self.assertIn("multi-step action", classify_turn(self.player, "draw my bow then climb the ridge quickly")[1])
+
+        self.player.hp = 20
+        self.assertEqual(classify_turn(self.player, "look around"), (COMPLEX, ["low HP"]))
+        self.player.hp = 90
+        self.player.adventure_log.entries.append(AdventureLogEntry(turn_number=1, type='ai_output',
+                                                                   content="An asura lunges, its blade raised."))
+        self.assertEqual(classify_turn(self.player, "look around"), (COMPLEX, ["in combat"]))
+
+    @patch('builtins.print')
+    def test_policy_and_per_tier_stats(self, mock_print):
+        """Tests policy overrides and that latency, tokens and cost are recorded per tier."""
+        router = ModelRouter(policy=parse_policy("turn:standard=strong, scene=huge"))
+        self.assertIn("unknown tier", mock_print.call_args[0][0])
+        self.assertEqual(router.route_turn(self.player, "go north").tier, DEFAULT_TIERS[FAST])
+        self.assertEqual(router.route_turn(self.player, "sing a song").tier.name, STRONG)
+        self.assertEqual(router.route('scene').tier.name, FAST)
+        self.assertEqual(router.route('other').tier.name, FAST)
+
+        decision = router.route_turn(self.player, "attack the rakshasa")
+        router.record(decision, 200_000_000, prompt_tokens=1000, response_tokens=100)
+        router.record(decision, 400_000_000, prompt_tokens=1000, response_tokens=100)
+        (row,) = router.stats()
+        self.assertEqual((row['tier'], row['count'], row['routes']), (STRONG, 2, {'turn:complex': 2}))
+        self.assertAlmostEqual(row['cost_usd'], 2 * (1000 * 0.10 + 100 * 0.40) / 1e6)
+        self.assertEqual((row['p50_ms'], row['p95_ms']), (200.0, 400.0))
+        self.assertIn("strong (gemini-2.0-flash): 2 calls", router.report())
+
+    def test_from_env(self):
+        """Tests routing configuration from the environment."""
+        with patch.dict(os.environ, {"AI_MODEL_ROUTING": "off"}):
+            self.assertIsNone(ModelRouter.from_env())
+        with patch.dict(os.environ, {"AI_MODEL_ROUTING": "summary=strong", "AI_STRONG_MODEL": "gemini-1.5-pro"}):
+            router = ModelRouter.from_env()
+        self.assertEqual(router.route('summary').model_name, "gemini-1.5-pro")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import json
+import os
+import sys
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.narrative_stream import NarrativeStreamParser
+
+
+class TestNarrativeStreamParser(unittest.TestCase):
+    """
+    Test suite for the NarrativeStreamParser class.
+    """
+
+    def feed_in_chunks(self, text, chunk_size):
+        parser = NarrativeStreamParser()
+        fragments = [parser.feed(text[index:index + chunk_size]) for index in range(0, len(text), chunk_size)]
+        return parser, fragments
+
+    def test_narrative_is_decoded_for_any_chunking(self):
+        """Tests that escapes, unicode and surrogate pairs split across chunks decode correctly."""
+        narrative = 'He says "halt!"\nThe path \\ splits. Ōm \U0001F525 done'
+        reply = json.dumps({"narrative": narrative, "game_state_updates": {"hp_change": -5}})
+        for chunk_size in (1, 2, 3, 5, 8, len(reply)):
+            parser, fragments = self.feed_in_chunks(reply, chunk_size)
+            self.assertEqual("".join(fragments), narrative, f"chunk size {chunk_size}")
+            self.assertTrue(parser.narrative_complete)
+            self.assertEqual(parser.text, reply)
+
+    def test_narrative_streams_before_reply_is_complete(self):
+        """Tests that text is returned as soon as it arrives, before the closing quote."""
+        parser = NarrativeStreamParser()
+        self.assertEqual(parser.feed('```json\n{"narrative": "You ent'), "You ent")
+        self.assertFalse(parser.narrative_complete)
+        self.assertEqual(parser.feed('er the grove.", "game_state_updates": {}}\n```'), "er the grove.")
+        self.assertEqual(parser.narrative, "You enter the grove.")
+
+    def test_other_keys_and_nested_narratives_are_skipped(self):
+        """Tests that only the top-level narrative value is streamed."""
+        reply = json.dumps({
+            "game_state_updates": {"narrative": "nested", "new_story_flags": {"a": "}\\"}},
+            "note": "narrative",
+            "narrative": "top level",
+        })
+        parser, fragments = self.feed_in_chunks(reply, 4)
+        self.assertEqual("".join(fragments), "top level")
+
+    def test_non_json_reply_streams_nothing(self):
+        """Tests that plain text replies yield no fragments."""
+        parser, fragments = self.feed_in_chunks("The AI forgot to use JSON.", 3)
+        self.assertEqual("".join(fragments), "")
+        self.assertFalse(parser.narrative_complete)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.persistence_benchmark import (
+    make_synthetic_player, run_benchmarks, summarize, main, SIZE_PROFILES
+)
+import random
+
+
+class TestPersistenceBenchmark(unittest.TestCase):
+    """
+    Test suite for the persistence_benchmark module.
+    """
+
+    def test_synthetic_player_matches_profile(self):
+        """Tests that generated players have the requested state sizes."""
+        profile = SIZE_PROFILES['medium']
+        player = make_synthetic_player(7, profile, random.Random(0))
+        self.assertEqual(len(player.inventory), profile['inventory'])
+        self.assertEqual(len(player.story_flags), profile['story_flags'])
+        self.assertEqual(len(player.adventure_log.entries), profile['log_entries'])
+
+    def test_summarize_percentiles(self):
+        """Tests latency percentiles and throughput on known samples."""
+        summary = summarize('load', 'memory', 'small', [1_000_000 * value for value in range(1, 101)])
+        self.assertEqual(summary['count'], 100)
+        self.assertAlmostEqual(summary['p50_ms'], 51.0)
+        self.assertAlmostEqual(summary['p99_ms'], 99.0)
+        self.assertAlmostEqual(summary['ops_per_sec'], 100 / 5.05)
+
+    def test_run_benchmarks_reports_every_operation(self):
+        """Tests that each mode reports insert, update, flush and load results."""
+        report = run_benchmarks(modes=['memory', 'sqlite'], sizes=['small'], iterations=3, load_window=4)
+        operations = {(row['mode'], row['operation']) for row in report['results']}
+        for mode in ('memory', 'sqlite'):
+            for operation in ('insert', 'update_full', 'update_delta', 'flush', 'load'):
+                self.assertIn((mode, operation), operations)
+        self.assertIn(('n/a', 'serialize'), operations)
+        self.assertEqual(report['load_window'], 4)
+
+    def test_main_writes_json_results(self):
+        """Tests the command line entry point's machine-readable output."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, 'results.json')
+            with patch('builtins.print'):
+                main(['--modes', 'memory', '--sizes', 'small', '--iterations', '2', '--output', output_path])
+            with open(output_path, encoding='utf-8') as output_file:
+                report = json.load(output_file)
+        self.assertEqual(report['iterations'], 2)
+        self.assertTrue(all(row['mode'] in ('memory', 'n/a') for row in report['results']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,19 @@
 import unittest
 import sqlite3
+from unittest.mock import patch
 import os
 import sys
 
 # Add the parent directory to the Python path to allow importing from game_engine
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from game_engine.persistence_service import setup_database, save_player, load_player
+from game_engine.persistence_service import (
+    setup_database, save_player, save_player_changes, load_player, load_adventure_log_history,
+    close_connections, ConnectionManager, WriteBehindWriter, get_connection_manager,
+    find_player_id_by_slot, find_player_ids_by_name, list_players
+)
 from game_engine.character_manager import Player # Import Player class
+from game_engine.common_types import AdventureLog, AdventureLogEntry
 import json # Import json
 
 class TestPersistenceService(unittest.TestCase):
@@ -34,6 +40,7 @@ class TestPersistenceService(unittest.TestCase):
         Deletes any existing test database file to ensure a clean state.
         Calls setup_database with the test database path.
         """
+        close_connections(self.test_db_path) # Pooled connections must not outlive the file
         if os.path.exists(self.test_db_path):
             os.remove(self.test_db_path)
         # Call setup_database to create the database and table for each test
@@ -62,6 +69,7 @@ class TestPersistenceService(unittest.TestCase):
         Clean up resources after each test.
         Deletes the test database file.
         """
+        close_connections(self.test_db_path)
         if os.path.exists(self.test_db_path):
             os.remove(self.test_db_path)
 
@@ -71,6 +79,7 @@ class TestPersistenceService(unittest.TestCase):
         Clean up resources for the entire test class.
         Removes the test data directory if it's empty.
         """
+        close_connections()
         if os.path.exists(cls.test_db_path): # Ensure file is removed if a test fails before tearDown
              os.remove(cls.test_db_path)
         if os.path.exists(cls.data_dir) and not os.listdir(cls.data_dir):
@@ -221,5 +230,230 @@ class TestPersistenceService(unittest.TestCase):
         loaded_player = load_player(self.test_db_path, 999)
         self.assertIsNone(loaded_player, "Loaded a player with ID 999, but it should not exist.")
 
+    def test_connections_are_reused_and_use_wal(self):
+        """Tests that save/load reuse one pooled connection configured for WAL journaling."""
+        manager = ConnectionManager(max_connections_per_path=2)
+        with manager.connection(self.test_db_path) as first_conn:
+            journal_mode = first_conn.execute("PRAGMA journal_mode;").fetchone()[0]
+        with manager.connection(self.test_db_path) as second_conn:
+            self.assertIs(second_conn, first_conn, "Idle connection was not reused.")
+        manager.close()
+        self.assertEqual(journal_mode.lower(), 'wal')
+
+    def test_pool_opens_second_connection_when_first_is_busy(self):
+        """Tests that concurrent users of one path get distinct connections, up to the limit."""
+        manager = ConnectionManager(max_connections_per_path=2)
+        with manager.connection(self.test_db_path) as first_conn:
+            with manager.connection(self.test_db_path) as second_conn:
+                self.assertIsNot(first_conn, second_conn)
+        manager.close()
+
+    def test_save_and_load_after_close_connections(self):
+        """Tests that closing the pool is a clean shutdown and later calls reopen connections."""
+        player = Player(player_id=3, name="Bhima", hp=150, max_hp=150, mp=10, max_mp=10)
+        save_player(self.test_db_path, player)
+        close_connections()
+        loaded_player = load_player(self.test_db_path, 3)
+        self.assertIsNotNone(loaded_player)
+        self.assertEqual(loaded_player.name, "Bhima")
+
+    def test_save_player_changes_skips_unchanged_player(self):
+        """Tests that a loaded, unmodified player is not written again."""
+        loaded_player = load_player(self.test_db_path, 1)
+        self.assertFalse(save_player_changes(self.test_db_path, loaded_player))
+
+    def test_save_player_changes_writes_only_dirty_columns(self):
+        """Tests that a delta save updates the changed column and leaves the others alone."""
+        loaded_player = load_player(self.test_db_path, 1)
+        loaded_player.hp = 42
+
+        # Change another column behind the player's back; a delta save must not overwrite it.
+        conn = sqlite3.connect(self.test_db_path)
+        conn.execute("UPDATE players SET current_location = 'Elsewhere' WHERE id = 1")
+        conn.commit()
+        conn.close()
+
+        self.assertTrue(save_player_changes(self.test_db_path, loaded_player))
+        row = self.get_player_from_db(1)
+        self.assertEqual(row[2], 42)
+        self.assertEqual(row[6], 'Elsewhere')
+        self.assertFalse(loaded_player.is_dirty())
+
+    def test_save_player_changes_inserts_new_player(self):
+        """Tests that a never-persisted player falls back to a full insert."""
+        new_player = Player(player_id=4, name="Nakula", hp=90, max_hp=90, mp=20, max_mp=20)
+        self.assertTrue(save_player_changes(self.test_db_path, new_player))
+        self.assertIsNotNone(self.get_player_from_db(4))
+        self.assertTrue(new_player.is_persisted())
+
+    def test_full_save_is_a_single_upsert(self):
+        """Tests that saving a new and an existing player each run one players statement."""
+        statements = []
+        with get_connection_manager().connection(self.test_db_path) as conn:
+            conn.set_trace_callback(statements.append)
+        try:
+            save_player(self.test_db_path, Player(player_id=9, name="Sahadeva", hp=80, max_hp=80, mp=10, max_mp=10))
+            save_player(self.test_db_path, load_player(self.test_db_path, 9))
+        finally:
+            with get_connection_manager().connection(self.test_db_path) as conn:
+                conn.set_trace_callback(None)
+        player_writes = [sql for sql in statements if 'players' in sql and sql.lstrip().startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(player_writes), 2)
+        self.assertTrue(all('ON CONFLICT(id) DO UPDATE' in sql for sql in player_writes))
+
+    def test_save_player_without_id_creates_player(self):
+        """Tests that SQLite assigns the ID of a player saved with player_id None."""
+        new_player = Player(player_id=None, name="Bhima", hp=120, max_hp=120, mp=5, max_mp=5, slot=3)
+        save_player(self.test_db_path, new_player)
+        self.assertEqual(new_player.player_id, 2)
+        self.assertEqual(find_player_id_by_slot(self.test_db_path, 3), 2)
+        self.assertEqual(find_player_ids_by_name(self.test_db_path, "Bhima"), [2])
+        self.assertEqual(load_player(self.test_db_path, 2).slot, 3)
+
+    def test_player_lookups_use_indexes(self):
+        """Tests that slot, name and paginated lookups are index searches, not table scans."""
+        plans = {}
+        with get_connection_manager().connection(self.test_db_path) as conn:
+            for label, sql, params in (
+                ('slot', "SELECT id FROM players WHERE slot = ?", (1,)),
+                ('name', "SELECT id FROM players WHERE name = ? ORDER BY id", ("x",)),
+                ('page', "SELECT id, name FROM players WHERE id > ? ORDER BY id LIMIT ?", (0, 10)),
+            ):
+                plans[label] = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+        self.assertIn('idx_players_slot', plans['slot'])
+        self.assertIn('idx_players_name', plans['name'])
+        self.assertIn('INTEGER PRIMARY KEY', plans['page'])
+        for plan in plans.values():
+            self.assertNotIn('SCAN', plan)
+
+    def test_list_players_pages_without_blobs(self):
+        """Tests keyset pagination of player summaries."""
+        for player_id in range(2, 6):
+            save_player(self.test_db_path, Player(player_id=player_id, name=f"P{player_id}", hp=1, max_hp=1, mp=1, max_mp=1))
+        first_page = list_players(self.test_db_path, limit=3)
+        self.assertEqual([summary['player_id'] for summary in first_page], [1, 2, 3])
+        self.assertNotIn('inventory', first_page[0])
+        self.assertEqual(first_page[0]['current_location'], "Test Location")
+        second_page = list_players(self.test_db_path, limit=3, after_id=3)
+        self.assertEqual([summary['player_id'] for summary in second_page], [4, 5])
+
+    def _append_turn(self, player, turn_number):
+        player.adventure_log.entries.append(
+            AdventureLogEntry(type="player_action", content=f"action {turn_number}", turn_number=turn_number))
+        player.adventure_log.entries.append(
+            AdventureLogEntry(type="ai_output", content=f"narrative {turn_number}", turn_number=turn_number))
+
+    def test_log_entries_are_appended_as_rows(self):
+        """Tests that each save inserts only the log entries added since the last save."""
+        player = load_player(self.test_db_path, 1)
+        self._append_turn(player, 1)
+        self.assertTrue(save_player_changes(self.test_db_path, player))
+        self._append_turn(player, 2)
+        self.assertTrue(save_player_changes(self.test_db_path, player))
+
+        conn = sqlite3.connect(self.test_db_path)
+        rows = conn.execute(
+            "SELECT turn_number, seq, type FROM adventure_log_entries WHERE player_id = 1 ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual(rows, [(1, 0, "player_action"), (1, 1, "ai_output"),
+                                (2, 0, "player_action"), (2, 1, "ai_output")])
+
+    def test_load_player_fetches_only_recent_log_entries(self):
+        """Tests that loading returns the newest max_log_entries and history keeps the rest."""
+        player = load_player(self.test_db_path, 1)
+        for turn_number in range(1, 9):
+            self._append_turn(player, turn_number)
+        save_player_changes(self.test_db_path, player)
+
+        loaded_player = load_player(self.test_db_path, 1, max_log_entries=4)
+        self.assertEqual([entry.turn_number for entry in loaded_player.adventure_log.entries], [7, 7, 8, 8])
+        self.assertEqual(loaded_player.adventure_log.entries[-1].content, "narrative 8")
+
+        older_entries = load_adventure_log_history(self.test_db_path, 1, limit=4, before_turn=7)
+        self.assertEqual([entry.turn_number for entry in older_entries], [5, 5, 6, 6])
+        self.assertEqual(older_entries[0].type, "player_action")
+
+    def test_trimming_in_memory_log_does_not_write(self):
+        """Tests that trimming the in-memory window alone is not a change to persist."""
+        player = load_player(self.test_db_path, 1)
+        self._append_turn(player, 1)
+        save_player_changes(self.test_db_path, player)
+        player.adventure_log.entries = player.adventure_log.entries[1:]
+        self.assertFalse(save_player_changes(self.test_db_path, player))
+
+    def test_write_behind_merges_and_group_commits(self):
+        """Tests that repeated saves of one player are merged and many players share one commit."""
+        writer = WriteBehindWriter(self.test_db_path, flush_interval=5)
+        try:
+            hero = load_player(self.test_db_path, 1)
+            others = [Player(player_id=10 + i, name=f"Soldier {i}", hp=20, max_hp=20, mp=0, max_mp=0) for i in range(5)]
+            for hp in (90, 80, 70):
+                hero.hp = hp
+                self.assertTrue(writer.submit(hero))
+            for other in others:
+                writer.submit(other)
+            self.assertFalse(writer.submit(hero), "Unchanged player should not be queued.")
+            self.assertTrue(writer.flush(timeout=5))
+        finally:
+            writer.close(timeout=5)
+
+        self.assertEqual(self.get_player_from_db(1)[2], 70)
+        for other in others:
+            self.assertIsNotNone(self.get_player_from_db(other.player_id))
+        self.assertEqual(writer.writes_merged, 2)
+        self.assertEqual(writer.writes_committed, 6)
+        self.assertEqual(writer.batches_committed, 1)
+
+    def test_write_behind_close_flushes_pending_writes(self):
+        """Tests that close() commits writes still inside the durability window."""
+        writer = WriteBehindWriter(self.test_db_path, flush_interval=60)
+        hero = load_player(self.test_db_path, 1)
+        hero.current_location = "Hastinapura"
+        writer.submit(hero)
+        writer.close(timeout=5)
+        self.assertEqual(self.get_player_from_db(1)[6], "Hastinapura")
+        with self.assertRaises(RuntimeError):
+            writer.submit(hero)
+
+    @patch('builtins.print')
+    def test_write_behind_failed_batch_is_reported_and_retried(self, mock_print):
+        """Tests that a batch the writer cannot commit leaves its player dirty and makes flush()/close() report the loss."""
+        writer = WriteBehindWriter(self.test_db_path, flush_interval=0.01, max_retries=2)
+        hero = load_player(self.test_db_path, 1)
+        hero.hp = 42
+        entry = AdventureLogEntry(type="player_action", content="hold the line", turn_number=7)
+        hero.adventure_log.entries.append(entry)
+        with patch.object(WriteBehindWriter, '_commit_batch', return_value=False):
+            self.assertTrue(writer.submit(hero))
+            self.assertFalse(hero.is_dirty())
+            self.assertFalse(writer.flush(timeout=5))
+        self.assertEqual(writer.writes_dropped, 1)
+        self.assertEqual(hero.get_dirty_fields(), {'hp', 'adventure_log'})
+        self.assertEqual(hero.get_unsaved_log_entries(), [entry])
+
+        self.assertTrue(writer.submit(hero)) # The next save retries the lost changes
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertFalse(writer.close(timeout=5), "close() reports that writes were dropped.")
+        self.assertEqual(self.get_player_from_db(1)[2], 42)
+        self.assertIn("hold the line", [e.content for e in load_player(self.test_db_path, 1).adventure_log.entries])
+
+    def test_write_behind_rewrites_a_deleted_row(self):
+        """Tests that a partial write whose row was deleted behind the writer saves the whole player instead."""
+        writer = WriteBehindWriter(self.test_db_path, flush_interval=60)
+        hero = load_player(self.test_db_path, 1)
+        conn = sqlite3.connect(self.test_db_path)
+        conn.execute("DELETE FROM players WHERE id = 1")
+        conn.commit()
+        conn.close()
+        hero.hp = 33
+        hero.adventure_log.entries.append(AdventureLogEntry(type="player_action", content="rebuild the camp", turn_number=8))
+        self.assertTrue(writer.submit(hero))
+        self.assertTrue(writer.close(timeout=5))
+
+        self.assertEqual(writer.writes_dropped, 0)
+        saved = load_player(self.test_db_path, 1)
+        self.assertEqual((saved.name, saved.hp), (hero.name, 33))
+        self.assertEqual([e.content for e in saved.adventure_log.entries].count("rebuild the camp"), 1)
+
 if __name__ == '__main__':
     unittest.main()
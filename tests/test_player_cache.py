@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import threading
+import time
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.player_cache import PlayerCache
+from game_engine.storage_backends import SQLiteBackend
+from game_engine.persistence_service import setup_database, save_player, load_player, close_connections
+from game_engine.character_manager import Player
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPlayerCache(unittest.TestCase):
+    """
+    Test suite for the PlayerCache class.
+    """
+    data_dir = 'data_test_cache'
+
+    def setUp(self):
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        self.db_path = os.path.join(self.data_dir, 'cache_test.db')
+        setup_database(self.db_path)
+        for player_id in (1, 2, 3):
+            save_player(self.db_path, Player(player_id=player_id, name=f"P{player_id}", hp=10, max_hp=10, mp=5, max_mp=5))
+        self.storage = SQLiteBackend(self.db_path)
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        if os.path.exists(self.data_dir) and not os.listdir(self.data_dir):
+            os.rmdir(self.data_dir)
+
+    def test_hit_returns_same_object_without_reloading(self):
+        """Tests that a cached player is returned as the same live object."""
+        cache = PlayerCache(self.storage, clock=self.clock)
+        first = cache.get(1)
+        second = cache.get(1)
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_miss_for_unknown_player_returns_none(self):
+        """Tests that a player missing from the database is not cached."""
+        cache = PlayerCache(self.storage, clock=self.clock)
+        self.assertIsNone(cache.get(999))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction_flushes_changes(self):
+        """Tests that the least recently used player is evicted and its changes saved."""
+        cache = PlayerCache(self.storage, max_size=2, clock=self.clock)
+        player_one = cache.get(1)
+        player_one.hp = 3 # Unsaved change
+        cache.get(2)
+        cache.get(3) # Evicts player 1, the least recently used
+
+        self.assertNotIn(1, cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(load_player(self.db_path, 1).hp, 3)
+
+    def test_idle_players_are_evicted(self):
+        """Tests idle-time eviction."""
+        cache = PlayerCache(self.storage, idle_timeout=60, clock=self.clock)
+        cache.get(1)
+        self.clock.now = 30
+        cache.get(2)
+        self.clock.now = 70
+        self.assertEqual(cache.evict_idle(), 1)
+        self.assertNotIn(1, cache)
+        self.assertIn(2, cache)
+
+    def test_save_writes_through(self):
+        """Tests that save() persists immediately and keeps the player cached."""
+        cache = PlayerCache(self.storage, clock=self.clock)
+        player = cache.get(2)
+        player.current_location = "Indraprastha"
+        self.assertTrue(cache.save(player))
+        self.assertEqual(load_player(self.db_path, 2).current_location, "Indraprastha")
+        self.assertIn(2, cache)
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_slow_load_does_not_block_other_sessions(self):
+        """Tests that a miss loads outside the cache lock and concurrent misses share one load."""
+        cache = PlayerCache(self.storage, clock=self.clock)
+        cache.get(2)
+        release_load = threading.Event()
+        real_load = self.storage.load_player
+        def slow_load(player_id, max_log_entries=None):
+            release_load.wait(5)
+            return real_load(player_id, max_log_entries)
+
+        with patch.object(self.storage, 'load_player', side_effect=slow_load) as load:
+            results = []
+            readers = [threading.Thread(target=lambda: results.append(cache.get(1))) for _ in range(3)]
+            for reader in readers:
+                reader.start()
+            time.sleep(0.05)
+            hit = threading.Thread(target=cache.get, args=(2,))
+            hit.start()
+            hit.join(1)
+            self.assertFalse(hit.is_alive(), "A hit for another player must not wait for player 1's load.")
+            release_load.set()
+            for reader in readers:
+                reader.join(5)
+
+        load.assert_called_once_with(1)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(player is results[0] for player in results))
+        self.assertIs(cache.get(1), results[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.prompt_builder import PromptBuilder, TokenCounter, estimate_tokens, rank_by_relevance
+from game_engine.character_manager import Player
+from game_engine.common_types import AdventureLogEntry
+
+
+class TestPromptBuilder(unittest.TestCase):
+    """
+    Test suite for the token-budgeted PromptBuilder.
+    """
+
+    def setUp(self):
+        self.player = Player(player_id=1, name="Veera", hp=90, max_hp=100, mp=40, max_mp=50)
+        self.player.current_location = "Kurukshetra - Battlefield Edge"
+        self.player.inventory = ["a simple dagger", "a healing herb", "a river stone"]
+        self.player.story_flags = {'war_just_started': True, 'met_king': False}
+
+    def test_state_is_encoded_compactly(self):
+        """Tests that lists and flags are written without Python reprs."""
+        prompt = PromptBuilder().build_turn(self.player, "look around")
+        self.assertIn("HP: 90/100", prompt.text)
+        self.assertIn("Inventory: ", prompt.text)
+        self.assertIn("Story flags: war_just_started, !met_king", prompt.text)
+        self.assertIn('The player says: "look around"', prompt.text)
+        self.assertNotIn("[", prompt.text)
+        self.assertNotIn("{", prompt.text)
+        self.assertEqual(prompt.omitted, {})
+        self.assertLessEqual(prompt.tokens, prompt.budget)
+
+    def test_trimming_keeps_relevant_and_recent_entries(self):
+        """Tests priority trimming of a long flag list to a small budget."""
+        self.player.story_flags = {f"old_rumour_{index}": True for index in range(200)}
+        self.player.story_flags['kurukshetra_gate_open'] = True # Relevant to the location
+        builder = PromptBuilder(turn_budget=100)
+        prompt = builder.build_turn(self.player, "use the healing herb")
+
+        self.assertLessEqual(prompt.tokens, 100)
+        self.assertIn("old_rumour_199, kurukshetra_gate_open", prompt.text) # Newest and relevant flags kept
+        self.assertNotIn("old_rumour_0,", prompt.text)
+        self.assertIn(f"(+{prompt.omitted['flags']} more)", prompt.text)
+        self.assertIn("a healing herb", prompt.text) # Higher priority sections are kept whole
+        self.assertIn('The player says: "use the healing herb"', prompt.text)
+
+    def test_rank_by_relevance(self):
+        """Tests that items sharing words with the context come first, then the newest."""
+        items = ["a torch", "a river stone", "a map", "a coil of rope"]
+        ranked = rank_by_relevance(items, "River Bank cross the river")
+        self.assertEqual([items[index] for index in ranked], ["a river stone", "a coil of rope", "a map", "a torch"])
+
+    def test_continuation_keeps_newest_log_entries(self):
+        """Tests that a long log is trimmed from the oldest end and shown in order."""
+        self.player.adventure_log.entries = [
+            AdventureLogEntry(type="player_action" if index % 2 == 0 else "ai_output",
+                              content=f"event number {index} " + "with many details " * 5, turn_number=index // 2)
+            for index in range(40)
+        ]
+        builder = PromptBuilder(continuation_budget=250)
+        prompt = builder.build_continuation(self.player, "Resume.", "Describe the scene.")
+        self.assertLessEqual(prompt.tokens, 250)
+        self.assertIn("log entries", prompt.omitted)
+        self.assertIn("event number 39", prompt.text)
+        self.assertNotIn("event number 0 ", prompt.text)
+        self.assertLess(prompt.text.index("event number 38"), prompt.text.index("event number 39"))
+        self.assertTrue(prompt.text.rstrip().endswith("Describe the scene."))
+
+    def test_token_counts_are_cached(self):
+        """Tests that repeated segments are only measured once."""
+        measured = []
+
+        def count(text):
+            measured.append(text)
+            return estimate_tokens(text)
+
+        builder = PromptBuilder(counter=TokenCounter(count_fn=count))
+        first = builder.build_turn(self.player, "look around")
+        measured_first = len(measured)
+        second = builder.build_turn(self.player, "look around")
+        self.assertEqual(first.tokens, second.tokens)
+        self.assertEqual(len(measured), measured_first) # Second build was served from the cache
+        self.assertGreater(builder.counter.hits, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.request_scheduler import (RequestScheduler, TokenBucket, PRIORITY_INTERACTIVE,
+                                           PRIORITY_BACKGROUND)
+
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Test suite for the TokenBucket class.
+    """
+
+    def test_refills_continuously_up_to_capacity(self):
+        """Tests the wait for a refill and that an idle bucket never holds more than its capacity."""
+        now = [0.0]
+        bucket = TokenBucket(per_minute=60, capacity=2, clock=lambda: now[0])
+        bucket.take(2)
+        self.assertAlmostEqual(bucket.wait_time(1), 1.0)
+        now[0] = 0.5
+        self.assertAlmostEqual(bucket.wait_time(1), 0.5)
+        now[0] = 100.0
+        self.assertEqual(bucket.available, 2)
+        self.assertEqual(bucket.wait_time(5), 0.0) # Oversized requests wait for a full bucket, not forever
+
+
+class TestRequestScheduler(unittest.TestCase):
+    """
+    Test suite for the RequestScheduler class.
+    """
+
+    def setUp(self):
+        # One request every 50ms, no burst: everything after the first request queues
+        self.scheduler = RequestScheduler(requests_per_minute=1200, burst=1)
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    def test_interactive_first_then_round_robin_between_sessions(self):
+        """Tests that queued turns go before background work and busy sessions do not starve others."""
+        granted = []
+
+        async def request(session, priority=PRIORITY_INTERACTIVE):
+            await self.scheduler.acquire_async(session, priority)
+            granted.append((session, priority))
+
+        async def main():
+            await asyncio.gather(request('alice'), request('bob', PRIORITY_BACKGROUND), request('alice'),
+                                 request('alice'), request('carol'))
+
+        asyncio.run(main())
+
+        self.assertEqual(granted, [('alice', PRIORITY_INTERACTIVE), ('alice', PRIORITY_INTERACTIVE),
+                                   ('carol', PRIORITY_INTERACTIVE), ('alice', PRIORITY_INTERACTIVE),
+                                   ('bob', PRIORITY_BACKGROUND)])
+        stats = self.scheduler.stats()
+        self.assertEqual((stats.granted, stats.queue_depth), (5, 0))
+        self.assertGreater(stats.wait_max_ms, 100)
+        self.assertIn('background', stats.wait_p95_ms_by_priority)
+
+    def test_cancelled_request_leaves_the_queue(self):
+        """Tests that queue depth is reported and a superseded turn withdraws its request."""
+        scheduler = RequestScheduler(requests_per_minute=1, burst=1)
+        self.addCleanup(scheduler.close)
+
+        async def main():
+            await scheduler.acquire_async('alice')
+            waiting = asyncio.ensure_future(scheduler.acquire_async('alice'))
+            await asyncio.sleep(0.01)
+            depth = scheduler.stats().queue_depth_by_priority
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            return depth
+
+        self.assertEqual(asyncio.run(main()), {'interactive': 1})
+        self.assertEqual(scheduler.stats().queue_depth, 0)
+
+    def test_sync_acquire_respects_token_quota_and_timeout(self):
+        """Tests that a request too large for the remaining tokens per minute waits, and times out."""
+        scheduler = RequestScheduler(requests_per_minute=1000, tokens_per_minute=600)
+        self.addCleanup(scheduler.close)
+        self.assertEqual(scheduler.acquire('alice', tokens=590), 0.0)
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            scheduler.acquire('bob', tokens=100, timeout=0.05)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(scheduler.stats().queue_depth, 0)
+        self.assertGreater(scheduler.acquire('bob', tokens=15), 0.0) # Waits ~0.5s for 5 tokens to refill
+
+    @patch('builtins.print')
+    def test_long_waits_are_reported(self, mock_print):
+        """Tests that a request held back longer than the warning threshold is printed."""
+        scheduler = RequestScheduler(requests_per_minute=1200, burst=1, slow_wait_warning=0.01)
+        self.addCleanup(scheduler.close)
+        scheduler.acquire('alice')
+        scheduler.acquire('alice')
+        self.assertIn("interactive request waited", mock_print.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
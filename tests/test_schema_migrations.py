@@ -0,0 +1,86 @@
+import unittest
+import sqlite3
+import os
+import sys
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.schema_migrations import migrate, get_schema_version, MIGRATIONS, LATEST_SCHEMA_VERSION
+from game_engine.common_types import AdventureLog, AdventureLogEntry
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    """
+    Test suite for the schema_migrations module.
+    """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+
+    def tearDown(self):
+        self.conn.close()
+
+    def table_names(self):
+        rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+        return {row[0] for row in rows}
+
+    def test_fresh_database_is_migrated_to_latest(self):
+        """Tests that an empty database gets every table and the latest version."""
+        self.assertEqual(migrate(self.conn), LATEST_SCHEMA_VERSION)
+        self.assertEqual(get_schema_version(self.conn), LATEST_SCHEMA_VERSION)
+        self.assertTrue({'players', 'adventure_log_entries'} <= self.table_names())
+
+    def test_current_database_is_left_alone(self):
+        """Tests that migrating an up-to-date database runs no migration."""
+        migrate(self.conn)
+        calls = []
+        extra_migrations = MIGRATIONS[:-1] + [(MIGRATIONS[-1][0], "should not run", lambda cursor: calls.append(1))]
+        self.assertEqual(migrate(self.conn, extra_migrations), LATEST_SCHEMA_VERSION)
+        self.assertEqual(calls, [])
+
+    def test_legacy_database_is_upgraded_and_log_blob_moved(self):
+        """Tests upgrading a database created by the old CREATE + ALTER setup code."""
+        self.conn.execute('''
+            CREATE TABLE players (
+                id INTEGER PRIMARY KEY, name TEXT NOT NULL, hp INTEGER, max_hp INTEGER,
+                mp INTEGER, max_mp INTEGER, current_location TEXT, story_flags TEXT, inventory TEXT,
+                adventure_log TEXT
+            )
+        ''')
+        legacy_log = AdventureLog(entries=[
+            AdventureLogEntry(type="player_action", content="old action", turn_number=3),
+            AdventureLogEntry(type="ai_output", content="old narrative", turn_number=3),
+        ])
+        self.conn.execute(
+            "INSERT INTO players VALUES (1, 'Veera', 100, 100, 50, 50, 'Camp', '{}', '[]', ?)",
+            (legacy_log.model_dump_json(),)
+        )
+        self.conn.commit()
+
+        migrate(self.conn)
+        migrate(self.conn) # A second run must not duplicate entries
+
+        rows = self.conn.execute(
+            "SELECT turn_number, seq, type, content FROM adventure_log_entries WHERE player_id = 1 ORDER BY seq"
+        ).fetchall()
+        self.assertEqual(rows, [(3, 0, "player_action", "old action"), (3, 1, "ai_output", "old narrative")])
+        blob = self.conn.execute("SELECT adventure_log FROM players WHERE id = 1").fetchone()[0]
+        self.assertIsNone(blob)
+        slot = self.conn.execute("SELECT slot FROM players WHERE id = 1").fetchone()[0]
+        self.assertEqual(slot, 1) # The single legacy player becomes the slot 1 save
+
+    def test_failed_migration_rolls_back(self):
+        """Tests that a failing migration leaves the previous version and no partial changes."""
+        def broken_migration(cursor):
+            cursor.execute("CREATE TABLE half_done (id INTEGER)")
+            raise sqlite3.OperationalError("simulated failure")
+
+        migrations = MIGRATIONS + [(LATEST_SCHEMA_VERSION + 1, "broken", broken_migration)]
+        with self.assertRaises(sqlite3.OperationalError):
+            migrate(self.conn, migrations)
+        self.assertEqual(get_schema_version(self.conn), LATEST_SCHEMA_VERSION)
+        self.assertNotIn('half_done', self.table_names())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.storage_backends import StorageBackend, SQLiteBackend, InMemoryBackend, FilePerPlayerBackend
+from game_engine.character_manager import Player
+from game_engine.common_types import AdventureLogEntry
+
+
+class StorageBackendContract:
+    """
+    Behaviour every StorageBackend must share. Concrete test cases provide make_backend().
+    """
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.backend = self.make_backend()
+        self.backend.setup()
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_player(self, player_id=1, turns=0):
+        player = Player(player_id=player_id, name=f"Player {player_id}", hp=50, max_hp=50, mp=20, max_mp=20)
+        player.story_flags = {"arrived": True}
+        player.inventory = ["lamp"]
+        for turn_number in range(1, turns + 1):
+            player.adventure_log.entries.append(
+                AdventureLogEntry(type="player_action", content=f"act {turn_number}", turn_number=turn_number))
+        return player
+
+    def test_implements_protocol(self):
+        self.assertIsInstance(self.backend, StorageBackend)
+
+    def test_save_and_load_round_trip(self):
+        player = self.make_player(turns=3)
+        self.backend.save_player(player)
+        loaded = self.backend.load_player(1)
+        self.assertIsNot(loaded, player)
+        self.assertEqual((loaded.name, loaded.hp, loaded.story_flags, loaded.inventory),
+                         (player.name, player.hp, player.story_flags, player.inventory))
+        self.assertEqual([entry.content for entry in loaded.adventure_log.entries], ["act 1", "act 2", "act 3"])
+        self.assertFalse(loaded.is_dirty())
+
+    def test_load_missing_player_returns_none(self):
+        self.assertIsNone(self.backend.load_player(42))
+
+    def test_changes_are_saved_and_unchanged_players_skipped(self):
+        player = self.make_player()
+        self.backend.save_player(player)
+        self.assertFalse(self.backend.save_player_changes(player))
+        player.hp = 7
+        player.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content="ouch", turn_number=1))
+        self.assertTrue(self.backend.save_player_changes(player))
+        self.backend.flush()
+        loaded = self.backend.load_player(1)
+        self.assertEqual(loaded.hp, 7)
+        self.assertEqual(loaded.adventure_log.entries[-1].content, "ouch")
+
+    def test_load_limits_log_entries(self):
+        self.backend.save_player(self.make_player(turns=6))
+        loaded = self.backend.load_player(1, max_log_entries=2)
+        self.assertEqual([entry.turn_number for entry in loaded.adventure_log.entries], [5, 6])
+
+    def test_delete_and_iterate(self):
+        self.backend.save_many([self.make_player(player_id) for player_id in (3, 1, 2)])
+        self.backend.flush()
+        self.assertEqual(list(self.backend.iter_player_ids()), [1, 2, 3])
+        self.assertTrue(self.backend.delete_player(2))
+        self.assertFalse(self.backend.delete_player(2))
+        self.assertEqual(list(self.backend.iter_player_ids()), [1, 3])
+        self.assertEqual(sorted(self.backend.load_many([1, 2, 3])), [1, 3])
+
+    def test_create_player_assigns_id_and_claims_slot(self):
+        first = Player(player_id=None, name="Arjuna", hp=50, max_hp=50, mp=20, max_mp=20, slot=1)
+        second = Player(player_id=None, name="Arjuna", hp=50, max_hp=50, mp=20, max_mp=20, slot=2)
+        first_id = self.backend.create_player(first)
+        second_id = self.backend.create_player(second)
+        self.assertIsNotNone(first_id)
+        self.assertNotEqual(first_id, second_id)
+        self.assertEqual(self.backend.find_player_id_by_slot(2), second_id)
+        self.assertIsNone(self.backend.find_player_id_by_slot(3))
+        self.assertEqual(self.backend.find_player_ids_by_name("Arjuna"), [first_id, second_id])
+        self.assertEqual(self.backend.load_player(second_id).slot, 2)
+
+        taken = Player(player_id=None, name="Karna", hp=50, max_hp=50, mp=20, max_mp=20, slot=1)
+        with patch('builtins.print'):
+            self.assertIsNone(self.backend.create_player(taken))
+        self.assertEqual(self.backend.find_player_ids_by_name("Karna"), [])
+
+    def test_list_players_is_paginated(self):
+        self.backend.save_many([self.make_player(player_id, turns=2) for player_id in range(1, 6)])
+        first_page = self.backend.list_players(limit=2)
+        self.assertEqual([summary['player_id'] for summary in first_page], [1, 2])
+        self.assertEqual(first_page[0]['name'], "Player 1")
+        next_page = self.backend.list_players(limit=2, after_id=first_page[-1]['player_id'])
+        self.assertEqual([summary['player_id'] for summary in next_page], [3, 4])
+        self.assertEqual(len(self.backend.list_players(limit=10, after_id=4)), 1)
+
+
+class TestSQLiteBackend(StorageBackendContract, unittest.TestCase):
+    def make_backend(self):
+        return SQLiteBackend(os.path.join(self.temp_dir, 'backend_test.db'))
+
+
+class TestSQLiteBackendWriteBehind(StorageBackendContract, unittest.TestCase):
+    def make_backend(self):
+        return SQLiteBackend(os.path.join(self.temp_dir, 'backend_test.db'), write_behind=True, write_behind_window=0.05)
+
+
+class TestInMemoryBackend(StorageBackendContract, unittest.TestCase):
+    def make_backend(self):
+        return InMemoryBackend()
+
+
+class TestFilePerPlayerBackend(StorageBackendContract, unittest.TestCase):
+    def make_backend(self):
+        return FilePerPlayerBackend(os.path.join(self.temp_dir, 'players'), fsync=False)
+
+    def test_state_file_is_replaced_atomically(self):
+        player = self.make_player()
+        self.backend.save_player(player)
+        player.current_location = "River bank"
+        self.backend.save_player_changes(player)
+        leftover_files = [name for name in os.listdir(self.backend.directory) if name.endswith('.tmp')]
+        self.assertEqual(leftover_files, [])
+        self.assertEqual(self.backend.load_player(1).current_location, "River bank")
+
+    @unittest.skipUnless(hasattr(os, 'O_DIRECTORY'), "directory fsync needs O_DIRECTORY")
+    def test_rename_is_followed_by_a_directory_fsync(self):
+        backend = FilePerPlayerBackend(os.path.join(self.temp_dir, 'durable'), fsync=True)
+        backend.setup()
+        synced = []
+        real_fsync = os.fsync
+        def record_fsync(fd):
+            synced.append(stat.S_ISDIR(os.fstat(fd).st_mode))
+            real_fsync(fd)
+        with patch('game_engine.storage_backends.os.fsync', side_effect=record_fsync), \
+             patch('game_engine.storage_backends.os.replace', wraps=os.replace) as replace:
+            backend.save_player(self.make_player())
+        replace.assert_called_once()
+        self.assertEqual(synced, [False, True]) # The temp file, then the directory after the rename
+
+    @patch('builtins.print')
+    def test_torn_log_line_only_loses_that_line(self, mock_print):
+        """Tests that a line cut short by a crash is skipped on load and the next append starts a new line."""
+        player = self.make_player(turns=3)
+        self.backend.save_player(player)
+        with open(self.backend._log_path(1), 'a', encoding='utf-8') as log_file:
+            log_file.write('{"type": "player_action", "cont')
+        self.assertEqual([entry.content for entry in self.backend.load_player(1).adventure_log.entries],
+                         ["act 1", "act 2", "act 3"])
+
+        player.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content="dawn", turn_number=4))
+        self.assertTrue(self.backend.save_player_changes(player))
+        self.assertEqual([entry.content for entry in self.backend.load_player(1).adventure_log.entries],
+                         ["act 1", "act 2", "act 3", "dawn"])
+
+    @patch('builtins.print')
+    def test_failed_log_append_is_retried_without_duplicates(self, mock_print):
+        """Tests that a failed append is cut off and retried alone once the state file is already saved."""
+        backend = FilePerPlayerBackend(os.path.join(self.temp_dir, 'durable'), fsync=True)
+        backend.setup()
+        player = self.make_player(turns=1)
+        backend.save_player(player)
+        player.hp = 9
+        player.adventure_log.entries.append(AdventureLogEntry(type="ai_output", content="rain", turn_number=2))
+        real_fsync, calls = os.fsync, []
+        def failing_log_fsync(fd):
+            calls.append(fd)
+            if len(calls) == 3: # The temp state file, the directory, then the log
+                raise OSError("disk full")
+            real_fsync(fd)
+        with patch('game_engine.storage_backends.os.fsync', side_effect=failing_log_fsync):
+            self.assertFalse(backend.save_player_changes(player))
+        self.assertEqual(backend.load_player(1).hp, 9)
+        self.assertEqual(len(backend.load_player(1).adventure_log.entries), 1) # The partial append was cut off
+        self.assertEqual(player.get_dirty_fields(), {'adventure_log'})
+
+        self.assertTrue(backend.save_player_changes(player))
+        self.assertEqual([entry.content for entry in backend.load_player(1).adventure_log.entries], ["act 1", "rain"])
+
+if __name__ == '__main__':
+    unittest.main()
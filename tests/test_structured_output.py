@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import google.generativeai as genai
+from google.generativeai.types import generation_types
+from game_engine.structured_output import (
+    TURN_RESPONSE_SCHEMA, RESPONSE_MIME_TYPE, schema_for_model, updates_from_wire, updates_to_wire
+)
+from game_engine.common_types import GameStateUpdates
+
+
+class TestStructuredOutput(unittest.TestCase):
+
+    def test_schema_is_derived_from_game_state_updates(self):
+        """Tests that every GameStateUpdates field appears with its type and description."""
+        schema = schema_for_model(GameStateUpdates)
+        self.assertEqual(set(schema['properties']), {'inventory_add', 'inventory_remove', 'hp_change', 'mp_change',
+                                                     'new_story_flags', 'new_location', 'player_name', 'skill_used'})
+        self.assertEqual(schema['properties']['hp_change']['type'], 'integer')
+        self.assertEqual(schema['properties']['inventory_add'], {'type': 'array', 'items': {'type': 'string'},
+                                                                 'description': "Items the player gains."})
+        self.assertTrue(schema['properties']['new_location']['nullable'])
+        flag_item = schema['properties']['new_story_flags']['items']
+        self.assertEqual(flag_item['properties']['value'], {'type': 'boolean'})
+        self.assertEqual(TURN_RESPONSE_SCHEMA['required'], ['narrative', 'game_state_updates'])
+
+    def test_schema_is_accepted_by_the_generation_config(self):
+        """Tests that the SDK converts the schema into its request form."""
+        config = generation_types.to_generation_config_dict(
+            genai.GenerationConfig(response_mime_type=RESPONSE_MIME_TYPE, response_schema=TURN_RESPONSE_SCHEMA))
+        updates_schema = config['response_schema'].properties['game_state_updates']
+        self.assertIn('new_story_flags', updates_schema.properties)
+
+    def test_story_flags_round_trip_through_the_wire_format(self):
+        """Tests that name/value pairs become a dict again, and prose-mode replies pass through."""
+        updates = {'hp_change': -3, 'new_story_flags': {'gate_open': True, 'guard_alert': False}}
+        wire = updates_to_wire(updates)
+        self.assertEqual(wire['new_story_flags'], [{'name': 'gate_open', 'value': True},
+                                                   {'name': 'guard_alert', 'value': False}])
+        self.assertEqual(updates_from_wire(wire), updates)
+        self.assertEqual(updates_from_wire(updates), updates)
+        self.assertEqual(GameStateUpdates(**updates_from_wire({'new_story_flags': []})).new_story_flags, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add the parent directory to the Python path to allow importing from game_engine
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game_engine.ai_cassette import Cassette, RecordingBackend
+from game_engine.game_manager import GameManager
+from game_engine.llm_backends import MockLLMBackend
+from game_engine.storage_backends import InMemoryBackend
+from game_engine.turn_benchmark import BenchmarkUI, run_benchmarks, format_report
+
+
+class TestTurnBenchmark(unittest.TestCase):
+    """
+    Test suite for the turn_benchmark module.
+    """
+
+    @patch('builtins.print')
+    def test_recorded_session_replays_in_every_mode(self, mock_print):
+        """Tests that a session recorded through GameManager replays with every turn matched."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'session.jsonl.gz')
+            game_manager = GameManager(ui_manager=BenchmarkUI(), storage=InMemoryBackend(),
+                                       llm_backend=RecordingBackend(MockLLMBackend(), Cassette(path)),
+                                       prefetch_opening_scene=False)
+            for action in ("look around", "attack the asura", "drink from the river"):
+                game_manager.process_player_command_from_js(action)
+            game_manager.memory_keeper.close()
+
+            report = run_benchmarks(path, runs=2)
+
+        self.assertEqual(report['turns_per_run'], 3)
+        self.assertEqual([row['mode'] for row in report['results']], ['sync', 'stream', 'async'])
+        for row in report['results']:
+            self.assertEqual(row['count'], 6)
+            self.assertEqual(row['exact_matches'], 6)
+            self.assertEqual(row['approximate_matches'], 0)
+        self.assertIn('stream', format_report(report))
+
+if __name__ == '__main__':
+    unittest.main()
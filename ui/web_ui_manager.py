@@ -44,6 +44,31 @@ class WebUIManager:
             print(f"WebUIManager: JS not ready. Story text (type: {msg_type}) not sent: {text_snippet}")
 
 
+    # Streaming channel: begin_story_stream() opens a new story message, append_story_stream()
+    # adds text to the end of it as the AI generates it, and end_story_stream() closes it.
+    def begin_story_stream(self, msg_type: str = 'normal'):
+        if self.is_ready:
+            eel.begin_narrative_stream(msg_type)
+        else:
+            print(f"WebUIManager: JS not ready. Story stream (type: {msg_type}) not opened.")
+
+    def append_story_stream(self, fragment: str):
+        if self.is_ready:
+            eel.append_narrative_stream(fragment)
+        else:
+            fragment_snippet = fragment[:100] + "..." if len(fragment) > 100 else fragment
+            print(f"WebUIManager: JS not ready. Story fragment not sent: {fragment_snippet}")
+
+    def end_story_stream(self):
+        if self.is_ready:
+            eel.end_narrative_stream()
+
+
+    def sleep(self, seconds: float):
+        # Yields to Eel's other greenlets (e.g. a newer command) while Python waits on the AI.
+        eel.sleep(seconds)
+
+
     def update_player_display(self, player): # player is a Player object
         if not self.is_ready or not player:
             player_name_for_log = "N/A"
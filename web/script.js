@@ -103,6 +103,76 @@ function update_narrative(text_line, type = 'normal') {
     }
 }
 
+// --- Streaming narrative: one message that grows as the AI generates it ---
+let currentStreamMessage = null; // { wrapper, paragraph, type } of the message being streamed
+
+function scrollNarrativeToBottom() {
+    const scrollContainer = document.getElementById('narrativeArea');
+    if (scrollContainer) {
+        requestAnimationFrame(() => {
+            requestAnimationFrame(() => {
+                scrollContainer.scrollTop = scrollContainer.scrollHeight;
+            });
+        });
+    }
+}
+
+function newStreamParagraph(type) {
+    const p = document.createElement('p');
+    p.className = type === 'command_response'
+        ? 'text-gray-200 text-lg leading-relaxed md:pl-8 mb-2'
+        : 'text-gray-200 text-lg leading-relaxed mb-2';
+    return p;
+}
+
+eel.expose(begin_narrative_stream);
+function begin_narrative_stream(type = 'normal') {
+    const narrativeContainer = document.getElementById('narrativeArea');
+    if (!narrativeContainer) {
+        console.error("Narrative container #narrativeArea not found!");
+        return;
+    }
+
+    const placeholder = narrativeContainer.querySelector('p.italic.text-neutral-400');
+    if (placeholder && placeholder.textContent.includes("The air grows heavy")) {
+        placeholder.remove();
+    }
+
+    const wrapperDiv = document.createElement('div');
+    wrapperDiv.className = 'mb-4';
+    const paragraph = newStreamParagraph(type);
+    wrapperDiv.appendChild(paragraph);
+    narrativeContainer.appendChild(wrapperDiv);
+    currentStreamMessage = { wrapper: wrapperDiv, paragraph: paragraph, type: type };
+}
+
+eel.expose(append_narrative_stream);
+function append_narrative_stream(fragment) {
+    if (!currentStreamMessage) {
+        begin_narrative_stream();
+        if (!currentStreamMessage) {
+            return;
+        }
+    }
+    // Text nodes, not innerHTML, so streamed text needs no escaping; newlines start a new paragraph.
+    const parts = String(fragment).split('\n');
+    parts.forEach((part, index) => {
+        if (index > 0) {
+            currentStreamMessage.paragraph = newStreamParagraph(currentStreamMessage.type);
+            currentStreamMessage.wrapper.appendChild(currentStreamMessage.paragraph);
+        }
+        if (part) {
+            currentStreamMessage.paragraph.appendChild(document.createTextNode(part));
+        }
+    });
+    scrollNarrativeToBottom();
+}
+
+eel.expose(end_narrative_stream);
+function end_narrative_stream() {
+    currentStreamMessage = null;
+}
+
 eel.expose(update_player_stats);
 // New signature: added 'name' as the first parameter
 function update_player_stats(name, hp, max_hp, mp, max_mp, location) {